@@ -1,14 +1,43 @@
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Request, Header, WebSocket
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field, ValidationError
+from typing import Dict, List, Optional
+from contextlib import asynccontextmanager
 import traceback
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import os
+import threading
+import time
+import uuid
 from app.core.ai_agent import get_response_from_ai_agents
 from app.config.settings import settings
-from app.common.logger import get_logger, log_full_traceback
+from app.common.logger import get_logger, log_full_traceback, log_maintenance, LOGS_DIR
+from app.common.log_analytics import format_request_completed
+from app.common.tracing import tracer, configure_tracing
 from app.common.custom_exception import CustomException
+from app.backend.jobs import JobQueue, create_job_store, JOB_PENDING, TERMINAL_STATUSES
+from app.backend.tenancy import UsageLedger, FairShareScheduler, resolve_tenant, check_tenant_limits
+from app.backend.concurrency import AdaptiveConcurrency
+from app.backend.worker_pool import AgentWorkerPool
+from app.core.prompts import PromptRegistry
+from app.core.moderation import ContentFlaggedError
+from app.core.hedging import RunCancelled
+from app.core.budget import LatencyTargetExceeded, DeadlineSaturated
+from app.backend.compression import CompressionMiddleware, available_encodings
+from app.backend.sessions import SessionStore
+from app.backend.websocket_chat import ChatConnection
+from app.backend.tiers import apply_tier, latency_limits
+from app.backend.cache_warming import CacheWarmer, format_query_record, parse_hours
+from app.common.shared_state import get_shared_state
+from app.core.caching import ResponseCache
+from app.backend.profiling import ProfilingMiddleware, attach_current_thread, profile_path
+from app.backend.serialization import (
+    FastJSONResponse, set_json_encoder, json_encoder_name, msgpack_available, negotiate_media_type, ndjson_line,
+    dumps_msgpack, NDJSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE
+)
 
 try:
     from groq import BadRequestError
@@ -17,7 +46,109 @@ except ImportError:
 
 logger = get_logger(__name__)
 
-app = FastAPI(title="MULTI AI AGENT")
+# State shared by every task of the deployment (in-process unless SHARED_STATE_BACKEND=redis)
+shared_state = get_shared_state()
+response_cache = ResponseCache(shared_state, settings.RESPONSE_CACHE_TTL)
+session_store = SessionStore(shared_state, settings.SESSION_TTL, settings.SESSION_MAX_TURNS)
+
+# Per-tenant accounting and scheduling; quotas and fair shares only hold for tenants proven by an API key
+for warning in check_tenant_limits(settings.TENANT_API_KEYS, settings.TENANT_TOKEN_QUOTA,
+                                   settings.TENANT_REQUEST_QUOTA, settings.TENANT_QUOTAS,
+                                   settings.MAX_CONCURRENT_REQUESTS):
+    logger.warning(warning)
+usage_ledger = UsageLedger(
+    window_seconds=settings.QUOTA_WINDOW_SECONDS,
+    token_quota=settings.TENANT_TOKEN_QUOTA,
+    request_quota=settings.TENANT_REQUEST_QUOTA,
+    tenant_quotas=settings.TENANT_QUOTAS,
+    flush_path=settings.USAGE_LOG_PATH,
+    flush_interval=settings.USAGE_FLUSH_INTERVAL,
+    # Local counters are already exact for a single task
+    shared_state=shared_state if settings.SHARED_STATE_BACKEND != "memory" else None,
+    sync_interval=settings.QUOTA_SYNC_INTERVAL
+)
+scheduler = FairShareScheduler(settings.MAX_CONCURRENT_REQUESTS)
+
+# Per-model upstream concurrency that adapts to observed latency and 429s
+adaptive_limits = AdaptiveConcurrency(
+    enabled=settings.ADAPTIVE_CONCURRENCY_ENABLED,
+    initial_limit=settings.ADAPTIVE_INITIAL_LIMIT,
+    min_limit=settings.ADAPTIVE_MIN_LIMIT,
+    max_limit=settings.ADAPTIVE_MAX_LIMIT,
+    backoff=settings.ADAPTIVE_BACKOFF,
+    latency_tolerance=settings.ADAPTIVE_LATENCY_TOLERANCE
+)
+
+# Agent runs in warm worker processes, so their CPU work does not share this process's GIL
+worker_pool = AgentWorkerPool(
+    settings.AGENT_WORKER_PROCESSES,
+    max_tasks=settings.AGENT_WORKER_MAX_TASKS,
+    warm_models=settings.AGENT_WORKER_WARM_MODELS or settings.ALLOWED_MODEL_NAMES
+) if settings.AGENT_WORKER_PROCESSES > 0 else None
+
+def _run_agent(*args, **kwargs):
+    """get_response_from_ai_agents, in a worker process when they are enabled"""
+    run_agent = worker_pool.get_response if worker_pool is not None else get_response_from_ai_agents
+    return run_agent(*args, **kwargs)
+
+# Off-peak pre-computation of frequently asked answers, mined from the query records in the logs
+cache_warmer = CacheWarmer(
+    response_cache,
+    run_agent=_run_agent,
+    state=shared_state,
+    log_dir=LOGS_DIR,
+    lookback_days=settings.CACHE_WARM_LOOKBACK_DAYS,
+    top_n=settings.CACHE_WARM_TOP_N,
+    half_life_days=settings.CACHE_WARM_HALF_LIFE_DAYS,
+    peak_hours=parse_hours(settings.CACHE_WARM_PEAK_HOURS),
+    warm_hours=parse_hours(settings.CACHE_WARM_HOURS),
+    daily_budget_usd=settings.CACHE_WARM_DAILY_BUDGET_USD,
+    check_interval=settings.CACHE_WARM_CHECK_INTERVAL,
+    record_usage=lambda model_name, usage, usage_by_model=None: usage_ledger.record(
+        settings.CACHE_WARM_TENANT, model_name, usage, usage_by_model=usage_by_model)
+) if settings.CACHE_WARMING_ENABLED else None
+
+# Registered system prompt templates, kept in step across tasks through the shared state
+prompt_registry = PromptRegistry(
+    state=shared_state if settings.SHARED_STATE_BACKEND != "memory" else None,
+    sync_interval=settings.PROMPT_SYNC_INTERVAL
+)
+prompt_registry.load_file(settings.PROMPT_TEMPLATES_FILE)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if worker_pool is not None:
+        await asyncio.to_thread(worker_pool.start)
+    if cache_warmer is not None:
+        cache_warmer.start()
+    log_maintenance.start()
+    yield
+    log_maintenance.stop()
+    if _job_queue is not None:
+        _job_queue.shutdown(wait=False, cancel_queued=True)
+    if cache_warmer is not None:
+        cache_warmer.stop()
+    if worker_pool is not None:
+        worker_pool.shutdown()
+    usage_ledger.close()
+
+def _codec_fallbacks():
+    """Configured encoders and codecs whose optional package is missing, as startup warnings"""
+    warnings = []
+    if settings.JSON_ENCODER == "orjson" and json_encoder_name() != "orjson":
+        warnings.append("orjson is not installed; JSON responses use the slower standard json encoder")
+    if not msgpack_available():
+        warnings.append("ormsgpack is not installed; MessagePack responses are unavailable")
+    if settings.COMPRESSION_ENABLED and "br" not in available_encodings():
+        warnings.append("brotli is not installed; responses are compressed with gzip only")
+    return warnings
+
+set_json_encoder(settings.JSON_ENCODER)
+for warning in _codec_fallbacks():
+    logger.warning(warning)
+configure_tracing(settings.TRACING_EXPORTER, settings.TRACING_SAMPLE_RATE, settings.TRACING_FILE)
+
+app = FastAPI(title="MULTI AI AGENT", lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # Enable debug mode if in development
 DEBUG_MODE = os.getenv("DEBUG", "false").lower() == "true"
@@ -34,11 +165,54 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large responses for clients that accept gzip/brotli
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MIN_SIZE,
+        gzip_level=settings.GZIP_LEVEL,
+        brotli_quality=settings.BROTLI_QUALITY
+    )
+
+# Admin-only per-request profiling (X-Profile: 1 or ?profile=1); outermost so it covers body validation
+if settings.PROFILING_ENABLED:
+    app.add_middleware(
+        ProfilingMiddleware,
+        store_dir=settings.PROFILE_DIR,
+        admin_key=settings.ADMIN_API_KEY,
+        interval=settings.PROFILE_SAMPLE_INTERVAL,
+        top_n=settings.PROFILE_TOP_N,
+        tracemalloc_frames=settings.PROFILE_TRACEMALLOC_FRAMES
+    )
+
 class RequestState(BaseModel):
     model_name:str
-    system_prompt:str
+    system_prompt:str = ""
     messages:List[str]
     allow_search: bool
+    allow_retrieval: bool = False
+    system_prompt_id: Optional[str] = None
+    system_prompt_version: Optional[int] = None
+    prompt_variables: Optional[Dict[str, str]] = None
+    session_id: Optional[str] = None
+    max_steps: Optional[int] = None
+    max_tool_calls: Optional[int] = None
+    max_tokens: Optional[int] = None
+    include_trace: bool = False
+    supervisor: bool = False
+    tier: Optional[str] = None
+    max_output_tokens: Optional[int] = Field(None, gt=0)
+    temperature: Optional[float] = Field(None, ge=0, le=2)
+    max_results: Optional[int] = Field(None, gt=0)
+
+class BatchRequest(BaseModel):
+    requests: List[RequestState]
+
+class PromptTemplateRequest(BaseModel):
+    id: str
+    text: str
+    version: Optional[int] = None
+    description: str = ""
 
 # Helper functions for error handling
 def _is_model_decommissioned(error_msg: str) -> bool:
@@ -62,6 +236,18 @@ def _handle_value_error(e: ValueError) -> HTTPException:
     error_msg = str(e)
     error_details = log_full_traceback(logger, e, "ValueError in /chat endpoint: ")
     
+    if isinstance(e, ContentFlaggedError):
+        return HTTPException(
+            status_code=400,
+            detail=_create_error_detail(
+                "Content Flagged",
+                "ContentFlaggedError",
+                error_msg,
+                error_details["traceback"],
+                categories=e.verdict["categories"]
+            )
+        )
+    
     if "TAVILY_API_KEY" in error_msg:
         logger.error("TAVILY_API_KEY is missing but allow_search=True")
         return HTTPException(
@@ -142,6 +328,7 @@ def _handle_generic_exception(e: Exception, request: RequestState) -> HTTPExcept
             request_details={
                 "model_name": request.model_name,
                 "allow_search": request.allow_search,
+                "allow_retrieval": request.allow_retrieval,
                 "messages_count": len(request.messages)
             }
         )
@@ -153,7 +340,7 @@ async def global_exception_handler(request: Request, exc: Exception):
     error_details = log_full_traceback(logger, exc, f"Unhandled exception in {request.url.path}: ")
     
     if DEBUG_MODE:
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=500,
             content={
                 "error": INTERNAL_SERVER_ERROR,
@@ -165,54 +352,489 @@ async def global_exception_handler(request: Request, exc: Exception):
             }
         )
     else:
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=500,
             content={
                 "error": INTERNAL_SERVER_ERROR,
                 "error_type": error_details["error_type"],
                 "error_message": error_details["error_message"],
-                "traceback": error_details["traceback"]  # Include traceback even in production for debugging
+                # Include traceback even in production for debugging, unless disabled to keep error bodies small
+                "traceback": error_details["traceback"] if settings.ERROR_TRACEBACKS else None
             }
         )
 
-@app.post("/chat")
-def chat_endpoint(request: RequestState):
-    """Handle chat requests to AI agents"""
-    logger.info(f"Received request for model: {request.model_name}, allow_search: {request.allow_search}")
-    logger.info(f"Request details: messages_count={len(request.messages)}, system_prompt_length={len(request.system_prompt)}")
-
-    # Validate model name
+def _validate_model_name(request: RequestState):
+    """Reject models outside ALLOWED_MODEL_NAMES"""
     if request.model_name not in settings.ALLOWED_MODEL_NAMES:
         logger.warning(f"Invalid model name: {request.model_name}. Allowed: {settings.ALLOWED_MODEL_NAMES}")
         raise HTTPException(
             status_code=400,
             detail=f"Invalid model name: {request.model_name}. Allowed models: {', '.join(settings.ALLOWED_MODEL_NAMES)}"
         )
-    
-    # Process request
+
+def _resolve_system_prompt(request: RequestState) -> RequestState:
+    """Replace a template reference (or inline prompt) with the canonical prompt text"""
+    if request.system_prompt_id and request.system_prompt:
+        raise HTTPException(status_code=400, detail="Provide either system_prompt or system_prompt_id, not both")
     try:
-        logger.info(f"Calling get_response_from_ai_agents for model: {request.model_name}")
-        response = get_response_from_ai_agents(
-            request.model_name,
-            request.messages,
-            request.allow_search,
-            request.system_prompt
+        request.system_prompt = prompt_registry.resolve(
+            request.system_prompt,
+            request.system_prompt_id,
+            request.system_prompt_version,
+            request.prompt_variables
         )
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    return request
+
+def _apply_latency_tier(request: RequestState) -> RequestState:
+    """Fill the request's generation controls (and maybe its model) from its latency tier"""
+    apply_tier(request, settings.LATENCY_TIERS, settings.DEFAULT_LATENCY_TIER or None)
+    return request
+
+def _require_admin(x_admin_key: Optional[str]):
+    """Fail closed: admin endpoints are disabled until ADMIN_API_KEY is configured"""
+    if not settings.ADMIN_API_KEY:
+        raise HTTPException(status_code=503, detail="Admin API disabled: ADMIN_API_KEY is not configured")
+    if x_admin_key != settings.ADMIN_API_KEY:
+        raise HTTPException(status_code=403, detail="Admin key required")
+
+def _get_tenant(x_api_key: Optional[str], x_tenant_id: Optional[str]) -> str:
+    return resolve_tenant(x_api_key, x_tenant_id, settings.TENANT_API_KEYS, settings.DEFAULT_TENANT)
+
+def _log_query(request: RequestState, tenant: str, generation: dict, history, cached: bool, cost: float = 0.0):
+    """Write the query record the cache warmer mines (answers that depend on history are not reusable)"""
+    if not settings.QUERY_LOG_ENABLED or history:
+        return
+    logger.info(format_query_record({
+        "model_name": request.model_name,
+        "system_prompt": request.system_prompt,
+        "messages": request.messages,
+        "allow_search": request.allow_search,
+        "allow_retrieval": request.allow_retrieval,
+        "generation": generation if any(value is not None for value in generation.values()) else None,
+        "supervisor": request.supervisor,
+        "tenant": tenant,
+        "cached": cached,
+        "cost_usd": round(cost, 8),
+    }))
+
+def _process_chat_request(request: RequestState, tenant: str = None, on_token=None, cancel_event=None) -> dict:
+    """
+    Run a validated request through the agent, mapping errors to HTTPException
+
+    on_token and cancel_event (see get_response_from_ai_agents) stream and
+    cancel the run; such runs stay in this process even with agent workers.
+    """
+    tenant = tenant or settings.DEFAULT_TENANT
+    metadata = {}
+    try:
+        history = session_store.get(tenant, request.session_id) if request.session_id else None
+        generation = {"max_output_tokens": request.max_output_tokens, "temperature": request.temperature,
+                      "max_results": request.max_results}
+        cache_key = None
+        # Cached entries hold only the answer, so trace requests always run the agent
+        if response_cache.enabled and not request.include_trace:
+            cache_key = ResponseCache.key(request.model_name, request.system_prompt, request.messages,
+                                          request.allow_search, request.allow_retrieval, history, generation,
+                                          request.supervisor)
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Response cache hit for model: {request.model_name}")
+                if on_token is not None:
+                    on_token(cached["response"])
+                usage_ledger.record(tenant, request.model_name)
+                _log_query(request, tenant, generation, history, cached=True)
+                if request.session_id:
+                    session_store.append(tenant, request.session_id, request.messages, cached["response"])
+                return {"response": cached["response"], "metadata": {"cached": True}}
+
+        logger.info(f"Calling get_response_from_ai_agents for model: {request.model_name}")
+        run_agent = worker_pool.get_response if worker_pool is not None else get_response_from_ai_agents
+        controls = {}
+        if on_token is not None or cancel_event is not None:
+            # Callbacks and events cannot cross into a worker process
+            run_agent = get_response_from_ai_agents
+            controls.update(on_token=on_token, cancel_event=cancel_event)
+        if any(value is not None for value in generation.values()):
+            controls["generation"] = generation
+        latency_target, timeout = latency_limits(request.tier, settings.LATENCY_TIERS)
+        if timeout:
+            controls.update(latency_target=latency_target, timeout=timeout)
+        start = time.perf_counter()
+        # Only agent runs hold an upstream slot, and the limit learns from model call latency alone
+        with adaptive_limits.slot(request.model_name, timeout=_slot_wait(request)) as feedback:
+            response = run_agent(
+                request.model_name,
+                request.messages,
+                request.allow_search,
+                request.system_prompt,
+                allow_retrieval=request.allow_retrieval,
+                metadata=metadata,
+                history=history,
+                limits={"max_steps": request.max_steps, "max_tool_calls": request.max_tool_calls,
+                        "max_tokens": request.max_tokens},
+                include_trace=request.include_trace,
+                supervisor=request.supervisor,
+                **controls
+            )
+            if metadata.get("model_latency"):
+                feedback.latency = metadata["model_latency"]["mean_ms"] / 1000
         logger.info(f"Successfully got response from AI Agent {request.model_name}")
+        if timeout:
+            latency_ms = round((time.perf_counter() - start) * 1000, 1)
+            met = latency_target is None or latency_ms <= latency_target * 1000
+            if not met:
+                logger.warning(f"Latency tier {request.tier} target missed: {latency_ms}ms > {latency_target * 1000:g}ms")
+            metadata["tier"] = {"name": request.tier, "latency_target_ms": latency_target and latency_target * 1000,
+                                "latency_ms": latency_ms, "met": met}
+        # A hedge to another model may have answered; the request is billed to the model that did
+        served_model = metadata.get("hedge", {}).get("winner", request.model_name)
+        cost = usage_ledger.record(tenant, served_model, metadata.get("usage"),
+                                   usage_by_model=metadata.get("usage_by_model"))
+        _log_query(request, tenant, generation, history, cached=False, cost=cost)
+        # Answers cut short by the step budget, or given by another model, are not cached under this model's key
+        if cache_key is not None and served_model == request.model_name \
+                and not metadata.get("steps", {}).get("limit_reached"):
+            response_cache.set(cache_key, response)
+        if request.session_id:
+            session_store.append(tenant, request.session_id, request.messages, response)
+        if metadata:
+            metadata["cost_usd"] = round(cost, 8)
+            return {"response": response, "metadata": metadata}
         return {"response": response}
     
+    except (HTTPException, RunCancelled):
+        raise
+
+    except LatencyTargetExceeded as e:
+        usage_ledger.record(tenant, request.model_name, error=True)
+        raise HTTPException(
+            status_code=504,
+            detail=_create_error_detail("Latency Target Exceeded", "LatencyTargetExceeded", str(e), tier=request.tier)
+        )
+
+    except DeadlineSaturated as e:
+        usage_ledger.record(tenant, request.model_name, error=True)
+        raise HTTPException(
+            status_code=503,
+            detail=_create_error_detail("Service Overloaded", "DeadlineSaturated", str(e), tier=request.tier),
+            headers={"Retry-After": "1"}
+        )
+
     except ValueError as e:
+        usage_ledger.record(tenant, request.model_name, error=True)
         raise _handle_value_error(e)
     
     except BadRequestError as e:
+        usage_ledger.record(tenant, request.model_name, error=True)
         if BadRequestError:  # Check if BadRequestError is available (not None)
             raise _handle_bad_request_error(e, request)
         # If BadRequestError is None, re-raise as generic exception
         raise _handle_generic_exception(e, request)
     
     except Exception as e:
+        usage_ledger.record(tenant, request.model_name, error=True)
         raise _handle_generic_exception(e, request)
-    
 
+def _slot_wait(request: RequestState) -> float:
+    """Seconds a request may wait for a slot: a tiered request no longer than its whole latency limit"""
+    return min(settings.FAIR_SHARE_TIMEOUT, latency_limits(request.tier, settings.LATENCY_TIERS)[1] or float("inf"))
+
+def _run_scheduled_chat_request(request: RequestState, tenant: str, **streaming) -> dict:
+    """Run a request once its tenant gets a fair-share slot"""
+    start = time.perf_counter()
+    status = 200
+    try:
+        # A claimed X-Tenant-ID could be rotated for a fresh fair share, so unkeyed callers share one queue
+        with scheduler.slot(tenant if settings.TENANT_API_KEYS else settings.DEFAULT_TENANT,
+                            timeout=_slot_wait(request)):
+            return _process_chat_request(request, tenant, **streaming)
+    except HTTPException as e:
+        status = e.status_code
+        raise
+    except RunCancelled:
+        status = 499  # client closed request
+        raise
+    except Exception:
+        status = 500
+        raise
+    finally:
+        # One line per request, read by app.common.log_analytics
+        logger.info(format_request_completed(request.model_name, status,
+                                             (time.perf_counter() - start) * 1000, tenant))
+
+@app.post("/chat")
+def chat_endpoint(request: RequestState,
+                  x_api_key: Optional[str] = Header(None),
+                  x_tenant_id: Optional[str] = Header(None)):
+    """Handle chat requests to AI agents"""
+    attach_current_thread()
+    with tracer.span("http.chat", **{"http.route": "/chat", "llm.model": request.model_name}) as span:
+        tenant = _get_tenant(x_api_key, x_tenant_id)
+        span.set_attribute("tenant", tenant)
+        _resolve_system_prompt(request)
+        _apply_latency_tier(request)
+        logger.info(f"Received request for model: {request.model_name}, allow_search: {request.allow_search}, allow_retrieval: {request.allow_retrieval}, tenant: {tenant}")
+        logger.info(f"Request details: messages_count={len(request.messages)}, system_prompt_length={len(request.system_prompt)}")
+
+        # Validate model name
+        _validate_model_name(request)
+        usage_ledger.check_quota(tenant)
+        
+        # Process request
+        result = _run_scheduled_chat_request(request, tenant)
+        span.set_attribute("http.status_code", 200)
+        return result
+
+def _open_ws_conversation(message: dict) -> RequestState:
+    """Validate a WebSocket start message once for the whole conversation"""
+    options = {key: value for key, value in message.items() if key not in ("type", "messages")}
+    try:
+        request = RequestState(messages=[], **options)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=json.loads(e.json()))
+    _resolve_system_prompt(request)
+    _apply_latency_tier(request)
+    _validate_model_name(request)
+    # History lives in the session store, so every conversation has a session
+    request.session_id = request.session_id or uuid.uuid4().hex
+    return request
+
+@app.websocket("/ws/chat")
+async def chat_websocket(websocket: WebSocket,
+                         x_api_key: Optional[str] = Header(None),
+                         x_tenant_id: Optional[str] = Header(None)):
+    """Multi-turn chat over one connection, streaming tokens and accepting cancel/interrupt (see ChatConnection)"""
+    try:
+        tenant = _get_tenant(x_api_key, x_tenant_id)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=e.detail)  # policy violation
+        return
+    await websocket.accept()
+    logger.info(f"WebSocket chat connected, tenant: {tenant}")
+
+    def run_turn(request, content, on_token, cancel_event):
+        usage_ledger.check_quota(tenant)
+        turn = request.model_copy(update={"messages": [content]})
+        logger.info(f"Received WebSocket turn for model: {turn.model_name}, session: {turn.session_id}, tenant: {tenant}")
+        return _run_scheduled_chat_request(turn, tenant, on_token=on_token, cancel_event=cancel_event)
+
+    await ChatConnection(websocket, _open_ws_conversation, run_turn).serve()
+
+def _run_batch_item(index: int, request: RequestState, tenant: str) -> dict:
+    """Process one batch entry, reporting failures in-band instead of failing the batch"""
+    try:
+        _resolve_system_prompt(request)
+        _apply_latency_tier(request)
+        _validate_model_name(request)
+        usage_ledger.check_quota(tenant)
+        return dict(_run_scheduled_chat_request(request, tenant), index=index, status_code=200)
+    except HTTPException as e:
+        return {"index": index, "status_code": e.status_code, "detail": e.detail}
+
+def _iter_batch_results(requests: List[RequestState], tenant: str):
+    """Yield batch results in completion order"""
+    with ThreadPoolExecutor(max_workers=settings.BATCH_MAX_CONCURRENCY, thread_name_prefix="chat-batch") as pool:
+        futures = [pool.submit(_run_batch_item, i, item, tenant) for i, item in enumerate(requests)]
+        for future in as_completed(futures):
+            yield future.result()
+
+@app.post("/chat/batch")
+def chat_batch_endpoint(batch: BatchRequest,
+                        http_request: Request,
+                        x_api_key: Optional[str] = Header(None),
+                        x_tenant_id: Optional[str] = Header(None)):
+    """
+    Run several chat requests concurrently
+
+    The response format follows the Accept header: application/x-ndjson
+    streams one result per line as each finishes, application/msgpack
+    returns a compact binary body, anything else returns JSON. Results
+    carry their request index and status code.
+    """
+    tenant = _get_tenant(x_api_key, x_tenant_id)
+    if len(batch.requests) > settings.BATCH_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"Batch too large: {len(batch.requests)} > {settings.BATCH_MAX_SIZE}")
+
+    media_type = negotiate_media_type(http_request.headers.get("accept"))
+    logger.info(f"Received batch of {len(batch.requests)} request(s), tenant: {tenant}, format: {media_type}")
+
+    results = _iter_batch_results(batch.requests, tenant)
+    if media_type == NDJSON_MEDIA_TYPE:
+        return StreamingResponse((ndjson_line(result) for result in results), media_type=NDJSON_MEDIA_TYPE)
+
+    ordered = sorted(results, key=lambda result: result["index"])
+    if media_type == MSGPACK_MEDIA_TYPE:
+        return Response(dumps_msgpack({"results": ordered}), media_type=MSGPACK_MEDIA_TYPE)
+    return {"results": ordered}
+
+@app.get("/usage")
+def usage_report(x_api_key: Optional[str] = Header(None),
+                 x_tenant_id: Optional[str] = Header(None),
+                 x_admin_key: Optional[str] = Header(None)):
+    """Report token, cost and quota usage for the caller's tenant (all tenants for admins)"""
+    if settings.ADMIN_API_KEY and x_admin_key == settings.ADMIN_API_KEY:
+        return {"tenants": usage_ledger.report(), "scheduler": scheduler.snapshot()}
+    tenant = _get_tenant(x_api_key, x_tenant_id)
+    return {"tenants": usage_ledger.report(tenant)}
+
+@app.get("/metrics/concurrency")
+def concurrency_metrics():
+    """Current adaptive per-model concurrency limits, in-flight counts and latency averages"""
+    return {
+        "adaptive": adaptive_limits.enabled,
+        "models": adaptive_limits.snapshot(),
+        "scheduler": scheduler.snapshot(),
+        "workers": worker_pool.snapshot() if worker_pool is not None else None,
+    }
+
+@app.post("/workers/recycle")
+def recycle_workers(x_admin_key: Optional[str] = Header(None)):
+    """Replace every agent worker process (admin only)"""
+    _require_admin(x_admin_key)
+    if worker_pool is None:
+        raise HTTPException(status_code=409, detail="Agent worker processes are disabled")
+    worker_pool.recycle()
+    return worker_pool.snapshot()
+
+@app.post("/cache/warm", status_code=202)
+def warm_cache(x_admin_key: Optional[str] = Header(None)):
+    """Start a cache warming pass in the background, within the daily budget (admin only)"""
+    _require_admin(x_admin_key)
+    if cache_warmer is None:
+        raise HTTPException(status_code=409, detail="Cache warming is disabled")
+    if not cache_warmer.start_pass():
+        raise HTTPException(status_code=409, detail="A cache warming pass already ran or is running this hour")
+    return {"status": "started"}
+
+@app.get("/cache/warm")
+def cache_warm_report(x_admin_key: Optional[str] = Header(None)):
+    """Report this task's last cache warming pass (admin only)"""
+    _require_admin(x_admin_key)
+    if cache_warmer is None:
+        raise HTTPException(status_code=409, detail="Cache warming is disabled")
+    return {"last_report": cache_warmer.last_report}
+
+@app.get("/prompts")
+def list_prompt_templates():
+    """List registered system prompt templates (metadata only)"""
+    return {"templates": prompt_registry.list()}
+
+@app.get("/prompts/stats")
+def prompt_template_stats():
+    """Report request-size and token statistics for system prompts"""
+    return prompt_registry.stats()
+
+@app.get("/prompts/{template_id:path}")
+def get_prompt_template(template_id: str, version: Optional[int] = None):
+    """Return one template version, including its canonical text"""
+    try:
+        template = prompt_registry.get(template_id, version)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    return dict(template.to_dict(), text=template.text)
+
+@app.post("/prompts", status_code=201)
+def register_prompt_template(template: PromptTemplateRequest, x_admin_key: Optional[str] = Header(None)):
+    """Register a new system prompt template version"""
+    _require_admin(x_admin_key)
+    try:
+        registered = prompt_registry.register(template.id, template.text, template.version, template.description)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return registered.to_dict()
+
+@app.get("/profiles/{profile_id}")
+def get_profile(profile_id: str, format: str = "json", x_admin_key: Optional[str] = Header(None)):
+    """Return a stored request profile: the JSON summary or folded stacks for flamegraph tools"""
+    _require_admin(x_admin_key)
+    try:
+        path = profile_path(settings.PROFILE_DIR, profile_id, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f"Profile not found: {profile_id}")
+    with open(path) as f:
+        content = f.read()
+    if format == "folded":
+        return Response(content, media_type="text/plain")
+    return json.loads(content)
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+def get_job_queue() -> JobQueue:
+    """Create the background job queue on first use"""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue(
+                create_job_store(settings.JOB_STORE, settings.JOB_SQLITE_PATH),
+                runner=_run_chat_job,
+                workers=settings.JOB_WORKERS,
+                ttl_seconds=settings.JOB_TTL_SECONDS,
+                max_queued=settings.JOB_MAX_QUEUED
+            )
+            logger.info(f"Job queue started with {settings.JOB_WORKERS} worker(s), store: {settings.JOB_STORE}")
+        return _job_queue
+
+def _run_chat_job(job: tuple) -> dict:
+    request, tenant = job
+    return _run_scheduled_chat_request(request, tenant)
+
+def _get_job_or_404(job_id: str, tenant: str) -> dict:
+    """The tenant's job; other tenants' jobs are reported as not found"""
+    job = get_job_queue().get(job_id)
+    if job is None or (job.get("request") or {}).get("tenant") != tenant:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job
+
+@app.post("/jobs", status_code=202)
+def submit_job(request: RequestState,
+               x_api_key: Optional[str] = Header(None),
+               x_tenant_id: Optional[str] = Header(None)):
+    """Queue a chat request and return its job id without waiting for the agent"""
+    tenant = _get_tenant(x_api_key, x_tenant_id)
+    _resolve_system_prompt(request)
+    _apply_latency_tier(request)
+    logger.info(f"Received job for model: {request.model_name}, allow_search: {request.allow_search}, allow_retrieval: {request.allow_retrieval}, tenant: {tenant}")
+    _validate_model_name(request)
+    usage_ledger.check_quota(tenant)
+
+    job_id = get_job_queue().submit((request, tenant), payload=dict(request.model_dump(), tenant=tenant))
+    return {"job_id": job_id, "status": JOB_PENDING}
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str,
+            x_api_key: Optional[str] = Header(None),
+            x_tenant_id: Optional[str] = Header(None)):
+    """Return the status, and the result or error once finished, of a job"""
+    job = _get_job_or_404(job_id, _get_tenant(x_api_key, x_tenant_id))
+    job.pop("request", None)
+    return job
+
+@app.get("/jobs/{job_id}/stream")
+async def stream_job(job_id: str,
+                     x_api_key: Optional[str] = Header(None),
+                     x_tenant_id: Optional[str] = Header(None)):
+    """Stream a job's status changes as server-sent events until it finishes"""
+    tenant = _get_tenant(x_api_key, x_tenant_id)
+    # Store reads (SQLite) block, so they run off the event loop
+    await asyncio.to_thread(_get_job_or_404, job_id, tenant)
 
+    async def events():
+        last_status = None
+        deadline = time.monotonic() + settings.JOB_STREAM_TIMEOUT
+        while time.monotonic() < deadline:
+            job = await asyncio.to_thread(get_job_queue().get, job_id)
+            if job["status"] != last_status:
+                last_status = job["status"]
+                job.pop("request", None)
+                yield f"event: {last_status}\ndata: {json.dumps(job)}\n\n"
+                if last_status in TERMINAL_STATUSES:
+                    return
+            await asyncio.sleep(settings.JOB_POLL_INTERVAL)
+        yield "event: timeout\ndata: {}\n\n"
 
+    return StreamingResponse(events(), media_type="text/event-stream")
@@ -0,0 +1,259 @@
+import json
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from app.common.logger import get_logger, list_log_files, log_full_traceback, open_log_file
+from app.core.caching import ResponseCache
+from app.core.usage import usage_cost
+
+logger = get_logger(__name__)
+
+QUERY_RECORD_MARKER = "Query record: "
+_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S,%f"
+# Fields of a query record that determine the answer, and so the response cache key
+PATTERN_FIELDS = ("model_name", "system_prompt", "messages", "allow_search", "allow_retrieval", "generation",
+                  "supervisor")
+
+
+def format_query_record(record):
+    """Log message for one answered request, mined later by the cache warmer"""
+    return QUERY_RECORD_MARKER + json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+
+
+def parse_hours(spec):
+    """Hours of the day from a spec like "2-4,22" (ranges are inclusive)"""
+    hours = set()
+    for part in filter(None, (part.strip() for part in spec.split(","))):
+        first, _, last = part.partition("-")
+        hours.update(range(int(first), int(last or first) + 1))
+    return hours
+
+
+def iter_query_records(log_dir, days, now=None):
+    """
+    Yield (timestamp, record) for the query records of the last days daily log files
+
+    Each day's rotated and compressed files are read too. Files are read
+    line by line; lines that are not query records (including multi-line
+    tracebacks) are skipped.
+    """
+    now = now or datetime.now()
+    for offset in range(days):
+        for path in list_log_files(log_dir, (now - timedelta(days=offset)).strftime('%Y-%m-%d')):
+            with open_log_file(path) as f:
+                for line in f:
+                    if QUERY_RECORD_MARKER not in line:
+                        continue
+                    parts = line.rstrip("\n").split(" - ", 3)
+                    if len(parts) < 4 or not parts[3].startswith(QUERY_RECORD_MARKER):
+                        continue
+                    try:
+                        timestamp = datetime.strptime(parts[0], _TIMESTAMP_FORMAT)
+                        record = json.loads(parts[3][len(QUERY_RECORD_MARKER):])
+                    except ValueError:
+                        continue
+                    yield timestamp, record
+
+
+def top_patterns(records, now, peak_hours=(), top_n=20, half_life_days=7.0):
+    """
+    Rank request patterns by how often they are asked in peak hours, weighting recent days more
+
+    Each record asked during peak_hours (any hour if empty) scores
+    0.5 ** (age_days / half_life_days). The expected cost of a pattern is
+    the mean cost of its uncached runs, else of its model's.
+
+    Args:
+        records: (timestamp, record) pairs from iter_query_records
+        now: Reference time for record ages
+        peak_hours: Hours of the day whose traffic the cache is warmed for
+        top_n: Number of patterns to return
+
+    Returns:
+        list: {"pattern", "score", "count", "est_cost_usd"} dicts, best first
+    """
+    scores = defaultdict(float)
+    counts = defaultdict(int)
+    patterns = {}
+    costs = defaultdict(list)
+    model_costs = defaultdict(list)
+    for timestamp, record in records:
+        pattern = {field: record.get(field) for field in PATTERN_FIELDS}
+        key = json.dumps(pattern, sort_keys=True)
+        if not record.get("cached") and record.get("cost_usd") is not None:
+            costs[key].append(record["cost_usd"])
+            model_costs[pattern["model_name"]].append(record["cost_usd"])
+        if peak_hours and timestamp.hour not in peak_hours:
+            continue
+        age_days = max(0.0, (now - timestamp).total_seconds() / 86400)
+        scores[key] += 0.5 ** (age_days / half_life_days)
+        counts[key] += 1
+        patterns[key] = pattern
+
+    ranked = sorted(scores, key=scores.get, reverse=True)[:top_n]
+    results = []
+    for key in ranked:
+        observed = costs.get(key) or model_costs.get(patterns[key]["model_name"]) or [0.0]
+        results.append({"pattern": patterns[key], "score": round(scores[key], 4), "count": counts[key],
+                        "est_cost_usd": sum(observed) / len(observed)})
+    return results
+
+
+def next_peak_end(now, peak_hours):
+    """End of the current or next run of peak hours (now when there are none)"""
+    if not peak_hours:
+        return now
+    if len(peak_hours) >= 24:
+        return now + timedelta(days=1)
+    hour = now.replace(minute=0, second=0, microsecond=0)
+    while hour.hour not in peak_hours:
+        hour += timedelta(hours=1)
+    while hour.hour in peak_hours:
+        hour += timedelta(hours=1)
+    return hour
+
+
+class CacheWarmer:
+    """
+    Pre-computes answers for the requests most often asked at peak times
+
+    Query records in the daily log files are ranked by top_patterns. Each
+    off-peak pass runs the top ones through run_agent and stores the
+    answers in the response cache, which also fills the search cache for
+    searches the agent makes. Answers still cached through the end of the
+    next peak window are left alone, and a pattern is skipped when its
+    expected cost would exceed what is left of the daily budget.
+
+    Spend and pass claims live in the shared state, so with several tasks
+    one pass runs per off-peak hour and the budget holds for all of them.
+    """
+
+    def __init__(self, response_cache, run_agent, state, log_dir="logs", lookback_days=14, top_n=20,
+                 half_life_days=7.0, peak_hours=(), warm_hours=(), daily_budget_usd=1.0, check_interval=300,
+                 record_usage=None):
+        self.response_cache = response_cache
+        self.run_agent = run_agent
+        self.state = state
+        self.log_dir = log_dir
+        self.lookback_days = lookback_days
+        self.top_n = top_n
+        self.half_life_days = half_life_days
+        self.peak_hours = set(peak_hours)
+        self.warm_hours = set(warm_hours)
+        self.daily_budget_usd = daily_budget_usd
+        self.check_interval = check_interval
+        # record_usage(model_name, usage, usage_by_model) accounts a run and returns its cost
+        self.record_usage = record_usage or usage_cost
+        self.last_report = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _spent_key(self, now):
+        return f"cache_warm:spent:{now.strftime('%Y-%m-%d')}"
+
+    def warm(self, now=None):
+        """
+        Run one warming pass
+
+        Returns:
+            dict: Pattern counts by outcome, spend and the remaining daily budget
+        """
+        now = now or datetime.now()
+        report = {"patterns": 0, "warmed": 0, "fresh": 0, "over_budget": 0, "failed": 0, "spent_usd": 0.0}
+        if not self.response_cache.enabled:
+            logger.warning("Cache warming skipped: the response cache is disabled (RESPONSE_CACHE_TTL=0)")
+            self.last_report = report
+            return report
+
+        records = iter_query_records(self.log_dir, self.lookback_days, now)
+        patterns = top_patterns(records, now, self.peak_hours, self.top_n, self.half_life_days)
+        report["patterns"] = len(patterns)
+        valid_until = time.time() + (next_peak_end(now, self.peak_hours) - now).total_seconds()
+        if self.response_cache.ttl < valid_until - time.time():
+            logger.warning("RESPONSE_CACHE_TTL is shorter than the time to the end of the next peak window; "
+                           "warmed answers will expire before it ends")
+        spent_key = self._spent_key(now)
+        spent = self.state.get(spent_key) or 0.0
+
+        for candidate in patterns:
+            pattern = candidate["pattern"]
+            key = ResponseCache.key(pattern["model_name"], pattern["system_prompt"], pattern["messages"],
+                                    pattern["allow_search"], pattern["allow_retrieval"], None, pattern["generation"],
+                                    bool(pattern["supervisor"]))
+            cached = self.response_cache.get(key)
+            if cached is not None and cached.get("cached_at", 0) + self.response_cache.ttl >= valid_until:
+                report["fresh"] += 1
+                continue
+            # Reserve the expected cost before the run, so passes on other tasks cannot spend it too
+            estimate = candidate["est_cost_usd"]
+            spent = self.state.incr(spent_key, estimate, ttl=2 * 86400)
+            if spent > self.daily_budget_usd:
+                spent = self.state.incr(spent_key, -estimate, ttl=2 * 86400)
+                report["over_budget"] += 1
+                continue
+
+            metadata = {}
+            controls = {"generation": pattern["generation"]} if pattern["generation"] else {}
+            try:
+                response = self.run_agent(pattern["model_name"], pattern["messages"], pattern["allow_search"],
+                                          pattern["system_prompt"], allow_retrieval=pattern["allow_retrieval"],
+                                          metadata=metadata, supervisor=bool(pattern["supervisor"]), **controls)
+            except Exception as e:
+                log_full_traceback(logger, e, "Cache warming run failed: ")
+                spent = self.state.incr(spent_key, -estimate, ttl=2 * 86400)
+                report["failed"] += 1
+                continue
+            served_model = metadata.get("hedge", {}).get("winner", pattern["model_name"])
+            cost = self.record_usage(served_model, metadata.get("usage") or {}, metadata.get("usage_by_model"))
+            # Settle the reservation at the run's actual cost
+            spent = self.state.incr(spent_key, cost - estimate, ttl=2 * 86400)
+            report["spent_usd"] += cost
+            if served_model == pattern["model_name"] and not metadata.get("steps", {}).get("limit_reached"):
+                self.response_cache.set(key, response)
+                report["warmed"] += 1
+
+        report["spent_usd"] = round(report["spent_usd"], 8)
+        report["budget_remaining_usd"] = round(max(0.0, self.daily_budget_usd - spent), 8)
+        logger.info(f"Cache warming pass finished: {report}")
+        self.last_report = report
+        return report
+
+    def _claim(self, now):
+        """True for the first task to claim this off-peak hour's pass"""
+        return self.state.incr(f"cache_warm:pass:{now.strftime('%Y-%m-%d-%H')}", 1, ttl=7200) == 1
+
+    def _run_pass(self, now):
+        try:
+            self.warm(now)
+        except Exception as e:
+            log_full_traceback(logger, e, "Cache warming pass failed: ")
+
+    def start_pass(self, now=None):
+        """
+        Run a pass in the background, unless a task already claimed this hour's pass
+
+        Returns:
+            bool: Whether a pass was started
+        """
+        now = now or datetime.now()
+        if not self._claim(now):
+            return False
+        threading.Thread(target=self._run_pass, args=(now,), name="cache-warm-pass", daemon=True).start()
+        return True
+
+    def _loop(self):
+        while not self._stop.wait(self.check_interval):
+            now = datetime.now()
+            if now.hour in self.warm_hours and self._claim(now):
+                self._run_pass(now)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="cache-warmer", daemon=True)
+            self._thread.start()
+            logger.info(f"Cache warmer started, off-peak hours: {sorted(self.warm_hours)}")
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,173 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from fastapi import HTTPException
+
+from app.common.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def is_overload_error(error):
+    """True if error (or the upstream error it was raised from) is a rate limit or timeout"""
+    while error is not None:
+        if getattr(error, "status_code", None) == 429:
+            return True
+        if type(error).__name__ in ("RateLimitError", "APITimeoutError", "TimeoutError"):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class SlotFeedback:
+    """Set latency (seconds) to what the limiter should learn from; None uses the time the slot was held"""
+
+    def __init__(self):
+        self.latency = None
+
+
+class AIMDLimiter:
+    """
+    Adaptive concurrency limit for one upstream model
+
+    Additive increase, multiplicative decrease: every successful request
+    that finds the limit in use grows it by 1/limit (about +1 per limit's
+    worth of requests), and a rate-limit/timeout error, or a short-term
+    latency average that drifts above latency_tolerance times the
+    long-term one, multiplies it by backoff. The limit therefore settles
+    just below the point where the upstream starts queueing, whatever the
+    model's throughput.
+    """
+
+    def __init__(self, name="upstream", initial_limit=10, min_limit=1, max_limit=200, backoff=0.9,
+                 latency_tolerance=2.0, short_alpha=0.2, long_alpha=0.02):
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.short_alpha = short_alpha
+        self.long_alpha = long_alpha
+
+        self.in_flight = 0
+        self.short_latency = None
+        self.long_latency = None
+        self.successes = 0
+        self.drops = 0
+        self.rejections = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def _decrease(self):
+        # At most one decrease per latency interval, so one slow burst does not collapse the limit
+        now = time.monotonic()
+        if now - self._last_decrease < (self.short_latency or 0):
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+
+    def _on_success(self, latency, in_flight):
+        if self.short_latency is None:
+            self.short_latency = self.long_latency = latency
+        else:
+            self.short_latency += self.short_alpha * (latency - self.short_latency)
+            self.long_latency += self.long_alpha * (latency - self.long_latency)
+        self.successes += 1
+
+        if self.short_latency > self.latency_tolerance * self.long_latency:
+            self._decrease()
+        elif in_flight >= int(self.limit) - 1:
+            # Only grow when the current limit is actually being used
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def _on_drop(self):
+        self.drops += 1
+        self._decrease()
+        logger.warning(f"Upstream overload for {self.name}, concurrency limit now {int(self.limit)}")
+
+    @contextmanager
+    def slot(self, timeout=30):
+        """
+        Hold one upstream slot, feeding the outcome back into the limit
+
+        Yields:
+            SlotFeedback: Lets the holder report the upstream latency itself
+
+        Raises:
+            HTTPException: 429 if no slot frees up within timeout
+        """
+        with self._condition:
+            acquired = self._condition.wait_for(lambda: self.in_flight < int(self.limit), timeout=timeout)
+            if not acquired:
+                self.rejections += 1
+                raise HTTPException(
+                    status_code=429,
+                    detail="Upstream concurrency limit reached, retry shortly",
+                    headers={"Retry-After": "1"}
+                )
+            self.in_flight += 1
+            in_flight = self.in_flight
+
+        feedback = SlotFeedback()
+        start = time.perf_counter()
+        try:
+            yield feedback
+        except BaseException as e:
+            with self._condition:
+                self.in_flight -= 1
+                if is_overload_error(e):
+                    self._on_drop()
+                self._condition.notify_all()
+            raise
+        latency = time.perf_counter() - start
+        if feedback.latency is not None:
+            latency = feedback.latency
+        with self._condition:
+            self.in_flight -= 1
+            self._on_success(latency, in_flight)
+            self._condition.notify_all()
+
+    def snapshot(self):
+        with self._condition:
+            return {
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "min_limit": self.min_limit,
+                "max_limit": self.max_limit,
+                "latency_short_ms": round(self.short_latency * 1000, 1) if self.short_latency else None,
+                "latency_long_ms": round(self.long_latency * 1000, 1) if self.long_latency else None,
+                "successes": self.successes,
+                "drops": self.drops,
+                "rejections": self.rejections,
+            }
+
+
+class AdaptiveConcurrency:
+    """One AIMDLimiter per model, created on first use; disabled when enabled is False"""
+
+    def __init__(self, enabled=False, **limiter_options):
+        self.enabled = enabled
+        self.limiter_options = limiter_options
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, model_name):
+        with self._lock:
+            if model_name not in self._limiters:
+                self._limiters[model_name] = AIMDLimiter(model_name, **self.limiter_options)
+            return self._limiters[model_name]
+
+    @contextmanager
+    def slot(self, model_name, timeout=30):
+        if not self.enabled:
+            yield SlotFeedback()
+            return
+        with self.limiter(model_name).slot(timeout) as feedback:
+            yield feedback
+
+    def snapshot(self):
+        with self._lock:
+            limiters = dict(self._limiters)
+        return {model_name: limiter.snapshot() for model_name, limiter in limiters.items()}
@@ -0,0 +1,241 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+from app.common.logger import get_logger, log_full_traceback
+
+logger = get_logger(__name__)
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+TERMINAL_STATUSES = (JOB_SUCCEEDED, JOB_FAILED)
+
+# Error of jobs that were pending or running when their process stopped
+INTERRUPTED_ERROR = {"status_code": 503, "detail": "Job interrupted: the server stopped before it finished"}
+
+
+class JobStore:
+    """Interface for job result stores"""
+
+    def create(self, job_id, request):
+        raise NotImplementedError
+
+    def update(self, job_id, **fields):
+        raise NotImplementedError
+
+    def get(self, job_id):
+        raise NotImplementedError
+
+    def purge(self, older_than):
+        """Drop finished jobs whose finished_at is before older_than"""
+        raise NotImplementedError
+
+    @staticmethod
+    def _new_record(job_id, request):
+        return {
+            "job_id": job_id,
+            "status": JOB_PENDING,
+            "request": request,
+            "result": None,
+            "error": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+
+
+class InMemoryJobStore(JobStore):
+    """Job store backed by a dict; jobs are lost on restart"""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id, request):
+        with self._lock:
+            self._jobs[job_id] = self._new_record(job_id, request)
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def purge(self, older_than):
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job["finished_at"] and job["finished_at"] < older_than]
+            for job_id in expired:
+                del self._jobs[job_id]
+        return len(expired)
+
+
+class SQLiteJobStore(JobStore):
+    """
+    Job store persisted to a local SQLite file
+
+    Jobs still pending or running in the file when the store opens were
+    cut off by a restart and are marked failed, so pollers get an answer
+    and the jobs are purged like any other. The file therefore belongs to
+    one process.
+    """
+
+    _JSON_FIELDS = ("request", "result", "error")
+
+    def __init__(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    request TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL,
+                    started_at REAL,
+                    finished_at REAL
+                )"""
+            )
+            interrupted = self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE status IN (?, ?)",
+                (JOB_FAILED, json.dumps(INTERRUPTED_ERROR), time.time(), JOB_PENDING, JOB_RUNNING)
+            ).rowcount
+        if interrupted:
+            logger.warning(f"Marked {interrupted} job(s) interrupted by a restart as failed")
+
+    def _encode(self, fields):
+        return {key: json.dumps(value) if key in self._JSON_FIELDS and value is not None else value
+                for key, value in fields.items()}
+
+    def create(self, job_id, request):
+        record = self._encode(self._new_record(job_id, request))
+        columns = ", ".join(record)
+        placeholders = ", ".join(f":{key}" for key in record)
+        with self._lock, self._conn:
+            self._conn.execute(f"INSERT INTO jobs ({columns}) VALUES ({placeholders})", record)
+
+    def update(self, job_id, **fields):
+        fields = self._encode(fields)
+        assignments = ", ".join(f"{key} = :{key}" for key in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE job_id = :job_id",
+                               dict(fields, job_id=job_id))
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        for key in self._JSON_FIELDS:
+            if job[key] is not None:
+                job[key] = json.loads(job[key])
+        return job
+
+    def purge(self, older_than):
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (older_than,)
+            )
+        return cursor.rowcount
+
+
+def create_job_store(kind, sqlite_path=None):
+    """Create the job store named by kind ("memory" or "sqlite")"""
+    if kind == "memory":
+        return InMemoryJobStore()
+    if kind == "sqlite":
+        return SQLiteJobStore(sqlite_path)
+    raise ValueError(f"Unknown job store: {kind}. Expected 'memory' or 'sqlite'")
+
+
+class JobQueue:
+    """
+    Runs submitted requests on a pool of background worker threads
+
+    The runner is called with the submitted request and must return a
+    JSON-serialisable result. An HTTPException raised by the runner is kept
+    as the job's error so pollers see the same status code and detail the
+    synchronous endpoint would have returned. At most max_queued jobs wait
+    for a worker; further submissions get a 429.
+    """
+
+    def __init__(self, store, runner, workers=4, ttl_seconds=3600, max_queued=100):
+        self.store = store
+        self.runner = runner
+        self.ttl_seconds = ttl_seconds
+        self.max_queued = max_queued
+        self._queued = set()   # ids of jobs not yet picked up by a worker
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="agent-job")
+
+    def submit(self, request, payload=None):
+        """
+        Queue a request and return its job id immediately
+
+        Args:
+            request: Object handed to the runner
+            payload: JSON-serialisable copy of the request to store with the job
+
+        Raises:
+            HTTPException: 429 with a Retry-After header when max_queued jobs are already waiting
+        """
+        self.store.purge(time.time() - self.ttl_seconds)
+
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            if self.max_queued and len(self._queued) >= self.max_queued:
+                raise HTTPException(status_code=429, detail="Job queue is full, retry later",
+                                    headers={"Retry-After": "5"})
+            self._queued.add(job_id)
+        self.store.create(job_id, payload)
+        self._executor.submit(self._run, job_id, request)
+        logger.info(f"Queued job {job_id}")
+        return job_id
+
+    def _run(self, job_id, request):
+        with self._lock:
+            self._queued.discard(job_id)
+        self.store.update(job_id, status=JOB_RUNNING, started_at=time.time())
+        logger.info(f"Job {job_id} started")
+        try:
+            result = self.runner(request)
+            self.store.update(job_id, status=JOB_SUCCEEDED, result=result, finished_at=time.time())
+            logger.info(f"Job {job_id} succeeded")
+        except HTTPException as e:
+            self.store.update(job_id, status=JOB_FAILED, finished_at=time.time(),
+                              error={"status_code": e.status_code, "detail": e.detail})
+            logger.error(f"Job {job_id} failed with status {e.status_code}")
+        except Exception as e:
+            error_details = log_full_traceback(logger, e, f"Job {job_id} failed: ")
+            self.store.update(job_id, status=JOB_FAILED, finished_at=time.time(),
+                              error={"status_code": 500, "detail": error_details["error_message"]})
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def shutdown(self, wait=True, cancel_queued=False):
+        """Stop the workers; with cancel_queued, jobs not yet started are failed instead of run"""
+        self._executor.shutdown(wait=wait, cancel_futures=cancel_queued)
+        if cancel_queued:
+            with self._lock:
+                cancelled, self._queued = self._queued, set()
+            for job_id in cancelled:
+                self.store.update(job_id, status=JOB_FAILED, error=INTERRUPTED_ERROR, finished_at=time.time())
@@ -0,0 +1,274 @@
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from urllib.parse import parse_qs
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.common.logger import get_logger
+
+logger = get_logger(__name__)
+
+_active_profile = contextvars.ContextVar("active_profile", default=None)
+
+# tracemalloc is process-wide, so only one request is profiled at a time
+_profile_lock = threading.Lock()
+
+# Leaf frames of threads that are blocked rather than running Python code
+_IDLE_FUNCTIONS = {("selectors.py", "select"), ("threading.py", "wait"), ("queue.py", "get")}
+
+_TRUE_VALUES = ("1", "true", "yes", "on")
+
+
+def _frame_label(code):
+    filename = code.co_filename.replace("\\", "/")
+    short = "/".join(filename.rsplit("/", 2)[-2:])
+    return f"{code.co_name} ({short}:{code.co_firstlineno})"
+
+
+def _is_idle(frame):
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in _IDLE_FUNCTIONS
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of a set of threads on a background thread
+
+    Stacks are kept in folded form ("root;child;leaf" -> count), which
+    flamegraph.pl, speedscope and inferno read directly. Samples where a
+    thread is blocked in select/wait are counted as idle and left out of
+    the stacks.
+    """
+
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.idle_samples = 0
+        self._threads = set()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_thread(self, ident):
+        self._threads.add(ident)
+
+    def _sample(self):
+        frames = sys._current_frames()
+        for ident in list(self._threads):
+            frame = frames.get(ident)
+            if frame is None:
+                continue
+            if _is_idle(frame):
+                self.idle_samples += 1
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def folded(self):
+        return [f"{stack} {count}" for stack, count in self.stacks.most_common()]
+
+    def top_functions(self, limit):
+        """Functions by samples spent in them (self) and under them (total)"""
+        self_counts, total_counts = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            self_counts[frames[-1]] += count
+            for frame in set(frames):
+                total_counts[frame] += count
+        return [
+            {"function": function, "self_samples": self_counts[function], "total_samples": total}
+            for function, total in total_counts.most_common(limit)
+        ]
+
+
+class RequestProfile:
+    """Sampling profile plus allocation summary for a single request"""
+
+    def __init__(self, interval=0.002, top_n=25, tracemalloc_frames=1):
+        self.id = uuid.uuid4().hex
+        self.top_n = top_n
+        self.tracemalloc_frames = tracemalloc_frames
+        self.sampler = SamplingProfiler(interval)
+        self.result = None
+        self._started_tracemalloc = False
+        self._before = None
+        self._start = None
+
+    def attach_current_thread(self):
+        self.sampler.add_thread(threading.get_ident())
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.tracemalloc_frames)
+            self._started_tracemalloc = True
+        tracemalloc.reset_peak()
+        self._before = tracemalloc.take_snapshot()
+        self.attach_current_thread()
+        self._start = time.perf_counter()
+        self.sampler.start()
+
+    def stop(self):
+        if self.result is not None:
+            return self.result
+        duration = time.perf_counter() - self._start
+        self.sampler.stop()
+
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        diff = after.filter_traces(filters).compare_to(self._before.filter_traces(filters), "lineno")
+        allocations = [
+            {
+                "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                "size_diff_kb": round(stat.size_diff / 1024, 2),
+                "count_diff": stat.count_diff,
+            }
+            for stat in diff[:self.top_n] if stat.size_diff
+        ]
+
+        self.result = {
+            "profile_id": self.id,
+            "duration_ms": round(duration * 1000, 3),
+            "interval_ms": self.sampler.interval * 1000,
+            "samples": self.sampler.samples,
+            "idle_samples": self.sampler.idle_samples,
+            "top_functions": self.sampler.top_functions(self.top_n),
+            "allocations": allocations,
+            "allocated_kb": round(sum(stat.size_diff for stat in diff) / 1024, 2),
+            "peak_traced_kb": round(peak / 1024, 2),
+        }
+        return self.result
+
+    def save(self, directory):
+        """Write <id>.json (summary) and <id>.folded (flamegraph input) under directory"""
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"{self.id}.json"), "w") as f:
+            json.dump(self.result, f, indent=2)
+        with open(os.path.join(directory, f"{self.id}.folded"), "w") as f:
+            f.write("\n".join(self.sampler.folded()) + "\n")
+
+
+def attach_current_thread():
+    """Add the calling thread to the active profile; a context variable lookup when profiling is off"""
+    profile = _active_profile.get()
+    if profile is not None:
+        profile.attach_current_thread()
+
+
+def profile_path(directory, profile_id, fmt="json"):
+    """
+    Path of a stored profile
+
+    Raises:
+        ValueError: If profile_id or fmt is malformed
+    """
+    if fmt not in ("json", "folded") or not profile_id.isalnum():
+        raise ValueError(f"Invalid profile id or format: {profile_id}.{fmt}")
+    return os.path.join(directory, f"{profile_id}.{fmt}")
+
+
+def profiling_requested(scope):
+    """True when the request asks for profiling via X-Profile header or ?profile= query flag"""
+    header = Headers(scope=scope).get("x-profile")
+    if header is not None:
+        return header.lower() in _TRUE_VALUES
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return any(value.lower() in _TRUE_VALUES for value in query.get("profile", []))
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in per-request CPU and allocation profiling
+
+    A request sent with "X-Profile: 1" (or ?profile=1) and a valid
+    X-Admin-Key is run under a sampling profiler and tracemalloc, starting
+    before body parsing and validation. The profile is stored under
+    store_dir and its id returned in the X-Profile-Id response header.
+    Handlers that run in worker threads join the profile with
+    attach_current_thread(). Other requests only pay for the header check.
+    Without an admin_key the profile flag is ignored.
+    """
+
+    def __init__(self, app, store_dir, admin_key=None, interval=0.002, top_n=25, tracemalloc_frames=1):
+        self.app = app
+        self.store_dir = store_dir
+        self.admin_key = admin_key
+        self.interval = interval
+        self.top_n = top_n
+        self.tracemalloc_frames = tracemalloc_frames
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.admin_key or not profiling_requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        if Headers(scope=scope).get("x-admin-key") != self.admin_key:
+            await self._reject(send, 403, "Admin key required for profiling")
+            return
+        if not _profile_lock.acquire(blocking=False):
+            await self._reject(send, 409, "Another request is being profiled")
+            return
+
+        profile = RequestProfile(self.interval, self.top_n, self.tracemalloc_frames)
+        token = _active_profile.set(profile)
+
+        def finish():
+            if profile.result is None:
+                profile.stop()
+                profile.save(self.store_dir)
+                logger.info(f"Stored request profile {profile.id} ({profile.result['samples']} samples, "
+                            f"{profile.result['duration_ms']} ms) in {self.store_dir}")
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Profile-Id", profile.id)
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                # Store before the last chunk so the id is fetchable once the client has the response
+                finish()
+            await send(message)
+
+        try:
+            profile.start()
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            try:
+                finish()
+            finally:
+                _active_profile.reset(token)
+                _profile_lock.release()
+
+    @staticmethod
+    async def _reject(send, status, detail):
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,90 @@
+import json
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ormsgpack
+except ImportError:
+    ormsgpack = None
+
+JSON_MEDIA_TYPE = "application/json"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+# Set from settings.JSON_ENCODER at startup; "orjson" falls back to json if not installed
+_json_encoder = "orjson"
+
+
+def set_json_encoder(name):
+    """Choose the JSON encoder used by dumps ("orjson" or "json")"""
+    global _json_encoder
+    if name not in ("orjson", "json"):
+        raise ValueError(f"Unknown JSON encoder: {name}. Expected 'orjson' or 'json'")
+    _json_encoder = name
+
+
+def json_encoder_name():
+    return "orjson" if _json_encoder == "orjson" and orjson is not None else "json"
+
+
+def msgpack_available():
+    return ormsgpack is not None
+
+
+def dumps(content):
+    """
+    Serialise content to compact JSON bytes
+
+    Uses orjson when available and selected, falling back to the standard
+    library for anything orjson rejects (e.g. non-string dict keys).
+    """
+    if json_encoder_name() == "orjson":
+        try:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def dumps_msgpack(content):
+    """
+    Serialise content to MessagePack bytes
+
+    Raises:
+        RuntimeError: If ormsgpack is not installed
+    """
+    if ormsgpack is None:
+        raise RuntimeError("ormsgpack is not installed; MessagePack responses are unavailable")
+    return ormsgpack.packb(content, option=ormsgpack.OPT_NON_STR_KEYS)
+
+
+def ndjson_line(content):
+    """Serialise one record as a newline-terminated JSON line"""
+    return dumps(content) + b"\n"
+
+
+def negotiate_media_type(accept):
+    """
+    Pick the response format for batch/streaming endpoints from an Accept header
+
+    Returns NDJSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE (only if ormsgpack is
+    installed) or JSON_MEDIA_TYPE.
+    """
+    accept = (accept or "").lower()
+    if NDJSON_MEDIA_TYPE in accept:
+        return NDJSON_MEDIA_TYPE
+    if ormsgpack is not None and (MSGPACK_MEDIA_TYPE in accept or "application/x-msgpack" in accept):
+        return MSGPACK_MEDIA_TYPE
+    return JSON_MEDIA_TYPE
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with the compact, optionally orjson-backed encoder"""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -0,0 +1,40 @@
+from app.common.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class SessionStore:
+    """
+    Conversation history per tenant and session id, kept in the shared state backend
+
+    History is a list of {"role": "user" | "assistant", "content": str}
+    turns, trimmed to the last max_turns messages and expired ttl seconds
+    after the last write, so any task can continue a conversation started
+    on another. Sessions are keyed by tenant too, so a session id only
+    reaches the history of the tenant that started it.
+    """
+
+    def __init__(self, state, ttl=3600, max_turns=20):
+        self.state = state
+        self.ttl = ttl
+        self.max_turns = max_turns
+
+    @staticmethod
+    def _key(tenant, session_id):
+        return f"session:{tenant}:{session_id}"
+
+    def get(self, tenant, session_id):
+        return self.state.get(self._key(tenant, session_id)) or []
+
+    def append(self, tenant, session_id, messages, response):
+        """Add one exchange (the user's messages and the agent's answer) to the session"""
+        history = list(self.get(tenant, session_id))
+        history.extend({"role": "user", "content": message} for message in messages)
+        history.append({"role": "assistant", "content": response})
+        if self.max_turns:
+            history = history[-self.max_turns:]
+        self.state.set(self._key(tenant, session_id), history, self.ttl)
+        return history
+
+    def clear(self, tenant, session_id):
+        self.state.delete(self._key(tenant, session_id))
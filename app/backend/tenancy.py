@@ -0,0 +1,394 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from fastapi import HTTPException
+
+from app.common.logger import get_logger, log_full_traceback
+from app.core.usage import estimate_cost
+
+logger = get_logger(__name__)
+
+
+def resolve_tenant(api_key, tenant_id, api_keys, default_tenant="default"):
+    """
+    Work out which tenant a request belongs to
+
+    When api_keys is configured every request must carry a known key.
+    Otherwise the optional tenant header is trusted, which is enough for
+    accounting on a private deployment but not for limits (see
+    check_tenant_limits).
+
+    Raises:
+        HTTPException: 401 if keys are configured and the key is missing or unknown
+    """
+    if api_keys:
+        if not api_key or api_key not in api_keys:
+            raise HTTPException(status_code=401, detail="Missing or invalid API key")
+        return api_keys[api_key]
+    return tenant_id or default_tenant
+
+
+def check_tenant_limits(api_keys, token_quota=0, request_quota=0, tenant_quotas=None, max_concurrent=0):
+    """
+    Check that per-tenant limits rest on authenticated tenants
+
+    Without api_keys the tenant comes from the X-Tenant-ID header, which a
+    caller can change on every request to get a fresh quota or fair share.
+
+    Returns:
+        list: Startup warnings
+
+    Raises:
+        ValueError: If quotas are configured without api keys
+    """
+    if api_keys:
+        return []
+    if token_quota or request_quota or tenant_quotas:
+        raise ValueError("Tenant quotas need TENANT_API_KEYS: without keys the tenant is the caller's "
+                         "X-Tenant-ID header, which can be rotated to get around any quota")
+    if max_concurrent:
+        return ["TENANT_API_KEYS is not set, so MAX_CONCURRENT_REQUESTS is one queue shared by all callers "
+                "rather than divided between X-Tenant-ID tenants"]
+    return []
+
+
+class UsageLedger:
+    """
+    In-memory per-tenant usage counters with periodic flushes to disk
+
+    record() only touches dicts under a lock. A daemon thread appends the
+    deltas accumulated since the last flush to a JSONL file every
+    flush_interval seconds, so accounting never costs a disk write per
+    request.
+
+    With a shared_state backend, quota windows are counted across every
+    task of the deployment: another daemon thread pushes local deltas with
+    incr() and pulls the shared totals every sync_interval seconds, and
+    check_quota() compares the last pulled totals plus unsynced local
+    usage against the quota, so quotas are not enforced N times over and
+    requests do not wait on the backend.
+    """
+
+    _FIELDS = ("requests", "errors", "input_tokens", "output_tokens", "cost_usd")
+
+    def __init__(self, window_seconds=86400, token_quota=0, request_quota=0,
+                 tenant_quotas=None, flush_path=None, flush_interval=60,
+                 shared_state=None, sync_interval=1.0):
+        self.window_seconds = window_seconds
+        self.token_quota = token_quota
+        self.request_quota = request_quota
+        self.tenant_quotas = tenant_quotas or {}
+        self.flush_path = flush_path
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        self._totals = defaultdict(self._zero)        # (tenant, model) -> counters since start
+        self._pending = defaultdict(self._zero)       # (tenant, model) -> counters since last flush
+        self._window = defaultdict(self._zero)        # tenant -> counters in the current quota window
+        self._window_start = self._current_window()
+        self._flusher = None
+        self._stop = threading.Event()
+
+        self.shared_state = shared_state
+        self.sync_interval = sync_interval
+        self._shared_pending = defaultdict(self._zero_quota)   # tenant -> window usage not yet pushed
+        self._shared_used = {}                                 # tenant -> shared window usage at last sync
+        self._syncer = None
+
+    @classmethod
+    def _zero(cls):
+        return dict.fromkeys(cls._FIELDS, 0)
+
+    @staticmethod
+    def _zero_quota():
+        return {"requests": 0, "tokens": 0}
+
+    def _current_window(self):
+        now = time.time()
+        return now - (now % self.window_seconds)
+
+    def _roll_window(self):
+        window_start = self._current_window()
+        if window_start != self._window_start:
+            self._window_start = window_start
+            self._window.clear()
+            self._shared_used.clear()
+            self._shared_pending.clear()
+
+    def _window_usage(self, tenant):
+        """(tokens, requests) used by tenant in the current window; caller holds the lock"""
+        if self.shared_state is not None:
+            shared = self._shared_used.get(tenant) or self._zero_quota()
+            pending = self._shared_pending.get(tenant) or self._zero_quota()
+            return shared["tokens"] + pending["tokens"], shared["requests"] + pending["requests"]
+        used = self._window.get(tenant) or self._zero()
+        return used["input_tokens"] + used["output_tokens"], used["requests"]
+
+    def quota_for(self, tenant):
+        """Return the (tokens, requests) quota for a tenant; 0 means unlimited"""
+        override = self.tenant_quotas.get(tenant, {})
+        return override.get("tokens", self.token_quota), override.get("requests", self.request_quota)
+
+    def check_quota(self, tenant):
+        """
+        Reject the request if the tenant has used up its quota for this window
+
+        Raises:
+            HTTPException: 429 with a Retry-After header
+        """
+        token_quota, request_quota = self.quota_for(tenant)
+        if not (token_quota or request_quota):
+            return
+        if self.shared_state is not None:
+            self._ensure_syncer()
+            if tenant not in self._shared_used:
+                self.sync([tenant])
+
+        with self._lock:
+            self._roll_window()
+            tokens_used, requests_used = self._window_usage(tenant)
+            exceeded = (token_quota and tokens_used >= token_quota) or \
+                       (request_quota and requests_used >= request_quota)
+            retry_after = int(self._window_start + self.window_seconds - time.time()) + 1
+
+        if exceeded:
+            logger.warning(f"Tenant {tenant} exceeded its quota: tokens={tokens_used}, requests={requests_used}")
+            raise HTTPException(
+                status_code=429,
+                detail=f"Quota exceeded for tenant '{tenant}'",
+                headers={"Retry-After": str(retry_after)}
+            )
+
+    def record(self, tenant, model_name, usage=None, error=False, usage_by_model=None):
+        """
+        Account one finished request
+
+        Args:
+            tenant: Tenant the request belongs to
+            model_name: Model that served it
+            usage: Usage dict from get_response_from_ai_agents metadata
+            error: Whether the request failed
+            usage_by_model: Optional {model: usage} for a request that ran several models (supervisor
+                mode); tokens and cost then go to each model, and the request count to model_name
+
+        Returns:
+            float: Estimated cost of the request in USD
+        """
+        deltas = {}
+        for name, model_usage in (usage_by_model or {model_name: usage or {}}).items():
+            delta = deltas[name] = self._zero()
+            delta["input_tokens"] = model_usage.get("input_tokens", 0)
+            delta["output_tokens"] = model_usage.get("output_tokens", 0)
+            delta["cost_usd"] = estimate_cost(name, delta["input_tokens"], delta["output_tokens"])
+        request = deltas.setdefault(model_name, self._zero())
+        request["requests"] = 1
+        request["errors"] = 1 if error else 0
+        totals = {field: sum(delta[field] for delta in deltas.values()) for field in self._FIELDS}
+
+        with self._lock:
+            self._roll_window()
+            for name, delta in deltas.items():
+                for counters in (self._totals[(tenant, name)], self._pending[(tenant, name)]):
+                    for field, value in delta.items():
+                        counters[field] += value
+            for field, value in totals.items():
+                self._window[tenant][field] += value
+            if self.shared_state is not None:
+                self._shared_pending[tenant]["requests"] += 1
+                self._shared_pending[tenant]["tokens"] += totals["input_tokens"] + totals["output_tokens"]
+
+        self._ensure_flusher()
+        if self.shared_state is not None:
+            self._ensure_syncer()
+        return totals["cost_usd"]
+
+    def report(self, tenant=None):
+        """
+        Summarise usage per tenant and model
+
+        Args:
+            tenant: Restrict the report to one tenant
+        """
+        tenants = {}
+        with self._lock:
+            self._roll_window()
+            for (name, model_name), counters in self._totals.items():
+                if tenant is not None and name != tenant:
+                    continue
+                entry = tenants.setdefault(name, {"totals": self._zero(), "models": {}})
+                entry["models"][model_name] = dict(counters)
+                for field in self._FIELDS:
+                    entry["totals"][field] += counters[field]
+
+            for name, entry in tenants.items():
+                token_quota, request_quota = self.quota_for(name)
+                tokens_used, requests_used = self._window_usage(name)
+                entry["window"] = {
+                    "started_at": self._window_start,
+                    "seconds": self.window_seconds,
+                    "tokens_used": tokens_used,
+                    "requests_used": requests_used,
+                    "token_quota": token_quota,
+                    "request_quota": request_quota,
+                }
+                entry["totals"]["cost_usd"] = round(entry["totals"]["cost_usd"], 6)
+        return tenants
+
+    def _ensure_flusher(self):
+        if self.flush_path is None or self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="usage-flush", daemon=True)
+                self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Append usage accumulated since the last flush to the usage log"""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(self._zero)
+        if not pending or self.flush_path is None:
+            return 0
+
+        try:
+            if os.path.dirname(self.flush_path):
+                os.makedirs(os.path.dirname(self.flush_path), exist_ok=True)
+            flushed_at = time.time()
+            with open(self.flush_path, "a") as f:
+                for (tenant, model_name), counters in pending.items():
+                    f.write(json.dumps(dict(counters, tenant=tenant, model=model_name, ts=flushed_at)) + "\n")
+        except OSError as e:
+            log_full_traceback(logger, e, "Failed to flush usage counters: ")
+        return len(pending)
+
+    def _ensure_syncer(self):
+        if self._syncer is not None:
+            return
+        with self._lock:
+            if self._syncer is None:
+                self._syncer = threading.Thread(target=self._sync_loop, name="quota-sync", daemon=True)
+                self._syncer.start()
+
+    def _sync_loop(self):
+        while not self._stop.wait(self.sync_interval):
+            self.sync()
+
+    def _quota_key(self, tenant, window_start, field):
+        return f"quota:{tenant}:{int(window_start)}:{field}"
+
+    def sync(self, tenants=()):
+        """
+        Push unsynced quota usage to the shared state and pull the shared totals
+
+        Args:
+            tenants: Extra tenants to pull even if they have no local usage
+        """
+        if self.shared_state is None:
+            return
+        with self._lock:
+            self._roll_window()
+            window_start = self._window_start
+            pending, self._shared_pending = self._shared_pending, defaultdict(self._zero_quota)
+            pull = (set(self._shared_used) | set(tenants)) - set(pending)
+
+        try:
+            totals = {}
+            for tenant, delta in pending.items():
+                totals[tenant] = {
+                    field: self.shared_state.incr(self._quota_key(tenant, window_start, field), amount,
+                                                  ttl=self.window_seconds)
+                    for field, amount in delta.items()
+                }
+            if pull:
+                keys = {(tenant, field): self._quota_key(tenant, window_start, field)
+                        for tenant in pull for field in ("requests", "tokens")}
+                values = self.shared_state.get_many(keys.values())
+                for (tenant, field), key in keys.items():
+                    totals.setdefault(tenant, self._zero_quota())[field] = values.get(key, 0)
+        except Exception as e:
+            log_full_traceback(logger, e, "Failed to sync quota usage with shared state: ")
+            with self._lock:
+                for tenant, delta in pending.items():
+                    for field, amount in delta.items():
+                        self._shared_pending[tenant][field] += amount
+            return
+
+        with self._lock:
+            if window_start == self._window_start:
+                self._shared_used.update(totals)
+
+    def close(self):
+        """Stop the flusher and write out anything pending"""
+        self._stop.set()
+        self.flush()
+        self.sync()
+
+
+class FairShareScheduler:
+    """
+    Caps in-flight requests and divides the cap evenly between active tenants
+
+    A tenant may start a request while it is below its fair share
+    (capacity // active tenants, at least one slot) and total capacity
+    remains, so one busy tenant cannot starve the others of upstream rate
+    limit. A capacity of 0 disables scheduling.
+    """
+
+    def __init__(self, capacity=0):
+        self.capacity = capacity
+        self._condition = threading.Condition()
+        self._in_flight = defaultdict(int)
+        self._waiting = defaultdict(int)
+
+    def _fair_share(self):
+        active = {t for t, n in self._in_flight.items() if n} | {t for t, n in self._waiting.items() if n}
+        return max(1, self.capacity // max(1, len(active)))
+
+    def _can_start(self, tenant):
+        total = sum(self._in_flight.values())
+        return total < self.capacity and self._in_flight[tenant] < self._fair_share()
+
+    @contextmanager
+    def slot(self, tenant, timeout=30):
+        """
+        Hold one request slot for tenant
+
+        Raises:
+            HTTPException: 429 if no slot frees up within timeout
+        """
+        if not self.capacity:
+            yield
+            return
+
+        with self._condition:
+            self._waiting[tenant] += 1
+            try:
+                acquired = self._condition.wait_for(lambda: self._can_start(tenant), timeout=timeout)
+            finally:
+                self._waiting[tenant] -= 1
+            if not acquired:
+                logger.warning(f"Tenant {tenant} timed out waiting for a request slot")
+                raise HTTPException(
+                    status_code=429,
+                    detail=f"Too many concurrent requests for tenant '{tenant}'",
+                    headers={"Retry-After": "1"}
+                )
+            self._in_flight[tenant] += 1
+
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._in_flight[tenant] -= 1
+                self._condition.notify_all()
+
+    def snapshot(self):
+        with self._condition:
+            return {"capacity": self.capacity, "in_flight": {t: n for t, n in self._in_flight.items() if n}}
@@ -0,0 +1,71 @@
+from fastapi import HTTPException
+
+from app.common.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Controls where a lower value is faster; a tier's value caps the request's
+CAPPED_CONTROLS = ("max_output_tokens", "max_results", "max_steps", "max_tool_calls", "max_tokens")
+# Controls a request may set freely; the tier's value is only a default
+DEFAULT_CONTROLS = ("temperature",)
+
+
+def apply_tier(request, tiers, default_tier=None):
+    """
+    Apply a latency tier's presets to a chat request, in place
+
+    A tier is a dict of generation controls (CAPPED_CONTROLS and
+    DEFAULT_CONTROLS), an optional "models" map from the requested model to
+    the one the tier serves it with, and its latency target
+    ("latency_target_ms", soft: the agent is asked for its final answer
+    when the next step would miss it) and hard "timeout_ms" (default twice
+    the target). A request can tighten a capped control but never loosen it.
+
+    Args:
+        request: RequestState whose tier field names the tier (default_tier if unset)
+        tiers: LATENCY_TIERS mapping of tier name to preset
+        default_tier: Tier for requests that do not name one; None = no tier
+
+    Returns:
+        str: Name of the applied tier, or None
+
+    Raises:
+        HTTPException: 400 if the tier is not configured
+    """
+    name = request.tier or default_tier
+    if not name:
+        return None
+    if name not in tiers:
+        raise HTTPException(status_code=400,
+                            detail=f"Unknown latency tier: {name}. Available tiers: {', '.join(sorted(tiers))}")
+    tier = tiers[name]
+    request.tier = name
+
+    served = tier.get("models", {}).get(request.model_name)
+    if served:
+        logger.info(f"Latency tier {name} serves {request.model_name} with {served}")
+        request.model_name = served
+    for control in CAPPED_CONTROLS:
+        preset, requested = tier.get(control), getattr(request, control)
+        if preset:
+            setattr(request, control, min(requested, preset) if requested else preset)
+    for control in DEFAULT_CONTROLS:
+        if getattr(request, control) is None and tier.get(control) is not None:
+            setattr(request, control, tier[control])
+
+    return name
+
+
+def latency_limits(name, tiers):
+    """
+    Soft latency target and hard timeout of a tier, in seconds
+
+    Returns:
+        tuple: (latency_target, timeout); both None for no tier or a tier without a target
+    """
+    tier = tiers.get(name) if name else None
+    if not tier or not (tier.get("latency_target_ms") or tier.get("timeout_ms")):
+        return None, None
+    target = tier.get("latency_target_ms") or 0
+    timeout = tier.get("timeout_ms") or 2 * target
+    return (target / 1000 or None), timeout / 1000
@@ -0,0 +1,139 @@
+import asyncio
+import json
+import threading
+
+from fastapi import HTTPException
+from starlette.websockets import WebSocketDisconnect
+
+from app.common.logger import get_logger, log_full_traceback
+from app.core.hedging import RunCancelled
+
+logger = get_logger(__name__)
+
+
+class ChatConnection:
+    """
+    One multi-turn conversation held open over a WebSocket
+
+    The conversation's options are validated once, from a "start" message,
+    and its history is kept on the server, so each turn only carries the
+    new message. Client messages are JSON objects:
+
+        {"type": "start", ...options}      set (or, between turns, replace) the options
+        {"type": "message", "content"}     run a turn with one new user message
+        {"type": "cancel"}                 stop the running turn; it is not added to the history
+        {"type": "interrupt", "content"}   cancel the running turn and run content instead
+
+    The server replies with "ready" (session_id), "token" (content) while
+    the answer is generated, then "done" (response, metadata),
+    "cancelled" or "error" (status_code, detail) for each turn.
+
+    open_conversation(message) validates a start message and returns the
+    options; run_turn(options, content, on_token, cancel_event) runs one
+    turn (in a worker thread) and returns the /chat result. Both report
+    failures as HTTPException.
+    """
+
+    def __init__(self, websocket, open_conversation, run_turn):
+        self.websocket = websocket
+        self.open_conversation = open_conversation
+        self.run_turn = run_turn
+        self.options = None
+        self._turn = None
+        self._cancel_event = None
+        self._send_lock = asyncio.Lock()
+
+    @property
+    def busy(self):
+        return self._turn is not None and not self._turn.done()
+
+    async def send(self, message):
+        async with self._send_lock:
+            await self.websocket.send_json(message)
+
+    async def error(self, status_code, detail):
+        await self.send({"type": "error", "status_code": status_code, "detail": detail})
+
+    async def serve(self):
+        """Handle client messages until the client disconnects, then cancel any running turn"""
+        try:
+            while True:
+                text = await self.websocket.receive_text()
+                try:
+                    message = json.loads(text)
+                except ValueError:
+                    await self.error(400, "Messages must be JSON objects")
+                    continue
+                await self.handle(message)
+        except WebSocketDisconnect:
+            logger.info("WebSocket chat client disconnected")
+        finally:
+            if self.busy:
+                self._cancel_event.set()
+                await asyncio.gather(self._turn, return_exceptions=True)
+
+    async def handle(self, message):
+        kind = message.get("type") if isinstance(message, dict) else None
+        if kind == "start":
+            if self.busy:
+                return await self.error(409, "A turn is running; cancel or interrupt it first")
+            try:
+                self.options = self.open_conversation(message)
+            except HTTPException as e:
+                return await self.error(e.status_code, e.detail)
+            await self.send({"type": "ready", "session_id": self.options.session_id})
+        elif kind in ("message", "interrupt"):
+            content = message.get("content")
+            if self.options is None:
+                return await self.error(400, "Send a start message first")
+            if not isinstance(content, str) or not content:
+                return await self.error(400, "content must be a non-empty string")
+            if kind == "interrupt":
+                await self.cancel()
+            elif self.busy:
+                return await self.error(409, "A turn is running; cancel or interrupt it first")
+            self._cancel_event = threading.Event()
+            self._turn = asyncio.create_task(self._run_turn(content, self._cancel_event))
+        elif kind == "cancel":
+            if not await self.cancel():
+                await self.error(409, "No turn is running")
+        else:
+            await self.error(400, f"Unknown message type: {kind}")
+
+    async def cancel(self):
+        """Stop the running turn and wait for it to wind down; False if no turn was running"""
+        if not self.busy:
+            return False
+        self._cancel_event.set()
+        await asyncio.gather(self._turn, return_exceptions=True)
+        return True
+
+    async def _run_turn(self, content, cancel_event):
+        loop = asyncio.get_running_loop()
+        tokens = asyncio.Queue()
+
+        def on_token(text):
+            loop.call_soon_threadsafe(tokens.put_nowait, text)
+
+        def work():
+            try:
+                return self.run_turn(self.options, content, on_token, cancel_event)
+            finally:
+                # Queued after every token, so "done" never overtakes the answer's last tokens
+                loop.call_soon_threadsafe(tokens.put_nowait, None)
+
+        worker = asyncio.ensure_future(asyncio.to_thread(work))
+        while (text := await tokens.get()) is not None:
+            await self.send({"type": "token", "content": text})
+
+        try:
+            result = await worker
+        except RunCancelled:
+            await self.send({"type": "cancelled"})
+        except HTTPException as e:
+            await self.error(e.status_code, e.detail)
+        except Exception as e:
+            error_details = log_full_traceback(logger, e, "WebSocket chat turn failed: ")
+            await self.error(500, error_details["error_message"])
+        else:
+            await self.send(dict(result, type="done"))
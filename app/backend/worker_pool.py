@@ -0,0 +1,212 @@
+import multiprocessing
+import os
+import pickle
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.common.logger import get_logger
+
+logger = get_logger(__name__)
+
+# ProcessPoolExecutor(max_tasks_per_child=...) needs Python 3.11; older versions recycle the whole pool instead
+_MAX_TASKS_PER_CHILD = sys.version_info >= (3, 11)
+
+
+class WorkerError(Exception):
+    """
+    An agent error that could not be sent back from a worker process as-is
+
+    Keeps the original type name, message, HTTP status code (so overload
+    detection still sees a 429) and the worker-side traceback.
+    """
+
+    def __init__(self, message, error_type="Exception", status_code=None, worker_traceback=""):
+        super().__init__(message)
+        self.error_type = error_type
+        self.status_code = status_code
+        self.worker_traceback = worker_traceback
+
+    def __reduce__(self):
+        return (type(self), (str(self), self.error_type, self.status_code, self.worker_traceback))
+
+
+def _portable_error(error):
+    """error itself if it survives pickling, otherwise a WorkerError describing it"""
+    try:
+        pickle.loads(pickle.dumps(error))
+        return error
+    except Exception:
+        return WorkerError(str(error), type(error).__name__, getattr(error, "status_code", None),
+                           "".join(traceback.format_exception(error)))
+
+
+def _init_worker(warm_models):
+    """Worker initializer: import the agent stack and pre-build model clients once per process"""
+    from app.config.settings import settings
+    from app.common.tracing import configure_tracing
+    from app.core import ai_agent
+
+    configure_tracing(settings.TRACING_EXPORTER, settings.TRACING_SAMPLE_RATE, settings.TRACING_FILE)
+    ai_agent.enable_model_cache()
+    for model_name in warm_models:
+        try:
+            ai_agent.chat_model(model_name)
+        except Exception as e:
+            logger.warning(f"Could not pre-build {model_name} in worker {os.getpid()}: {e}")
+    logger.info(f"Agent worker {os.getpid()} ready")
+
+
+def _ping():
+    return os.getpid()
+
+
+def _run_agent(args, kwargs):
+    """Worker entry point: run the agent and return (response, metadata)"""
+    from app.core.ai_agent import get_response_from_ai_agents
+
+    metadata = {}
+    try:
+        response = get_response_from_ai_agents(*args, metadata=metadata, **kwargs)
+    except Exception as e:
+        raise _portable_error(e) from None
+    return response, metadata
+
+
+class AgentWorkerPool:
+    """
+    Runs get_response_from_ai_agents in long-lived worker processes
+
+    Each worker imports the agent stack once and keeps its own model
+    clients (and their HTTP connection pools), so the CPU-side work of a
+    request runs outside the frontend's GIL. Requests and responses cross
+    the process boundary as plain strings and dicts. A worker is replaced
+    after max_tasks requests (before Python 3.11, the whole pool is
+    recycled after workers * max_tasks requests), and recycle() replaces
+    them all while in-flight requests finish on the old pool. Workers are
+    spawned, not forked, so they never inherit the frontend's threads or
+    sockets.
+    """
+
+    def __init__(self, workers, max_tasks=1000, warm_models=(), start_timeout=60):
+        self.workers = workers
+        self.max_tasks = max_tasks or None
+        self.warm_models = tuple(warm_models)
+        self.start_timeout = start_timeout
+        self.submitted = 0
+        self.recycles = 0
+        self.pids = []
+        self._served = 0
+        self._recycling = False
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _new_executor(self):
+        options = {"max_tasks_per_child": self.max_tasks} if _MAX_TASKS_PER_CHILD else {}
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.warm_models,),
+            **options
+        )
+        # One ping per worker spawns (and so warms) the whole pool up front
+        start = time.perf_counter()
+        pings = [executor.submit(_ping) for _ in range(self.workers)]
+        pids = sorted({ping.result(timeout=self.start_timeout) for ping in pings})
+        logger.info(f"Started {len(pids)} agent worker(s) in {time.perf_counter() - start:.2f}s")
+        return executor, pids
+
+    def start(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor, self.pids = self._new_executor()
+        return self
+
+    def recycle(self):
+        """Replace every worker; requests already running finish on the old ones"""
+        executor, pids = self._new_executor()
+        with self._lock:
+            old, self._executor, self.pids = self._executor, executor, pids
+            self.recycles += 1
+            self._served = 0
+        if old is not None:
+            old.shutdown(wait=False)
+        logger.info(f"Agent worker pool recycled ({self.recycles} time(s))")
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def get_response(self, *args, metadata=None, **kwargs):
+        """
+        Call get_response_from_ai_agents in a worker; same arguments and errors
+
+        A pool broken by a crashed worker is rebuilt and the request retried once.
+        """
+        for attempt in range(2):
+            try:
+                future, executor = self._submit(args, kwargs)
+                response, worker_metadata = future.result()
+                break
+            except BrokenProcessPool:
+                if attempt:
+                    raise
+                logger.error("Agent worker pool is broken, restarting it")
+                with self._lock:
+                    if self._executor is executor:
+                        self._executor = None
+        if metadata is not None:
+            metadata.update(worker_metadata)
+        return response
+
+    def _submit(self, args, kwargs):
+        """Submit a request to the current executor, under the lock so recycle() cannot shut it down first"""
+        while True:
+            self.start()
+            with self._lock:
+                executor = self._executor
+                if executor is None:
+                    continue  # shut down since start(); start a new one
+                future = executor.submit(_run_agent, args, kwargs)
+                self.submitted += 1
+                self._served += 1
+                recycle = self._due_for_recycle()
+            break
+        if recycle:
+            threading.Thread(target=self._background_recycle, name="agent-pool-recycle", daemon=True).start()
+        return future, executor
+
+    def _due_for_recycle(self):
+        """Whether the pool has served its task limit on a Python without max_tasks_per_child (call with the lock held)"""
+        if _MAX_TASKS_PER_CHILD or not self.max_tasks or self._recycling:
+            return False
+        if self._served < self.workers * self.max_tasks:
+            return False
+        self._recycling = True
+        return True
+
+    def _background_recycle(self):
+        # Off the request path: spawning and warming the new pool takes seconds
+        try:
+            self.recycle()
+        except Exception as e:
+            logger.error(f"Agent worker pool recycle failed: {e}")
+        finally:
+            with self._lock:
+                self._recycling = False
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "pids": list(self.pids),
+                "max_tasks_per_worker": self.max_tasks,
+                "submitted": self.submitted,
+                "recycles": self.recycles,
+            }
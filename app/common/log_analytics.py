@@ -0,0 +1,375 @@
+import argparse
+import json
+import math
+import os
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from app.common.logger import LOGS_DIR, list_log_files, open_log_file
+
+INDEX_FILE = ".log_index.json"
+INDEX_VERSION = 2
+CHUNK_BYTES = 64 * 1024 * 1024
+
+REQUEST_COMPLETED_MARKER = "Request completed: "
+# Latency histogram buckets grow by 2%, so percentiles are within 2% of the exact value
+LATENCY_GROWTH = 1.02
+
+_LEVELS = {b"DEBUG", b"INFO", b"WARNING", b"ERROR", b"CRITICAL"}
+# "Received request for model: X, ...", "Received job for model: X, ..." and the WebSocket variant
+_RECEIVED_RE = re.compile(rb"^Received .*?for model: ([^,\s]+)")
+_COMPLETED_RE = re.compile(rb"model=(\S+) status=(\d+) latency_ms=([\d.]+)")
+_ERROR_TYPE = b"Error Type: "
+_SEP = b" - "
+# Length of "2026-10-19 03:00:00,123", the %(asctime)s prefix of every record
+_ASCTIME_LEN = 23
+_AGGREGATES = ("levels", "errors", "received", "statuses", "latency")
+
+
+def format_request_completed(model_name, status, latency_ms, tenant):
+    """Log message written once per chat request, whatever its outcome"""
+    return f"{REQUEST_COMPLETED_MARKER}model={model_name} status={status} latency_ms={latency_ms:.1f} tenant={tenant}"
+
+
+def latency_bucket(latency_ms):
+    return max(0, math.ceil(math.log(max(latency_ms, 1.0), LATENCY_GROWTH)))
+
+
+def _empty():
+    return {name: Counter() for name in _AGGREGATES}
+
+
+def _parse_range(job):
+    """
+    Aggregate the log lines that start in [start, end) of one file (all of it if end is None)
+
+    A range may begin mid-line; that line belongs to the previous range.
+    Lines that do not start with a log record prefix (traceback
+    continuations, print output) are skipped.
+
+    Returns:
+        tuple: (aggregates, lines parsed)
+    """
+    path, start, end = job
+    levels, errors, received, statuses, latency = (Counter() for _ in _AGGREGATES)
+    parsed = 0
+    with open_log_file(path, binary=True) as f:
+        if start:
+            f.seek(start - 1)
+            if f.read(1) != b"\n":
+                start += len(f.readline())
+        position = start
+        while end is None or position < end:
+            line = f.readline()
+            if not line:
+                break
+            position += len(line)
+            if len(line) < _ASCTIME_LEN + 3 or line[_ASCTIME_LEN:_ASCTIME_LEN + 3] != _SEP or line[4:5] != b"-":
+                continue
+            name, sep, rest = line[_ASCTIME_LEN + 3:].partition(_SEP)
+            level, sep, message = rest.partition(_SEP)
+            if not sep or level not in _LEVELS:
+                continue
+            parsed += 1
+            date = line[:10]
+            levels[(date, name, level)] += 1
+
+            if level == b"ERROR":
+                marker = message.find(_ERROR_TYPE)
+                if marker != -1:
+                    errors[(date, message[marker + len(_ERROR_TYPE):].strip())] += 1
+            elif message[:9] == b"Received ":
+                match = _RECEIVED_RE.match(message)
+                if match:
+                    received[(date, match.group(1))] += 1
+            elif message[:19] == b"Request completed: ":
+                match = _COMPLETED_RE.search(message)
+                if match:
+                    model = match.group(1)
+                    statuses[(date, model, match.group(2))] += 1
+                    latency[(date, model, str(latency_bucket(float(match.group(3)))).encode())] += 1
+
+    aggregates = {}
+    for name, counter in zip(_AGGREGATES, (levels, errors, received, statuses, latency)):
+        aggregates[name] = {"|".join(part.decode("utf-8", "replace") for part in key): count
+                            for key, count in counter.items()}
+    return aggregates, parsed
+
+
+def _complete_end(path, start, size):
+    """Offset just past the last complete line in [start, size); a line still being written waits for the next run"""
+    with open(path, "rb") as f:
+        end = size
+        while end > start:
+            block = min(64 * 1024, end - start)
+            f.seek(end - block)
+            data = f.read(block)
+            newline = data.rfind(b"\n")
+            if newline != -1:
+                return end - block + newline + 1
+            end -= block
+    return start
+
+
+def _split(path, start, end, chunk_bytes):
+    return [(path, offset, min(offset + chunk_bytes, end)) for offset in range(start, end, chunk_bytes)]
+
+
+class LogIndex:
+    """
+    Compact counts over the daily log files, merged from any number of byte ranges
+
+    Every aggregate is a Counter keyed by "date|..." strings:
+
+        levels    date|logger|level     records
+        errors    date|error type       "Error Type:" records from log_full_traceback
+        received  date|model            requests received
+        statuses  date|model|status     completed requests, from the "Request completed:" lines
+        latency   date|model|bucket     completed requests per latency histogram bucket
+
+    so questions over any date range are answered from the index alone,
+    without reading the logs again.
+    """
+
+    def __init__(self, aggregates=None, files=None):
+        self.aggregates = _empty()
+        for name, counts in (aggregates or {}).items():
+            self.aggregates[name].update(counts)
+        # File name -> {"inode", "size", "offset", "lines", "aggregates"}: how far each file has been indexed
+        self.files = files or {}
+
+    def merge(self, aggregates):
+        for name, counts in aggregates.items():
+            self.aggregates[name].update(counts)
+
+    def _rows(self, name, since=None, until=None):
+        for key, count in self.aggregates[name].items():
+            parts = key.split("|")
+            if (since and parts[0] < since) or (until and parts[0] > until):
+                continue
+            yield parts, count
+
+    def dates(self):
+        return sorted({key.split("|", 1)[0] for key in self.aggregates["levels"]})
+
+    def level_counts(self, by=("level",), since=None, until=None):
+        """
+        Record counts grouped by any of "date", "logger" and "level"
+
+        Returns:
+            list: (group tuple, count) pairs, largest first
+        """
+        fields = {"date": 0, "logger": 1, "level": 2}
+        counts = Counter()
+        for parts, count in self._rows("levels", since, until):
+            counts[tuple(parts[fields[field]] for field in by)] += count
+        return counts.most_common()
+
+    def error_counts(self, since=None, until=None):
+        """Logged exceptions by type, largest first"""
+        counts = Counter()
+        for (date, error_type), count in self._rows("errors", since, until):
+            counts[error_type] += count
+        return counts.most_common()
+
+    def status_counts(self, since=None, until=None):
+        """Completed requests by HTTP status"""
+        counts = Counter()
+        for (date, model, status), count in self._rows("statuses", since, until):
+            counts[int(status)] += count
+        return sorted(counts.items())
+
+    def model_requests(self, since=None, until=None):
+        """
+        Request volume per model
+
+        Returns:
+            dict: model -> {"received", "completed", "errors"}; errors are completions with a status >= 400
+        """
+        models = {}
+        for (date, model), count in self._rows("received", since, until):
+            models.setdefault(model, Counter())["received"] += count
+        for (date, model, status), count in self._rows("statuses", since, until):
+            stats = models.setdefault(model, Counter())
+            stats["completed"] += count
+            if int(status) >= 400:
+                stats["errors"] += count
+        return {model: {field: stats[field] for field in ("received", "completed", "errors")}
+                for model, stats in sorted(models.items())}
+
+    def latency_percentiles(self, percentiles=(50, 95, 99), since=None, until=None):
+        """
+        Request latency percentiles in seconds per model, plus "all" models
+
+        Returns:
+            dict: model -> {"count", "p50", ...}
+        """
+        histograms = {}
+        for (date, model, bucket), count in self._rows("latency", since, until):
+            for name in (model, "all"):
+                histograms.setdefault(name, Counter())[int(bucket)] += count
+        results = {}
+        for model, histogram in sorted(histograms.items()):
+            total = sum(histogram.values())
+            stats = {"count": total}
+            for percentile in percentiles:
+                rank = max(1, math.ceil(percentile / 100 * total))
+                seen = 0
+                for bucket in sorted(histogram):
+                    seen += histogram[bucket]
+                    if seen >= rank:
+                        stats[f"p{percentile:g}"] = round(LATENCY_GROWTH ** bucket / 1000, 3)
+                        break
+            results[model] = stats
+        return results
+
+    def to_dict(self):
+        return {"version": INDEX_VERSION, "files": self.files}
+
+
+def build_index(log_dir=LOGS_DIR, workers=None, index_path=None, use_index=True, chunk_bytes=CHUNK_BYTES):
+    """
+    Index every daily log file in log_dir, including rotated and compressed ones
+
+    Plain files are split into byte ranges on line boundaries and parsed
+    in a process pool, one process per compressed file. Per-file results
+    are saved to index_path (default log_dir/.log_index.json), so later
+    runs only parse what was appended since. Files are matched to their
+    index entries by inode, so a size-rotated file keeps its entry under
+    its new name and a new file reusing a name is parsed from the start.
+
+    Args:
+        log_dir: Directory of the daily log files
+        workers: Parser processes (default one per CPU); 1 parses in-process
+        index_path: Where the index is cached
+        use_index: False ignores and does not write the cached index
+        chunk_bytes: Size of the byte ranges handed to each process
+
+    Returns:
+        LogIndex: Counts over all the files
+    """
+    index_path = index_path or os.path.join(log_dir, INDEX_FILE)
+    cached = {}
+    if use_index and os.path.exists(index_path):
+        with open(index_path, "r") as f:
+            saved = json.load(f)
+        if saved.get("version") == INDEX_VERSION:
+            cached = saved["files"]
+
+    by_inode = {entry.get("inode"): entry for entry in cached.values()}
+    files, jobs, owners = {}, [], []
+    for path in list_log_files(log_dir):
+        name = os.path.basename(path)
+        stat = os.stat(path)
+        entry = by_inode.get(stat.st_ino)
+        if entry is None or stat.st_size < entry["offset"]:
+            entry = {"offset": 0, "lines": 0, "aggregates": _empty()}
+        else:
+            entry["aggregates"] = {field: Counter(entry["aggregates"].get(field, {})) for field in _AGGREGATES}
+        if path.endswith(".gz"):
+            # Compressed files are complete and cannot be split
+            end = stat.st_size
+            new_jobs = [(path, 0, None)] if entry["offset"] < end else []
+        else:
+            end = _complete_end(path, entry["offset"], stat.st_size)
+            new_jobs = _split(path, entry["offset"], end, chunk_bytes)
+        jobs.extend(new_jobs)
+        owners.extend([name] * len(new_jobs))
+        entry.update(inode=stat.st_ino, size=stat.st_size, offset=end)
+        files[name] = entry
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) <= 1:
+        results = map(_parse_range, jobs)
+        _collect(files, owners, results)
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            _collect(files, owners, pool.map(_parse_range, jobs))
+
+    index = LogIndex(files=files)
+    for entry in files.values():
+        index.merge(entry["aggregates"])
+    if use_index:
+        tmp_path = f"{index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(index.to_dict(), f, separators=(",", ":"))
+        os.replace(tmp_path, index_path)
+    return index
+
+
+def _collect(files, owners, results):
+    for name, (aggregates, parsed) in zip(owners, results):
+        entry = files[name]
+        entry["lines"] += parsed
+        for field, counts in aggregates.items():
+            entry["aggregates"][field].update(counts)
+
+
+def _table(header, rows):
+    rows = [[str(cell) for cell in row] for row in rows]
+    widths = [max(len(str(cell)) for cell in column) for column in zip(header, *rows)]
+    lines = ["  ".join(str(cell).ljust(width) for cell, width in zip(row, widths)).rstrip()
+             for row in [header] + rows]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Counts, errors and latency percentiles from the daily log files")
+    parser.add_argument("--logs-dir", default=LOGS_DIR)
+    parser.add_argument("--since", help="First date to include (YYYY-MM-DD)")
+    parser.add_argument("--until", help="Last date to include (YYYY-MM-DD)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--no-index", action="store_true", help="Parse every file again and leave the cached index alone")
+    parser.add_argument("--json", action="store_true", help="Print JSON instead of tables")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("summary", help="Files, dates, levels, errors and models")
+    levels = subparsers.add_parser("levels", help="Record counts grouped by date, logger and/or level")
+    levels.add_argument("--by", default="level", help="Comma-separated fields: date, logger, level")
+    subparsers.add_parser("errors", help="Logged exceptions by type and completed requests by status")
+    subparsers.add_parser("models", help="Request volume per model")
+    latency = subparsers.add_parser("latency", help="Request latency percentiles in seconds per model")
+    latency.add_argument("--percentiles", default="50,90,95,99")
+
+    args = parser.parse_args(argv)
+    index = build_index(args.logs_dir, workers=args.workers, use_index=not args.no_index)
+    window = {"since": args.since, "until": args.until}
+
+    if args.command == "summary":
+        dates = [date for date in index.dates()
+                 if (not args.since or date >= args.since) and (not args.until or date <= args.until)]
+        result = {"files": len(index.files), "lines": sum(entry["lines"] for entry in index.files.values()),
+                  "dates": [dates[0], dates[-1]] if dates else [],
+                  "levels": {key[0]: count for key, count in index.level_counts(**window)},
+                  "errors": dict(index.error_counts(**window)[:10]),
+                  "models": index.model_requests(**window)}
+        text = json.dumps(result, indent=2)
+    elif args.command == "levels":
+        by = tuple(field.strip() for field in args.by.split(","))
+        if not set(by) <= {"date", "logger", "level"}:
+            parser.error("--by takes date, logger and level")
+        rows = index.level_counts(by, **window)
+        result = [dict(zip(by, key), count=count) for key, count in rows]
+        text = _table(list(by) + ["count"], [list(key) + [count] for key, count in rows])
+    elif args.command == "errors":
+        result = {"error_types": dict(index.error_counts(**window)),
+                  "statuses": {str(status): count for status, count in index.status_counts(**window)}}
+        text = (_table(["error type", "count"], result["error_types"].items()) + "\n\n"
+                + _table(["status", "requests"], result["statuses"].items()))
+    elif args.command == "models":
+        result = index.model_requests(**window)
+        text = _table(["model", "received", "completed", "errors"],
+                      [[model] + list(stats.values()) for model, stats in result.items()])
+    else:
+        percentiles = tuple(float(p) for p in args.percentiles.split(","))
+        result = index.latency_percentiles(percentiles, **window)
+        columns = ["count"] + [f"p{p:g}" for p in percentiles]
+        text = _table(["model"] + columns,
+                      [[model] + [stats.get(column, "") for column in columns] for model, stats in result.items()])
+
+    print(json.dumps(result, indent=2) if args.json else text)
+
+
+if __name__ == "__main__":
+    main()
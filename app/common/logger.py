@@ -1,20 +1,288 @@
+import gzip
 import logging
 import os
+import re
+import shutil
 import sys
-from datetime import datetime
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 import traceback
 
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking
+    fcntl = None
+
+from app.config.settings import settings
+
 LOGS_DIR = "logs"
 os.makedirs(LOGS_DIR,exist_ok=True)
 
-LOG_FILE = os.path.join(LOGS_DIR, f"log_{datetime.now().strftime('%Y-%m-%d')}.log")
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# log_2026-10-19.log, its size-rotated segments log_2026-10-19.log.1, .2, ... and their compressed .gz
+LOG_FILE_RE = re.compile(r"^log_(\d{4}-\d{2}-\d{2})\.log(?:\.(\d+))?(\.gz)?$")
+_ROTATE_LOCK = ".rotate.lock"
+_MAINTENANCE_LOCK = ".maintenance.lock"
+
+
+def log_file_path(log_dir, date):
+    """The file records dated date (YYYY-MM-DD) are currently appended to"""
+    return os.path.join(log_dir, f"log_{date}.log")
+
+
+def list_log_files(log_dir, date=None):
+    """
+    Log files in log_dir, optionally of one date, oldest first
+
+    Each day's rotated segments come in rotation order, then the day's
+    current file. Where a file and its .gz are both present (compression
+    just finished), only the .gz is listed.
+    """
+    if not os.path.isdir(log_dir):
+        return []
+    found = {}
+    for name in os.listdir(log_dir):
+        match = LOG_FILE_RE.match(name)
+        if match and (date is None or match.group(1) == date):
+            segment = int(match.group(2)) if match.group(2) else float("inf")
+            key = (match.group(1), segment)
+            if key not in found or match.group(3):
+                found[key] = name
+    return [os.path.join(log_dir, found[key]) for key in sorted(found)]
+
+
+def open_log_file(path, binary=False):
+    """Open a log file for reading, decompressing .gz files"""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb") if binary else gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, "rb") if binary else open(path, encoding="utf-8", errors="replace")
+
+
+@contextmanager
+def _file_lock(log_dir, name, blocking=True):
+    """Exclusive lock shared by every process writing log_dir; yields False if not blocking and taken"""
+    if fcntl is None:
+        yield True
+        return
+    with open(os.path.join(log_dir, name), "a") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class DailyRotatingFileHandler(logging.Handler):
+    """
+    Append records to log_dir/log_YYYY-MM-DD.log, switching files at midnight and by size
+
+    The day comes from each record's time, so a process running for weeks
+    moves to a new file every day. A file that would grow past max_bytes
+    is renamed to the day's next segment (log_YYYY-MM-DD.log.1, .2, ...)
+    and a new one started.
+
+    Several processes (uvicorn workers, agent workers) can share the
+    files: every record is a single O_APPEND write, so lines never
+    interleave, and before each write a process checks that the file it
+    has open is still the day's current one, reopening it if another
+    process rotated it. Rotation itself happens under a file lock, so only
+    one process renames a full file.
+    """
+
+    def __init__(self, log_dir=LOGS_DIR, max_bytes=0, on_rotate=None):
+        super().__init__()
+        self.log_dir = log_dir
+        self.max_bytes = max_bytes
+        # Called after a rotation or day change, e.g. to compress the finished file
+        self.on_rotate = on_rotate
+        self._fd = None
+        self._inode = None
+        self._date = None
+        self._day_end = 0.0
+
+    def _open(self, path):
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._inode = os.fstat(self._fd).st_ino
+
+    def _start_day(self, created):
+        day = datetime.fromtimestamp(created).replace(hour=0, minute=0, second=0, microsecond=0)
+        changed = self._date is not None
+        self._date = day.strftime("%Y-%m-%d")
+        self._day_end = (day + timedelta(days=1)).timestamp()
+        self._open(log_file_path(self.log_dir, self._date))
+        if changed and self.on_rotate:
+            self.on_rotate()
+
+    def _next_segment(self):
+        segments = [LOG_FILE_RE.match(os.path.basename(path)).group(2)
+                    for path in list_log_files(self.log_dir, self._date)]
+        return max((int(segment) for segment in segments if segment), default=0) + 1
+
+    def _rotate(self, path):
+        with _file_lock(self.log_dir, _ROTATE_LOCK):
+            try:
+                current = os.stat(path).st_ino
+            except FileNotFoundError:
+                current = None
+            # Another process may have rotated the file while this one waited for the lock
+            if current == self._inode:
+                os.rename(path, f"{path}.{self._next_segment()}")
+            self._open(path)
+        if self.on_rotate:
+            self.on_rotate()
+
+    def emit(self, record):
+        try:
+            data = (self.format(record) + "\n").encode("utf-8", "replace")
+            if record.created >= self._day_end:
+                self._start_day(record.created)
+            path = log_file_path(self.log_dir, self._date)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                stat = None
+            if stat is None or stat.st_ino != self._inode:
+                # Rotated or removed by another process
+                self._open(path)
+                stat = os.fstat(self._fd)
+            size = stat.st_size
+            if self.max_bytes and size and size + len(data) > self.max_bytes:
+                self._rotate(path)
+            os.write(self._fd, data)
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        with self.lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+        super().close()
+
+
+class LogMaintenance:
+    """
+    Compress finished log files and apply retention limits, off the request path
+
+    Finished files are rotated segments and earlier days' files that no
+    process has written to for grace seconds. A pass runs every interval
+    seconds, and grace seconds after a rotation when triggered. With
+    several processes, a pass that finds another one running is skipped.
+    """
+
+    def __init__(self, log_dir=LOGS_DIR, compress=True, retention_days=0, max_total_bytes=0, interval=3600,
+                 grace=10):
+        self.log_dir = log_dir
+        self.compress = compress
+        self.retention_days = retention_days
+        self.max_total_bytes = max_total_bytes
+        self.interval = interval
+        self.grace = grace
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _finished(self, path, today, now):
+        match = LOG_FILE_RE.match(os.path.basename(path))
+        return (match.group(2) is not None or match.group(1) < today) and os.path.getmtime(path) < now - self.grace
+
+    def run(self, now=None):
+        """
+        Run one maintenance pass
+
+        Returns:
+            dict: Numbers of files compressed and deleted (None if another process holds the pass)
+        """
+        now = now or time.time()
+        today = datetime.fromtimestamp(now).strftime("%Y-%m-%d")
+        with _file_lock(self.log_dir, _MAINTENANCE_LOCK, blocking=False) as acquired:
+            if not acquired:
+                return None
+            report = {"compressed": 0, "deleted": 0}
+            if self.compress:
+                for path in list_log_files(self.log_dir):
+                    if not path.endswith(".gz") and self._finished(path, today, now):
+                        self._compress(path)
+                        report["compressed"] += 1
+
+            files = list_log_files(self.log_dir)
+            if self.retention_days:
+                cutoff = (datetime.fromtimestamp(now) - timedelta(days=self.retention_days)).strftime("%Y-%m-%d")
+                for path in [path for path in files if LOG_FILE_RE.match(os.path.basename(path)).group(1) < cutoff]:
+                    os.remove(path)
+                    files.remove(path)
+                    report["deleted"] += 1
+            if self.max_total_bytes:
+                total = sum(os.path.getsize(path) for path in files)
+                for path in files:
+                    if total <= self.max_total_bytes:
+                        break
+                    if self._finished(path, today, now):
+                        total -= os.path.getsize(path)
+                        os.remove(path)
+                        report["deleted"] += 1
+        if report["compressed"] or report["deleted"]:
+            get_logger(__name__).info(f"Log maintenance: {report}")
+        return report
+
+    @staticmethod
+    def _compress(path):
+        tmp_path = f"{path}.gz.tmp"
+        with open(path, "rb") as source, gzip.open(tmp_path, "wb") as target:
+            shutil.copyfileobj(source, target, 1024 * 1024)
+        # Keep the modification time, which retention orders files by
+        stat = os.stat(path)
+        os.utime(tmp_path, (stat.st_atime, stat.st_mtime))
+        os.replace(tmp_path, f"{path}.gz")
+        os.remove(path)
+
+    def trigger(self):
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            if self._wake.wait(self.interval):
+                self._wake.clear()
+                # Let writers that still had the rotated file open finish
+                if self._stop.wait(self.grace):
+                    break
+            try:
+                self.run()
+            except Exception as e:
+                log_full_traceback(get_logger(__name__), e, "Log maintenance failed: ")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="log-maintenance", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+
+log_maintenance = LogMaintenance(
+    LOGS_DIR,
+    compress=settings.LOG_COMPRESS,
+    retention_days=settings.LOG_RETENTION_DAYS,
+    max_total_bytes=settings.LOG_MAX_TOTAL_BYTES,
+    interval=settings.LOG_MAINTENANCE_INTERVAL
+)
 
 # Configure logging to both file and console (for CloudWatch)
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    format=LOG_FORMAT,
     handlers=[
-        logging.FileHandler(LOG_FILE),
+        DailyRotatingFileHandler(LOGS_DIR, max_bytes=settings.LOG_MAX_BYTES, on_rotate=log_maintenance.trigger),
         logging.StreamHandler(sys.stdout)  # This ensures logs go to CloudWatch
     ]
 )
@@ -0,0 +1,261 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from app.config.settings import settings
+from app.common.logger import get_logger
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = get_logger(__name__)
+
+_MISSING = object()
+
+
+class SharedState:
+    """
+    Interface for key/value state shared by every task of a deployment
+
+    Values must be JSON-serialisable. ttl is in seconds; None keeps the
+    key until it is deleted.
+    """
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def get_many(self, keys):
+        """Return {key: value} for the keys that exist"""
+        values = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                values[key] = value
+        return values
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def incr(self, key, amount=1, ttl=None):
+        """Atomically add amount to a numeric key and return the new value; ttl applies when the key is created"""
+        raise NotImplementedError
+
+
+class InMemorySharedState(SharedState):
+    """Process-local implementation, for single-task deployments and tests"""
+
+    def __init__(self):
+        self._data = {}   # key -> (value, expires_at or None)
+        self._lock = threading.Lock()
+
+    def _live(self, key, now):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= now:
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key, time.time())
+            return entry[0] if entry else None
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key, amount=1, ttl=None):
+        with self._lock:
+            now = time.time()
+            entry = self._live(key, now)
+            if entry is None:
+                entry = (0, now + ttl if ttl else None)
+            value = entry[0] + amount
+            self._data[key] = (value, entry[1])
+            return value
+
+
+class RedisSharedState(SharedState):
+    """Redis (or any Redis-protocol server) implementation shared across ECS tasks"""
+
+    def __init__(self, url, prefix=""):
+        if redis is None:
+            raise ImportError("The redis package is required for SHARED_STATE_BACKEND=redis (pip install redis)")
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def _key(self, key):
+        return f"{self.prefix}{key}"
+
+    @staticmethod
+    def _decode(raw):
+        return None if raw is None else json.loads(raw)
+
+    def get(self, key):
+        return self._decode(self._client.get(self._key(key)))
+
+    def get_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        raws = self._client.mget([self._key(key) for key in keys])
+        return {key: self._decode(raw) for key, raw in zip(keys, raws) if raw is not None}
+
+    def set(self, key, value, ttl=None):
+        self._client.set(self._key(key), json.dumps(value), ex=int(ttl) if ttl else None)
+
+    def delete(self, key):
+        self._client.delete(self._key(key))
+
+    def incr(self, key, amount=1, ttl=None):
+        key = self._key(key)
+        if isinstance(amount, int):
+            value = self._client.incrby(key, amount)
+        else:
+            value = float(self._client.incrbyfloat(key, amount))
+        if ttl and value == amount:
+            self._client.expire(key, int(ttl))
+        return value
+
+
+class NearCache(SharedState):
+    """
+    Local read cache in front of a shared backend
+
+    Reads are served from a bounded LRU for up to ttl seconds, so hot keys
+    cost a network round trip at most once per ttl per task; misses are
+    cached too. Writes go through to the backend and update the local copy.
+    Counters (incr) always go to the backend. Other tasks' writes become
+    visible once the local entry expires.
+    """
+
+    def __init__(self, backend, ttl=1.0, max_entries=10000):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._local = OrderedDict()   # key -> (value or _MISSING, cached_at)
+        self._lock = threading.Lock()
+
+    def _lookup(self, key, now):
+        entry = self._local.get(key)
+        if entry is None or now - entry[1] >= self.ttl:
+            return _MISSING, False
+        self._local.move_to_end(key)
+        return entry[0], True
+
+    def _store(self, key, value, now):
+        self._local[key] = (value, now)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            value, found = self._lookup(key, now)
+            if found:
+                self.hits += 1
+                return None if value is _MISSING else value
+            self.misses += 1
+
+        value = self.backend.get(key)
+        with self._lock:
+            self._store(key, _MISSING if value is None else value, now)
+        return value
+
+    def get_many(self, keys):
+        keys = list(keys)
+        now = time.time()
+        values, remote = {}, []
+        with self._lock:
+            for key in keys:
+                value, found = self._lookup(key, now)
+                if not found:
+                    remote.append(key)
+                elif value is not _MISSING:
+                    values[key] = value
+            self.hits += len(keys) - len(remote)
+            self.misses += len(remote)
+
+        if remote:
+            fetched = self.backend.get_many(remote)
+            with self._lock:
+                for key in remote:
+                    self._store(key, fetched.get(key, _MISSING), now)
+            values.update(fetched)
+        return values
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(key, value, ttl)
+        with self._lock:
+            self._store(key, value, time.time())
+
+    def delete(self, key):
+        self.backend.delete(key)
+        with self._lock:
+            self._local.pop(key, None)
+
+    def incr(self, key, amount=1, ttl=None):
+        value = self.backend.incr(key, amount, ttl)
+        with self._lock:
+            self._local.pop(key, None)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._local)}
+
+
+def create_shared_state(kind="memory", url=None, prefix="", near_cache_ttl=0, near_cache_max_entries=10000):
+    """
+    Create the shared state backend selected by SHARED_STATE_BACKEND
+
+    A near cache is put in front of remote backends when near_cache_ttl > 0.
+
+    Raises:
+        ValueError: If kind is unknown
+        ImportError: If kind is "redis" and the redis package is not installed
+    """
+    if kind == "memory":
+        return InMemorySharedState()
+    if kind == "redis":
+        backend = RedisSharedState(url, prefix)
+        logger.info(f"Using Redis shared state at {url} (near cache ttl={near_cache_ttl}s)")
+        if near_cache_ttl > 0:
+            return NearCache(backend, near_cache_ttl, near_cache_max_entries)
+        return backend
+    raise ValueError(f"Unknown SHARED_STATE_BACKEND: {kind}. Expected 'memory' or 'redis'")
+
+
+_shared_state = None
+_shared_state_lock = threading.Lock()
+
+
+def get_shared_state():
+    """Return the process-wide shared state backend, creating it from settings on first use"""
+    global _shared_state
+    if _shared_state is None:
+        with _shared_state_lock:
+            if _shared_state is None:
+                _shared_state = create_shared_state(
+                    settings.SHARED_STATE_BACKEND,
+                    settings.SHARED_STATE_URL,
+                    settings.SHARED_STATE_PREFIX,
+                    settings.NEAR_CACHE_TTL,
+                    settings.NEAR_CACHE_MAX_ENTRIES
+                )
+    return _shared_state
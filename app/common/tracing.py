@@ -0,0 +1,247 @@
+import contextvars
+import functools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from app.common.logger import get_logger
+
+logger = get_logger(__name__)
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def _new_id(bits=64):
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+class Span:
+    """A timed operation with attributes, exported when it ends"""
+
+    sampled = True
+
+    def __init__(self, name, trace_id=None, parent_id=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id or _new_id(128)
+        self.span_id = _new_id()
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self.duration_ms = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes):
+        self.attributes.update(attributes)
+
+    def record_exception(self, error):
+        self.status = "error"
+        self.attributes["error.type"] = type(error).__name__
+        self.attributes["error.message"] = str(error)[:500]
+        status_code = getattr(error, "status_code", None)
+        if status_code is not None:
+            self.attributes["http.status_code"] = status_code
+
+    def end(self):
+        if self.duration_ms is None:
+            self.duration_ms = round((time.perf_counter() - self._start) * 1000, 3)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Stand-in for spans that are not sampled; every operation is free"""
+
+    sampled = False
+    trace_id = span_id = parent_id = None
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, attributes):
+        pass
+
+    def record_exception(self, error):
+        pass
+
+    def end(self):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class ConsoleExporter:
+    """Writes one JSON line per span to stdout"""
+
+    def export(self, span):
+        sys.stdout.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+
+class FileExporter:
+    """Appends one JSON line per span to a local file"""
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        line = json.dumps(span.to_dict(), default=str) + "\n"
+        with self._lock, open(self.path, "a") as f:
+            f.write(line)
+
+
+class InMemoryExporter:
+    """Keeps finished spans in a list (for tests and local inspection)"""
+
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+
+_exporter_factories = {
+    "console": lambda path: ConsoleExporter(),
+    "file": lambda path: FileExporter(path),
+    "memory": lambda path: InMemoryExporter(),
+}
+
+
+def register_exporter(name, factory):
+    """Register an exporter factory; factory(path) must return an object with export(span)"""
+    _exporter_factories[name] = factory
+
+
+def create_exporter(name, path=None):
+    """
+    Create the exporter named by TRACING_EXPORTER
+
+    Returns None for "none", which disables tracing entirely.
+
+    Raises:
+        ValueError: If the exporter name is unknown
+    """
+    if not name or name == "none":
+        return None
+    if name not in _exporter_factories:
+        raise ValueError(f"Unknown tracing exporter: {name}. Available: {', '.join(sorted(_exporter_factories))}")
+    return _exporter_factories[name](path)
+
+
+class Tracer:
+    """
+    Creates spans and hands finished ones to an exporter
+
+    Sampling is decided once per trace at the root span; children inherit
+    the decision. Unsampled traces, or a tracer without an exporter, only
+    ever see NOOP_SPAN, so the cost of tracing when it is off is a context
+    variable lookup.
+    """
+
+    def __init__(self, exporter=None, sample_rate=1.0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    @property
+    def enabled(self):
+        return self.exporter is not None and self.sample_rate > 0
+
+    def _should_sample(self, parent):
+        if parent is not None:
+            return parent.sampled
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def start_span(self, name, parent=None, attributes=None):
+        """Start a span under an explicit parent without making it current"""
+        if not self.enabled or (parent is not None and not parent.sampled):
+            return NOOP_SPAN
+        if parent is None and not self._should_sample(None):
+            return NOOP_SPAN
+        return Span(
+            name,
+            trace_id=parent.trace_id if parent else None,
+            parent_id=parent.span_id if parent else None,
+            attributes=attributes
+        )
+
+    def finish(self, span):
+        """End a span and export it"""
+        if not span.sampled:
+            return
+        span.end()
+        try:
+            self.exporter.export(span)
+        except Exception as e:
+            logger.warning(f"Failed to export span {span.name}: {e}")
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Run a block inside a span that becomes the current span"""
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+
+        parent = _current_span.get()
+        span = Span(
+            name,
+            trace_id=parent.trace_id if parent else None,
+            parent_id=parent.span_id if parent else None,
+            attributes=attributes
+        ) if self._should_sample(parent) else NOOP_SPAN
+
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            self.finish(span)
+
+    def trace(self, name):
+        """Decorator form of span()"""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+
+def current_span():
+    """Return the active span (NOOP_SPAN if there is none)"""
+    return _current_span.get() or NOOP_SPAN
+
+
+tracer = Tracer()
+
+
+def configure_tracing(exporter_name, sample_rate=1.0, path=None):
+    """Point the global tracer at a new exporter and sample rate"""
+    tracer.exporter = create_exporter(exporter_name, path)
+    tracer.sample_rate = sample_rate
+    if tracer.enabled:
+        logger.info(f"Tracing enabled: exporter={exporter_name}, sample_rate={sample_rate}")
+    return tracer
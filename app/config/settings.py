@@ -1,4 +1,5 @@
 from dotenv import load_dotenv
+import json
 import os
 
 load_dotenv()
@@ -15,4 +16,167 @@ class Settings:
         "meta-llama/llama-guard-4-12b"    # Meta Llama Guard 4 12B - Content moderation, 1200 t/s
     ]
 
+    # USD per 1M tokens as (input, output), matching the notes above; models without a listed price cost 0
+    MODEL_PRICING = {
+        "llama-3.1-8b-instant": (0.05, 0.08),
+        "llama-3.3-70b-versatile": (0.59, 0.79),
+        "openai/gpt-oss-120b": (0.15, 0.60),
+        "openai/gpt-oss-20b": (0.075, 0.30),
+    }
+
+    # Local document retrieval (RAG)
+    RAG_INDEX_DIR = os.getenv("RAG_INDEX_DIR", "data/rag_index")
+    RAG_EMBEDDING_DIM = int(os.getenv("RAG_EMBEDDING_DIM", "1024"))
+    RAG_CHUNK_SIZE = int(os.getenv("RAG_CHUNK_SIZE", "200"))        # words per chunk
+    RAG_CHUNK_OVERLAP = int(os.getenv("RAG_CHUNK_OVERLAP", "40"))   # words shared by neighbouring chunks
+    RAG_TOP_K = int(os.getenv("RAG_TOP_K", "4"))
+    RAG_INGEST_WORKERS = int(os.getenv("RAG_INGEST_WORKERS", "0"))  # 0 = one per CPU
+
+    # Async job queue
+    JOB_STORE = os.getenv("JOB_STORE", "memory")                     # memory | sqlite
+    JOB_SQLITE_PATH = os.getenv("JOB_SQLITE_PATH", "data/jobs.sqlite3")
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+    JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", "3600"))      # finished jobs are kept this long
+    JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "100"))         # jobs waiting for a worker; more get 429 (0 = unbounded)
+    JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.5"))
+    JOB_STREAM_TIMEOUT = float(os.getenv("JOB_STREAM_TIMEOUT", "900"))
+
+    # Tenants, quotas and usage accounting
+    TENANT_API_KEYS = json.loads(os.getenv("TENANT_API_KEYS", "{}"))  # {"api-key": "tenant"}; empty = trust X-Tenant-ID, no quotas
+    DEFAULT_TENANT = os.getenv("DEFAULT_TENANT", "default")
+    ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+    QUOTA_WINDOW_SECONDS = int(os.getenv("QUOTA_WINDOW_SECONDS", "86400"))
+    TENANT_TOKEN_QUOTA = int(os.getenv("TENANT_TOKEN_QUOTA", "0"))      # tokens per window, 0 = unlimited
+    TENANT_REQUEST_QUOTA = int(os.getenv("TENANT_REQUEST_QUOTA", "0"))  # requests per window, 0 = unlimited
+    TENANT_QUOTAS = json.loads(os.getenv("TENANT_QUOTAS", "{}"))        # {"tenant": {"tokens": N, "requests": N}}
+    MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "0"))  # shared fairly by tenants, 0 = unlimited
+    FAIR_SHARE_TIMEOUT = float(os.getenv("FAIR_SHARE_TIMEOUT", "30"))
+    ADAPTIVE_CONCURRENCY_ENABLED = os.getenv("ADAPTIVE_CONCURRENCY_ENABLED", "false").lower() == "true"
+    ADAPTIVE_INITIAL_LIMIT = int(os.getenv("ADAPTIVE_INITIAL_LIMIT", "10"))          # per-model in-flight requests
+    ADAPTIVE_MIN_LIMIT = int(os.getenv("ADAPTIVE_MIN_LIMIT", "1"))
+    ADAPTIVE_MAX_LIMIT = int(os.getenv("ADAPTIVE_MAX_LIMIT", "200"))
+    ADAPTIVE_BACKOFF = float(os.getenv("ADAPTIVE_BACKOFF", "0.9"))                   # limit multiplier on overload
+    ADAPTIVE_LATENCY_TOLERANCE = float(os.getenv("ADAPTIVE_LATENCY_TOLERANCE", "2.0"))  # short/long latency ratio
+    USAGE_FLUSH_INTERVAL = float(os.getenv("USAGE_FLUSH_INTERVAL", "60"))
+    USAGE_LOG_PATH = os.getenv("USAGE_LOG_PATH", "data/usage.jsonl")
+
+    # System prompt templates (JSON: {"template-id": "text" | {"text": ..., "version": N}})
+    PROMPT_TEMPLATES_FILE = os.getenv("PROMPT_TEMPLATES_FILE", "prompts/templates.json")
+    PROMPT_SYNC_INTERVAL = float(os.getenv("PROMPT_SYNC_INTERVAL", "1.0"))  # seconds between shared template syncs
+
+    # Response serialization and compression
+    JSON_ENCODER = os.getenv("JSON_ENCODER", "orjson")                     # orjson | json
+    COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+    COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))  # bytes; smaller bodies are sent as-is
+    GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+    BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+    ERROR_TRACEBACKS = os.getenv("ERROR_TRACEBACKS", "true").lower() == "true"  # tracebacks in production 500 bodies
+    BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "50"))
+    BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+
+    # Daily log files: size rotation, compression and retention (see app.common.logger)
+    LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(100 * 1024 * 1024)))  # per file before rotating; 0 = daily only
+    LOG_COMPRESS = os.getenv("LOG_COMPRESS", "true").lower() == "true"       # gzip rotated and earlier days' files
+    LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", "30"))          # 0 = keep every day
+    LOG_MAX_TOTAL_BYTES = int(os.getenv("LOG_MAX_TOTAL_BYTES", "0"))         # oldest files go first; 0 = no cap
+    LOG_MAINTENANCE_INTERVAL = float(os.getenv("LOG_MAINTENANCE_INTERVAL", "3600"))  # seconds between passes
+
+    # Tracing
+    TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none")              # none | console | file | memory
+    TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", "1.0"))  # fraction of requests traced
+    TRACING_FILE = os.getenv("TRACING_FILE", "logs/traces.jsonl")
+
+    # Per-request profiling (admin only, requested with X-Profile: 1 or ?profile=1)
+    PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "logs/profiles")
+    PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.002"))  # seconds between stack samples
+    PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", "25"))
+    PROFILE_TRACEMALLOC_FRAMES = int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", "1"))
+
+    # Shared state across ECS tasks (caches, quota counters, sessions)
+    SHARED_STATE_BACKEND = os.getenv("SHARED_STATE_BACKEND", "memory")   # memory | redis
+    SHARED_STATE_URL = os.getenv("SHARED_STATE_URL", "redis://localhost:6379/0")
+    SHARED_STATE_PREFIX = os.getenv("SHARED_STATE_PREFIX", "multi-ai-agent:")
+    NEAR_CACHE_TTL = float(os.getenv("NEAR_CACHE_TTL", "1.0"))           # seconds reads are served locally; 0 = off
+    NEAR_CACHE_MAX_ENTRIES = int(os.getenv("NEAR_CACHE_MAX_ENTRIES", "10000"))
+    QUOTA_SYNC_INTERVAL = float(os.getenv("QUOTA_SYNC_INTERVAL", "1.0"))  # seconds between shared quota syncs
+    RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "0"))       # seconds; 0 = no response cache
+    SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "0"))           # seconds; 0 = no search cache
+    # Search result compression (dedupe, boilerplate removal, BM25 ranking, token budget)
+    SEARCH_COMPRESSION_ENABLED = os.getenv("SEARCH_COMPRESSION_ENABLED", "false").lower() == "true"
+    SEARCH_TOKEN_BUDGET = int(os.getenv("SEARCH_TOKEN_BUDGET", "1500"))  # passage tokens per search; 0 = no trim
+    SEARCH_MODEL_TOKEN_BUDGETS = json.loads(os.getenv("SEARCH_MODEL_TOKEN_BUDGETS", "{}"))  # {"model": tokens}
+    # Predictive cache warming from query records in the daily logs (QUERY_LOG_ENABLED writes queries to the logs)
+    QUERY_LOG_ENABLED = os.getenv("QUERY_LOG_ENABLED", "false").lower() == "true"
+    CACHE_WARMING_ENABLED = os.getenv("CACHE_WARMING_ENABLED", "false").lower() == "true"
+    CACHE_WARM_HOURS = os.getenv("CACHE_WARM_HOURS", "3-5")               # off-peak hours passes run in
+    CACHE_WARM_PEAK_HOURS = os.getenv("CACHE_WARM_PEAK_HOURS", "8-19")    # hours whose traffic is warmed for
+    CACHE_WARM_TOP_N = int(os.getenv("CACHE_WARM_TOP_N", "50"))
+    CACHE_WARM_LOOKBACK_DAYS = int(os.getenv("CACHE_WARM_LOOKBACK_DAYS", "14"))
+    CACHE_WARM_HALF_LIFE_DAYS = float(os.getenv("CACHE_WARM_HALF_LIFE_DAYS", "7"))  # recency weighting of history
+    CACHE_WARM_DAILY_BUDGET_USD = float(os.getenv("CACHE_WARM_DAILY_BUDGET_USD", "1.0"))
+    CACHE_WARM_CHECK_INTERVAL = float(os.getenv("CACHE_WARM_CHECK_INTERVAL", "300"))
+    CACHE_WARM_TENANT = os.getenv("CACHE_WARM_TENANT", "cache-warmer")   # usage ledger tenant for warming runs
+    SESSION_TTL = int(os.getenv("SESSION_TTL", "3600"))
+    SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "20"))        # messages of history kept per session
+
+    # Hedged requests: resend slow requests once, first answer wins
+    HEDGING_ENABLED = os.getenv("HEDGING_ENABLED", "false").lower() == "true"
+    HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))       # hedge after this latency percentile
+    HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "2.0"))        # seconds; floor, and delay until warmed up
+    HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+    HEDGE_BUDGET = float(os.getenv("HEDGE_BUDGET", "0.05"))             # max hedges as a fraction of requests
+    HEDGE_MODELS = json.loads(os.getenv("HEDGE_MODELS", "{}"))          # {"slow-model": "fast-model"}; default same model
+
+    # Input moderation with the guard model, run concurrently with the agent
+    MODERATION_ENABLED = os.getenv("MODERATION_ENABLED", "false").lower() == "true"
+    MODERATION_MODEL = os.getenv("MODERATION_MODEL", "meta-llama/llama-guard-4-12b")
+    MODERATION_CACHE_TTL = int(os.getenv("MODERATION_CACHE_TTL", "86400"))  # seconds verdicts are reused
+    MODERATION_FAIL_OPEN = os.getenv("MODERATION_FAIL_OPEN", "true").lower() == "true"  # allow if the guard errors
+
+    # Warm agent worker processes (0 = run agents in the API process)
+    AGENT_WORKER_PROCESSES = int(os.getenv("AGENT_WORKER_PROCESSES", "0"))
+    AGENT_WORKER_MAX_TASKS = int(os.getenv("AGENT_WORKER_MAX_TASKS", "1000"))  # requests before a worker is replaced
+    AGENT_WORKER_WARM_MODELS = [m for m in os.getenv("AGENT_WORKER_WARM_MODELS", "").split(",") if m]  # default: all allowed
+
+    # React-loop budget per agent run (0 = unlimited); requests may only tighten these
+    AGENT_MAX_STEPS = int(os.getenv("AGENT_MAX_STEPS", "0"))            # model calls per run
+    AGENT_MAX_TOOL_CALLS = int(os.getenv("AGENT_MAX_TOOL_CALLS", "0"))
+    AGENT_MAX_TOKENS = int(os.getenv("AGENT_MAX_TOKENS", "0"))          # total tokens, checked between steps
+    AGENT_MODEL_LIMITS = json.loads(os.getenv("AGENT_MODEL_LIMITS", "{}"))  # {"model": {"max_steps": 4, ...}}
+    SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "2"))      # web search results per query
+
+    # Latency tiers: named presets of generation controls and models, with a latency target each
+    LATENCY_TIERS = json.loads(os.getenv("LATENCY_TIERS", json.dumps({
+        "interactive": {"latency_target_ms": 8000, "max_output_tokens": 1024, "max_results": 2,
+                        "max_steps": 4, "max_tool_calls": 2, "temperature": 0.3,
+                        "models": {"llama-3.3-70b-versatile": "llama-3.1-8b-instant"}},
+        "batch": {"latency_target_ms": 120000, "max_output_tokens": 4096, "max_results": 5, "max_steps": 12},
+    })))
+    DEFAULT_LATENCY_TIER = os.getenv("DEFAULT_LATENCY_TIER", "")        # tier for requests that name none; "" = none
+    DEADLINE_WORKERS = int(os.getenv("DEADLINE_WORKERS", "0"))  # threads for runs with a timeout; 0 = 2 x MAX_CONCURRENT_REQUESTS, or 64
+
+    # Supervisor mode: a planner splits the request into subtasks run by parallel sub-agents
+    SUPERVISOR_PLANNER_MODEL = os.getenv("SUPERVISOR_PLANNER_MODEL", "llama-3.1-8b-instant")
+    SUPERVISOR_MAX_SUBTASKS = int(os.getenv("SUPERVISOR_MAX_SUBTASKS", "4"))
+    SUPERVISOR_AGENT_MODELS = json.loads(os.getenv("SUPERVISOR_AGENT_MODELS", "{}"))  # {"search": "model"}; default request model
+
+    # LLM providers: groq | local (deterministic, offline, for load tests and failover drills)
+    LLM_PROVIDER = os.getenv("LLM_PROVIDER", "groq")
+    MODEL_PROVIDERS = json.loads(os.getenv("MODEL_PROVIDERS", "{}"))          # {"model": "provider"} overrides
+    LOCAL_TOKENS_PER_SECOND = float(os.getenv("LOCAL_TOKENS_PER_SECOND", "500"))  # 0 = no simulated delay
+    LOCAL_LATENCY_MS = float(os.getenv("LOCAL_LATENCY_MS", "200"))           # median time to first token
+    LOCAL_LATENCY_SIGMA = float(os.getenv("LOCAL_LATENCY_SIGMA", "0.5"))     # lognormal spread of that latency
+    LOCAL_OUTPUT_TOKENS = int(os.getenv("LOCAL_OUTPUT_TOKENS", "64"))
+    LOCAL_TOOL_ROUNDS = int(os.getenv("LOCAL_TOOL_ROUNDS", "1"))             # tool calls before answering, when tools are bound
+    LOCAL_ERROR_RATE = float(os.getenv("LOCAL_ERROR_RATE", "0.0"))           # fraction of calls that fail
+    LOCAL_ERROR_STATUS = int(os.getenv("LOCAL_ERROR_STATUS", "503"))         # e.g. 429 to exercise rate-limit handling
+    LOCAL_SEED = int(os.getenv("LOCAL_SEED", "0"))
+
+    # Offline record/replay of Groq and Tavily calls
+    CASSETTE_MODE = os.getenv("CASSETTE_MODE", "off").lower()                       # off | record | replay
+    CASSETTE_DIR = os.getenv("CASSETTE_DIR", "cassettes")
+    CASSETTE_NAME = os.getenv("CASSETTE_NAME", "default")
+    CASSETTE_LATENCY_SCALE = float(os.getenv("CASSETTE_LATENCY_SCALE", "1.0"))  # x recorded latency; 0 = no delay
+
 settings=Settings()
@@ -0,0 +1,181 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from app.common.tracing import tracer, current_span
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    Turns langgraph node, LLM and tool callbacks into child spans
+
+    Internal runnables that are not graph nodes are not traced, but their
+    children are attached to the nearest traced ancestor so the span tree
+    stays connected.
+    """
+
+    def __init__(self, root_span, llm_id=None):
+        self.root_span = root_span
+        self.llm_id = llm_id
+        self._spans = {}     # run_id -> span started for that run
+        self._parents = {}   # run_id -> nearest traced span (for untraced runs)
+        self._lock = threading.Lock()
+
+    def _parent_for(self, parent_run_id):
+        if parent_run_id is None:
+            return self.root_span
+        with self._lock:
+            return self._spans.get(parent_run_id) or self._parents.get(parent_run_id) or self.root_span
+
+    def _start(self, run_id, parent_run_id, name, attributes):
+        span = tracer.start_span(name, parent=self._parent_for(parent_run_id), attributes=attributes)
+        with self._lock:
+            self._spans[run_id] = span
+
+    def _end(self, run_id, attributes=None, error=None):
+        with self._lock:
+            span = self._spans.pop(run_id, None)
+        if span is None:
+            return
+        if attributes:
+            span.set_attributes(attributes)
+        if error is not None:
+            span.record_exception(error)
+        tracer.finish(span)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, tags=None,
+                       metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        if node and kwargs.get("name") == node:
+            self._start(run_id, parent_run_id, f"langgraph.node.{node}", {
+                "langgraph.node": node,
+                "langgraph.step": metadata.get("langgraph_step"),
+            })
+        else:
+            parent = self._parent_for(parent_run_id)
+            with self._lock:
+                self._parents[run_id] = parent
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        with self._lock:
+            self._parents.pop(run_id, None)
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._parents.pop(run_id, None)
+        self._end(run_id, error=error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, tags=None,
+                            metadata=None, **kwargs):
+        metadata = metadata or {}
+        invocation_params = kwargs.get("invocation_params") or {}
+        self._start(run_id, parent_run_id, "llm.call", {
+            "llm.model": invocation_params.get("model") or metadata.get("ls_model_name") or self.llm_id,
+            "llm.provider": metadata.get("ls_provider"),
+            "llm.message_count": sum(len(batch) for batch in messages),
+            "llm.tools_bound": len(invocation_params.get("tools") or []),
+        })
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        attributes = {}
+        generations = response.generations[0] if response.generations else []
+        message = getattr(generations[0], "message", None) if generations else None
+        usage = getattr(message, "usage_metadata", None)
+        if usage:
+            attributes["llm.input_tokens"] = usage.get("input_tokens", 0)
+            attributes["llm.output_tokens"] = usage.get("output_tokens", 0)
+            attributes["llm.total_tokens"] = usage.get("total_tokens", 0)
+        if message is not None:
+            attributes["llm.tool_calls"] = len(getattr(message, "tool_calls", None) or [])
+        self._end(run_id, attributes)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, tags=None,
+                      metadata=None, inputs=None, **kwargs):
+        name = (serialized or {}).get("name") or kwargs.get("name") or "tool"
+        self._start(run_id, parent_run_id, f"tool.{name}", {
+            "tool.name": name,
+            "tool.input_chars": len(input_str or ""),
+        })
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        content = getattr(output, "content", output)
+        self._end(run_id, {"tool.output_chars": len(str(content))})
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=error)
+
+
+class ModelLatency(BaseCallbackHandler):
+    """
+    Times every chat model call of a request, leaving out tool calls and agent overhead
+
+    One instance is shared by all of a request's agents; calls are keyed by
+    run id, so a call seen through more than one callback list counts once.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self._starts = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        with self._lock:
+            self._starts.setdefault(run_id, time.perf_counter())
+
+    def _finish(self, run_id):
+        with self._lock:
+            start = self._starts.pop(run_id, None)
+            if start is not None:
+                self.calls += 1
+                self.seconds += time.perf_counter() - start
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def report(self):
+        with self._lock:
+            return {"calls": self.calls, "mean_ms": round(self.seconds / self.calls * 1000, 1) if self.calls else None}
+
+
+_model_latency = contextvars.ContextVar("model_latency", default=None)
+
+
+@contextmanager
+def model_latency_stats():
+    """
+    Time the chat model calls of agents run inside the block (see latency_callbacks)
+
+    Yields:
+        ModelLatency: Call count and total seconds, filled in as calls finish
+    """
+    stats = ModelLatency()
+    token = _model_latency.set(stats)
+    try:
+        yield stats
+    finally:
+        _model_latency.reset(token)
+
+
+def latency_callbacks():
+    """Return the callbacks that time model calls for the current model_latency_stats block, if any"""
+    stats = _model_latency.get()
+    return [stats] if stats is not None else []
+
+
+def tracing_callbacks(llm_id=None):
+    """Return the callbacks to pass to agent.invoke; empty when the current trace is not sampled"""
+    span = current_span()
+    if not span.sampled:
+        return []
+    return [TracingCallbackHandler(span, llm_id)]
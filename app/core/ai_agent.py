@@ -1,3 +1,8 @@
+import contextvars
+import threading
+from functools import partial
+from itertools import islice
+
 from langchain_groq import ChatGroq
 from langchain_tavily import TavilySearch
 
@@ -7,10 +12,230 @@ from langchain_core.messages.human import HumanMessage
 
 from app.config.settings import settings
 from app.common.logger import get_logger, log_full_traceback
+from app.common.tracing import tracer, current_span
+from app.core import cassettes
+from app.core.budget import StepBudget, LatencyTargetExceeded, DeadlineRunner, DeadlineSaturated, resolve_limits
+from app.core.providers import GroqProvider, get_provider, register_provider
+from app.core.caching import cached_search_tool
+from app.core.hedging import Hedger, CancellationCallback, RunCancelled
+from app.core.moderation import Moderator, ContentFlaggedError
+from app.common.shared_state import get_shared_state
+from app.core.agent_tracing import tracing_callbacks, latency_callbacks, model_latency_stats
+from app.core.results import final_answer, iter_trace
+from app.core.search_compression import compressed_search_tool, compression_stats
+from app.core.retrieval import build_retrieval_tool
+from app.core.supervisor import Supervisor, AGENT_KINDS
+from app.core.usage import extract_usage, empty_usage, add_usage, merge_usage, AttemptUsage
 
 logger = get_logger(__name__)
 
-def get_response_from_ai_agents(llm_id, query, allow_search, system_prompt):
+# Hedged requests (second attempt when the first is slower than the recent percentile)
+hedger = Hedger(
+    percentile=settings.HEDGE_PERCENTILE,
+    min_delay=settings.HEDGE_MIN_DELAY,
+    budget_ratio=settings.HEDGE_BUDGET,
+    hedge_models=settings.HEDGE_MODELS,
+    min_samples=settings.HEDGE_MIN_SAMPLES
+) if settings.HEDGING_ENABLED else None
+
+# Guard model run alongside the agent on every request's input
+moderator = Moderator(
+    settings.MODERATION_MODEL,
+    state=get_shared_state(),
+    cache_ttl=settings.MODERATION_CACHE_TTL,
+    fail_open=settings.MODERATION_FAIL_OPEN,
+    chat_model=lambda model_name: chat_model(model_name)
+) if settings.MODERATION_ENABLED else None
+
+# Web search results per query when neither the request nor its latency tier sets max_results
+DEFAULT_SEARCH_RESULTS = settings.SEARCH_MAX_RESULTS
+
+# Runs with a hard timeout; an abandoned run holds its thread until its next step, so there is
+# room for one abandoned run per request the scheduler lets in
+_deadline_runner = DeadlineRunner(settings.DEADLINE_WORKERS or 2 * settings.MAX_CONCURRENT_REQUESTS or 64)
+
+# ChatGroq is looked up at call time, so patching this module's ChatGroq still takes effect
+register_provider(GroqProvider(lambda model_name: ChatGroq(model=model_name)))
+
+# Model clients reused across requests; only enabled in agent worker processes
+_model_cache = None
+_model_cache_lock = threading.Lock()
+
+def enable_model_cache():
+    """Reuse one chat model client (and its HTTP connection pool) per model from now on"""
+    global _model_cache
+    _model_cache = {}
+
+def chat_model(llm_id):
+    """Chat model for llm_id from its provider, via the model cache when it is enabled"""
+    if _model_cache is None:
+        return get_provider(llm_id).chat_model(llm_id)
+    with _model_cache_lock:
+        if llm_id not in _model_cache:
+            _model_cache[llm_id] = get_provider(llm_id).chat_model(llm_id)
+        return _model_cache[llm_id]
+
+def _build_agent(llm_id, allow_search, system_prompt, allow_retrieval=False, replaying=False, budget=None,
+                 generation=None):
+    """
+    Create the react agent for one model with the requested tools, bounded by budget if given
+
+    generation holds optional per-request max_output_tokens, temperature
+    and max_results (web search results per query).
+    """
+    generation = generation or {}
+    with tracer.span("agent.build", **{"llm.model": llm_id}):
+        if replaying:
+            llm = cassettes.replay_chat_model(llm_id)
+            logger.info("Replaying recorded ChatGroq responses")
+        else:
+            provider = get_provider(llm_id)
+            llm = provider.configure(chat_model(llm_id), generation.get("max_output_tokens"),
+                                     generation.get("temperature"))
+            logger.info(f"{provider.name} chat model initialized successfully")
+
+        if allow_search:
+            max_results = generation.get("max_results") or DEFAULT_SEARCH_RESULTS
+            search = None if replaying else get_provider(llm_id).search_tool(max_results=max_results)
+            if search is None:
+                logger.info("Search is enabled, checking TAVILY_API_KEY")
+                if not settings.TAVILY_API_KEY and not replaying:
+                    error_msg = "TAVILY_API_KEY is required when allow_search is True"
+                    logger.error(error_msg)
+                    raise ValueError(error_msg)
+                search = TavilySearch(max_results=max_results,
+                                      tavily_api_key=settings.TAVILY_API_KEY or cassettes.REPLAY_API_KEY)
+            # Raw results are cached; compression depends on the model's token budget
+            search = cached_search_tool(search, key_params={"max_results": max_results})
+            tools = [compressed_search_tool(search, llm_id)]
+            logger.info("TavilySearch tool configured")
+        else:
+            tools = []
+            logger.info("Search is disabled, no tools configured")
+
+        if allow_retrieval:
+            logger.info("Retrieval is enabled, loading local document index")
+            tools.append(build_retrieval_tool())
+            logger.info("Local document search tool configured")
+
+        llm, tools = cassettes.wrap_for_cassette(llm, tools, llm_id)
+
+        hooks = {}
+        if budget is not None and budget.active:
+            hooks = {"pre_model_hook": budget.pre_model_hook, "post_model_hook": budget.post_model_hook}
+
+        logger.info(f"Creating react agent with {len(tools)} tool(s)")
+        agent = create_react_agent(
+            model=llm,
+            tools=tools,
+            prompt=system_prompt,
+            **hooks
+        )
+        logger.info("React agent created successfully")
+    return agent
+
+def _invoke_agent(agent, state, llm_id, cancel_events=(), recursion_limit=None, on_token=None, callbacks=()):
+    """
+    Run the agent to completion; setting any of cancel_events stops it at its next step or token
+
+    With on_token, the run is streamed and on_token(text) is called with
+    each piece of model output as it is generated. callbacks are added to the run's own.
+    """
+    callbacks = tracing_callbacks(llm_id) + latency_callbacks() + list(callbacks)
+    cancel_events = [event for event in cancel_events if event is not None]
+    if cancel_events:
+        callbacks.append(CancellationCallback(*cancel_events))
+    config = {"callbacks": callbacks}
+    if recursion_limit is not None:
+        config["recursion_limit"] = recursion_limit
+
+    logger.info("Invoking agent...")
+    with tracer.span("agent.invoke", **{"llm.model": llm_id}):
+        if on_token is None:
+            response = agent.invoke(state, config=config)
+        else:
+            response = None
+            for mode, chunk in agent.stream(state, config=config, stream_mode=["messages", "values"]):
+                if mode == "values":
+                    response = chunk
+                elif isinstance(chunk[0], AIMessage) and chunk[0].text:
+                    on_token(chunk[0].text)
+    logger.info("Agent invocation completed")
+    return response
+
+def _supervisor_model(llm_id, replaying, generation=None):
+    """Tool-less model for the supervisor's planning and synthesis calls"""
+    generation = generation or {}
+    llm = cassettes.replay_chat_model(llm_id) if replaying else get_provider(llm_id).configure(
+        chat_model(llm_id), generation.get("max_output_tokens"), generation.get("temperature"))
+    return cassettes.wrap_for_cassette(llm, [], llm_id)[0]
+
+def _run_supervisor(llm_id, request, allow_search, system_prompt, allow_retrieval, replaying, limits, cancel_events,
+                    generation=None, latency_target=None):
+    """
+    Answer request with a planner and parallel sub-agents instead of one react agent
+
+    Sub-agents get only the tools the request allows, each on its
+    SUPERVISOR_AGENT_MODELS model (default llm_id) and with its own step
+    budget. generation applies to the sub-agents and the synthesis call.
+
+    Returns:
+        tuple: ({"messages", "supervisor", "usage_by_model"}, StepBudget covering the whole run)
+    """
+    kinds = [kind for kind, tools in AGENT_KINDS.items()
+             if (allow_search or not tools["allow_search"]) and (allow_retrieval or not tools["allow_retrieval"])]
+    budget = StepBudget(**resolve_limits(llm_id, limits))
+
+    def run_subagent(kind, task):
+        model_name = settings.SUPERVISOR_AGENT_MODELS.get(kind, llm_id)
+        sub_budget = StepBudget(**resolve_limits(model_name, limits), start=1, max_seconds=latency_target or 0)
+        agent = _build_agent(model_name, AGENT_KINDS[kind]["allow_search"], system_prompt,
+                             AGENT_KINDS[kind]["allow_retrieval"], replaying, sub_budget, generation)
+        recursion_limit = sub_budget.recursion_limit if sub_budget.active else None
+        result = _invoke_agent(agent, {"messages": [HumanMessage(content=task)]}, model_name,
+                               cancel_events, recursion_limit)
+        budget.limit_reached = budget.limit_reached or sub_budget.limit_reached
+        return list(islice(result["messages"], sub_budget.start, None))
+
+    supervisor = Supervisor(
+        planner=_supervisor_model(settings.SUPERVISOR_PLANNER_MODEL, replaying),
+        synthesizer=_supervisor_model(llm_id, replaying, generation),
+        run_subagent=run_subagent,
+        kinds=kinds,
+        system_prompt=system_prompt,
+        max_subtasks=settings.SUPERVISOR_MAX_SUBTASKS
+    )
+    callbacks = tracing_callbacks(llm_id) + latency_callbacks()
+    cancel_events = [event for event in cancel_events if event is not None]
+    if cancel_events:
+        callbacks.append(CancellationCallback(*cancel_events))
+
+    logger.info(f"Running supervisor with sub-agents: {kinds}")
+    with tracer.span("agent.supervisor", **{"llm.model": llm_id}):
+        result = supervisor.invoke(request, config={"callbacks": callbacks})
+    info = {
+        "planner_model": settings.SUPERVISOR_PLANNER_MODEL,
+        "subtasks": [{"task": subtask["task"], "agent": subtask["agent"],
+                      "model": settings.SUPERVISOR_AGENT_MODELS.get(subtask["agent"], llm_id),
+                      "latency_ms": subtask["latency_ms"]} for subtask in result["results"]],
+    }
+    # The planner, each sub-agent and the synthesis call may run on different models, priced separately
+    runs = [(settings.SUPERVISOR_PLANNER_MODEL, result["messages"][:1])]
+    runs += [(subtask["model"], run["messages"]) for subtask, run in zip(info["subtasks"], result["results"])]
+    if len(result["results"]) > 1:
+        runs.append((llm_id, result["messages"][-1:]))
+    usage_by_model = {}
+    for model_name, messages in runs:
+        usage = usage_by_model.setdefault(model_name, empty_usage())
+        for message in messages:
+            if isinstance(message, AIMessage):
+                add_usage(usage, message)
+    return {"messages": result["messages"], "supervisor": info, "usage_by_model": usage_by_model}, budget
+
+@tracer.trace("agent.get_response_from_ai_agents")
+def get_response_from_ai_agents(llm_id, query, allow_search, system_prompt, allow_retrieval=False,
+                                metadata=None, history=None, limits=None, include_trace=False, supervisor=False,
+                                on_token=None, cancel_event=None, generation=None, latency_target=None, timeout=None):
     """
     Get response from AI agents with full error logging
     
@@ -19,80 +244,176 @@ def get_response_from_ai_agents(llm_id, query, allow_search, system_prompt):
         query: List of message strings
         allow_search: Whether to enable web search
         system_prompt: System prompt for the agent
+        allow_retrieval: Whether to enable search over the local document index
+        metadata: Optional dict filled in with run details (token "usage", "steps", "hedge", "moderation", "supervisor",
+            "usage_by_model" for supervisor runs and hedges that ran a second attempt, "model_latency",
+            "search_compression")
+        history: Optional earlier turns as {"role": "user" | "assistant", "content"} dicts
+        limits: Optional per-request max_steps, max_tool_calls and max_tokens (see resolve_limits)
+        include_trace: Whether to add the run's model and tool steps to metadata["trace"]
+        supervisor: Whether to split the request into subtasks run by parallel sub-agents (see _run_supervisor)
+        on_token: Optional callable streamed the model's output text as it is generated (not hedged; supervisor runs do not stream)
+        cancel_event: Optional threading.Event; setting it stops the run with RunCancelled
+        generation: Optional per-request max_output_tokens, temperature and max_results (see _build_agent)
+        latency_target: Optional seconds; the agent gives its final answer when another step would miss this
+        timeout: Optional seconds after which the run is stopped with LatencyTargetExceeded
         
     Returns:
         str: AI response message
         
     Raises:
-        ValueError: If required API keys are missing
+        ValueError: If required API keys or the local document index are missing
+        ContentFlaggedError: If moderation is enabled and the guard model flags the input
+        RunCancelled: If cancel_event was set before the run finished
+        LatencyTargetExceeded: If the run was still going after timeout seconds
+        DeadlineSaturated: If timeout is set and every thread for timed runs is busy
         Exception: Any other error with full traceback logged
     """
     try:
-        logger.info(f"Initializing ChatGroq with model: {llm_id}")
+        provider = get_provider(llm_id)
+        logger.info(f"Initializing {provider.name} chat model: {llm_id}")
         
-        # Check if GROQ_API_KEY is set
-        if not settings.GROQ_API_KEY:
-            error_msg = "GROQ_API_KEY is not set in environment variables"
+        # Replay mode answers from recorded cassettes, so no API keys are needed
+        replaying = cassettes.is_replaying()
+
+        # Check the provider's API key (e.g. GROQ_API_KEY) is set
+        if provider.api_key_setting and not getattr(settings, provider.api_key_setting) and not replaying:
+            error_msg = f"{provider.api_key_setting} is not set in environment variables"
             logger.error(error_msg)
             raise ValueError(error_msg)
         
-        llm = ChatGroq(model=llm_id)
-        logger.info("ChatGroq initialized successfully")
-
-        if allow_search:
-            logger.info("Search is enabled, checking TAVILY_API_KEY")
-            if not settings.TAVILY_API_KEY:
-                error_msg = "TAVILY_API_KEY is required when allow_search is True"
-                logger.error(error_msg)
-                raise ValueError(error_msg)
-            tools = [TavilySearch(max_results=2, tavily_api_key=settings.TAVILY_API_KEY)]
-            logger.info("TavilySearch tool configured")
-        else:
-            tools = []
-            logger.info("Search is disabled, no tools configured")
-
-        logger.info(f"Creating react agent with {len(tools)} tool(s)")
-        agent = create_react_agent(
-            model=llm,
-            tools=tools,
-            prompt=system_prompt
-        )
-        logger.info("React agent created successfully")
+        span = current_span()
+        span.set_attributes({"llm.model": llm_id, "agent.allow_search": allow_search,
+                             "agent.allow_retrieval": allow_retrieval, "agent.input_messages": len(query)})
 
         # Convert string messages to HumanMessage objects
         logger.info(f"Converting {len(query)} message(s) to HumanMessage objects")
         messages = [HumanMessage(content=msg) for msg in query]
+        if history:
+            logger.info(f"Prepending {len(history)} message(s) of session history")
+            messages = [AIMessage(content=turn["content"]) if turn["role"] == "assistant"
+                        else HumanMessage(content=turn["content"]) for turn in history] + messages
         state = {"messages": messages}
 
-        logger.info("Invoking agent...")
-        response = agent.invoke(state)
-        logger.info("Agent invocation completed")
+        # The guard model classifies the input while the agent runs; a flagged verdict stops the agent
+        moderation = moderator.start(query) if moderator is not None else None
+        flagged = moderation.flagged if moderation is not None else None
+
+        # Hard latency limit: the caller gets LatencyTargetExceeded at the deadline, while the
+        # abandoned run sees timed_out at its next step or token and stops in the background
+        timed_out = threading.Event() if timeout else None
+
+        # Hedged attempts count their own tokens: the loser's final state never comes back
+        attempts = []
+
+        def run(model_name, attempt_cancel=None):
+            attempt_usage = None
+            if attempt_cancel is not None:
+                attempt_usage = AttemptUsage()
+                attempts.append((model_name, attempt_usage))
+            budget = StepBudget(**resolve_limits(model_name, limits), start=len(messages),
+                                max_seconds=latency_target or 0)
+            agent = _build_agent(model_name, allow_search, system_prompt, allow_retrieval, replaying, budget, generation)
+            # Concurrent (hedged) attempts get their own message objects, which langgraph assigns ids to
+            attempt_state = state if attempt_cancel is None else {"messages": [m.model_copy() for m in messages]}
+            recursion_limit = budget.recursion_limit if budget.active else None
+            response = _invoke_agent(agent, attempt_state, model_name,
+                                     (attempt_cancel, flagged, cancel_event, timed_out), recursion_limit, on_token,
+                                     [attempt_usage] if attempt_usage is not None else ())
+            return response, budget, attempt_usage
+
+        losers = []
+
+        def execute():
+            if supervisor:
+                request = "\n".join(f"{message.type}: {message.content}" for message in messages) if history \
+                    else "\n".join(query)
+                response, budget = _run_supervisor(llm_id, request, allow_search, system_prompt, allow_retrieval,
+                                                   replaying, limits, (flagged, cancel_event, timed_out),
+                                                   generation, latency_target)
+                if metadata is not None:
+                    metadata["supervisor"] = response["supervisor"]
+                    metadata["usage_by_model"] = response["usage_by_model"]
+                return response, budget
+            # Streamed tokens cannot be taken back, so streamed runs are not hedged
+            if hedger is not None and on_token is None:
+                (response, budget, winner_usage), hedge_info = hedger.run(run, llm_id)
+                span.set_attributes({f"hedge.{key}": value for key, value in hedge_info.items()})
+                if metadata is not None:
+                    metadata["hedge"] = hedge_info
+                    # Snapshot the losers now; a call still in flight counts at its estimated input
+                    losers.extend((name, usage.snapshot()) for name, usage in attempts if usage is not winner_usage)
+                return response, budget
+            return run(llm_id)[:2]
+
+        with compression_stats() as search_stats, model_latency_stats() as model_latency:
+            try:
+                if timeout:
+                    response, budget = _deadline_runner.run(partial(contextvars.copy_context().run, execute),
+                                                            timeout, on_timeout=timed_out.set)
+                else:
+                    response, budget = execute()
+            except RunCancelled:
+                if flagged is not None and flagged.is_set():
+                    raise ContentFlaggedError(moderation.result())
+                raise
+
+        if moderation is not None:
+            verdict = moderation.result()
+            span.set_attribute("moderation.safe", verdict["safe"])
+            if metadata is not None:
+                metadata["moderation"] = verdict
+            if not verdict["safe"]:
+                raise ContentFlaggedError(verdict)
 
         messages = response.get("messages", [])
         logger.info(f"Retrieved {len(messages)} message(s) from response")
 
-        ai_messages = [message.content for message in messages if isinstance(message, AIMessage)]
-        
-        if not ai_messages:
+        answer = final_answer(messages)
+        if answer is None:
             error_msg = "No AI messages found in response"
             logger.error(error_msg)
             logger.error(f"Response messages: {[type(m).__name__ for m in messages]}")
             raise ValueError(error_msg)
         
-        logger.info(f"Extracted AI response (length: {len(ai_messages[-1])})")
-        return ai_messages[-1]
+        if metadata is not None:
+            # The react agent's state starts with the session history, whose turns earlier requests paid for
+            history_turns = len(history) if history and not supervisor else 0
+            metadata["usage"] = extract_usage(islice(messages, history_turns, None))
+            logger.info(f"Token usage: {metadata['usage']}")
+            if losers:
+                # Bill the answer to the model that won the hedge, and the cancelled attempts to theirs
+                usage_by_model = {metadata["hedge"]["winner"]: dict(metadata["usage"])}
+                for name, usage in losers:
+                    merge_usage(usage_by_model.setdefault(name, empty_usage()), usage)
+                metadata["usage_by_model"] = usage_by_model
+            span.set_attributes({f"llm.{key}": value for key, value in metadata["usage"].items()})
+            metadata["steps"] = budget.report(messages)
+            logger.info(f"Agent steps: {metadata['steps']}")
+            if metadata["steps"]["limit_reached"]:
+                span.set_attribute("agent.limit_reached", metadata["steps"]["limit_reached"])
+            if model_latency.calls:
+                metadata["model_latency"] = model_latency.report()
+            if search_stats["searches"]:
+                metadata["search_compression"] = search_stats
+                logger.info(f"Search compression saved ~{search_stats['tokens_saved']} tokens")
+            if include_trace:
+                metadata["trace"] = list(iter_trace(messages, start=budget.start))
+
+        logger.info(f"Extracted AI response (length: {len(answer)})")
+        return answer
         
     except ValueError as e:
         # Re-raise ValueError as-is (already logged)
         raise
+    except RunCancelled:
+        logger.info("Agent run cancelled")
+        raise
+    except (LatencyTargetExceeded, DeadlineSaturated) as e:
+        logger.warning(str(e))
+        raise
     except Exception as e:
         # Log full traceback for any other exception
         log_full_traceback(logger, e, "Error in get_response_from_ai_agents: ")
         # Re-raise to be handled by API layer
         raise
-
-
-
-
-
-
@@ -0,0 +1,221 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from itertools import islice
+
+from langchain_core.messages.ai import AIMessage
+from langchain_core.messages.human import HumanMessage
+
+from app.config.settings import settings
+from app.common.logger import get_logger
+
+logger = get_logger(__name__)
+
+LIMIT_NAMES = ("max_steps", "max_tool_calls", "max_tokens")
+
+FINAL_ANSWER_PROMPT = (
+    "You have reached the limit for this request and cannot call any more tools. "
+    "Answer the question now, as well as you can, using only the information gathered so far."
+)
+
+
+class LatencyTargetExceeded(TimeoutError):
+    """Raised when a run is stopped at its hard latency timeout"""
+
+
+class DeadlineSaturated(RuntimeError):
+    """Raised when every thread for runs with a hard timeout is busy, including with abandoned runs"""
+
+
+class DeadlineRunner:
+    """
+    Runs functions with a hard timeout on a bounded set of threads
+
+    The timeout counts from when the function starts, not from when it was
+    submitted. A run abandoned at its timeout keeps its thread until it
+    notices and stops, so once every thread is busy new runs are refused
+    with DeadlineSaturated instead of queueing behind them.
+    """
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent-deadline")
+
+    def run(self, fn, timeout, on_timeout=None):
+        """
+        Return fn(), or raise LatencyTargetExceeded timeout seconds after it started
+
+        on_timeout is called before raising, to tell the abandoned run to stop.
+
+        Raises:
+            DeadlineSaturated: If no thread is free
+            LatencyTargetExceeded: If fn is still running at the timeout
+        """
+        if not self._slots.acquire(blocking=False):
+            raise DeadlineSaturated(f"All {self.max_workers} threads for timed runs are busy, retry shortly")
+        started = threading.Event()
+
+        def target():
+            started.set()
+            try:
+                return fn()
+            finally:
+                self._slots.release()
+
+        try:
+            future = self._executor.submit(target)
+        except BaseException:
+            self._slots.release()
+            raise
+        # A slot means a free thread, so this wait is only the thread hand-off
+        started.wait()
+        done, _ = wait([future], timeout=timeout)
+        if not done:
+            if on_timeout is not None:
+                on_timeout()
+            raise LatencyTargetExceeded(f"Request stopped after its {timeout:g}s latency limit")
+        return future.result()
+
+
+# Without hooks langgraph's default recursion limit (25) allows about 12 model calls
+DEFAULT_STEPS = 12
+
+
+def resolve_limits(model_name, overrides=None):
+    """
+    Effective limits for one agent run (0 = unlimited)
+
+    Starts from the AGENT_MAX_* defaults, applies the model's entry in
+    AGENT_MODEL_LIMITS, then the per-request overrides. A request can only
+    tighten a configured limit, never raise it.
+
+    Args:
+        model_name: Model identifier
+        overrides: Optional dict with any of max_steps, max_tool_calls, max_tokens
+
+    Returns:
+        dict: max_steps, max_tool_calls and max_tokens
+    """
+    limits = {
+        "max_steps": settings.AGENT_MAX_STEPS,
+        "max_tool_calls": settings.AGENT_MAX_TOOL_CALLS,
+        "max_tokens": settings.AGENT_MAX_TOKENS,
+    }
+    limits.update({name: value for name, value in settings.AGENT_MODEL_LIMITS.get(model_name, {}).items()
+                   if name in LIMIT_NAMES})
+    for name, value in (overrides or {}).items():
+        if name in LIMIT_NAMES and value:
+            limits[name] = min(limits[name], value) if limits[name] else value
+    return limits
+
+
+class StepBudget:
+    """
+    Step, tool call and token limits for one react-agent run
+
+    Used as the agent's pre/post model hooks. Once a limit is reached the
+    next model call is asked for a final answer, and any tool calls it
+    still makes are dropped, so the loop ends with an answer instead of
+    another search. Tool calls beyond max_tool_calls are trimmed from the
+    step that requests them. max_tokens is checked between steps, so the
+    step that crosses it still completes. max_seconds is a latency target:
+    the final answer is requested once another step, at the run's average
+    step time so far, would miss it.
+
+    Only messages after start (the run's input) are counted.
+    """
+
+    def __init__(self, max_steps=0, max_tool_calls=0, max_tokens=0, start=0, max_seconds=0):
+        self.max_steps = max_steps
+        self.max_tool_calls = max_tool_calls
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+        self.start = start
+        self.started = time.monotonic()
+        self.limit_reached = None
+
+    @property
+    def active(self):
+        return bool(self.max_steps or self.max_tool_calls or self.max_tokens or self.max_seconds)
+
+    @property
+    def recursion_limit(self):
+        # Each step runs the pre hook, model, post hook and tools nodes
+        return 4 * (self.max_steps or DEFAULT_STEPS) + 1
+
+    def counts(self, messages):
+        """Model calls, tool calls and tokens used by the run so far"""
+        counts = {"llm_calls": 0, "tool_calls": 0, "total_tokens": 0}
+        for message in islice(messages, self.start, None):
+            if isinstance(message, AIMessage):
+                counts["llm_calls"] += 1
+                counts["tool_calls"] += len(message.tool_calls)
+                counts["total_tokens"] += (message.usage_metadata or {}).get("total_tokens", 0)
+        return counts
+
+    def _exhausted(self, counts):
+        """Name of the limit that makes the next model call the last one, if any"""
+        if self.max_steps and counts["llm_calls"] + 1 >= self.max_steps:
+            return "max_steps"
+        if self.max_tool_calls and counts["tool_calls"] >= self.max_tool_calls:
+            return "max_tool_calls"
+        if self.max_tokens and counts["total_tokens"] >= self.max_tokens:
+            return "max_tokens"
+        if self.max_seconds and counts["llm_calls"]:
+            elapsed = time.monotonic() - self.started
+            if elapsed + elapsed / counts["llm_calls"] >= self.max_seconds:
+                return "max_seconds"
+        return None
+
+    def partial_answer(self, messages):
+        """The latest non-empty answer text of the run, for when the final step produced none"""
+        for index in range(len(messages) - 1, self.start - 1, -1):
+            message = messages[index]
+            if isinstance(message, AIMessage) and isinstance(message.content, str) and message.content.strip():
+                return message.content
+        return f"I could not finish answering within this request's {self.limit_reached} limit."
+
+    def pre_model_hook(self, state):
+        messages = state["messages"]
+        reason = self._exhausted(self.counts(messages))
+        if reason is None:
+            return {"llm_input_messages": messages}
+        self.limit_reached = reason
+        logger.info(f"Agent budget {reason} reached, asking for a final answer")
+        return {"llm_input_messages": messages + [HumanMessage(content=FINAL_ANSWER_PROMPT)]}
+
+    def post_model_hook(self, state):
+        messages = state["messages"]
+        last = messages[-1]
+        if not isinstance(last, AIMessage) or not last.tool_calls:
+            return {}
+
+        counts = self.counts(messages[:-1])
+        reason = self._exhausted(counts)
+        allowed = len(last.tool_calls)
+        if reason is not None:
+            allowed = 0
+        elif self.max_tool_calls and counts["tool_calls"] + allowed > self.max_tool_calls:
+            reason = "max_tool_calls"
+            allowed = self.max_tool_calls - counts["tool_calls"]
+        if reason is None:
+            return {}
+
+        self.limit_reached = reason
+        logger.info(f"Agent budget {reason} reached, keeping {allowed} of {len(last.tool_calls)} tool call(s)")
+        additional_kwargs = {key: value for key, value in last.additional_kwargs.items() if key != "tool_calls"}
+        update = {"tool_calls": last.tool_calls[:allowed], "additional_kwargs": additional_kwargs}
+        if allowed == 0 and not (isinstance(last.content, str) and last.content.strip()):
+            update["content"] = self.partial_answer(messages)
+        # Same id, so add_messages replaces the model's message in place
+        return {"messages": [last.model_copy(update=update)]}
+
+    def report(self, messages):
+        """Step counts for response metadata"""
+        counts = self.counts(messages)
+        counts["limit_reached"] = self.limit_reached
+        counts["limits"] = {name: getattr(self, name) for name in LIMIT_NAMES}
+        if self.max_seconds:
+            counts["limits"]["max_seconds"] = self.max_seconds
+        return counts
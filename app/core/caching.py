@@ -0,0 +1,95 @@
+import hashlib
+import json
+import time
+from typing import Any
+
+from langchain_core.tools import BaseTool
+
+from app.config.settings import settings
+from app.common.logger import get_logger
+from app.common.shared_state import get_shared_state
+
+logger = get_logger(__name__)
+
+
+def cache_key(namespace, payload):
+    """Stable key for a JSON-serialisable payload"""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return f"{namespace}:{hashlib.sha256(canonical.encode('utf-8')).hexdigest()}"
+
+
+class ResponseCache:
+    """
+    Final agent answers keyed on everything that determines them
+
+    Entries live in the shared state backend, so every task serves answers
+    computed by any other. A ttl of 0 disables the cache.
+    """
+
+    def __init__(self, state, ttl=0):
+        self.state = state
+        self.ttl = ttl
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    @staticmethod
+    def key(model_name, system_prompt, messages, allow_search=False, allow_retrieval=False, history=None,
+            options=None, supervisor=False):
+        """options holds any other settings that change the answer (e.g. temperature); None values are ignored"""
+        payload = {
+            "model": model_name,
+            "system_prompt": system_prompt,
+            "messages": list(messages),
+            "allow_search": allow_search,
+            "allow_retrieval": allow_retrieval,
+            "history": history or [],
+            "supervisor": supervisor,
+        }
+        options = {name: value for name, value in (options or {}).items() if value is not None}
+        if options:
+            payload["options"] = options
+        return cache_key("response", payload)
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        return self.state.get(key)
+
+    def set(self, key, response):
+        if self.enabled:
+            self.state.set(key, {"response": response, "cached_at": time.time()}, self.ttl)
+
+
+class CachedSearchTool(BaseTool):
+    """Serves repeated search queries from the shared state backend, under the wrapped tool's name and schema"""
+
+    inner: Any
+    state: Any
+    ttl: float
+    key_params: dict = {}
+
+    def _run(self, run_manager=None, **kwargs):
+        key = cache_key(f"search:{self.name}", dict(kwargs, **self.key_params))
+        cached = self.state.get(key)
+        if cached is not None:
+            logger.info(f"Search cache hit for {self.name}")
+            return cached
+        output = self.inner.invoke(kwargs)
+        self.state.set(key, output, self.ttl)
+        return output
+
+
+def cached_search_tool(tool, state=None, ttl=None, key_params=None):
+    """
+    Wrap a search tool with the shared search cache; returns the tool unchanged when the ttl is 0
+
+    key_params are the tool's own settings that change its output (e.g.
+    max_results), kept apart in the cache from the same query with others.
+    """
+    ttl = settings.SEARCH_CACHE_TTL if ttl is None else ttl
+    if ttl <= 0:
+        return tool
+    return CachedSearchTool(name=tool.name, description=tool.description, args_schema=tool.args_schema,
+                            inner=tool, state=state or get_shared_state(), ttl=ttl, key_params=key_params or {})
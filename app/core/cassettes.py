@@ -0,0 +1,254 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import messages_from_dict, message_to_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import BaseTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from app.config.settings import settings
+from app.common.logger import get_logger
+
+logger = get_logger(__name__)
+
+MODE_OFF = "off"
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+
+# Placeholder credential for clients that are constructed but never called in replay mode
+REPLAY_API_KEY = "replay"
+
+
+class CassetteMissError(LookupError):
+    """Raised in replay mode when a request was never recorded"""
+
+
+def _message_key(message):
+    # Message and run ids are random per run, so they are left out of the key
+    return {
+        "type": message.type,
+        "content": message.content,
+        "tool_calls": [{"name": c["name"], "args": c["args"], "id": c.get("id")}
+                       for c in getattr(message, "tool_calls", None) or []],
+        "tool_call_id": getattr(message, "tool_call_id", None),
+    }
+
+
+def request_key(kind, name, payload):
+    """Stable hash identifying an upstream request"""
+    canonical = json.dumps({"kind": kind, "name": name, "payload": payload},
+                           sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def llm_request_key(llm_id, messages, stop=None, **kwargs):
+    payload = {
+        "messages": [_message_key(m) for m in messages],
+        "stop": stop,
+        "tools": kwargs.get("tools"),
+        "tool_choice": kwargs.get("tool_choice"),
+    }
+    return request_key("llm", llm_id, payload)
+
+
+class Cassette:
+    """
+    Recorded upstream calls stored as gzip-compressed JSON lines
+
+    Every record() appends one gzip member to the file, so a crash never
+    loses earlier entries and the file stays readable with gzip.open. On
+    replay, entries for the same request key are served in recorded order;
+    once exhausted the last one is repeated, so a cassette can be replayed
+    by repeated benchmark runs.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = None
+
+    def record(self, key, kind, name, response, elapsed):
+        entry = {"key": key, "kind": kind, "name": name, "elapsed": round(elapsed, 6), "response": response}
+        line = (json.dumps(entry, separators=(",", ":"), default=str) + "\n").encode("utf-8")
+        with self._lock:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with gzip.open(self.path, "ab") as f:
+                f.write(line)
+            if self._entries is not None:
+                self._entries[key].append(entry)
+
+    def _load(self):
+        entries = defaultdict(deque)
+        if os.path.exists(self.path):
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        entries[entry["key"]].append(entry)
+        logger.info(f"Loaded cassette {self.path} ({sum(len(q) for q in entries.values())} entries)")
+        return entries
+
+    def next(self, key):
+        """
+        Return the next recorded entry for key
+
+        Raises:
+            CassetteMissError: If key was never recorded
+        """
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._load()
+            queue = self._entries.get(key)
+            if not queue:
+                raise CassetteMissError(f"No recorded response in {self.path} for request {key[:12]}")
+            return queue.popleft() if len(queue) > 1 else queue[0]
+
+
+class RecordingChatModel(BaseChatModel):
+    """Delegates to a real chat model and records every call"""
+
+    inner: Any
+    cassette: Any
+    llm_id: str
+
+    @property
+    def _llm_type(self):
+        return "cassette-recording"
+
+    def bind_tools(self, tools, tool_choice=None, **kwargs):
+        if tool_choice:
+            kwargs["tool_choice"] = tool_choice
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        key = llm_request_key(self.llm_id, messages, stop, **kwargs)
+        start = time.perf_counter()
+        result = self.inner._generate(messages, stop=stop, **kwargs)
+        elapsed = time.perf_counter() - start
+
+        self.cassette.record(key, "llm", self.llm_id, {
+            "generations": [message_to_dict(g.message) for g in result.generations],
+            "llm_output": result.llm_output,
+        }, elapsed)
+        return result
+
+
+class ReplayChatModel(BaseChatModel):
+    """Serves recorded chat model responses, optionally with their recorded latency"""
+
+    cassette: Any
+    llm_id: str
+    latency_scale: float = 1.0
+
+    @property
+    def _llm_type(self):
+        return "cassette-replay"
+
+    def bind_tools(self, tools, tool_choice=None, **kwargs):
+        if tool_choice:
+            kwargs["tool_choice"] = tool_choice
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        entry = self.cassette.next(llm_request_key(self.llm_id, messages, stop, **kwargs))
+        if self.latency_scale > 0:
+            time.sleep(entry["elapsed"] * self.latency_scale)
+
+        response = entry["response"]
+        generations = [ChatGeneration(message=message)
+                       for message in messages_from_dict(response["generations"])]
+        return ChatResult(generations=generations, llm_output=response.get("llm_output"))
+
+
+class RecordingTool(BaseTool):
+    """Delegates to a real tool and records every call"""
+
+    inner: Any
+    cassette: Any
+
+    def _run(self, run_manager=None, **kwargs):
+        key = request_key("tool", self.name, kwargs)
+        start = time.perf_counter()
+        output = self.inner.invoke(kwargs)
+        self.cassette.record(key, "tool", self.name, output, time.perf_counter() - start)
+        return output
+
+
+class ReplayTool(BaseTool):
+    """Serves recorded tool outputs under the original tool's name and schema"""
+
+    cassette: Any
+    latency_scale: float = 1.0
+
+    def _run(self, run_manager=None, **kwargs):
+        entry = self.cassette.next(request_key("tool", self.name, kwargs))
+        if self.latency_scale > 0:
+            time.sleep(entry["elapsed"] * self.latency_scale)
+        return entry["response"]
+
+
+def _wrap_tool(tool_class, tool, **fields):
+    return tool_class(name=tool.name, description=tool.description,
+                      args_schema=tool.args_schema, **fields)
+
+
+_cassettes = {}
+_cassettes_lock = threading.Lock()
+
+
+def get_cassette(name=None, directory=None):
+    """Return the (shared) cassette for name under directory"""
+    path = os.path.join(directory or settings.CASSETTE_DIR, f"{name or settings.CASSETTE_NAME}.jsonl.gz")
+    with _cassettes_lock:
+        if path not in _cassettes:
+            _cassettes[path] = Cassette(path)
+        return _cassettes[path]
+
+
+def cassette_mode():
+    return settings.CASSETTE_MODE
+
+
+def is_replaying():
+    return cassette_mode() == MODE_REPLAY
+
+
+def replay_chat_model(llm_id):
+    """Chat model that answers from the active cassette without network access"""
+    return ReplayChatModel(cassette=get_cassette(), llm_id=llm_id,
+                           latency_scale=settings.CASSETTE_LATENCY_SCALE)
+
+
+def wrap_for_cassette(llm, tools, llm_id):
+    """
+    Apply the configured cassette mode to an agent's model and tools
+
+    In record mode both are wrapped so every call is captured; in replay
+    mode tools are swapped for recorded outputs (the model is expected to
+    come from replay_chat_model already). Off returns them unchanged.
+
+    Raises:
+        ValueError: If CASSETTE_MODE is not off, record or replay
+    """
+    mode = cassette_mode()
+    if mode == MODE_OFF:
+        return llm, tools
+
+    cassette = get_cassette()
+    if mode == MODE_RECORD:
+        logger.info(f"Recording upstream calls to {cassette.path}")
+        return (RecordingChatModel(inner=llm, cassette=cassette, llm_id=llm_id),
+                [_wrap_tool(RecordingTool, tool, inner=tool, cassette=cassette) for tool in tools])
+    if mode == MODE_REPLAY:
+        logger.info(f"Replaying upstream calls from {cassette.path}")
+        return llm, [_wrap_tool(ReplayTool, tool, cassette=cassette,
+                                latency_scale=settings.CASSETTE_LATENCY_SCALE) for tool in tools]
+    raise ValueError(f"Unknown CASSETTE_MODE: {mode}. Expected 'off', 'record' or 'replay'")
@@ -0,0 +1,150 @@
+import contextvars
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from app.common.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class RunCancelled(Exception):
+    """Raised inside an agent run that was cancelled (lost its hedge race, or its input was flagged)"""
+
+
+class CancellationCallback(BaseCallbackHandler):
+    """Stops an agent run at its next chain, LLM or tool step (or streamed token) once any of its events is set"""
+
+    raise_error = True
+
+    def __init__(self, *cancel_events):
+        self.cancel_events = cancel_events
+
+    def _check(self, *args, **kwargs):
+        if any(event.is_set() for event in self.cancel_events):
+            raise RunCancelled("Agent run cancelled")
+
+    on_chain_start = on_chat_model_start = on_llm_start = on_tool_start = on_llm_new_token = _check
+
+
+class LatencyTracker:
+    """Recent request latencies per model, for percentile-based hedge delays"""
+
+    def __init__(self, window=200):
+        self.window = window
+        self._latencies = defaultdict(lambda: deque(maxlen=self.window))
+        self._lock = threading.Lock()
+
+    def record(self, model_name, latency):
+        with self._lock:
+            self._latencies[model_name].append(latency)
+
+    def percentile(self, model_name, percentile, min_samples=20):
+        """Return the latency percentile in seconds, or None with fewer than min_samples observations"""
+        with self._lock:
+            samples = sorted(self._latencies.get(model_name, ()))
+        if len(samples) < max(1, min_samples):
+            return None
+        index = min(len(samples) - 1, int(round(percentile / 100 * (len(samples) - 1))))
+        return samples[index]
+
+
+class HedgeBudget:
+    """Allows hedges while they stay below ratio of all requests seen"""
+
+    def __init__(self, ratio=0.05):
+        self.ratio = ratio
+        self.requests = 0
+        self.hedges = 0
+        self._lock = threading.Lock()
+
+    def note_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def try_acquire(self):
+        with self._lock:
+            if self.hedges + 1 > self.ratio * self.requests:
+                return False
+            self.hedges += 1
+            return True
+
+
+class Hedger:
+    """
+    Runs a request and, if it is slow, a second copy; the first answer wins
+
+    The hedge is sent once the primary has run longer than the model's
+    recent latency percentile (min_delay until enough samples exist), to
+    hedge_models.get(model, model), and only while the budget allows. The
+    losing attempt is cancelled at its next agent step through its cancel
+    event; an LLM call already in flight finishes in the background.
+    """
+
+    def __init__(self, percentile=95, min_delay=1.0, budget_ratio=0.05, hedge_models=None,
+                 min_samples=20, max_workers=64):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.hedge_models = hedge_models or {}
+        self.latencies = LatencyTracker()
+        self.budget = HedgeBudget(budget_ratio)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+
+    def delay_for(self, model_name):
+        observed = self.latencies.percentile(model_name, self.percentile, self.min_samples)
+        return max(self.min_delay, observed or 0)
+
+    def _submit(self, fn, model_name):
+        cancel_event = threading.Event()
+        context = contextvars.copy_context()
+        start = time.perf_counter()
+
+        def attempt():
+            result = context.run(fn, model_name, cancel_event)
+            self.latencies.record(model_name, time.perf_counter() - start)
+            return result
+
+        future = self._executor.submit(attempt)
+        future.model_name = model_name
+        future.cancel_event = cancel_event
+        return future
+
+    def run(self, fn, model_name):
+        """
+        Call fn(model_name, cancel_event), hedging it if it runs past the hedge delay
+
+        Returns:
+            tuple: (result, info) where info describes whether and how the request was hedged
+
+        Raises:
+            Exception: The primary's error if every attempt fails
+        """
+        self.budget.note_request()
+        delay = self.delay_for(model_name)
+        primary = self._submit(fn, model_name)
+        info = {"hedged": False, "delay_ms": round(delay * 1000, 1), "winner": model_name}
+
+        done, _ = wait([primary], timeout=delay)
+        if done or not self.budget.try_acquire():
+            return primary.result(), info
+
+        hedge_model = self.hedge_models.get(model_name, model_name)
+        logger.info(f"Hedging {model_name} request after {delay:.2f}s with {hedge_model}")
+        attempts = [primary, self._submit(fn, hedge_model)]
+        info["hedged"] = True
+
+        pending = set(attempts)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for other in attempts:
+                        if other is not future:
+                            other.cancel_event.set()
+                    info["winner"] = future.model_name
+                    return future.result(), info
+        return primary.result(), info
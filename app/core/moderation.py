@@ -0,0 +1,115 @@
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_groq import ChatGroq
+from langchain_core.messages.human import HumanMessage
+
+from app.common.logger import get_logger, log_full_traceback
+from app.core.caching import cache_key
+
+logger = get_logger(__name__)
+
+# Llama Guard hazard categories (https://huggingface.co/meta-llama/Llama-Guard-4-12B)
+HAZARD_CATEGORIES = {
+    "S1": "Violent Crimes", "S2": "Non-Violent Crimes", "S3": "Sex-Related Crimes",
+    "S4": "Child Sexual Exploitation", "S5": "Defamation", "S6": "Specialized Advice",
+    "S7": "Privacy", "S8": "Intellectual Property", "S9": "Indiscriminate Weapons",
+    "S10": "Hate", "S11": "Suicide & Self-Harm", "S12": "Sexual Content",
+    "S13": "Elections", "S14": "Code Interpreter Abuse",
+}
+
+
+class ContentFlaggedError(ValueError):
+    """Raised when the guard model classifies the request as unsafe"""
+
+    def __init__(self, verdict):
+        self.verdict = verdict
+        names = ", ".join(HAZARD_CATEGORIES.get(c, c) for c in verdict["categories"]) or "unspecified"
+        super().__init__(f"Request flagged by content moderation ({names})")
+
+    def __reduce__(self):
+        return (type(self), (self.verdict,))
+
+
+def parse_verdict(text):
+    """Parse Llama Guard output ("safe" or "unsafe" followed by category codes)"""
+    lines = [line.strip() for line in (text or "").strip().splitlines() if line.strip()]
+    if not lines or lines[0].lower() != "unsafe":
+        return {"safe": True, "categories": []}
+    categories = [code.strip() for line in lines[1:] for code in line.split(",") if code.strip()]
+    return {"safe": False, "categories": categories}
+
+
+class ModerationCheck:
+    """A guard classification that may still be running; flagged is set as soon as it comes back unsafe"""
+
+    def __init__(self, future=None, verdict=None):
+        self.flagged = threading.Event()
+        self._future = future
+        self._verdict = verdict
+        if verdict is not None and not verdict["safe"]:
+            self.flagged.set()
+
+    def result(self):
+        """Wait for and return the verdict"""
+        if self._verdict is None:
+            self._verdict = self._future.result()
+        return self._verdict
+
+
+class Moderator:
+    """
+    Classifies request messages with the guard model, off the request thread
+
+    start() returns immediately so the main agent can run while the guard
+    model answers; verdicts are cached in the shared state backend by
+    message content. If the guard call fails the request is allowed
+    (fail_open) or flagged. chat_model(model) builds the guard client
+    (ChatGroq by default).
+    """
+
+    def __init__(self, model, state=None, cache_ttl=86400, fail_open=True, max_workers=16, chat_model=None):
+        self.model = model
+        self.chat_model = chat_model
+        self.state = state
+        self.cache_ttl = cache_ttl
+        self.fail_open = fail_open
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="moderation")
+
+    def classify(self, messages):
+        """Ask the guard model about messages (blocking)"""
+        llm = self.chat_model(self.model) if self.chat_model is not None else ChatGroq(model=self.model)
+        response = llm.invoke([HumanMessage(content=m) for m in messages])
+        return parse_verdict(response.content)
+
+    def _check(self, messages, key):
+        try:
+            verdict = self.classify(messages)
+        except Exception as e:
+            log_full_traceback(logger, e, "Moderation call failed: ")
+            return {"safe": self.fail_open, "categories": [], "error": type(e).__name__}
+        if self.state is not None and self.cache_ttl > 0:
+            self.state.set(key, verdict, self.cache_ttl)
+        if not verdict["safe"]:
+            logger.warning(f"Guard model flagged request: {verdict['categories']}")
+        return verdict
+
+    def start(self, messages):
+        """Begin classifying messages; returns a ModerationCheck"""
+        key = cache_key("moderation", {"model": self.model, "messages": list(messages)})
+        cached = self.state.get(key) if self.state is not None and self.cache_ttl > 0 else None
+        if cached is not None:
+            return ModerationCheck(verdict=dict(cached, cached=True))
+
+        check = ModerationCheck()
+        context = contextvars.copy_context()
+
+        def run():
+            verdict = context.run(self._check, messages, key)
+            if not verdict["safe"]:
+                check.flagged.set()
+            return verdict
+
+        check._future = self._executor.submit(run)
+        return check
@@ -0,0 +1,320 @@
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+import unicodedata
+
+from app.common.logger import get_logger
+
+logger = get_logger(__name__)
+
+_TRAILING_SPACE_RE = re.compile(r"[ \t]+\n")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+# Shared registration log: a counter of entries and one key per entry
+_LOG_KEY = "prompts:log"
+
+
+def canonicalize_prompt(text):
+    """
+    Normalise a prompt so equivalent prompts are byte-identical
+
+    Provider-side prompt caching matches on exact prefixes, so unicode
+    form, line endings and stray whitespace are normalised once here
+    rather than leaking into every request.
+    """
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+    text = _TRAILING_SPACE_RE.sub("\n", text)
+    text = _BLANK_LINES_RE.sub("\n\n", text)
+    return text.strip()
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token) used for statistics"""
+    return (len(text) + 3) // 4
+
+
+def _append_variables(text, variables):
+    if not variables:
+        return text
+    context = "\n".join(f"{key}: {variables[key]}" for key in sorted(variables))
+    return f"{text}\n\n{context}"
+
+
+class PromptTemplate:
+    """One registered, immutable version of a system prompt"""
+
+    def __init__(self, template_id, version, text, description=""):
+        self.template_id = template_id
+        self.version = version
+        self.text = sys.intern(canonicalize_prompt(text))
+        self.description = description
+        self.sha256 = hashlib.sha256(self.text.encode("utf-8")).hexdigest()
+        self.size_bytes = len(self.text.encode("utf-8"))
+        self.tokens = estimate_tokens(self.text)
+
+    def render(self, variables=None):
+        """
+        Return the prompt for a request
+
+        The canonical template always comes first and per-request variables
+        are appended after it, so the cacheable prefix is identical across
+        requests.
+        """
+        return _append_variables(self.text, variables)
+
+    def to_dict(self):
+        return {
+            "id": self.template_id,
+            "version": self.version,
+            "description": self.description,
+            "sha256": self.sha256,
+            "size_bytes": self.size_bytes,
+            "tokens": self.tokens,
+        }
+
+
+class PromptRegistry:
+    """
+    Versioned system-prompt templates that clients reference by id
+
+    With a shared state, registrations are appended to a log in it that
+    every task replays in the same order, so all tasks agree on template
+    versions. A task pulls new entries at most every sync_interval seconds,
+    and at once when a template or version it does not know is asked for.
+    """
+
+    def __init__(self, state=None, sync_interval=1.0, gap_timeout=10.0):
+        self.state = state
+        self.sync_interval = sync_interval
+        self.gap_timeout = gap_timeout
+        self._templates = {}   # id -> {version: PromptTemplate}
+        self._by_hash = {}     # sha256 -> PromptTemplate
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._applied = 0      # log entries replayed so far
+        self._synced_at = 0.0
+        self._gap = None       # (entry, first seen) of an entry reserved but not yet written
+        self._outcomes = {}    # entry -> PromptTemplate or ValueError, for this task's registrations
+        self._stats = {
+            "template_requests": 0,
+            "inline_requests": 0,
+            "inline_bytes": 0,
+            "inline_matching_template": 0,
+            "request_bytes_saved": 0,
+            "cacheable_prefix_tokens": 0,
+            "canonicalization_tokens_saved": 0,
+            "by_template": {},
+        }
+
+    def register(self, template_id, text, version=None, description=""):
+        """
+        Register a template version
+
+        Re-registering identical text returns the existing latest version, so
+        loading the same templates file twice is harmless.
+
+        Raises:
+            ValueError: If the version already exists with different text
+        """
+        if self.state is None:
+            return self._apply(template_id, text, version, description)
+
+        self._sync(fresh=True)
+        existing = self._existing(template_id, text, version)
+        if existing is not None:
+            return existing
+        entry = self.state.incr(_LOG_KEY)
+        with self._sync_lock:
+            self._outcomes[entry] = None
+        self.state.set(f"{_LOG_KEY}:{entry}", {"id": template_id, "text": text, "version": version,
+                                               "description": description})
+        # Earlier entries are replayed first, so the version is the one every task assigns
+        deadline = time.monotonic() + self.gap_timeout + self.sync_interval
+        while True:
+            self._sync(fresh=True)
+            with self._sync_lock:
+                outcome = self._outcomes.get(entry)
+                if outcome is not None or time.monotonic() >= deadline:
+                    self._outcomes.pop(entry, None)
+                    break
+            time.sleep(0.05)
+        if outcome is None:
+            raise ValueError(f"Prompt template {template_id} was not registered in time, try again")
+        if isinstance(outcome, ValueError):
+            raise outcome
+        return outcome
+
+    def _existing(self, template_id, text, version):
+        """Return the registered template a registration would be a no-op for, if any"""
+        sha256 = hashlib.sha256(canonicalize_prompt(text).encode("utf-8")).hexdigest()
+        with self._lock:
+            versions = self._templates.get(template_id) or {}
+            template = versions.get(version) if version is not None else \
+                (versions[max(versions)] if versions else None)
+        return template if template is not None and template.sha256 == sha256 else None
+
+    def _apply(self, template_id, text, version=None, description=""):
+        candidate = PromptTemplate(template_id, version or 0, text, description)
+        with self._lock:
+            versions = self._templates.setdefault(template_id, {})
+            latest = versions[max(versions)] if versions else None
+
+            if version is None:
+                if latest and latest.sha256 == candidate.sha256:
+                    return latest
+                version = (max(versions) if versions else 0) + 1
+            elif version in versions:
+                if versions[version].sha256 == candidate.sha256:
+                    return versions[version]
+                raise ValueError(f"Prompt template {template_id} v{version} already exists with different text")
+
+            candidate.version = version
+            versions[version] = candidate
+            self._by_hash.setdefault(candidate.sha256, candidate)
+
+        logger.info(f"Registered prompt template {template_id} v{version} ({candidate.tokens} tokens)")
+        return candidate
+
+    def _sync(self, fresh=False):
+        """
+        Replay new entries of the shared registration log
+
+        An entry whose number was taken but which is not written yet stops the
+        replay, so every task applies entries in the same order; one still
+        missing after gap_timeout seconds (its writer died) is skipped.
+        """
+        if self.state is None:
+            return
+        with self._sync_lock:
+            now = time.monotonic()
+            if not fresh and now - self._synced_at < self.sync_interval:
+                return
+            self._synced_at = now
+            # incr by 0 reads the counter past any local read cache
+            count = int(self.state.incr(_LOG_KEY, 0) if fresh else self.state.get(_LOG_KEY) or 0)
+            if count <= self._applied:
+                return
+            keys = [f"{_LOG_KEY}:{entry}" for entry in range(self._applied + 1, count + 1)]
+            values = self.state.get_many(keys)
+            for entry, key in enumerate(keys, start=self._applied + 1):
+                value = values.get(key)
+                if value is None:
+                    if self._gap is None or self._gap[0] != entry:
+                        self._gap = (entry, now)
+                    if now - self._gap[1] < self.gap_timeout:
+                        break
+                    logger.warning(f"Skipping prompt registration {entry}, which was never written")
+                    outcome = None
+                else:
+                    try:
+                        outcome = self._apply(value["id"], value["text"], value.get("version"),
+                                              value.get("description", ""))
+                    except ValueError as e:
+                        outcome = e
+                if entry in self._outcomes:
+                    self._outcomes[entry] = outcome
+                self._applied = entry
+
+    def get(self, template_id, version=None):
+        """
+        Look up a template, defaulting to its latest version
+
+        Raises:
+            KeyError: If the template or version is unknown
+        """
+        self._sync()
+        try:
+            return self._lookup(template_id, version)
+        except KeyError:
+            if self.state is None:
+                raise
+        # Registered by another task since the last sync
+        self._sync(fresh=True)
+        return self._lookup(template_id, version)
+
+    def _lookup(self, template_id, version):
+        with self._lock:
+            versions = self._templates.get(template_id)
+            if not versions:
+                raise KeyError(f"Unknown system prompt template: {template_id}")
+            version = version or max(versions)
+            if version not in versions:
+                raise KeyError(f"Unknown version {version} of system prompt template: {template_id}")
+            return versions[version]
+
+    def list(self):
+        self._sync(fresh=True)
+        with self._lock:
+            return [t.to_dict() for versions in self._templates.values() for t in versions.values()]
+
+    def resolve(self, system_prompt="", template_id=None, version=None, variables=None):
+        """
+        Produce the system prompt for a request and record size statistics
+
+        Args:
+            system_prompt: Inline prompt text, used when no template_id is given
+            template_id: Registered template to use
+            version: Template version (latest if omitted)
+            variables: Per-request values appended after the template
+
+        Raises:
+            KeyError: If the template is unknown
+        """
+        if template_id:
+            template = self.get(template_id, version)
+            saved = template.size_bytes - len(template_id.encode("utf-8"))
+            with self._lock:
+                self._stats["template_requests"] += 1
+                self._stats["request_bytes_saved"] += max(saved, 0)
+                self._stats["cacheable_prefix_tokens"] += template.tokens
+                key = f"{template.template_id}@v{template.version}"
+                self._stats["by_template"][key] = self._stats["by_template"].get(key, 0) + 1
+            return template.render(variables)
+
+        self._sync()
+        text = canonicalize_prompt(system_prompt)
+        sha256 = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            match = self._by_hash.get(sha256)
+            self._stats["inline_requests"] += 1
+            self._stats["inline_bytes"] += len(system_prompt.encode("utf-8"))
+            self._stats["canonicalization_tokens_saved"] += estimate_tokens(system_prompt) - estimate_tokens(text)
+            if match:
+                self._stats["inline_matching_template"] += 1
+                self._stats["cacheable_prefix_tokens"] += match.tokens
+        # Reuse the interned copy when an inline prompt matches a template
+        return _append_variables(match.text if match else text, variables)
+
+    def stats(self):
+        """
+        Return request-size and token statistics
+
+        request_bytes_saved counts prompt bytes clients did not have to send
+        because they referenced a template. cacheable_prefix_tokens counts
+        prompt tokens sent as a byte-identical registered prefix, i.e. the
+        tokens eligible for provider-side prompt caching.
+        """
+        with self._lock:
+            return dict(self._stats, by_template=dict(self._stats["by_template"]))
+
+    def load_file(self, path):
+        """
+        Register templates from a JSON file
+
+        The file maps template ids to either a prompt string or an object
+        with "text" and optional "version" and "description".
+        """
+        if not os.path.exists(path):
+            return 0
+        with open(path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        for template_id, entry in entries.items():
+            if isinstance(entry, str):
+                entry = {"text": entry}
+            self.register(template_id, entry["text"], entry.get("version"), entry.get("description", ""))
+        logger.info(f"Loaded {len(entries)} prompt template(s) from {path}")
+        return len(entries)
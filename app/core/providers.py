@@ -0,0 +1,244 @@
+import math
+import random
+import threading
+import time
+import zlib
+from typing import Any, List, Optional
+
+from pydantic import PrivateAttr
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages.ai import AIMessage
+from langchain_core.messages.human import HumanMessage
+from langchain_core.messages.tool import ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import tool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from app.config.settings import settings
+from app.common.logger import get_logger
+from app.core.prompts import estimate_tokens
+
+logger = get_logger(__name__)
+
+_WORDS = ("agent", "answer", "based", "context", "data", "details", "evidence", "model", "request", "result",
+          "search", "source", "summary", "system", "token", "tool", "value")
+
+
+class LocalProviderError(Exception):
+    """Injected upstream failure from the local provider (for failover drills)"""
+
+    def __init__(self, message, status_code=503):
+        super().__init__(message)
+        self.status_code = status_code
+
+    def __reduce__(self):
+        return (type(self), (str(self), self.status_code))
+
+
+class Provider:
+    """Interface for LLM providers: builds chat models and names the credential they need"""
+
+    name = None
+    api_key_setting = None  # settings attribute that must be set, or None
+
+    def chat_model(self, model_name):
+        raise NotImplementedError
+
+    def search_tool(self, max_results):
+        """A search tool that needs no external service, or None to use Tavily"""
+        return None
+
+    def configure(self, model, max_output_tokens=None, temperature=None):
+        """A copy of model with per-request generation controls; controls it has no field for are ignored"""
+        fields = getattr(type(model), "model_fields", {})
+        update = {field: value for field, value in (("max_tokens", max_output_tokens), ("temperature", temperature))
+                  if value is not None and field in fields}
+        return model.model_copy(update=update) if update else model
+
+
+class GroqProvider(Provider):
+    """Groq chat models; factory(model_name) builds the ChatGroq client"""
+
+    name = "groq"
+    api_key_setting = "GROQ_API_KEY"
+
+    def __init__(self, factory):
+        self.factory = factory
+
+    def chat_model(self, model_name):
+        return self.factory(model_name)
+
+
+class LocalChatModel(BaseChatModel):
+    """
+    CPU-only chat model with deterministic output and simulated timing
+
+    Answers are derived from a hash of the conversation, so the same input
+    always yields the same text, tool calls and token counts. When tools are
+    bound it calls the first one tool_rounds times (with the latest user
+    message as the query) before answering. Latency is a lognormal
+    time-to-first-token around latency_ms plus output_tokens at
+    tokens_per_second, with output capped at max_tokens. A fraction error_rate of calls raises
+    LocalProviderError. Timing and errors come from an RNG seeded with seed,
+    so a given sequence of calls replays identically.
+    """
+
+    model_name: str = "local"
+    tokens_per_second: float = 500.0
+    latency_ms: float = 200.0
+    latency_sigma: float = 0.5
+    output_tokens: int = 64
+    max_tokens: Optional[int] = None
+    temperature: Optional[float] = None
+    tool_rounds: int = 1
+    error_rate: float = 0.0
+    error_status: int = 503
+    seed: int = 0
+    tool_names: List[str] = []
+    _rng: Any = PrivateAttr(default=None)
+    _rng_lock: Any = PrivateAttr(default=None)
+
+    def model_post_init(self, __context):
+        super().model_post_init(__context)
+        self._rng = random.Random(self.seed)
+        self._rng_lock = threading.Lock()
+
+    @property
+    def _llm_type(self):
+        return "local"
+
+    def bind_tools(self, tools, tool_choice=None, **kwargs):
+        names = [convert_to_openai_tool(t)["function"]["name"] for t in tools]
+        # The copy shares this model's RNG, so timing stays one reproducible sequence
+        return self.model_copy(update={"tool_names": names})
+
+    def _sample(self):
+        with self._rng_lock:
+            failed = self._rng.random() < self.error_rate
+            first_token = self.latency_ms / 1000 * math.exp(self._rng.gauss(0, self.latency_sigma)) \
+                if self.latency_ms > 0 else 0.0
+        return failed, first_token
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        failed, first_token = self._sample()
+        if failed:
+            time.sleep(first_token)
+            raise LocalProviderError(f"Local provider injected a {self.error_status} for {self.model_name}",
+                                     self.error_status)
+
+        prompt = "\n".join(str(message.content) for message in messages)
+        digest = zlib.crc32(f"{self.model_name}\n{prompt}".encode("utf-8"))
+        question = next((str(m.content) for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+        rounds = 0
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                break
+            rounds += isinstance(message, ToolMessage)
+
+        if self.tool_names and rounds < self.tool_rounds:
+            tool_calls = [{"name": self.tool_names[0], "args": {"query": question[:200]},
+                           "id": f"call_{digest:08x}_{rounds}", "type": "tool_call"}]
+            content, output_tokens = "", 8
+        else:
+            tool_calls = []
+            output_tokens = min(self.output_tokens, self.max_tokens or self.output_tokens)
+            rng = random.Random(digest)
+            filler = " ".join(rng.choice(_WORDS) for _ in range(max(0, output_tokens - 8)))
+            content = f"[{self.model_name}] Answer to: {question[:200]}. {filler}".strip()
+
+        if self.tokens_per_second > 0:
+            time.sleep(first_token + output_tokens / self.tokens_per_second)
+        input_tokens = estimate_tokens(prompt)
+        message = AIMessage(content=content, tool_calls=tool_calls, usage_metadata={
+            "input_tokens": input_tokens, "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        })
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def local_search_tool(max_results=2):
+    """Deterministic offline stand-in for the Tavily search tool"""
+
+    @tool
+    def local_search(query: str) -> dict:
+        """Search the (simulated) web for current information"""
+        digest = zlib.crc32(query.encode("utf-8"))
+        return {
+            "query": query,
+            "answer": None,
+            "results": [{
+                "title": f"Local result {i + 1} for {query[:60]}",
+                "url": f"https://local.invalid/{digest:08x}/{i + 1}",
+                "content": f"Simulated page {i + 1} about {query}. It repeats the query for deterministic tests.",
+                "score": round(1.0 - i * 0.1, 2),
+            } for i in range(max_results)],
+        }
+
+    return local_search
+
+
+class LocalProvider(Provider):
+    """Deterministic offline models for load tests, profiling and failover drills"""
+
+    name = "local"
+
+    def __init__(self, **options):
+        self.options = options
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def chat_model(self, model_name):
+        # One model (and so one seeded RNG) per name, so a run's timing sequence is reproducible
+        with self._lock:
+            if model_name not in self._models:
+                self._models[model_name] = LocalChatModel(model_name=model_name, **self.options)
+            return self._models[model_name]
+
+    def search_tool(self, max_results):
+        return local_search_tool(max_results)
+
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def register_provider(provider):
+    """Add or replace a provider in the registry under provider.name"""
+    with _providers_lock:
+        _providers[provider.name] = provider
+    return provider
+
+
+def _default_local_provider():
+    return LocalProvider(
+        tokens_per_second=settings.LOCAL_TOKENS_PER_SECOND,
+        latency_ms=settings.LOCAL_LATENCY_MS,
+        latency_sigma=settings.LOCAL_LATENCY_SIGMA,
+        output_tokens=settings.LOCAL_OUTPUT_TOKENS,
+        tool_rounds=settings.LOCAL_TOOL_ROUNDS,
+        error_rate=settings.LOCAL_ERROR_RATE,
+        error_status=settings.LOCAL_ERROR_STATUS,
+        seed=settings.LOCAL_SEED
+    )
+
+
+def get_provider(model_name):
+    """
+    Provider serving model_name
+
+    MODEL_PROVIDERS maps individual models to providers; every other model
+    uses LLM_PROVIDER. The local provider is created from the LOCAL_*
+    settings on first use.
+
+    Raises:
+        ValueError: If the configured provider is not registered
+    """
+    name = settings.MODEL_PROVIDERS.get(model_name, settings.LLM_PROVIDER)
+    with _providers_lock:
+        if name == LocalProvider.name and name not in _providers:
+            _providers[name] = _default_local_provider()
+        provider = _providers.get(name)
+    if provider is None:
+        raise ValueError(f"Unknown LLM provider '{name}' for model {model_name}. Registered: {sorted(_providers)}")
+    return provider
@@ -0,0 +1,44 @@
+from itertools import islice
+
+from langchain_core.messages.ai import AIMessage
+from langchain_core.messages.tool import ToolMessage
+
+
+def final_answer(messages):
+    """
+    Content of the last AIMessage, found by scanning back from the end
+
+    Args:
+        messages: Messages in the agent's final state
+
+    Returns:
+        The answer content, or None if the state holds no AIMessage
+    """
+    for message in reversed(messages):
+        if isinstance(message, AIMessage):
+            return message.content
+    return None
+
+
+def iter_trace(messages, start=0):
+    """
+    Yield the run's steps after its input messages as plain dicts
+
+    Model steps carry their text and tool calls, and tool steps carry the tool's
+    output. Nothing is built unless the caller consumes the generator.
+    """
+    for message in islice(messages, start, None):
+        if isinstance(message, AIMessage):
+            yield {
+                "type": "ai",
+                "content": message.content,
+                "tool_calls": [{"id": call["id"], "name": call["name"], "args": call["args"]}
+                               for call in message.tool_calls],
+            }
+        elif isinstance(message, ToolMessage):
+            yield {
+                "type": "tool",
+                "name": message.name,
+                "tool_call_id": message.tool_call_id,
+                "content": message.content,
+            }
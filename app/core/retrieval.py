@@ -0,0 +1,367 @@
+import argparse
+import json
+import mmap
+import os
+import re
+import shutil
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from langchain_core.tools import StructuredTool
+
+from app.config.settings import settings
+from app.common.logger import get_logger
+
+logger = get_logger(__name__)
+
+SUPPORTED_EXTENSIONS = (".txt", ".md", ".rst", ".csv", ".json", ".html", ".log")
+
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.npy"
+OFFSETS_FILE = "offsets.npy"
+CHUNKS_FILE = "chunks.jsonl"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def chunk_text(text, chunk_size=200, overlap=40):
+    """
+    Split text into overlapping word windows
+
+    Args:
+        text: Raw document text
+        chunk_size: Number of words per chunk
+        overlap: Number of words shared by consecutive chunks
+
+    Returns:
+        list: Chunk strings, in document order
+    """
+    if overlap >= chunk_size:
+        raise ValueError("chunk overlap must be smaller than chunk size")
+
+    words = text.split()
+    if not words:
+        return []
+
+    step = chunk_size - overlap
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(" ".join(words[start:start + chunk_size]))
+        if start + chunk_size >= len(words):
+            break
+    return chunks
+
+
+def _tokenize(text):
+    tokens = _TOKEN_RE.findall(text.lower())
+    # Bigrams give the hashed vectors a little phrase sensitivity
+    return tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def embed_texts(texts, dim=1024):
+    """
+    Embed texts with signed feature hashing
+
+    The embedding is fully local and deterministic across processes (it
+    uses crc32 rather than the salted built-in hash), so documents embedded
+    by ingestion workers and queries embedded by the API agree.
+
+    Args:
+        texts: Iterable of strings
+        dim: Vector dimension
+
+    Returns:
+        np.ndarray: float32 array of shape (len(texts), dim), L2-normalised
+    """
+    texts = list(texts)
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for token in _tokenize(text):
+            h = zlib.crc32(token.encode("utf-8"))
+            vectors[row, h % dim] += 1.0 if (h >> 31) & 1 else -1.0
+
+    # Sub-linear term frequency, then unit length so dot product == cosine
+    vectors = np.sign(vectors) * np.log1p(np.abs(vectors))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32, copy=False)
+
+
+def _iter_document_paths(source_dir):
+    for root, _, files in os.walk(source_dir):
+        for name in sorted(files):
+            if name.lower().endswith(SUPPORTED_EXTENSIONS):
+                yield os.path.join(root, name)
+
+
+def _process_file(args):
+    """Read, chunk and embed one file (runs inside an ingestion worker)"""
+    path, source_dir, chunk_size, overlap, dim = args
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        text = f.read()
+
+    chunks = chunk_text(text, chunk_size, overlap)
+    source = os.path.relpath(path, source_dir)
+    records = [{"source": source, "chunk": i, "text": chunk} for i, chunk in enumerate(chunks)]
+    return records, embed_texts(chunks, dim)
+
+
+def ingest_directory(source_dir, index_dir=None, chunk_size=None, overlap=None,
+                     dim=None, workers=None):
+    """
+    Build an on-disk vector index from every supported file under source_dir
+
+    Files are chunked and embedded in a process pool. Each build is written
+    to its own directory next to index_dir, and index_dir is a symlink that
+    is atomically switched to the new build, so readers never observe a
+    half-written or missing index.
+
+    Args:
+        source_dir: Directory containing the documents
+        index_dir: Destination of the index (defaults to settings.RAG_INDEX_DIR)
+        chunk_size: Words per chunk (defaults to settings.RAG_CHUNK_SIZE)
+        overlap: Words shared between chunks (defaults to settings.RAG_CHUNK_OVERLAP)
+        dim: Embedding dimension (defaults to settings.RAG_EMBEDDING_DIM)
+        workers: Number of ingestion processes; 1 runs in-process
+
+    Returns:
+        dict: The manifest written alongside the index
+    """
+    index_dir = index_dir or settings.RAG_INDEX_DIR
+    chunk_size = chunk_size or settings.RAG_CHUNK_SIZE
+    overlap = settings.RAG_CHUNK_OVERLAP if overlap is None else overlap
+    dim = dim or settings.RAG_EMBEDDING_DIM
+    workers = workers or settings.RAG_INGEST_WORKERS or os.cpu_count() or 1
+
+    paths = list(_iter_document_paths(source_dir))
+    logger.info(f"Ingesting {len(paths)} file(s) from {source_dir} with {workers} worker(s)")
+
+    jobs = [(path, source_dir, chunk_size, overlap, dim) for path in paths]
+    if workers == 1:
+        results = map(_process_file, jobs)
+        _write_index(index_dir, results, dim, chunk_size, overlap, len(paths))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(_process_file, jobs, chunksize=max(1, len(jobs) // (workers * 4)))
+            _write_index(index_dir, results, dim, chunk_size, overlap, len(paths))
+
+    with open(os.path.join(index_dir, MANIFEST_FILE), "r") as f:
+        manifest = json.load(f)
+    logger.info(f"Index written to {index_dir}: {manifest['chunks']} chunk(s)")
+    return manifest
+
+
+def _write_index(index_dir, results, dim, chunk_size, overlap, file_count):
+    base = index_dir.rstrip(os.sep)
+    build_dir = f"{base}.v{time.time_ns()}"
+    os.makedirs(build_dir)
+    try:
+        _write_build(build_dir, results, dim, chunk_size, overlap, file_count)
+        _switch_index(base, build_dir)
+    except BaseException:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+
+    # Earlier builds; indexes already open keep their memory-mapped files after the unlink
+    prefix = f"{os.path.basename(base)}.v"
+    parent = os.path.dirname(base) or "."
+    for name in os.listdir(parent):
+        path = os.path.join(parent, name)
+        if name.startswith(prefix) and name[len(prefix):].isdigit() and path != build_dir:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _write_build(build_dir, results, dim, chunk_size, overlap, file_count):
+    blocks = []
+    offsets = []
+    with open(os.path.join(build_dir, CHUNKS_FILE), "wb") as f:
+        for records, vectors in results:
+            for record in records:
+                offsets.append(f.tell())
+                f.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+            if len(records):
+                blocks.append(vectors)
+
+    vectors = np.concatenate(blocks) if blocks else np.zeros((0, dim), dtype=np.float32)
+    np.save(os.path.join(build_dir, VECTORS_FILE), vectors)
+    np.save(os.path.join(build_dir, OFFSETS_FILE), np.asarray(offsets, dtype=np.int64))
+
+    manifest = {
+        "dim": dim,
+        "chunks": int(vectors.shape[0]),
+        "files": file_count,
+        "chunk_size": chunk_size,
+        "chunk_overlap": overlap,
+    }
+    with open(os.path.join(build_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def _switch_index(base, build_dir):
+    """Point the index_dir symlink at build_dir with a single rename"""
+    if os.path.isdir(base) and not os.path.islink(base):
+        # Index written before builds were versioned: move it to a build directory once
+        legacy_dir = f"{base}.v0"
+        os.rename(base, legacy_dir)
+        os.symlink(os.path.basename(legacy_dir), base)
+    link = f"{base}.link.tmp"
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(os.path.basename(build_dir), link)
+    try:
+        os.replace(link, base)
+    except OSError:
+        os.remove(link)
+        raise
+
+
+class VectorIndex:
+    """
+    Read-only, memory-mapped view of an index written by ingest_directory
+
+    Every file is opened from the build index_dir pointed to when the index
+    was loaded, so a later re-ingest does not change what it reads.
+    """
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        build_dir = os.path.realpath(index_dir)
+        with open(os.path.join(build_dir, MANIFEST_FILE), "r") as f:
+            self.manifest = json.load(f)
+        self.dim = self.manifest["dim"]
+        self.vectors = np.load(os.path.join(build_dir, VECTORS_FILE), mmap_mode="r")
+        self.offsets = np.load(os.path.join(build_dir, OFFSETS_FILE), mmap_mode="r")
+        with open(os.path.join(build_dir, CHUNKS_FILE), "rb") as f:
+            # mmap cannot map an empty file
+            self._chunks = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if len(self) else None
+
+    def __len__(self):
+        return int(self.vectors.shape[0])
+
+    def _read_chunk(self, position):
+        start = int(self.offsets[position])
+        end = self._chunks.find(b"\n", start)
+        return json.loads(self._chunks[start:end if end != -1 else len(self._chunks)])
+
+    def search(self, query, k=4, min_score=0.0):
+        """
+        Return the top-k chunks by cosine similarity to the query
+
+        Args:
+            query: Free-text query
+            k: Maximum number of results
+            min_score: Results scoring below this are dropped
+
+        Returns:
+            list: Dicts with source, chunk, text and score, best first
+        """
+        if len(self) == 0 or k <= 0:
+            return []
+
+        query_vector = embed_texts([query], self.dim)[0]
+        scores = self.vectors @ query_vector
+
+        k = min(k, len(self))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        for position in top:
+            score = float(scores[position])
+            if score <= min_score:
+                break
+            record = self._read_chunk(position)
+            record["score"] = round(score, 4)
+            results.append(record)
+        return results
+
+
+_index_cache = {}
+
+
+def load_index(index_dir=None):
+    """
+    Open (and cache) the index at index_dir
+
+    The cache is keyed on the build index_dir points to, so a re-ingest is
+    picked up without restarting the API.
+
+    Raises:
+        ValueError: If no index exists at index_dir
+    """
+    index_dir = index_dir or settings.RAG_INDEX_DIR
+    manifest_path = os.path.join(index_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        raise ValueError(f"Local document index not found at {index_dir}")
+
+    build = (os.path.realpath(index_dir), os.path.getmtime(manifest_path))
+    cached = _index_cache.get(index_dir)
+    if cached and cached[0] == build:
+        return cached[1]
+
+    index = VectorIndex(index_dir)
+    _index_cache[index_dir] = (build, index)
+    logger.info(f"Loaded local document index from {index_dir} ({len(index)} chunk(s))")
+    return index
+
+
+def format_results(results):
+    """Render search hits as compact text for the LLM"""
+    if not results:
+        return "No matching internal documents found."
+    return "\n\n".join(
+        f"[{r['source']}#{r['chunk']} score={r['score']}]\n{r['text']}" for r in results
+    )
+
+
+def build_retrieval_tool(index_dir=None, k=None):
+    """
+    Create a tool the react agent can call to search the local document index
+
+    Raises:
+        ValueError: If no index exists at index_dir
+    """
+    index = load_index(index_dir)
+    k = k or settings.RAG_TOP_K
+
+    def local_document_search(query: str) -> str:
+        """Search internal documents for passages relevant to the query."""
+        return format_results(index.search(query, k=k))
+
+    return StructuredTool.from_function(
+        func=local_document_search,
+        name="local_document_search",
+        description=(
+            "Search the internal document store for passages relevant to a query. "
+            "Prefer this over web search for questions about internal or domain data."
+        ),
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local document retrieval index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest = subparsers.add_parser("ingest", help="Build the index from a directory of documents")
+    ingest.add_argument("source_dir")
+    ingest.add_argument("--index-dir", default=None)
+    ingest.add_argument("--workers", type=int, default=None)
+
+    search = subparsers.add_parser("search", help="Query the index")
+    search.add_argument("query")
+    search.add_argument("--index-dir", default=None)
+    search.add_argument("-k", type=int, default=None)
+
+    args = parser.parse_args(argv)
+    if args.command == "ingest":
+        manifest = ingest_directory(args.source_dir, args.index_dir, workers=args.workers)
+        print(json.dumps(manifest, indent=2))
+    else:
+        index = load_index(args.index_dir)
+        print(format_results(index.search(args.query, k=args.k or settings.RAG_TOP_K)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import contextvars
+import json
+import math
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any
+
+from langchain_core.tools import BaseTool
+
+from app.config.settings import settings
+from app.common.logger import get_logger
+from app.core.prompts import estimate_tokens
+
+logger = get_logger(__name__)
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_PASSAGE_SPLIT_RE = re.compile(r"\n+|(?<=[.!?])\s+(?=[A-Z0-9\"'(\[])")
+_BOILERPLATE_RE = re.compile(
+    r"cookie|subscribe|sign (?:in|up)|log ?in\b|all rights reserved|privacy policy|terms of (?:use|service)"
+    r"|skip to (?:main )?content|advertisement|share (?:this|on)|follow us|newsletter|javascript"
+    r"|click here|read more|related articles|accept all|©|copyright",
+    re.IGNORECASE
+)
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from how in is it of on or that the this to was what when where which who why "
+    "with does do did can you your i me my we our".split()
+)
+
+# Token counts of the searches made by the current request, summed by compression_stats()
+_request_stats = contextvars.ContextVar("search_compression_stats", default=None)
+_stats_lock = threading.Lock()
+
+
+def _words(text):
+    return [word for word in _WORD_RE.findall(text.lower()) if word not in _STOPWORDS]
+
+
+def _shingles(words, size=3):
+    if len(words) < size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def is_boilerplate(passage, min_words=4):
+    """True for navigation, cookie/legal notices and fragments too short to carry information"""
+    return len(passage.split()) < min_words or bool(_BOILERPLATE_RE.search(passage) and len(passage) < 200)
+
+
+def split_passages(text):
+    """Split page content into sentence/line passages"""
+    return [passage.strip() for passage in _PASSAGE_SPLIT_RE.split(text or "") if passage.strip()]
+
+
+def dedupe(passages, threshold=0.8):
+    """
+    Drop exact and near-duplicate passages, keeping the first occurrence
+
+    Passages are near-duplicates when the Jaccard similarity of their word
+    3-gram shingles is at least threshold.
+    """
+    kept, kept_shingles = [], []
+    for passage in passages:
+        shingles = _shingles(_words(passage["text"]))
+        if any(len(shingles & other) / len(shingles | other) >= threshold for other in kept_shingles):
+            continue
+        kept.append(passage)
+        kept_shingles.append(shingles)
+    return kept
+
+
+def bm25_scores(query, texts, k1=1.2, b=0.75):
+    """BM25 relevance of each text to query, with IDF taken from the texts themselves"""
+    query_words = set(_words(query))
+    documents = [Counter(_words(text)) for text in texts]
+    if not documents or not query_words:
+        return [0.0] * len(texts)
+    average_length = sum(sum(doc.values()) for doc in documents) / len(documents) or 1
+    containing = {word: sum(1 for doc in documents if word in doc) for word in query_words}
+    scores = []
+    for doc in documents:
+        length = sum(doc.values())
+        score = 0.0
+        for word in query_words:
+            frequency = doc.get(word, 0)
+            if not frequency:
+                continue
+            idf = math.log(1 + (len(documents) - containing[word] + 0.5) / (containing[word] + 0.5))
+            score += idf * frequency * (k1 + 1) / (frequency + k1 * (1 - b + b * length / average_length))
+        scores.append(score)
+    return scores
+
+
+def compress_results(output, query, token_budget):
+    """
+    Compress a Tavily search response to the passages most relevant to query
+
+    Boilerplate and (near-)duplicate passages are removed, the rest are
+    ranked by BM25 against the query (ties broken by Tavily's own result
+    score) and kept, best first, until token_budget is used. Kept passages
+    are put back under their source in page order. Only the fields the
+    model uses (answer, title, url, content) are kept.
+
+    Args:
+        output: The search tool's output (Tavily response dict)
+        query: The search query
+        token_budget: Maximum estimated tokens of passage text; 0 = no limit
+
+    Returns:
+        dict: Compressed response with "query", "results" and, if present, "answer"
+    """
+    results = output.get("results") or []
+    passages = []
+    for source, result in enumerate(results):
+        for position, text in enumerate(split_passages(result.get("content", ""))):
+            if not is_boilerplate(text):
+                passages.append({"source": source, "position": position, "text": text})
+    passages = dedupe(passages)
+
+    relevance = bm25_scores(query, [passage["text"] for passage in passages])
+    ranked = sorted(range(len(passages)),
+                    key=lambda i: (relevance[i], results[passages[i]["source"]].get("score") or 0), reverse=True)
+    selected, used = [], 0
+    for i in ranked:
+        tokens = estimate_tokens(passages[i]["text"])
+        if token_budget and used + tokens > token_budget:
+            continue
+        selected.append(passages[i])
+        used += tokens
+
+    by_source = {}
+    for passage in sorted(selected, key=lambda passage: (passage["source"], passage["position"])):
+        by_source.setdefault(passage["source"], []).append(passage["text"])
+    compressed = {
+        "query": output.get("query", query),
+        "results": [{"title": results[source].get("title", ""), "url": results[source].get("url", ""),
+                     "content": " ".join(texts)} for source, texts in by_source.items()],
+    }
+    if output.get("answer"):
+        compressed["answer"] = output["answer"]
+    return compressed
+
+
+def _estimate_output_tokens(output):
+    text = output if isinstance(output, str) else json.dumps(output, ensure_ascii=False, default=str)
+    return estimate_tokens(text)
+
+
+def token_budget_for(model_name):
+    """Per-search token budget for model_name (SEARCH_MODEL_TOKEN_BUDGETS, else SEARCH_TOKEN_BUDGET)"""
+    return settings.SEARCH_MODEL_TOKEN_BUDGETS.get(model_name, settings.SEARCH_TOKEN_BUDGET)
+
+
+@contextmanager
+def compression_stats():
+    """
+    Collect token savings of every compressed search made inside the block
+
+    Yields:
+        dict: searches, tokens_before, tokens_after and tokens_saved, filled in as searches run
+    """
+    stats = {"searches": 0, "tokens_before": 0, "tokens_after": 0, "tokens_saved": 0}
+    token = _request_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _request_stats.reset(token)
+
+
+class CompressedSearchTool(BaseTool):
+    """Compresses the wrapped search tool's results before they reach the model, under its name and schema"""
+
+    inner: Any
+    token_budget: int
+
+    def _run(self, run_manager=None, **kwargs):
+        output = self.inner.invoke(kwargs)
+        if not isinstance(output, dict) or "results" not in output:
+            return output
+        compressed = compress_results(output, kwargs.get("query", ""), self.token_budget)
+
+        before, after = _estimate_output_tokens(output), _estimate_output_tokens(compressed)
+        logger.info(f"Search results compressed from ~{before} to ~{after} tokens")
+        stats = _request_stats.get()
+        if stats is not None:
+            with _stats_lock:
+                stats["searches"] += 1
+                stats["tokens_before"] += before
+                stats["tokens_after"] += after
+                stats["tokens_saved"] += before - after
+        return compressed
+
+
+def compressed_search_tool(tool, model_name):
+    """Wrap a search tool with result compression; returns the tool unchanged when compression is disabled"""
+    if not settings.SEARCH_COMPRESSION_ENABLED:
+        return tool
+    return CompressedSearchTool(name=tool.name, description=tool.description, args_schema=tool.args_schema,
+                                inner=tool, token_budget=token_budget_for(model_name))
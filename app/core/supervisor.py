@@ -0,0 +1,149 @@
+import json
+import operator
+import time
+from typing import Annotated, List, TypedDict
+
+from langchain_core.messages.human import HumanMessage
+from langchain_core.messages.system import SystemMessage
+from langgraph.graph import StateGraph, START, END
+from langgraph.types import Send
+
+from app.common.logger import get_logger
+from app.common.tracing import tracer
+from app.core.results import final_answer
+
+logger = get_logger(__name__)
+
+# Sub-agent kinds the planner can assign, with the tools each one gets
+AGENT_KINDS = {
+    "search": {"allow_search": True, "allow_retrieval": False, "description": "answers with web search"},
+    "retrieval": {"allow_search": False, "allow_retrieval": True, "description": "answers from internal documents"},
+    "general": {"allow_search": False, "allow_retrieval": False, "description": "answers from its own knowledge"},
+}
+
+PLANNER_PROMPT = """Split the user's request into at most {max_subtasks} independent subtasks that can be worked on at the same time.
+Each subtask must be answerable on its own, without the other subtasks' results.
+Available agents:
+{agents}
+Reply with JSON only, in the form {{"subtasks": [{{"task": "...", "agent": "..."}}]}}.
+If the request is simple or cannot be split, reply with a single subtask."""
+
+SYNTHESIS_PROMPT = """Several agents worked on parts of the user's request. Their findings are below.
+Combine them into one complete answer to the original request.
+
+{findings}"""
+
+
+class SupervisorState(TypedDict, total=False):
+    request: str
+    subtasks: List[dict]
+    results: Annotated[List[dict], operator.add]
+    messages: List
+
+
+def parse_plan(text, kinds, default_kind, max_subtasks):
+    """
+    Subtasks from the planner's JSON reply
+
+    Unknown agent kinds fall back to default_kind, and the list is capped at
+    max_subtasks. An unusable reply yields an empty list.
+    """
+    start, end = (text or "").find("{"), (text or "").rfind("}")
+    try:
+        plan = json.loads(text[start:end + 1]) if start != -1 else {}
+    except json.JSONDecodeError:
+        return []
+    subtasks = []
+    for item in plan.get("subtasks", []) if isinstance(plan, dict) else []:
+        if isinstance(item, dict) and isinstance(item.get("task"), str) and item["task"].strip():
+            kind = item.get("agent") if item.get("agent") in kinds else default_kind
+            subtasks.append({"task": item["task"].strip(), "agent": kind})
+    return subtasks[:max_subtasks]
+
+
+class Supervisor:
+    """
+    Plans a request into independent subtasks and runs a sub-agent per subtask in parallel
+
+    The planner model writes the plan, one react sub-agent per subtask runs
+    concurrently (run_subagent(kind, task) -> messages), and the synthesizer
+    model combines their answers. A plan with a single subtask returns that
+    sub-agent's answer directly, with no synthesis call. Wall-clock time is
+    therefore about planning + the slowest subtask + synthesis.
+    """
+
+    def __init__(self, planner, synthesizer, run_subagent, kinds, system_prompt="", max_subtasks=4):
+        self.planner = planner
+        self.synthesizer = synthesizer
+        self.run_subagent = run_subagent
+        self.kinds = kinds
+        self.default_kind = kinds[0]
+        self.system_prompt = system_prompt
+        self.max_subtasks = max_subtasks
+        self.graph = self._build_graph()
+
+    def _build_graph(self):
+        graph = StateGraph(SupervisorState)
+        graph.add_node("plan", self._plan)
+        graph.add_node("subtask", self._subtask)
+        graph.add_node("synthesize", self._synthesize)
+        graph.add_edge(START, "plan")
+        graph.add_conditional_edges("plan", self._fan_out, ["subtask"])
+        graph.add_edge("subtask", "synthesize")
+        graph.add_edge("synthesize", END)
+        return graph.compile()
+
+    def _plan(self, state):
+        agents = "\n".join(f"- {kind}: {AGENT_KINDS[kind]['description']}" for kind in self.kinds)
+        prompt = PLANNER_PROMPT.format(max_subtasks=self.max_subtasks, agents=agents)
+        with tracer.span("supervisor.plan"):
+            reply = self.planner.invoke([SystemMessage(content=prompt), HumanMessage(content=state["request"])])
+        subtasks = parse_plan(reply.content, self.kinds, self.default_kind, self.max_subtasks)
+        if not subtasks:
+            logger.warning("Planner reply had no usable subtasks, running the request as one")
+            subtasks = [{"task": state["request"], "agent": self.default_kind}]
+        logger.info(f"Planned {len(subtasks)} subtask(s): {[subtask['agent'] for subtask in subtasks]}")
+        return {"subtasks": subtasks, "messages": [reply]}
+
+    def _fan_out(self, state):
+        return [Send("subtask", dict(subtask, index=index)) for index, subtask in enumerate(state["subtasks"])]
+
+    def _subtask(self, subtask):
+        start = time.perf_counter()
+        with tracer.span("supervisor.subtask", **{"supervisor.agent": subtask["agent"]}):
+            messages = self.run_subagent(subtask["agent"], subtask["task"])
+        return {"results": [dict(subtask, messages=messages, answer=final_answer(messages) or "",
+                                 latency_ms=round((time.perf_counter() - start) * 1000, 1))]}
+
+    def _synthesize(self, state):
+        results = sorted(state["results"], key=lambda result: result["index"])
+        messages = list(state["messages"])
+        for result in results:
+            messages.extend(result["messages"])
+        if len(results) == 1:
+            return {"messages": messages}
+
+        findings = "\n\n".join(f"Subtask {result['index'] + 1}: {result['task']}\nFindings: {result['answer']}"
+                               for result in results)
+        prompt = [HumanMessage(content=state["request"]),
+                  HumanMessage(content=SYNTHESIS_PROMPT.format(findings=findings))]
+        if self.system_prompt:
+            prompt.insert(0, SystemMessage(content=self.system_prompt))
+        with tracer.span("supervisor.synthesize"):
+            messages.append(self.synthesizer.invoke(prompt))
+        return {"messages": messages}
+
+    def invoke(self, request, config=None):
+        """
+        Run the plan / parallel subtasks / synthesis graph for a request
+
+        Returns:
+            dict: "messages" (planner reply, every sub-agent's messages in
+            plan order, then the synthesized answer) and "results" (one entry
+            per subtask with its agent, answer and latency)
+        """
+        config = dict(config or {})
+        config.setdefault("max_concurrency", self.max_subtasks)
+        state = self.graph.invoke({"request": request, "results": []}, config=config)
+        return {"messages": state["messages"],
+                "results": sorted(state["results"], key=lambda result: result["index"])}
@@ -0,0 +1,104 @@
+import threading
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages.ai import AIMessage
+
+from app.config.settings import settings
+from app.core.prompts import estimate_tokens
+
+
+def empty_usage():
+    """Return a zeroed usage record"""
+    return {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0, "llm_calls": 0}
+
+
+def add_usage(usage, message):
+    """Add the token usage reported on an AIMessage to a usage record"""
+    usage["llm_calls"] += 1
+    usage_metadata = getattr(message, "usage_metadata", None) or {}
+    usage["input_tokens"] += usage_metadata.get("input_tokens", 0)
+    usage["output_tokens"] += usage_metadata.get("output_tokens", 0)
+    usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+    return usage
+
+
+def extract_usage(messages):
+    """
+    Sum token usage over every AIMessage in an agent's final state
+
+    Args:
+        messages: Messages returned by the agent
+
+    Returns:
+        dict: input_tokens, output_tokens, total_tokens and llm_calls
+    """
+    usage = empty_usage()
+    for message in messages:
+        if isinstance(message, AIMessage):
+            add_usage(usage, message)
+    return usage
+
+
+class AttemptUsage(BaseCallbackHandler):
+    """
+    Counts the tokens one agent run has used so far, for runs whose final state is thrown away
+
+    A hedge's losing attempt is cancelled at its next step, so its messages never
+    come back; its model calls are still billed by the provider. snapshot()
+    includes the estimated input of calls still in flight, whose output is unknown.
+    """
+
+    def __init__(self):
+        self.usage = empty_usage()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        text = "".join(str(message.content) for batch in messages for message in batch)
+        with self._lock:
+            self._in_flight[run_id] = estimate_tokens(text)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            self._in_flight.pop(run_id, None)
+            for generations in response.generations:
+                for generation in generations:
+                    add_usage(self.usage, getattr(generation, "message", None))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._in_flight.pop(run_id, None)
+
+    def snapshot(self):
+        """Return the usage so far, counting calls still in flight at their estimated input"""
+        with self._lock:
+            usage = dict(self.usage)
+            usage["llm_calls"] += len(self._in_flight)
+            usage["input_tokens"] += sum(self._in_flight.values())
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        return usage
+
+
+def merge_usage(usage, other):
+    """Add the token counts of usage record other into usage"""
+    for field in ("input_tokens", "output_tokens", "llm_calls"):
+        usage[field] += other.get(field, 0)
+    usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+    return usage
+
+
+def estimate_cost(model_name, input_tokens, output_tokens):
+    """
+    Estimate the USD cost of a call from settings.MODEL_PRICING
+
+    Unknown models are costed at zero rather than failing the request.
+    """
+    input_price, output_price = settings.MODEL_PRICING.get(model_name, (0.0, 0.0))
+    return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+def usage_cost(model_name, usage, usage_by_model=None):
+    """Estimate the USD cost of a run's usage, priced per model when it ran several (usage_by_model)"""
+    runs = usage_by_model or {model_name: usage or {}}
+    return sum(estimate_cost(name, run.get("input_tokens", 0), run.get("output_tokens", 0))
+               for name, run in runs.items())
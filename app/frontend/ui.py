@@ -14,6 +14,7 @@ system_prompt = st.text_area("Define your AI Agent: " , height=70)
 selected_model = st.selectbox("Select your AI model: ", settings.ALLOWED_MODEL_NAMES)
 
 allow_web_search = st.checkbox("Allow web search")
+allow_retrieval = st.checkbox("Search internal documents")
 
 user_query = st.text_area("Enter your query : " , height=150)
 
@@ -25,7 +26,8 @@ if st.button("Ask Agent") and user_query.strip():
         "model_name" : selected_model,
         "system_prompt" : system_prompt,
         "messages" : [user_query],
-        "allow_search" : allow_web_search
+        "allow_search" : allow_web_search,
+        "allow_retrieval" : allow_retrieval
     }
 
     try:
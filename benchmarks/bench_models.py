@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Benchmark the allowed models on a versioned prompt dataset and report the quality/latency/cost Pareto frontier
+
+Usage:
+    python -m benchmarks.bench_models [--models llama-3.1-8b-instant,openai/gpt-oss-20b] [--search off,on]
+        [--repeat 3] [--concurrency 4] [--mode live|record|replay|local] [--cassette NAME]
+
+Every prompt of the dataset runs through get_response_from_ai_agents for
+every model and search setting. --mode record runs live and saves every
+model and search call to a cassette; replay repeats that run offline at
+the recorded latencies. local uses the deterministic local provider, which
+exercises the harness, tokens and latency but not answer quality.
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from app.config.settings import settings
+from app.core.ai_agent import get_response_from_ai_agents
+from app.core.usage import usage_cost
+
+DEFAULT_DATASET = os.path.join(os.path.dirname(__file__), "datasets", "agent_prompts_v1.json")
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "results")
+MODES = ("live", "record", "replay", "local")
+
+
+def load_dataset(path):
+    """Load a prompt dataset, adding the sha256 of its file so results name the exact prompts they ran"""
+    with open(path, "rb") as f:
+        raw = f.read()
+    dataset = json.loads(raw)
+    dataset["sha256"] = hashlib.sha256(raw).hexdigest()
+    return dataset
+
+
+def score_response(response, expected):
+    """
+    Automatic quality score of an answer, from 0 to 1
+
+    Each check in expected scores 0-1 and the score is their mean:
+    "contains" (share of the strings present, case-insensitive), "any"
+    (one of the strings present), "regex" (matches, case-insensitive) and
+    "max_words" (1 up to the limit, falling to 0 at twice the limit).
+    """
+    text = (response or "").lower()
+    checks = []
+    if expected.get("contains"):
+        checks.append(sum(s.lower() in text for s in expected["contains"]) / len(expected["contains"]))
+    if expected.get("any"):
+        checks.append(float(any(s.lower() in text for s in expected["any"])))
+    if expected.get("regex"):
+        checks.append(float(re.search(expected["regex"], response or "", re.IGNORECASE) is not None))
+    if expected.get("max_words"):
+        words, limit = len(text.split()), expected["max_words"]
+        checks.append(max(0.0, min(1.0, 2 - words / limit)))
+    return sum(checks) / len(checks) if checks else 1.0
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of values, or None if there are none"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(p / 100 * len(ordered))) - 1]
+
+
+def configure_mode(mode, cassette):
+    """Point the agent stack at live upstreams, a cassette, or the local provider"""
+    if mode == "local":
+        settings.LLM_PROVIDER = "local"
+        settings.MODEL_PROVIDERS = {}
+    settings.CASSETTE_MODE = {"record": "record", "replay": "replay"}.get(mode, "off")
+    settings.CASSETTE_NAME = cassette
+
+
+def run_one(run_agent, model, search, prompt, system_prompt):
+    metadata = {}
+    start = time.perf_counter()
+    try:
+        response = run_agent(model, prompt["messages"], search, system_prompt, metadata=metadata)
+        error = None
+    except Exception as e:
+        response, error = None, f"{type(e).__name__}: {e}"
+    latency = time.perf_counter() - start
+    usage = metadata.get("usage") or {}
+    # A hedged run also spent tokens on its cancelled attempt, possibly on another model
+    runs = (metadata.get("usage_by_model") or {model: usage}).values()
+    input_tokens = sum(run.get("input_tokens", 0) for run in runs)
+    output_tokens = sum(run.get("output_tokens", 0) for run in runs)
+    return {
+        "model": model,
+        "search": search,
+        "prompt_id": prompt["id"],
+        "category": prompt.get("category"),
+        "latency_s": round(latency, 4),
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "cost_usd": usage_cost(model, usage, metadata.get("usage_by_model")),
+        "quality": 0.0 if error else round(score_response(response, prompt.get("expected", {})), 4),
+        "error": error,
+        "response": response,
+    }
+
+
+def run_benchmark(dataset, models, search_modes=(False, True), repeat=1, concurrency=4,
+                  run_agent=get_response_from_ai_agents):
+    """
+    Run every prompt for every model and search setting
+
+    Args:
+        dataset: Dataset from load_dataset
+        models: Model names to benchmark
+        search_modes: allow_search values to run each prompt with
+        repeat: Runs per prompt, model and search setting
+        concurrency: Runs in flight at once
+        run_agent: get_response_from_ai_agents or a stand-in with its signature
+
+    Returns:
+        list: One dict per run (latency, tokens, cost, quality, error), in submission order
+    """
+    jobs = [(model, search, prompt) for model in models for search in search_modes
+            for prompt in dataset["prompts"] for _ in range(repeat)]
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = [pool.submit(run_one, run_agent, model, search, prompt, dataset["system_prompt"])
+                   for model, search, prompt in jobs]
+        return [future.result() for future in futures]
+
+
+def summarize(runs, latency_percentile=90):
+    """
+    Aggregate runs per (model, search) configuration and mark the Pareto frontier
+
+    allow_search comes with the request rather than being a routing
+    choice, so each search setting has its own frontier: a configuration
+    is on it when no other model with the same setting has at least its
+    quality with no more p<latency_percentile> latency and cost per
+    request, and is strictly better on one of them. Failed runs count as
+    quality 0; latency and tokens are over successful runs only.
+
+    Returns:
+        list: Summary dicts sorted by quality, best first
+    """
+    groups = {}
+    for run in runs:
+        groups.setdefault((run["model"], run["search"]), []).append(run)
+
+    summaries = []
+    for (model, search), group in groups.items():
+        ok = [run for run in group if not run["error"]]
+        latencies = [run["latency_s"] for run in ok]
+        summaries.append({
+            "model": model,
+            "search": search,
+            "runs": len(group),
+            "errors": len(group) - len(ok),
+            "quality": round(sum(run["quality"] for run in group) / len(group), 4),
+            "p50_s": percentile(latencies, 50),
+            "p90_s": percentile(latencies, 90),
+            "p99_s": percentile(latencies, 99),
+            "frontier_latency_s": percentile(latencies, latency_percentile),
+            "input_tokens": round(sum(run["input_tokens"] for run in ok) / len(ok), 1) if ok else 0,
+            "output_tokens": round(sum(run["output_tokens"] for run in ok) / len(ok), 1) if ok else 0,
+            "cost_per_request_usd": round(sum(run["cost_usd"] for run in group) / len(group), 8),
+        })
+
+    def objectives(summary):
+        latency = summary["frontier_latency_s"]
+        return -summary["quality"], float("inf") if latency is None else latency, summary["cost_per_request_usd"]
+
+    for summary in summaries:
+        mine = objectives(summary)
+        summary["pareto"] = not any(
+            all(a <= b for a, b in zip(objectives(other), mine)) and objectives(other) != mine
+            for other in summaries if other is not summary and other["search"] == summary["search"])
+    return sorted(summaries, key=lambda s: (-s["quality"], objectives(s)[1], s["cost_per_request_usd"]))
+
+
+def recommend(summaries, min_quality=0.8):
+    """
+    Routing defaults per search setting, from the frontier
+
+    Returns:
+        dict: "search_off"/"search_on" -> {"best_quality", "fastest", "cheapest"} model names;
+        fastest and cheapest only consider models with at least min_quality (None if none qualify)
+    """
+    recommendations = {}
+    for search in sorted({s["search"] for s in summaries}):
+        frontier = [s for s in summaries if s["search"] == search and s["pareto"]]
+        good = [s for s in frontier if s["quality"] >= min_quality]
+        fastest = min(good, key=lambda s: s["frontier_latency_s"], default=None)
+        cheapest = min(good, key=lambda s: s["cost_per_request_usd"], default=None)
+        recommendations[f"search_{'on' if search else 'off'}"] = {
+            "best_quality": frontier[0]["model"] if frontier else None,
+            "fastest": fastest and fastest["model"],
+            "cheapest": cheapest and cheapest["model"],
+        }
+    return recommendations
+
+
+def format_report(meta, summaries, recommendations):
+    """Markdown report: run details, per-configuration table and routing recommendations"""
+    p = meta["latency_percentile"]
+    lines = [
+        f"# Model benchmark: {meta['dataset']} v{meta['dataset_version']}",
+        "",
+        f"- Date: {meta['started_at']}, mode: {meta['mode']}, repeat: {meta['repeat']}, "
+        f"concurrency: {meta['concurrency']}",
+        f"- Dataset sha256: {meta['dataset_sha256'][:12]}, prompts: {meta['prompts']}",
+        f"- Frontier objectives: quality (higher), p{p:g} latency and cost per request (lower); * = on the frontier",
+        "",
+        "| | model | search | quality | p50 s | p90 s | p99 s | in tokens | out tokens | $/request | errors |",
+        "|---|---|---|---|---|---|---|---|---|---|---|",
+    ]
+    for s in summaries:
+        lines.append(f"| {'*' if s['pareto'] else ''} | {s['model']} | {'on' if s['search'] else 'off'} | "
+                     f"{s['quality']:.3f} | {_seconds(s['p50_s'])} | {_seconds(s['p90_s'])} | {_seconds(s['p99_s'])} | "
+                     f"{s['input_tokens']:g} | {s['output_tokens']:g} | {s['cost_per_request_usd']:.6f} | "
+                     f"{s['errors']}/{s['runs']} |")
+    lines += ["", f"## Routing defaults (quality >= {meta['min_quality']:g})", ""]
+    for search, picks in recommendations.items():
+        lines.append(f"- {search.replace('_', ' ')}: best quality {picks['best_quality']}, "
+                     f"fastest {picks['fastest']}, cheapest {picks['cheapest']}")
+    return "\n".join(lines) + "\n"
+
+
+def _seconds(value):
+    return "-" if value is None else f"{value:.3f}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dataset", default=DEFAULT_DATASET)
+    parser.add_argument("--models", default=",".join(settings.ALLOWED_MODEL_NAMES),
+                        help="Comma-separated model names (default: ALLOWED_MODEL_NAMES)")
+    parser.add_argument("--search", default="off,on", help="Comma-separated search settings: off, on")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--mode", choices=MODES, default="live")
+    parser.add_argument("--cassette", default=None, help="Cassette name for record/replay (default: bench-<dataset>-v<version>)")
+    parser.add_argument("--latency-percentile", type=float, default=90, help="Latency percentile the frontier uses")
+    parser.add_argument("--min-quality", type=float, default=0.8, help="Quality floor for the fastest/cheapest picks")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    args = parser.parse_args(argv)
+
+    dataset = load_dataset(args.dataset)
+    models = [m.strip() for m in args.models.split(",") if m.strip()]
+    search_modes = [{"off": False, "on": True}[s.strip()] for s in args.search.split(",")]
+    configure_mode(args.mode, args.cassette or f"bench-{dataset['name']}-v{dataset['version']}")
+
+    started_at = datetime.now()
+    runs = run_benchmark(dataset, models, search_modes, args.repeat, args.concurrency)
+    summaries = summarize(runs, args.latency_percentile)
+    recommendations = recommend(summaries, args.min_quality)
+    meta = {"dataset": dataset["name"], "dataset_version": dataset["version"], "dataset_sha256": dataset["sha256"],
+            "prompts": len(dataset["prompts"]), "mode": args.mode, "repeat": args.repeat,
+            "concurrency": args.concurrency, "latency_percentile": args.latency_percentile,
+            "min_quality": args.min_quality, "started_at": started_at.isoformat(timespec="seconds")}
+    report = format_report(meta, summaries, recommendations)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    stem = os.path.join(args.output_dir, f"{dataset['name']}-v{dataset['version']}-{args.mode}-"
+                                         f"{started_at.strftime('%Y%m%d-%H%M%S')}")
+    with open(f"{stem}.json", "w") as f:
+        json.dump({"meta": meta, "summaries": summaries, "recommendations": recommendations, "runs": runs}, f,
+                  indent=2)
+    with open(f"{stem}.md", "w") as f:
+        f.write(report)
+    print(report)
+    print(f"Results written to {stem}.json and {stem}.md")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark response serialization and compression cost by payload size
+
+Usage:
+    python -m benchmarks.bench_serialization [--sizes 1000,10000,100000] [--repeat 200]
+"""
+import argparse
+import json
+import random
+import string
+import time
+import zlib
+
+from app.backend import serialization
+from app.backend.compression import brotli
+
+
+def make_payload(size):
+    """Build a /chat/batch-shaped payload of roughly size bytes"""
+    rng = random.Random(size)
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9))) for _ in range(500)]
+    results = []
+    while len(json.dumps({"results": results})) < size:
+        text = " ".join(rng.choices(words, k=120))
+        results.append({
+            "index": len(results),
+            "status_code": 200,
+            "response": text,
+            "metadata": {"usage": {"input_tokens": 812, "output_tokens": 240, "total_tokens": 1052, "llm_calls": 2},
+                         "cost_usd": 0.0000598},
+        })
+    return {"results": results}
+
+
+def _time(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        out = fn()
+    return (time.perf_counter() - start) / repeat * 1e6, out
+
+
+def run(sizes, repeat):
+    encoders = [("json", lambda p: json.dumps(p).encode("utf-8"))]
+    if serialization.orjson is not None:
+        encoders.append(("orjson", lambda p: serialization.orjson.dumps(p)))
+    if serialization.ormsgpack is not None:
+        encoders.append(("msgpack", serialization.dumps_msgpack))
+    encoders.append(("ndjson", lambda p: b"".join(serialization.ndjson_line(r) for r in p["results"])))
+
+    compressors = [("gzip-1", lambda b: zlib.compress(b, 1)), ("gzip-6", lambda b: zlib.compress(b, 6))]
+    if brotli is not None:
+        compressors.append(("br-4", lambda b: brotli.compress(b, quality=4)))
+
+    print(f"{'size':>9} {'step':<16} {'us/op':>10} {'bytes':>10} {'ratio':>7}")
+    for size in sizes:
+        payload = make_payload(size)
+        raw = json.dumps(payload).encode("utf-8")
+        for name, encode in encoders:
+            elapsed, body = _time(lambda: encode(payload), repeat)
+            print(f"{size:>9} {'encode:' + name:<16} {elapsed:>10.1f} {len(body):>10} {len(body) / len(raw):>7.2f}")
+        for name, compress in compressors:
+            elapsed, body = _time(lambda: compress(raw), max(1, repeat // 4))
+            print(f"{size:>9} {'compress:' + name:<16} {elapsed:>10.1f} {len(body):>10} {len(body) / len(raw):>7.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000",
+                        help="Comma-separated payload sizes in bytes")
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args(argv)
+    run([int(s) for s in args.sizes.split(",")], args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,8 @@ import pytest
 from unittest.mock import Mock, patch, MagicMock
 from app.core.ai_agent import get_response_from_ai_agents
 from langchain_core.messages.ai import AIMessage
+from langchain_core.messages.human import HumanMessage
+from langchain_core.messages.tool import ToolMessage
 
 
 class TestGetResponseFromAIAgents:
@@ -198,3 +200,114 @@ class TestGetResponseFromAIAgents:
         
         assert result == "Second response"
 
+    
+    @patch('app.core.ai_agent.settings')
+    @patch('app.core.ai_agent.ChatGroq')
+    @patch('app.core.ai_agent.create_react_agent')
+    def test_metadata_reports_token_usage(self, mock_create_agent, mock_chatgroq, mock_settings):
+        """Test that a metadata dict is filled with token usage"""
+        mock_settings.GROQ_API_KEY = "test_groq_key"
+        
+        mock_agent = MagicMock()
+        mock_agent.invoke.return_value = {
+            "messages": [AIMessage(content="Answer", usage_metadata={
+                "input_tokens": 12, "output_tokens": 3, "total_tokens": 15
+            })]
+        }
+        mock_create_agent.return_value = mock_agent
+        
+        metadata = {}
+        get_response_from_ai_agents(
+            llm_id="llama-3.1-8b-instant",
+            query=["test message"],
+            allow_search=False,
+            system_prompt="You are a helpful assistant",
+            metadata=metadata
+        )
+        
+        assert metadata["usage"]["input_tokens"] == 12
+        assert metadata["usage"]["output_tokens"] == 3
+        assert metadata["usage"]["llm_calls"] == 1
+    
+    @patch('app.core.ai_agent.settings')
+    @patch('app.core.ai_agent.ChatGroq')
+    @patch('app.core.ai_agent.create_react_agent')
+    def test_history_prepended(self, mock_create_agent, mock_chatgroq, mock_settings):
+        """Test that session history is sent ahead of the new messages"""
+        mock_settings.GROQ_API_KEY = "test_groq_key"
+        
+        mock_agent = MagicMock()
+        mock_agent.invoke.return_value = {"messages": [AIMessage(content="Answer")]}
+        mock_create_agent.return_value = mock_agent
+        
+        get_response_from_ai_agents(
+            llm_id="llama-3.1-8b-instant",
+            query=["follow-up"],
+            allow_search=False,
+            system_prompt="You are a helpful assistant",
+            history=[{"role": "user", "content": "first"}, {"role": "assistant", "content": "reply"}]
+        )
+        
+        messages = mock_agent.invoke.call_args.args[0]["messages"]
+        assert [(m.type, m.content) for m in messages] == [
+            ("human", "first"), ("ai", "reply"), ("human", "follow-up")
+        ]
+    
+    @patch('app.core.ai_agent.settings')
+    @patch('app.core.ai_agent.ChatGroq')
+    @patch('app.core.ai_agent.create_react_agent')
+    def test_usage_excludes_history(self, mock_create_agent, mock_chatgroq, mock_settings):
+        """Test that assistant turns from the session history are not counted as this run's model calls"""
+        mock_settings.GROQ_API_KEY = "test_groq_key"
+
+        def invoke(state, **kwargs):
+            answer = AIMessage(content="Answer", usage_metadata={"input_tokens": 20, "output_tokens": 2,
+                                                                 "total_tokens": 22})
+            return {"messages": state["messages"] + [answer]}
+
+        mock_agent = MagicMock()
+        mock_agent.invoke.side_effect = invoke
+        mock_create_agent.return_value = mock_agent
+        metadata = {}
+
+        get_response_from_ai_agents(
+            llm_id="llama-3.1-8b-instant",
+            query=["follow-up"],
+            allow_search=False,
+            system_prompt="You are a helpful assistant",
+            history=[{"role": "user", "content": "first"}, {"role": "assistant", "content": "reply"}],
+            metadata=metadata
+        )
+
+        assert metadata["usage"]["llm_calls"] == 1
+        assert metadata["usage"]["input_tokens"] == 20
+
+    @patch('app.core.ai_agent.settings')
+    @patch('app.core.ai_agent.ChatGroq')
+    @patch('app.core.ai_agent.create_react_agent')
+    def test_trace_only_on_request(self, mock_create_agent, mock_chatgroq, mock_settings):
+        """Test that the run's tool calls and results are reported only when include_trace is set"""
+        mock_settings.GROQ_API_KEY = "test_groq_key"
+        
+        tool_call = {"name": "tavily_search", "args": {"query": "q"}, "id": "call_1"}
+        mock_agent = MagicMock()
+        mock_agent.invoke.return_value = {"messages": [
+            HumanMessage(content="test message"),
+            AIMessage(content="", tool_calls=[tool_call]),
+            ToolMessage(content="results", name="tavily_search", tool_call_id="call_1"),
+            AIMessage(content="Answer"),
+        ]}
+        mock_create_agent.return_value = mock_agent
+        
+        metadata = {}
+        get_response_from_ai_agents("llama-3.1-8b-instant", ["test message"], True, "prompt", metadata=metadata)
+        assert "trace" not in metadata
+        
+        result = get_response_from_ai_agents("llama-3.1-8b-instant", ["test message"], True, "prompt",
+                                             metadata=metadata, include_trace=True)
+        assert result == "Answer"
+        assert metadata["trace"] == [
+            {"type": "ai", "content": "", "tool_calls": [tool_call]},
+            {"type": "tool", "name": "tavily_search", "tool_call_id": "call_1", "content": "results"},
+            {"type": "ai", "content": "Answer", "tool_calls": []},
+        ]
@@ -0,0 +1,60 @@
+"""Tests for benchmarks.bench_models"""
+import pytest
+from benchmarks.bench_models import (
+    DEFAULT_DATASET, load_dataset, recommend, run_benchmark, run_one, score_response, summarize
+)
+from app.core.usage import estimate_cost
+
+# (answer, latency in seconds, output tokens) of each fake model
+MODELS = {"fast-wrong": ("wrong", 0.1, 10), "slow-right": ("right", 2.0, 10), "slow-wrong": ("wrong", 3.0, 50)}
+
+
+def fake_agent(model, messages, allow_search, system_prompt, metadata=None):
+    answer, seconds, output_tokens = MODELS[model]
+    if model == "slow-wrong" and allow_search:
+        raise ValueError("TAVILY_API_KEY is not set")
+    metadata["usage"] = {"input_tokens": 100, "output_tokens": output_tokens}
+    return answer
+
+
+class TestBenchModels:
+    """Test cases for scoring, summaries and the Pareto frontier"""
+
+    def test_score_response(self):
+        expected = {"contains": ["red", "blue"], "regex": r"\bgreen\b", "max_words": 4}
+        assert score_response("Red, blue, green", expected) == 1.0
+        assert score_response("red and eight more words in this long answer", expected) == 0.5 / 3
+        assert score_response(None, {"any": ["x"]}) == 0.0
+
+    def test_dataset_is_versioned(self):
+        dataset = load_dataset(DEFAULT_DATASET)
+        assert dataset["version"] and len(dataset["sha256"]) == 64
+        assert len({prompt["id"] for prompt in dataset["prompts"]}) == len(dataset["prompts"])
+
+    def test_frontier_and_routing_defaults(self):
+        dataset = {"system_prompt": "", "prompts": [{"id": "q", "messages": ["q"], "expected": {"contains": ["right"]}}]}
+        runs = run_benchmark(dataset, list(MODELS), repeat=2, concurrency=3, run_agent=fake_agent)
+        for run in runs:
+            run["latency_s"] = MODELS[run["model"]][1]
+        summaries = summarize(runs)
+
+        frontier = {(s["model"], s["search"]) for s in summaries if s["pareto"]}
+        assert frontier == {("slow-right", False), ("fast-wrong", False), ("slow-right", True), ("fast-wrong", True)}
+        failed = next(s for s in summaries if s["model"] == "slow-wrong" and s["search"])
+        assert (failed["errors"], failed["p50_s"]) == (2, None)
+        assert recommend(summaries, min_quality=0.8)["search_off"] == {
+            "best_quality": "slow-right", "fastest": "slow-right", "cheapest": "slow-right"}
+
+    def test_run_priced_per_model(self):
+        """Test a run that used several models (a hedge to another model) is priced per model"""
+        def hedged_agent(model, messages, allow_search, system_prompt, metadata=None):
+            metadata["usage"] = {"input_tokens": 100, "output_tokens": 10}
+            metadata["usage_by_model"] = {"llama-3.3-70b-versatile": {"input_tokens": 100, "output_tokens": 10},
+                                          "llama-3.1-8b-instant": {"input_tokens": 50, "output_tokens": 0}}
+            return "right"
+
+        run = run_one(hedged_agent, "llama-3.1-8b-instant", False, {"id": "q", "messages": ["q"]}, "")
+
+        assert (run["input_tokens"], run["output_tokens"]) == (150, 10)
+        assert run["cost_usd"] == pytest.approx(estimate_cost("llama-3.3-70b-versatile", 100, 10)
+                                                + estimate_cost("llama-3.1-8b-instant", 50, 0))
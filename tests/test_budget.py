@@ -0,0 +1,147 @@
+"""Tests for app.core.budget module"""
+import pytest
+from unittest.mock import patch
+from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+from langchain_core.messages.ai import AIMessage
+from langchain_core.messages.human import HumanMessage
+from langchain_core.tools import tool
+from langgraph.prebuilt import create_react_agent
+from app.core.budget import StepBudget, resolve_limits, FINAL_ANSWER_PROMPT
+from app.core.ai_agent import get_response_from_ai_agents
+
+
+class ToolCallingFakeModel(FakeMessagesListChatModel):
+    """Fake chat model that accepts tools and records the messages it was sent"""
+
+    seen: list = []
+
+    def bind_tools(self, tools, tool_choice=None, **kwargs):
+        return self
+
+    def _generate(self, messages, *args, **kwargs):
+        self.seen.append(messages)
+        return super()._generate(messages, *args, **kwargs)
+
+
+@tool
+def search(query: str) -> str:
+    """Search the web"""
+    return f"results for {query}"
+
+
+def search_call(index, query="q", answer="", tokens=100):
+    return AIMessage(content=answer, tool_calls=[{"name": "search", "args": {"query": query}, "id": f"call_{index}"}],
+                     usage_metadata={"input_tokens": tokens, "output_tokens": 0, "total_tokens": tokens})
+
+
+def run_agent(budget, responses):
+    model = ToolCallingFakeModel(responses=responses, seen=[])
+    agent = create_react_agent(model=model, tools=[search], pre_model_hook=budget.pre_model_hook,
+                               post_model_hook=budget.post_model_hook)
+    result = agent.invoke({"messages": [HumanMessage(content="question")]},
+                          config={"recursion_limit": budget.recursion_limit})
+    return result["messages"], model.seen
+
+
+class TestResolveLimits:
+    """Test cases for resolve_limits"""
+
+    @patch('app.core.budget.settings')
+    def test_model_limits_and_request_tightening(self, mock_settings):
+        mock_settings.AGENT_MAX_STEPS = 10
+        mock_settings.AGENT_MAX_TOOL_CALLS = 0
+        mock_settings.AGENT_MAX_TOKENS = 0
+        mock_settings.AGENT_MODEL_LIMITS = {"big-model": {"max_steps": 4}}
+
+        assert resolve_limits("big-model") == {"max_steps": 4, "max_tool_calls": 0, "max_tokens": 0}
+        assert resolve_limits("big-model", {"max_steps": 8, "max_tool_calls": 2, "max_tokens": None}) == \
+            {"max_steps": 4, "max_tool_calls": 2, "max_tokens": 0}
+        assert resolve_limits("other", {"max_steps": 3})["max_steps"] == 3
+
+
+class TestStepBudget:
+    """Test cases for StepBudget as react agent hooks"""
+
+    def test_step_limit_asks_for_final_answer(self):
+        """Test the last allowed step is told to answer and the loop ends there"""
+        budget = StepBudget(max_steps=2)
+        messages, seen = run_agent(budget, [search_call(1), AIMessage(content="final answer"), search_call(2)])
+
+        assert messages[-1].content == "final answer"
+        assert seen[-1][-1].content == FINAL_ANSWER_PROMPT
+        assert budget.report(messages)["llm_calls"] == 2
+        assert budget.report(messages)["limit_reached"] == "max_steps"
+
+    def test_tool_calls_dropped_with_partial_answer(self):
+        """Test a model that keeps calling tools is stopped with its latest text"""
+        budget = StepBudget(max_steps=2)
+        messages, _ = run_agent(budget, [search_call(1, answer="Partial answer"), search_call(2)])
+
+        assert not messages[-1].tool_calls
+        assert messages[-1].content == "Partial answer"
+        assert budget.report(messages)["tool_calls"] == 1
+
+    def test_tool_calls_trimmed(self):
+        budget = StepBudget(max_tool_calls=1)
+        double = AIMessage(content="", tool_calls=[
+            {"name": "search", "args": {"query": "a"}, "id": "call_a"},
+            {"name": "search", "args": {"query": "b"}, "id": "call_b"},
+        ])
+        messages, _ = run_agent(budget, [double, AIMessage(content="answer")])
+
+        assert [m.tool_call_id for m in messages if m.type == "tool"] == ["call_a"]
+        assert messages[-1].content == "answer"
+        assert budget.report(messages)["limit_reached"] == "max_tool_calls"
+
+    def test_latency_target_asks_for_final_answer(self):
+        """Test the final answer is requested once another step at the average step time would miss the target"""
+        budget = StepBudget(max_seconds=10)
+        budget.started = 0
+        with patch('app.core.budget.time.monotonic', return_value=6):
+            messages, seen = run_agent(budget, [search_call(1), AIMessage(content="final answer"), search_call(2)])
+
+        assert messages[-1].content == "final answer"
+        assert seen[-1][-1].content == FINAL_ANSWER_PROMPT
+        assert budget.report(messages)["limit_reached"] == "max_seconds"
+        assert budget.report(messages)["limits"]["max_seconds"] == 10
+
+    def test_token_limit(self):
+        budget = StepBudget(max_tokens=150)
+        messages, _ = run_agent(budget, [search_call(1, tokens=100), search_call(2, tokens=100), search_call(3)])
+
+        assert budget.report(messages) == {
+            "llm_calls": 3, "tool_calls": 2, "total_tokens": 300, "limit_reached": "max_tokens",
+            "limits": {"max_steps": 0, "max_tool_calls": 0, "max_tokens": 150},
+        }
+        assert "could not finish" in messages[-1].content
+
+    def test_input_messages_not_counted(self):
+        budget = StepBudget(max_steps=1, start=2)
+        history = [HumanMessage(content="earlier"), AIMessage(content="earlier answer")]
+        assert budget.counts(history) == {"llm_calls": 0, "tool_calls": 0, "total_tokens": 0}
+
+
+class TestAgentBudget:
+    """Test cases for the step budget inside get_response_from_ai_agents"""
+
+    @pytest.fixture(autouse=True)
+    def limits(self):
+        with patch('app.core.budget.settings', AGENT_MAX_STEPS=0, AGENT_MAX_TOOL_CALLS=0, AGENT_MAX_TOKENS=0,
+                   AGENT_MODEL_LIMITS={"llama-3.1-8b-instant": {"max_steps": 2}}):
+            yield
+
+    @patch('app.core.ai_agent.settings', GROQ_API_KEY="test_groq_key", TAVILY_API_KEY="test_tavily_key")
+    @patch('app.core.ai_agent.TavilySearch')
+    @patch('app.core.ai_agent.ChatGroq')
+    def test_steps_metadata(self, mock_chatgroq, mock_tavily, mock_settings):
+        mock_tavily.return_value = search
+        mock_chatgroq.return_value = ToolCallingFakeModel(
+            responses=[search_call(1), AIMessage(content="Answer"), search_call(2)], seen=[])
+
+        metadata = {}
+        result = get_response_from_ai_agents("llama-3.1-8b-instant", ["hi"], True, "prompt",
+                                             metadata=metadata, limits={"max_tool_calls": 5})
+
+        assert result == "Answer"
+        assert metadata["steps"]["llm_calls"] == 2
+        assert metadata["steps"]["limits"] == {"max_steps": 2, "max_tool_calls": 5, "max_tokens": 0}
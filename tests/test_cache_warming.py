@@ -0,0 +1,175 @@
+"""Tests for app.backend.cache_warming module"""
+import json
+import os
+import threading
+import pytest
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+from fastapi.testclient import TestClient
+from app.backend import api
+from app.backend.cache_warming import (
+    CacheWarmer, QUERY_RECORD_MARKER, format_query_record, iter_query_records, next_peak_end, parse_hours,
+    top_patterns
+)
+from app.common.logger import LogMaintenance
+from app.common.shared_state import InMemorySharedState
+from app.core.caching import ResponseCache
+
+NOW = datetime(2026, 10, 19, 3, 0)
+
+
+def record(message, model="llama-3.1-8b-instant", cached=False, cost=0.01):
+    return {"model_name": model, "system_prompt": "Be brief", "messages": [message], "allow_search": False,
+            "allow_retrieval": False, "generation": None, "supervisor": False, "tenant": "default",
+            "cached": cached, "cost_usd": cost}
+
+
+def log_line(timestamp, entry):
+    return f"{timestamp},123 - app.backend.api - INFO - {format_query_record(entry)}\n"
+
+
+def write_logs(log_dir):
+    lines = {
+        "2026-10-18": [
+            log_line("2026-10-18 09:00:00", record("weather?")),
+            log_line("2026-10-18 10:00:00", record("weather?", cached=True, cost=0)),
+            log_line("2026-10-18 11:00:00", record("news?", cost=0.02)),
+            log_line("2026-10-18 23:00:00", record("night owl?")),
+            "2026-10-18 11:00:01,000 - app.backend.api - ERROR - Full Traceback:\n",
+            f'  File "x.py", line 1 {QUERY_RECORD_MARKER}not a record\n',
+        ],
+        "2026-10-10": [log_line("2026-10-10 09:00:00", record("news?", cost=0.02))],
+    }
+    for day, day_lines in lines.items():
+        (log_dir / f"log_{day}.log").write_text("".join(day_lines))
+
+
+class TestMining:
+    """Test cases for reading and ranking query records"""
+
+    def test_parse_hours(self):
+        assert parse_hours("2-4, 22") == {2, 3, 4, 22}
+        assert parse_hours("") == set()
+
+    def test_records_and_ranking(self, tmp_path):
+        """Test only peak-hour records count, recent ones weigh more and costs come from uncached runs"""
+        write_logs(tmp_path)
+        records = list(iter_query_records(str(tmp_path), days=14, now=NOW))
+        assert len(records) == 5
+
+        ranked = top_patterns(records, NOW, peak_hours=parse_hours("8-19"), top_n=10, half_life_days=7)
+        assert [p["pattern"]["messages"] for p in ranked] == [["weather?"], ["news?"]]
+        assert ranked[0]["count"] == 2 and ranked[0]["est_cost_usd"] == 0.01
+        assert ranked[1]["count"] == 2 and ranked[1]["score"] < ranked[0]["score"]
+
+    def test_reads_rotated_and_compressed_files(self, tmp_path):
+        write_logs(tmp_path)
+        os.rename(tmp_path / "log_2026-10-18.log", tmp_path / "log_2026-10-18.log.1")
+        LogMaintenance._compress(str(tmp_path / "log_2026-10-18.log.1"))
+        (tmp_path / "log_2026-10-18.log").write_text(log_line("2026-10-18 12:00:00", record("later?")))
+
+        records = list(iter_query_records(str(tmp_path), days=14, now=NOW))
+        assert [r["messages"] for _, r in records][:5] == [["weather?"], ["weather?"], ["news?"], ["night owl?"],
+                                                             ["later?"]]
+
+    def test_next_peak_end(self):
+        assert next_peak_end(NOW, parse_hours("8-19")) == datetime(2026, 10, 19, 20, 0)
+        assert next_peak_end(datetime(2026, 10, 19, 9, 30), parse_hours("8-19")) == datetime(2026, 10, 19, 20, 0)
+
+
+class TestCacheWarmer:
+    """Test cases for warming passes"""
+
+    def make_warmer(self, log_dir, budget=1.0):
+        run_agent = MagicMock(side_effect=lambda model, messages, *args, metadata=None, **kwargs: (
+            metadata.update(usage={"input_tokens": 100, "output_tokens": 50}) or f"answer to {messages[0]}"))
+        cache = ResponseCache(InMemorySharedState(), ttl=86400)
+        warmer = CacheWarmer(cache, run_agent, InMemorySharedState(), log_dir=str(log_dir),
+                             peak_hours=parse_hours("8-19"), daily_budget_usd=budget,
+                             record_usage=lambda model_name, usage, usage_by_model: 0.015)
+        return warmer, cache, run_agent
+
+    def test_warms_then_leaves_fresh_answers(self, tmp_path):
+        write_logs(tmp_path)
+        warmer, cache, run_agent = self.make_warmer(tmp_path)
+
+        first = warmer.warm(NOW)
+        second = warmer.warm(NOW)
+
+        assert (first["warmed"], first["spent_usd"]) == (2, 0.03)
+        assert (second["warmed"], second["fresh"]) == (0, 2)
+        key = ResponseCache.key("llama-3.1-8b-instant", "Be brief", ["weather?"])
+        assert cache.get(key)["response"] == "answer to weather?"
+        assert run_agent.call_count == 2
+
+    def test_daily_budget(self, tmp_path):
+        """Test patterns whose expected cost no longer fits the budget are skipped"""
+        write_logs(tmp_path)
+        warmer, _, _ = self.make_warmer(tmp_path, budget=0.02)
+
+        report = warmer.warm(NOW)
+        assert (report["warmed"], report["over_budget"]) == (1, 1)
+        assert report["budget_remaining_usd"] == 0.005
+
+    def test_budget_reserved_before_each_run(self, tmp_path):
+        """Test a run's expected cost is taken from the shared budget before it starts, then settled"""
+        write_logs(tmp_path)
+        warmer, _, run_agent = self.make_warmer(tmp_path, budget=0.02)
+        spent_during_runs = []
+        run = run_agent.side_effect
+        run_agent.side_effect = lambda *args, **kwargs: (
+            spent_during_runs.append(warmer.state.get(warmer._spent_key(NOW))) or run(*args, **kwargs))
+
+        warmer.warm(NOW)
+
+        assert spent_during_runs == [0.01]
+        assert warmer.state.get(warmer._spent_key(NOW)) == pytest.approx(0.015)
+
+    def test_failed_run_returns_reservation(self, tmp_path):
+        write_logs(tmp_path)
+        warmer, _, run_agent = self.make_warmer(tmp_path)
+        run_agent.side_effect = RuntimeError("upstream down")
+
+        report = warmer.warm(NOW)
+
+        assert report["failed"] == 2
+        assert warmer.state.get(warmer._spent_key(NOW)) == pytest.approx(0)
+
+    def test_start_pass_takes_hourly_claim(self, tmp_path):
+        """Test a manual pass runs in the background and only once per claimed hour"""
+        write_logs(tmp_path)
+        warmer, _, _ = self.make_warmer(tmp_path)
+        with patch.object(warmer, "warm") as warm:
+            assert warmer.start_pass(NOW) is True
+            assert warmer.start_pass(NOW) is False
+            for thread in threading.enumerate():
+                if thread.name == "cache-warm-pass":
+                    thread.join(1)
+
+        warm.assert_called_once_with(NOW)
+
+    @patch.object(api.settings, 'ADMIN_API_KEY', "secret")
+    def test_warm_endpoint_accepted(self, tmp_path):
+        warmer = MagicMock()
+        warmer.start_pass.side_effect = [True, False]
+        with patch.object(api, "cache_warmer", warmer):
+            client = TestClient(api.app)
+            assert client.post("/cache/warm", headers={"X-Admin-Key": "secret"}).status_code == 202
+            assert client.post("/cache/warm", headers={"X-Admin-Key": "secret"}).status_code == 409
+
+
+class TestQueryRecords:
+    """Test cases for the query records written by the API"""
+
+    @patch('app.backend.api.get_response_from_ai_agents', return_value="Hi")
+    def test_chat_writes_query_record(self, mock_agent):
+        with patch('app.backend.api.settings.QUERY_LOG_ENABLED', True), \
+             patch.object(api.logger, 'info') as mock_info:
+            response = TestClient(api.app).post("/chat", json={"model_name": "llama-3.1-8b-instant",
+                                                               "messages": ["Hello"], "allow_search": False})
+
+        assert response.status_code == 200
+        lines = [call.args[0] for call in mock_info.call_args_list if call.args[0].startswith(QUERY_RECORD_MARKER)]
+        assert len(lines) == 1
+        logged = json.loads(lines[0][len(QUERY_RECORD_MARKER):])
+        assert (logged["messages"], logged["cached"]) == (["Hello"], False)
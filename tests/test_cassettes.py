@@ -0,0 +1,105 @@
+"""Tests for app.core.cassettes module"""
+import pytest
+from unittest.mock import patch
+from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+from langchain_core.messages.ai import AIMessage
+from langchain_core.messages.human import HumanMessage
+from langchain_core.tools import tool
+from app.core import cassettes
+from app.core.cassettes import (
+    Cassette, CassetteMissError, RecordingChatModel, ReplayChatModel, RecordingTool, ReplayTool,
+    llm_request_key, request_key
+)
+from app.core.ai_agent import get_response_from_ai_agents
+
+
+@tool
+def lookup(query: str) -> str:
+    """Look something up"""
+    return f"result for {query}"
+
+
+@pytest.fixture
+def cassette(tmp_path):
+    return Cassette(str(tmp_path / "run.jsonl.gz"))
+
+
+class TestCassette:
+    """Test cases for the on-disk cassette store"""
+
+    def test_round_trip(self, cassette):
+        """Test entries survive a reload and are served in recorded order"""
+        cassette.record("k", "tool", "lookup", "first", 0.1)
+        cassette.record("k", "tool", "lookup", "second", 0.2)
+
+        reloaded = Cassette(cassette.path)
+        assert reloaded.next("k")["response"] == "first"
+        assert reloaded.next("k")["response"] == "second"
+        assert reloaded.next("k")["response"] == "second"
+
+    def test_missing_key(self, cassette):
+        with pytest.raises(CassetteMissError):
+            cassette.next("unknown")
+
+    def test_key_ignores_message_ids(self):
+        """Test ids assigned per run do not change the request key"""
+        first = llm_request_key("m", [HumanMessage(content="hi", id="a")])
+        second = llm_request_key("m", [HumanMessage(content="hi", id="b")])
+        assert first == second
+        assert first != llm_request_key("m", [HumanMessage(content="bye")])
+
+
+class TestRecordReplay:
+    """Test cases for the recording and replaying wrappers"""
+
+    def test_chat_model(self, cassette):
+        """Test a recorded chat response is replayed without the real model"""
+        inner = FakeMessagesListChatModel(responses=[AIMessage(content="recorded answer")])
+        recorder = RecordingChatModel(inner=inner, cassette=cassette, llm_id="m")
+        assert recorder.invoke([HumanMessage(content="hi")]).content == "recorded answer"
+
+        replay = ReplayChatModel(cassette=Cassette(cassette.path), llm_id="m", latency_scale=0)
+        assert replay.invoke([HumanMessage(content="hi")]).content == "recorded answer"
+
+    def test_tool(self, cassette):
+        """Test replayed tools keep the original name and schema"""
+        recorder = RecordingTool(name=lookup.name, description=lookup.description,
+                                 args_schema=lookup.args_schema, inner=lookup, cassette=cassette)
+        assert recorder.invoke({"query": "x"}) == "result for x"
+
+        replay = ReplayTool(name=lookup.name, description=lookup.description,
+                            args_schema=lookup.args_schema, cassette=Cassette(cassette.path), latency_scale=0)
+        assert replay.invoke({"query": "x"}) == "result for x"
+        assert replay.args == lookup.args
+        assert cassette.next(request_key("tool", "lookup", {"query": "x"}))["kind"] == "tool"
+
+    @patch.object(cassettes.settings, "CASSETTE_MODE", "bogus")
+    def test_unknown_mode(self):
+        with pytest.raises(ValueError, match="Unknown CASSETTE_MODE"):
+            cassettes.wrap_for_cassette(None, [], "m")
+
+
+class TestAgentReplay:
+    """Test cases for running the agent from a cassette"""
+
+    def test_record_then_replay_without_api_keys(self, tmp_path):
+        """Test an agent run recorded against the model is replayed offline"""
+        recorded_model = FakeMessagesListChatModel(responses=[AIMessage(content="A graph library")])
+        with patch.object(cassettes.settings, "CASSETTE_DIR", str(tmp_path)), \
+             patch.object(cassettes.settings, "CASSETTE_LATENCY_SCALE", 0.0), \
+             patch("app.core.ai_agent.settings") as mock_settings, \
+             patch("app.core.ai_agent.ChatGroq") as mock_chatgroq:
+            mock_chatgroq.return_value = recorded_model
+
+            with patch.object(cassettes.settings, "CASSETTE_MODE", "record"):
+                mock_settings.GROQ_API_KEY = "test_groq_key"
+                recorded = get_response_from_ai_agents("llama-3.1-8b-instant", ["What is LangGraph?"], False, "")
+
+            mock_chatgroq.reset_mock()
+            with patch.object(cassettes.settings, "CASSETTE_MODE", "replay"):
+                mock_settings.GROQ_API_KEY = None
+                replayed = get_response_from_ai_agents("llama-3.1-8b-instant", ["What is LangGraph?"], False, "")
+
+        assert recorded == replayed == "A graph library"
+        assert (tmp_path / "default.jsonl.gz").exists()
+        mock_chatgroq.assert_not_called()
@@ -0,0 +1,180 @@
+"""Tests for app.backend.compression and app.backend.serialization modules"""
+import gzip
+import json
+import pytest
+from unittest.mock import patch
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+from app.backend import api
+from app.backend.compression import CompressionMiddleware, negotiate_encoding
+from app.backend.serialization import (
+    dumps, negotiate_media_type, set_json_encoder, NDJSON_MEDIA_TYPE, JSON_MEDIA_TYPE
+)
+
+
+@pytest.fixture
+def compressed_client():
+    """App with the compression middleware and a few canned responses"""
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+    @app.get("/small")
+    def small():
+        return PlainTextResponse("tiny")
+
+    @app.get("/large")
+    def large():
+        return PlainTextResponse("x" * 5000)
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse((f"line {i}\n" for i in range(50)), media_type=NDJSON_MEDIA_TYPE)
+
+    @app.get("/events")
+    def events():
+        return StreamingResponse(iter(["data: 1\n\n"] * 100), media_type="text/event-stream")
+
+    return TestClient(app)
+
+
+class TestNegotiateEncoding:
+    """Test cases for negotiate_encoding"""
+
+    def test_gzip_selected(self):
+        assert negotiate_encoding("gzip, deflate") == "gzip"
+
+    def test_q_zero_disables(self):
+        assert negotiate_encoding("gzip;q=0") is None
+
+    def test_wildcard(self):
+        assert negotiate_encoding("*") in ("br", "gzip")
+
+    def test_identity(self):
+        assert negotiate_encoding("") is None
+        assert negotiate_encoding("identity") is None
+
+
+class TestCompressionMiddleware:
+    """Test cases for CompressionMiddleware"""
+
+    def test_large_body_compressed(self, compressed_client):
+        """Test bodies above the threshold are gzip-encoded"""
+        response = compressed_client.get("/large", headers={"Accept-Encoding": "gzip"})
+
+        assert response.headers["content-encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["vary"]
+        assert int(response.headers["content-length"]) < 5000
+        assert response.text == "x" * 5000
+
+    def test_small_body_not_compressed(self, compressed_client):
+        """Test bodies below the threshold are sent as-is"""
+        response = compressed_client.get("/small", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in response.headers
+
+    def test_no_accept_encoding(self, compressed_client):
+        """Test clients that do not accept gzip get identity"""
+        response = compressed_client.get("/large", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in response.headers
+
+    def test_streaming_body_compressed(self, compressed_client):
+        """Test streamed bodies are compressed chunk by chunk"""
+        with compressed_client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as response:
+            raw = b"".join(response.iter_raw())
+
+        assert response.headers["content-encoding"] == "gzip"
+        assert gzip.decompress(raw).decode().splitlines()[-1] == "line 49"
+
+    def test_event_stream_not_compressed(self, compressed_client):
+        """Test server-sent events are left unbuffered"""
+        response = compressed_client.get("/events", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in response.headers
+
+
+class TestSerialization:
+    """Test cases for the JSON helpers"""
+
+    def test_dumps_is_compact(self):
+        assert dumps({"a": [1, 2]}) == b'{"a":[1,2]}'
+
+    def test_dumps_stdlib_fallback(self):
+        """Test the json encoder produces the same document"""
+        set_json_encoder("json")
+        try:
+            assert json.loads(dumps({"a": "é", 1: 2})) == {"a": "é", "1": 2}
+        finally:
+            set_json_encoder("orjson")
+
+    def test_unknown_encoder(self):
+        with pytest.raises(ValueError):
+            set_json_encoder("ujson")
+
+    def test_negotiate_media_type(self):
+        assert negotiate_media_type("application/x-ndjson") == NDJSON_MEDIA_TYPE
+        assert negotiate_media_type("*/*") == JSON_MEDIA_TYPE
+        assert negotiate_media_type(None) == JSON_MEDIA_TYPE
+
+    def test_codec_fallbacks_reported(self):
+        """Test a configured encoder or codec whose package is missing is reported at startup"""
+        with patch('app.backend.serialization.orjson', None), patch('app.backend.serialization.ormsgpack', None), \
+             patch('app.backend.compression.brotli', None), \
+             patch.object(api.settings, 'JSON_ENCODER', "orjson"), patch.object(api.settings, 'COMPRESSION_ENABLED', True):
+            warnings = api._codec_fallbacks()
+
+        assert [warning.split()[0] for warning in warnings] == ["orjson", "ormsgpack", "brotli"]
+
+
+class TestBatchEndpoint:
+    """Test cases for POST /chat/batch"""
+
+    @pytest.fixture
+    def client(self):
+        return TestClient(api.app)
+
+    @pytest.fixture
+    def batch(self):
+        item = {
+            "model_name": "llama-3.1-8b-instant",
+            "system_prompt": "You are a helpful assistant",
+            "messages": ["Hello"],
+            "allow_search": False
+        }
+        return {"requests": [item, dict(item, model_name="invalid-model"), item]}
+
+    @patch('app.backend.api.get_response_from_ai_agents')
+    def test_batch_json(self, mock_get_response, client, batch):
+        """Test JSON batches are ordered and report per-item errors"""
+        mock_get_response.return_value = "ok"
+
+        results = client.post("/chat/batch", json=batch).json()["results"]
+
+        assert [r["index"] for r in results] == [0, 1, 2]
+        assert [r["status_code"] for r in results] == [200, 400, 200]
+        assert results[0]["response"] == "ok"
+
+    @patch('app.backend.api.get_response_from_ai_agents')
+    def test_batch_ndjson(self, mock_get_response, client, batch):
+        """Test NDJSON batches stream one result per line"""
+        mock_get_response.return_value = "ok"
+
+        response = client.post("/chat/batch", json=batch, headers={"Accept": NDJSON_MEDIA_TYPE})
+
+        assert response.headers["content-type"].startswith(NDJSON_MEDIA_TYPE)
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert sorted(r["index"] for r in lines) == [0, 1, 2]
+
+    @patch('app.backend.api.get_response_from_ai_agents')
+    def test_batch_msgpack(self, mock_get_response, client, batch):
+        """Test MessagePack batches decode to the same results"""
+        ormsgpack = pytest.importorskip("ormsgpack")
+        mock_get_response.return_value = "ok"
+
+        response = client.post("/chat/batch", json=batch, headers={"Accept": "application/msgpack"})
+
+        assert response.headers["content-type"] == "application/msgpack"
+        assert len(ormsgpack.unpackb(response.content)["results"]) == 3
+
+    @patch.object(api.settings, 'BATCH_MAX_SIZE', 2)
+    def test_batch_too_large(self, client, batch):
+        """Test batches over the size limit are rejected"""
+        assert client.post("/chat/batch", json=batch).status_code == 400
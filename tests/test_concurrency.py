@@ -0,0 +1,173 @@
+"""Tests for app.backend.concurrency module"""
+import threading
+import pytest
+from unittest.mock import patch
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from app.backend import api
+from app.backend.concurrency import AIMDLimiter, AdaptiveConcurrency, is_overload_error
+from app.common.shared_state import InMemorySharedState
+from app.core.caching import ResponseCache
+
+
+class RateLimitError(Exception):
+    """Stand-in for groq.RateLimitError"""
+
+
+def run(limiter, latency, error=None):
+    """Pass one request through the limiter with a fixed measured latency"""
+    with patch("app.backend.concurrency.time.perf_counter", side_effect=[0.0, latency]):
+        with limiter.slot():
+            if error is not None:
+                raise error
+
+
+class TestAIMDLimiter:
+    """Test cases for AIMDLimiter"""
+
+    def test_grows_while_used(self):
+        """Test the limit grows additively only while requests keep it (nearly) full"""
+        limiter = AIMDLimiter(initial_limit=1, max_limit=5)
+        for _ in range(50):
+            run(limiter, 0.1)
+        assert 2 <= limiter.limit < 3.5
+
+    def test_does_not_grow_when_idle(self):
+        limiter = AIMDLimiter(initial_limit=10)
+        run(limiter, 0.1)
+        assert limiter.limit == 10
+
+    def test_rate_limit_backs_off(self):
+        """Test an upstream 429 shrinks the limit multiplicatively"""
+        limiter = AIMDLimiter(initial_limit=10, backoff=0.5)
+        with pytest.raises(RateLimitError):
+            run(limiter, 0.1, RateLimitError("429 Too Many Requests"))
+
+        assert limiter.limit == 5
+        assert limiter.snapshot()["drops"] == 1
+        assert limiter.in_flight == 0
+
+    def test_latency_spike_backs_off(self):
+        """Test short-term latency far above the long-term average shrinks the limit"""
+        limiter = AIMDLimiter(initial_limit=10, backoff=0.5, latency_tolerance=2.0, short_alpha=1.0)
+        run(limiter, 0.1)
+        with patch("app.backend.concurrency.time.monotonic", return_value=1000.0):
+            run(limiter, 5.0)
+        assert limiter.limit == 5
+
+    def test_reported_latency_used(self):
+        """Test latency reported through the slot replaces the time the slot was held"""
+        limiter = AIMDLimiter(initial_limit=10)
+        with patch("app.backend.concurrency.time.perf_counter", side_effect=[0.0, 30.0]):
+            with limiter.slot() as feedback:
+                feedback.latency = 0.5
+        assert limiter.long_latency == 0.5
+
+    def test_other_errors_ignored(self):
+        limiter = AIMDLimiter(initial_limit=10)
+        with pytest.raises(ValueError):
+            run(limiter, 0.1, ValueError("bad input"))
+        assert limiter.limit == 10
+
+    def test_rejects_when_full(self):
+        """Test requests beyond the limit wait and then get a 429"""
+        limiter = AIMDLimiter(initial_limit=1)
+        entered, release = threading.Event(), threading.Event()
+
+        def hold():
+            with limiter.slot():
+                entered.set()
+                release.wait()
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        entered.wait()
+        try:
+            with pytest.raises(HTTPException) as exc:
+                with limiter.slot(timeout=0.01):
+                    pass
+            assert exc.value.status_code == 429
+        finally:
+            release.set()
+            thread.join()
+        assert limiter.snapshot()["rejections"] == 1
+
+
+class TestOverloadDetection:
+    """Test cases for is_overload_error"""
+
+    def test_wrapped_upstream_error(self):
+        """Test a rate limit is found behind the HTTPException it was mapped to"""
+        try:
+            try:
+                raise RateLimitError("slow down")
+            except RateLimitError:
+                raise HTTPException(status_code=500, detail="Internal Server Error")
+        except HTTPException as e:
+            assert is_overload_error(e)
+
+    def test_plain_error(self):
+        assert not is_overload_error(ValueError("nope"))
+
+
+class TestAdaptiveConcurrency:
+    """Test cases for the per-model registry and its metrics"""
+
+    def test_disabled_passthrough(self):
+        limits = AdaptiveConcurrency(enabled=False)
+        with limits.slot("llama-3.1-8b-instant"):
+            pass
+        assert limits.snapshot() == {}
+
+    def test_metrics_endpoint(self):
+        """Test per-model limits are exposed after requests go through"""
+        limits = AdaptiveConcurrency(enabled=True, initial_limit=4)
+        with limits.slot("llama-3.1-8b-instant"):
+            pass
+
+        with patch.object(api, "adaptive_limits", limits):
+            metrics = TestClient(api.app).get("/metrics/concurrency").json()
+
+        assert metrics["adaptive"] is True
+        assert metrics["models"]["llama-3.1-8b-instant"]["limit"] == 4
+        assert metrics["models"]["llama-3.1-8b-instant"]["successes"] == 1
+
+
+class TestChatSlots:
+    """Test cases for the upstream slot taken by /chat"""
+
+    @pytest.fixture
+    def payload(self):
+        return {"model_name": "llama-3.1-8b-instant", "messages": ["Hello"], "allow_search": False}
+
+    @patch('app.backend.api.get_response_from_ai_agents')
+    def test_learns_model_call_latency(self, mock_get_response, payload):
+        """Test the limit learns the mean model call latency, not the whole agent run"""
+        def fake_response(*args, metadata=None, **kwargs):
+            metadata["model_latency"] = {"calls": 2, "mean_ms": 250.0}
+            return "Hi"
+        mock_get_response.side_effect = fake_response
+        limits = AdaptiveConcurrency(enabled=True)
+
+        with patch.object(api, "adaptive_limits", limits):
+            assert TestClient(api.app).post("/chat", json=payload).status_code == 200
+
+        assert limits.snapshot()["llama-3.1-8b-instant"]["latency_long_ms"] == 250.0
+
+    @patch('app.backend.api.get_response_from_ai_agents', return_value="Hi")
+    def test_cache_hits_skip_the_limiter(self, mock_get_response, payload):
+        limits = AdaptiveConcurrency(enabled=True)
+        client = TestClient(api.app)
+
+        with patch.object(api, "adaptive_limits", limits), \
+             patch.object(api, "response_cache", ResponseCache(InMemorySharedState(), ttl=60)):
+            client.post("/chat", json=payload)
+            assert client.post("/chat", json=payload).json()["metadata"] == {"cached": True}
+
+        assert limits.snapshot()["llama-3.1-8b-instant"]["successes"] == 1
+
+    @patch('app.backend.api.get_response_from_ai_agents', return_value="Hi")
+    def test_rejection_is_429(self, mock_get_response, payload):
+        limits = AdaptiveConcurrency(enabled=True, initial_limit=0, min_limit=0)
+        with patch.object(api, "adaptive_limits", limits), patch.object(api.settings, "FAIR_SHARE_TIMEOUT", 0.01):
+            assert TestClient(api.app).post("/chat", json=payload).status_code == 429
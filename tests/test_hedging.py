@@ -0,0 +1,222 @@
+"""Tests for app.core.hedging module"""
+import threading
+import pytest
+from unittest.mock import patch, MagicMock
+from langchain_core.messages.ai import AIMessage
+from app.core.hedging import (
+    Hedger, HedgeBudget, RunCancelled, LatencyTracker, CancellationCallback
+)
+from app.core.ai_agent import get_response_from_ai_agents
+from app.backend import api
+from app.backend.tenancy import UsageLedger
+from app.core.caching import ResponseCache
+from app.common.shared_state import InMemorySharedState
+from fastapi.testclient import TestClient
+
+
+def make_hedger(**options):
+    options.setdefault("min_delay", 0.05)
+    options.setdefault("budget_ratio", 1.0)
+    return Hedger(**options)
+
+
+class TestLatencyTracker:
+    """Test cases for LatencyTracker"""
+
+    def test_percentile(self):
+        tracker = LatencyTracker()
+        for latency in range(1, 101):
+            tracker.record("m", latency / 100)
+        assert tracker.percentile("m", 95) == pytest.approx(0.95, abs=0.01)
+
+    def test_not_enough_samples(self):
+        tracker = LatencyTracker()
+        tracker.record("m", 1.0)
+        assert tracker.percentile("m", 95, min_samples=20) is None
+
+
+class TestHedgeBudget:
+    """Test cases for HedgeBudget"""
+
+    def test_ratio_caps_hedges(self):
+        budget = HedgeBudget(ratio=0.1)
+        allowed = 0
+        for _ in range(100):
+            budget.note_request()
+            allowed += budget.try_acquire()
+        assert allowed == 10
+
+
+class TestHedger:
+    """Test cases for Hedger"""
+
+    def test_fast_request_not_hedged(self):
+        hedger = make_hedger()
+        calls = []
+
+        def fn(model, cancel_event):
+            calls.append(model)
+            return "fast"
+
+        assert hedger.run(fn, "m") == ("fast", {"hedged": False, "delay_ms": 50.0, "winner": "m"})
+        assert calls == ["m"]
+
+    def test_slow_request_hedged_and_loser_cancelled(self):
+        """Test the hedge answers first and the primary is told to stop"""
+        hedger = make_hedger(hedge_models={"slow-model": "fast-model"})
+        primary_cancelled = threading.Event()
+
+        def fn(model, cancel_event):
+            if model == "slow-model":
+                cancel_event.wait(5)
+                primary_cancelled.set()
+                raise RunCancelled()
+            return "hedge answer"
+
+        result, info = hedger.run(fn, "slow-model")
+
+        assert result == "hedge answer"
+        assert info["hedged"] and info["winner"] == "fast-model"
+        assert primary_cancelled.wait(1)
+
+    def test_budget_exhausted(self):
+        """Test no hedge is sent once the budget is spent"""
+        hedger = make_hedger(budget_ratio=0.0)
+        models = []
+
+        def fn(model, cancel_event):
+            models.append(model)
+            threading.Event().wait(0.1)
+            return "slow answer"
+
+        result, info = hedger.run(fn, "m")
+        assert result == "slow answer" and not info["hedged"]
+        assert models == ["m"]
+
+    def test_failed_primary_falls_back_to_hedge(self):
+        def fn(model, cancel_event):
+            if model == "m":
+                threading.Event().wait(0.1)
+                raise RuntimeError("upstream error")
+            return "hedge answer"
+
+        result, _ = make_hedger(hedge_models={"m": "other"}).run(fn, "m")
+        assert result == "hedge answer"
+
+    def test_all_attempts_fail(self):
+        def fn(model, cancel_event):
+            threading.Event().wait(0.1)
+            raise RuntimeError(f"{model} failed")
+
+        with pytest.raises(RuntimeError, match="m failed"):
+            make_hedger(hedge_models={"m": "other"}).run(fn, "m")
+
+
+class TestCancellationCallback:
+    """Test cases for CancellationCallback"""
+
+    def test_raises_once_cancelled(self):
+        event = threading.Event()
+        callback = CancellationCallback(event)
+        callback.on_tool_start({}, "query")
+
+        event.set()
+        with pytest.raises(RunCancelled):
+            callback.on_chat_model_start({}, [[]])
+
+
+class TestAgentHedging:
+    """Test cases for hedging inside get_response_from_ai_agents"""
+
+    @patch('app.core.ai_agent.settings')
+    @patch('app.core.ai_agent.ChatGroq')
+    @patch('app.core.ai_agent.create_react_agent')
+    def test_hedge_metadata(self, mock_create_agent, mock_chatgroq, mock_settings):
+        """Test hedged runs report the hedge outcome and carry a cancellation callback"""
+        mock_settings.GROQ_API_KEY = "test_groq_key"
+        mock_agent = MagicMock()
+        mock_agent.invoke.return_value = {"messages": [AIMessage(content="Answer")]}
+        mock_create_agent.return_value = mock_agent
+
+        metadata = {}
+        with patch('app.core.ai_agent.hedger', make_hedger()):
+            result = get_response_from_ai_agents("llama-3.1-8b-instant", ["hi"], False, "prompt",
+                                                 metadata=metadata)
+
+        assert result == "Answer"
+        assert metadata["hedge"]["hedged"] is False
+        callbacks = mock_agent.invoke.call_args.kwargs["config"]["callbacks"]
+        assert any(isinstance(callback, CancellationCallback) for callback in callbacks)
+
+    @patch('app.core.ai_agent.settings')
+    @patch('app.core.ai_agent.ChatGroq')
+    @patch('app.core.ai_agent.create_react_agent')
+    def test_hedge_bills_winner_and_loser(self, mock_create_agent, mock_chatgroq, mock_settings):
+        """Test a cross-model hedge reports the answer under the winner and the cancelled attempt under its model"""
+        from uuid import uuid4
+        from langchain_core.outputs import ChatGeneration, LLMResult
+        from app.core.usage import AttemptUsage
+        mock_settings.GROQ_API_KEY = "test_groq_key"
+        calls = []
+
+        def invoke(state, config):
+            callbacks = config["callbacks"]
+            usage = next(callback for callback in callbacks if isinstance(callback, AttemptUsage))
+            cancel = next(callback for callback in callbacks if isinstance(callback, CancellationCallback))
+            calls.append(usage)
+            if len(calls) == 1:
+                # The primary's model call is still in flight when the hedge wins
+                usage.on_chat_model_start({}, [[AIMessage(content="x" * 400)]], run_id=uuid4())
+                while True:
+                    cancel.on_llm_new_token("")
+                    threading.Event().wait(0.01)
+            message = AIMessage(content="Answer", usage_metadata={"input_tokens": 10, "output_tokens": 5,
+                                                                  "total_tokens": 15})
+            run_id = uuid4()
+            usage.on_chat_model_start({}, [[message]], run_id=run_id)
+            usage.on_llm_end(LLMResult(generations=[[ChatGeneration(message=message)]]), run_id=run_id)
+            return {"messages": [message]}
+
+        mock_agent = MagicMock()
+        mock_agent.invoke.side_effect = invoke
+        mock_create_agent.return_value = mock_agent
+
+        metadata = {}
+        hedger = make_hedger(hedge_models={"llama-3.1-8b-instant": "llama-3.3-70b-versatile"})
+        with patch('app.core.ai_agent.hedger', hedger):
+            result = get_response_from_ai_agents("llama-3.1-8b-instant", ["hi"], False, "prompt",
+                                                 metadata=metadata)
+
+        assert result == "Answer"
+        assert metadata["hedge"]["winner"] == "llama-3.3-70b-versatile"
+        assert metadata["usage_by_model"]["llama-3.3-70b-versatile"]["total_tokens"] == 15
+        loser = metadata["usage_by_model"]["llama-3.1-8b-instant"]
+        assert loser["llm_calls"] == 1 and loser["input_tokens"] == 100 and loser["output_tokens"] == 0
+
+
+class TestHedgedChat:
+    """Test cases for how /chat bills and caches a hedged answer"""
+
+    @patch('app.backend.api.get_response_from_ai_agents')
+    def test_cross_model_hedge_billed_to_winner_and_not_cached(self, mock_get_response):
+        def fake_response(*args, metadata=None, **kwargs):
+            metadata["usage"] = {"input_tokens": 10, "output_tokens": 5}
+            metadata["hedge"] = {"hedged": True, "delay_ms": 50.0, "winner": "llama-3.3-70b-versatile"}
+            metadata["usage_by_model"] = {"llama-3.3-70b-versatile": {"input_tokens": 10, "output_tokens": 5},
+                                          "llama-3.1-8b-instant": {"input_tokens": 100, "output_tokens": 0}}
+            return "Hi"
+        mock_get_response.side_effect = fake_response
+        ledger = UsageLedger()
+        cache = ResponseCache(InMemorySharedState(), ttl=60)
+        payload = {"model_name": "llama-3.1-8b-instant", "messages": ["Hello"], "allow_search": False}
+
+        with patch.object(api, "usage_ledger", ledger), patch.object(api, "response_cache", cache):
+            client = TestClient(api.app)
+            client.post("/chat", json=payload)
+            client.post("/chat", json=payload)
+
+        assert mock_get_response.call_count == 2
+        models = ledger.report()[api.settings.DEFAULT_TENANT]["models"]
+        assert models["llama-3.3-70b-versatile"]["requests"] == 2
+        assert models["llama-3.1-8b-instant"]["requests"] == 0
+        assert models["llama-3.1-8b-instant"]["input_tokens"] == 200
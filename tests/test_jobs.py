@@ -0,0 +1,216 @@
+"""Tests for app.backend.jobs module and the /jobs endpoints"""
+import threading
+import time
+import pytest
+from unittest.mock import patch
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from app.backend import api
+from app.backend.jobs import (
+    InMemoryJobStore, SQLiteJobStore, JobQueue, create_job_store,
+    JOB_PENDING, JOB_RUNNING, JOB_SUCCEEDED, JOB_FAILED, TERMINAL_STATUSES, INTERRUPTED_ERROR
+)
+
+
+def wait_for_job(queue, job_id, timeout=5):
+    """Poll a job until it reaches a terminal status"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in TERMINAL_STATUSES:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    """Create each job store implementation"""
+    return create_job_store(request.param, str(tmp_path / "jobs.sqlite3"))
+
+
+class TestJobStores:
+    """Test cases for the job store implementations"""
+
+    def test_create_update_get(self, store):
+        """Test a job round-trips through the store"""
+        store.create("job1", {"model_name": "m"})
+        store.update("job1", status=JOB_SUCCEEDED, result={"response": "ok"}, finished_at=1.0)
+
+        job = store.get("job1")
+        assert job["status"] == JOB_SUCCEEDED
+        assert job["request"] == {"model_name": "m"}
+        assert job["result"] == {"response": "ok"}
+
+    def test_get_missing(self, store):
+        """Test that unknown job ids return None"""
+        assert store.get("missing") is None
+
+    def test_purge_finished_jobs(self, store):
+        """Test that only finished jobs older than the cutoff are purged"""
+        store.create("old", None)
+        store.update("old", finished_at=10.0)
+        store.create("pending", None)
+
+        store.purge(older_than=20.0)
+
+        assert store.get("old") is None
+        assert store.get("pending")["status"] == JOB_PENDING
+
+    def test_sqlite_fails_interrupted_jobs(self, tmp_path):
+        """Test jobs left pending or running by a stopped process are failed when the store reopens"""
+        path = str(tmp_path / "jobs.sqlite3")
+        store = SQLiteJobStore(path)
+        store.create("pending", None)
+        store.create("running", None)
+        store.update("running", status=JOB_RUNNING)
+        store.create("done", None)
+        store.update("done", status=JOB_SUCCEEDED, finished_at=1.0)
+
+        reopened = SQLiteJobStore(path)
+
+        for job_id in ("pending", "running"):
+            job = reopened.get(job_id)
+            assert (job["status"], job["error"]) == (JOB_FAILED, INTERRUPTED_ERROR)
+            assert job["finished_at"] is not None
+        assert reopened.get("done")["status"] == JOB_SUCCEEDED
+
+    def test_unknown_store(self):
+        """Test that an unknown store kind raises ValueError"""
+        with pytest.raises(ValueError, match="Unknown job store"):
+            create_job_store("redis")
+
+
+class TestJobQueue:
+    """Test cases for JobQueue"""
+
+    def test_successful_job(self):
+        """Test that the runner's result is stored"""
+        queue = JobQueue(InMemoryJobStore(), runner=lambda request: {"response": request.upper()})
+        job_id = queue.submit("hello")
+
+        job = wait_for_job(queue, job_id)
+        assert job["status"] == JOB_SUCCEEDED
+        assert job["result"] == {"response": "HELLO"}
+        queue.shutdown()
+
+    def test_http_exception_job(self):
+        """Test that HTTPException status and detail are kept"""
+        def runner(request):
+            raise HTTPException(status_code=400, detail="bad model")
+
+        queue = JobQueue(InMemoryJobStore(), runner=runner)
+        job = wait_for_job(queue, queue.submit("x"))
+
+        assert job["status"] == JOB_FAILED
+        assert job["error"] == {"status_code": 400, "detail": "bad model"}
+        queue.shutdown()
+
+    def test_unexpected_exception_job(self):
+        """Test that unexpected errors become 500 errors"""
+        def runner(request):
+            raise RuntimeError("boom")
+
+        queue = JobQueue(InMemoryJobStore(), runner=runner)
+        job = wait_for_job(queue, queue.submit("x"))
+
+        assert job["error"]["status_code"] == 500
+        assert job["error"]["detail"] == "boom"
+        queue.shutdown()
+
+    def test_queue_bounded(self):
+        """Test submissions beyond max_queued waiting jobs get a 429"""
+        release = threading.Event()
+        queue = JobQueue(InMemoryJobStore(), runner=lambda request: release.wait(5), workers=1, max_queued=1)
+        try:
+            running = queue.submit("a")
+            deadline = time.time() + 5
+            while queue.get(running)["status"] != JOB_RUNNING and time.time() < deadline:
+                time.sleep(0.01)
+            queue.submit("b")
+            with pytest.raises(HTTPException) as exc:
+                queue.submit("c")
+            assert exc.value.status_code == 429
+        finally:
+            release.set()
+            queue.shutdown()
+
+    def test_shutdown_fails_queued_jobs(self):
+        release = threading.Event()
+        queue = JobQueue(InMemoryJobStore(), runner=lambda request: release.wait(5), workers=1)
+        queue.submit("a")
+        queued = queue.submit("b")
+
+        queue.shutdown(wait=False, cancel_queued=True)
+        release.set()
+
+        assert queue.get(queued)["status"] == JOB_FAILED
+
+
+class TestJobEndpoints:
+    """Test cases for the /jobs endpoints"""
+
+    @pytest.fixture
+    def client(self):
+        """Create test client with a fresh in-memory queue"""
+        queue = JobQueue(InMemoryJobStore(), runner=api._run_chat_job, workers=1)
+        with patch('app.backend.api._job_queue', queue):
+            yield TestClient(api.app)
+        queue.shutdown()
+
+    @pytest.fixture
+    def payload(self):
+        return {
+            "model_name": "llama-3.1-8b-instant",
+            "system_prompt": "You are a helpful assistant",
+            "messages": ["Hello"],
+            "allow_search": False
+        }
+
+    @patch('app.backend.api.get_response_from_ai_agents')
+    def test_submit_and_poll(self, mock_get_response, client, payload):
+        """Test that a submitted job can be polled to completion"""
+        mock_get_response.return_value = "Test AI response"
+
+        response = client.post("/jobs", json=payload)
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+
+        job = wait_for_job(api._job_queue, job_id)
+        assert job["result"] == {"response": "Test AI response"}
+
+        polled = client.get(f"/jobs/{job_id}").json()
+        assert polled["status"] == JOB_SUCCEEDED
+        assert "request" not in polled
+
+    @patch('app.backend.api.get_response_from_ai_agents')
+    def test_stream_job(self, mock_get_response, client, payload):
+        """Test that the stream ends with the terminal status event"""
+        mock_get_response.return_value = "Streamed"
+        job_id = client.post("/jobs", json=payload).json()["job_id"]
+
+        response = client.get(f"/jobs/{job_id}/stream")
+
+        assert response.status_code == 200
+        assert "event: succeeded" in response.text
+        assert "Streamed" in response.text
+
+    def test_submit_invalid_model(self, client, payload):
+        """Test that invalid models are rejected before queueing"""
+        payload["model_name"] = "invalid-model"
+        response = client.post("/jobs", json=payload)
+        assert response.status_code == 400
+
+    def test_unknown_job(self, client):
+        """Test that unknown job ids return 404"""
+        assert client.get("/jobs/unknown").status_code == 404
+
+    @patch('app.backend.api.get_response_from_ai_agents', return_value="secret answer")
+    def test_jobs_scoped_to_tenant(self, mock_get_response, client, payload):
+        """Test another tenant cannot poll or stream a job"""
+        job_id = client.post("/jobs", json=payload, headers={"X-Tenant-ID": "team-a"}).json()["job_id"]
+        wait_for_job(api._job_queue, job_id)
+
+        assert client.get(f"/jobs/{job_id}", headers={"X-Tenant-ID": "team-b"}).status_code == 404
+        assert client.get(f"/jobs/{job_id}/stream", headers={"X-Tenant-ID": "team-b"}).status_code == 404
+        assert client.get(f"/jobs/{job_id}", headers={"X-Tenant-ID": "team-a"}).json()["status"] == JOB_SUCCEEDED
@@ -0,0 +1,129 @@
+"""Tests for app.common.log_analytics module"""
+import os
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.backend import api
+from app.common import log_analytics
+from app.common.logger import LogMaintenance
+from app.common.log_analytics import (
+    LATENCY_GROWTH, REQUEST_COMPLETED_MARKER, build_index, format_request_completed, main
+)
+
+API = "app.backend.api"
+
+
+def record(timestamp, level, message, name=API):
+    return f"{timestamp},123 - {name} - {level} - {message}\n"
+
+
+def completed(timestamp, model, status, latency_ms):
+    return record(timestamp, "INFO", format_request_completed(model, status, latency_ms, "default"))
+
+
+def write_logs(log_dir):
+    day_one = [
+        record("2026-10-18 09:00:00", "INFO", "Received request for model: llama-3.1-8b-instant, allow_search: False"),
+        completed("2026-10-18 09:00:01", "llama-3.1-8b-instant", 200, 1000.0),
+        record("2026-10-18 09:05:00", "INFO", "Received WebSocket turn for model: openai/gpt-oss-20b, session: x"),
+        completed("2026-10-18 09:05:03", "openai/gpt-oss-20b", 500, 3000.0),
+        record("2026-10-18 09:05:03", "ERROR", "Error Type: APIConnectionError"),
+        record("2026-10-18 09:05:03", "ERROR", "Full Traceback:\nTraceback (most recent call last):"),
+        '  File "api.py", line 1, in <module>\n',
+        "APIConnectionError: Error Type: not a record\n",
+    ]
+    day_two = [completed("2026-10-19 10:00:00", "llama-3.1-8b-instant", 200, latency)
+               for latency in (100.0, 200.0, 300.0, 400.0)]
+    day_two.append(record("2026-10-19 10:00:00", "WARNING", "Slow", name="app.core.ai_agent"))
+    (log_dir / "log_2026-10-18.log").write_text("".join(day_one))
+    (log_dir / "log_2026-10-19.log").write_text("".join(day_two))
+    (log_dir / "notes.txt").write_text(record("2026-10-19 10:00:00", "ERROR", "Error Type: Ignored"))
+
+
+class TestLogIndex:
+    """Test cases for indexing and querying the daily log files"""
+
+    def test_counts(self, tmp_path):
+        write_logs(tmp_path)
+        index = build_index(str(tmp_path), workers=1)
+
+        assert dict(index.level_counts()) == {("INFO",): 8, ("ERROR",): 2, ("WARNING",): 1}
+        assert dict(index.level_counts(("date", "logger"), since="2026-10-19")) == {
+            ("2026-10-19", API): 4, ("2026-10-19", "app.core.ai_agent"): 1}
+        assert index.error_counts() == [("APIConnectionError", 1)]
+        assert index.status_counts() == [(200, 5), (500, 1)]
+        assert index.model_requests(until="2026-10-18") == {
+            "llama-3.1-8b-instant": {"received": 1, "completed": 1, "errors": 0},
+            "openai/gpt-oss-20b": {"received": 1, "completed": 1, "errors": 1}}
+
+    def test_latency_percentiles(self, tmp_path):
+        """Test percentiles are in seconds and within the histogram's bucket error"""
+        write_logs(tmp_path)
+        percentiles = build_index(str(tmp_path), workers=1).latency_percentiles((50, 100), since="2026-10-19")
+
+        stats = percentiles["llama-3.1-8b-instant"]
+        assert stats["count"] == 4
+        assert 0.2 <= stats["p50"] <= 0.2 * LATENCY_GROWTH
+        assert 0.4 <= stats["p100"] <= 0.4 * LATENCY_GROWTH
+        assert percentiles["all"]["count"] == 4
+
+    def test_byte_ranges_match_single_pass(self, tmp_path):
+        """Test small chunks in several processes count every line exactly once"""
+        write_logs(tmp_path)
+        single = build_index(str(tmp_path), workers=1, use_index=False)
+        chunked = build_index(str(tmp_path), workers=2, use_index=False, chunk_bytes=37)
+
+        assert chunked.aggregates == single.aggregates
+
+    def test_incremental_index(self, tmp_path):
+        """Test a second run only parses appended lines and skips a partly written last line"""
+        write_logs(tmp_path)
+        build_index(str(tmp_path), workers=1)
+        path = tmp_path / "log_2026-10-19.log"
+        with open(path, "a") as f:
+            f.write(completed("2026-10-19 11:00:00", "llama-3.1-8b-instant", 429, 50.0))
+            f.write("2026-10-19 11:00:01,000 - app.backend.api - INFO - Request compl")
+
+        with patch.object(log_analytics, "_parse_range", wraps=log_analytics._parse_range) as mock_parse:
+            index = build_index(str(tmp_path), workers=1)
+
+        assert [call.args[0][0] for call in mock_parse.call_args_list] == [str(path)]
+        assert index.status_counts() == [(200, 5), (429, 1), (500, 1)]
+        assert index.files["log_2026-10-19.log"]["offset"] < path.stat().st_size
+
+    def test_rotated_and_compressed_files(self, tmp_path):
+        """Test a size-rotated file keeps its index entry and compressed files are read whole"""
+        write_logs(tmp_path)
+        before = build_index(str(tmp_path), workers=1)
+        os.rename(tmp_path / "log_2026-10-19.log", tmp_path / "log_2026-10-19.log.1")
+        LogMaintenance._compress(str(tmp_path / "log_2026-10-18.log"))
+
+        with patch.object(log_analytics, "_parse_range", wraps=log_analytics._parse_range) as mock_parse:
+            after = build_index(str(tmp_path), workers=1)
+
+        assert [call.args[0] for call in mock_parse.call_args_list] == [
+            (str(tmp_path / "log_2026-10-18.log.gz"), 0, None)]
+        assert after.aggregates == before.aggregates
+        assert sorted(after.files) == ["log_2026-10-18.log.gz", "log_2026-10-19.log.1"]
+
+    def test_cli(self, tmp_path, capsys):
+        write_logs(tmp_path)
+        main(["--logs-dir", str(tmp_path), "--workers", "1", "models"])
+
+        output = capsys.readouterr().out
+        assert output.splitlines()[0].split() == ["model", "received", "completed", "errors"]
+        assert "openai/gpt-oss-20b" in output
+
+
+class TestRequestCompletedLine:
+    """Test cases for the per-request line written by the API"""
+
+    @patch('app.backend.api.get_response_from_ai_agents', side_effect=ValueError("boom"))
+    def test_logged_for_failed_requests(self, mock_agent):
+        with patch.object(api.logger, 'info') as mock_info:
+            response = TestClient(api.app).post("/chat", json={"model_name": "llama-3.1-8b-instant",
+                                                               "messages": ["Hello"], "allow_search": False})
+
+        lines = [call.args[0] for call in mock_info.call_args_list if call.args[0].startswith(REQUEST_COMPLETED_MARKER)]
+        assert len(lines) == 1
+        assert f"status={response.status_code} " in lines[0]
+        assert "model=llama-3.1-8b-instant " in lines[0]
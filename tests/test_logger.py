@@ -2,8 +2,12 @@
 import pytest
 import logging
 import os
+from datetime import datetime
 from unittest.mock import patch, MagicMock
-from app.common.logger import get_logger, log_full_traceback
+from app.common.logger import (
+    DailyRotatingFileHandler, LOG_FORMAT, LogMaintenance, get_logger, list_log_files, log_full_traceback,
+    open_log_file
+)
 
 
 class TestLogger:
@@ -64,3 +68,68 @@ class TestLogger:
             assert result["error_message"] == "Key not found"
 
 
+
+
+def emit(handler, message, created):
+    record = logging.LogRecord("test_module", logging.INFO, __file__, 0, message, None, None)
+    record.created = created
+    handler.emit(record)
+
+
+class TestRotation:
+    """Test cases for DailyRotatingFileHandler and LogMaintenance"""
+
+    DAY = datetime(2026, 10, 18, 23, 59).timestamp()
+
+    def make_handler(self, log_dir, **kwargs):
+        handler = DailyRotatingFileHandler(str(log_dir), **kwargs)
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        return handler
+
+    def test_switches_file_at_midnight(self, tmp_path):
+        on_rotate = MagicMock()
+        handler = self.make_handler(tmp_path, on_rotate=on_rotate)
+        emit(handler, "before", self.DAY)
+        emit(handler, "after", self.DAY + 120)
+        handler.close()
+
+        assert "before" in (tmp_path / "log_2026-10-18.log").read_text()
+        assert "after" in (tmp_path / "log_2026-10-19.log").read_text()
+        on_rotate.assert_called_once()
+
+    def test_size_rotation_across_handlers(self, tmp_path):
+        """Test two handlers (as in two workers) on the same files rotate once each time and lose no lines"""
+        first = self.make_handler(tmp_path, max_bytes=300)
+        second = self.make_handler(tmp_path, max_bytes=300)
+        for i in range(20):
+            emit(first if i % 2 else second, f"line {i}", self.DAY)
+        first.close()
+        second.close()
+
+        files = list_log_files(str(tmp_path))
+        assert [os.path.basename(path) for path in files][-1] == "log_2026-10-18.log"
+        assert all(os.path.getsize(path) <= 300 for path in files)
+        lines = [line for path in files for line in open(path)]
+        assert [line.rsplit(" ", 1)[1].strip() for line in lines] == [str(i) for i in range(20)]
+
+    def test_compression_and_retention(self, tmp_path):
+        for name in ("log_2026-09-01.log", "log_2026-10-18.log.1", "log_2026-10-18.log", "log_2026-10-19.log"):
+            (tmp_path / name).write_text("2026-10-18 09:00:00,000 - test_module - INFO - hello\n")
+            os.utime(tmp_path / name, (self.DAY, self.DAY))
+        now = datetime(2026, 10, 19, 12, 0).timestamp()
+        maintenance = LogMaintenance(str(tmp_path), retention_days=30, grace=0)
+
+        assert maintenance.run(now) == {"compressed": 3, "deleted": 1}
+        assert [os.path.basename(path) for path in list_log_files(str(tmp_path))] == [
+            "log_2026-10-18.log.1.gz", "log_2026-10-18.log.gz", "log_2026-10-19.log"]
+        with open_log_file(str(tmp_path / "log_2026-10-18.log.1.gz")) as f:
+            assert f.read().endswith("hello\n")
+
+    def test_total_size_cap_keeps_current_file(self, tmp_path):
+        for name in ("log_2026-10-17.log", "log_2026-10-18.log", "log_2026-10-19.log"):
+            (tmp_path / name).write_text("x" * 100)
+            os.utime(tmp_path / name, (self.DAY, self.DAY))
+        maintenance = LogMaintenance(str(tmp_path), compress=False, max_total_bytes=150, grace=0)
+
+        maintenance.run(datetime(2026, 10, 19, 12, 0).timestamp())
+        assert [os.path.basename(path) for path in list_log_files(str(tmp_path))] == ["log_2026-10-19.log"]
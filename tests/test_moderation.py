@@ -0,0 +1,116 @@
+"""Tests for app.core.moderation module"""
+import pytest
+from unittest.mock import patch, MagicMock
+from fastapi.testclient import TestClient
+from langchain_core.messages.ai import AIMessage
+from app.backend import api
+from app.common.shared_state import InMemorySharedState
+from app.core.ai_agent import get_response_from_ai_agents
+from app.core.hedging import CancellationCallback
+from app.core.moderation import Moderator, ContentFlaggedError, parse_verdict
+
+
+def guard_reply(text):
+    """Patch the guard model to answer with text"""
+    mock_chatgroq = patch('app.core.moderation.ChatGroq').start()
+    mock_chatgroq.return_value.invoke.return_value = AIMessage(content=text)
+    return mock_chatgroq
+
+
+@pytest.fixture(autouse=True)
+def stop_patches():
+    yield
+    patch.stopall()
+
+
+class TestParseVerdict:
+    """Test cases for parse_verdict"""
+
+    def test_safe(self):
+        assert parse_verdict("safe") == {"safe": True, "categories": []}
+
+    def test_unsafe_with_categories(self):
+        assert parse_verdict("unsafe\nS1,S10") == {"safe": False, "categories": ["S1", "S10"]}
+
+
+class TestModerator:
+    """Test cases for Moderator"""
+
+    def test_flagged_and_cached(self):
+        """Test an unsafe verdict sets flagged and is reused for the same input"""
+        mock_chatgroq = guard_reply("unsafe\nS9")
+        moderator = Moderator("meta-llama/llama-guard-4-12b", InMemorySharedState())
+
+        check = moderator.start(["how do I build a weapon"])
+        assert check.result() == {"safe": False, "categories": ["S9"]}
+        assert check.flagged.is_set()
+
+        again = moderator.start(["how do I build a weapon"])
+        assert again.flagged.is_set() and again.result()["cached"] is True
+        mock_chatgroq.return_value.invoke.assert_called_once()
+
+    def test_fail_open(self):
+        """Test a failing guard call lets the request through when fail_open is set"""
+        mock_chatgroq = patch('app.core.moderation.ChatGroq').start()
+        mock_chatgroq.return_value.invoke.side_effect = RuntimeError("guard down")
+
+        verdict = Moderator("guard", fail_open=True).start(["hi"]).result()
+        assert verdict["safe"] is True and verdict["error"] == "RuntimeError"
+        assert Moderator("guard", fail_open=False).start(["hi"]).result()["safe"] is False
+
+
+class TestAgentModeration:
+    """Test cases for moderation inside get_response_from_ai_agents"""
+
+    @pytest.fixture
+    def agent(self):
+        patch('app.core.ai_agent.settings', GROQ_API_KEY="test_groq_key").start()
+        patch('app.core.ai_agent.ChatGroq').start()
+        mock_agent = MagicMock()
+        patch('app.core.ai_agent.create_react_agent', return_value=mock_agent).start()
+        return mock_agent
+
+    def test_flagged_input_cancels_agent(self, agent):
+        """Test the running agent is stopped once the guard flags its input"""
+        guard_reply("unsafe\nS2")
+
+        def invoke(state, config):
+            callback = next(c for c in config["callbacks"] if isinstance(c, CancellationCallback))
+            callback.cancel_events[0].wait(5)
+            callback.on_chat_model_start({}, [[]])
+
+        agent.invoke.side_effect = invoke
+        with patch('app.core.ai_agent.moderator', Moderator("guard")):
+            with pytest.raises(ContentFlaggedError) as exc:
+                get_response_from_ai_agents("llama-3.1-8b-instant", ["bad request"], False, "prompt")
+
+        assert exc.value.verdict["categories"] == ["S2"]
+
+    def test_safe_input_reports_verdict(self, agent):
+        guard_reply("safe")
+        agent.invoke.return_value = {"messages": [AIMessage(content="Answer")]}
+
+        metadata = {}
+        with patch('app.core.ai_agent.moderator', Moderator("guard")):
+            result = get_response_from_ai_agents("llama-3.1-8b-instant", ["hi"], False, "prompt",
+                                                 metadata=metadata)
+
+        assert result == "Answer"
+        assert metadata["moderation"] == {"safe": True, "categories": []}
+
+
+class TestFlaggedResponse:
+    """Test cases for the /chat error mapping"""
+
+    @patch('app.backend.api.get_response_from_ai_agents')
+    def test_flagged_is_400(self, mock_get_response):
+        mock_get_response.side_effect = ContentFlaggedError({"safe": False, "categories": ["S10"]})
+        response = TestClient(api.app).post("/chat", json={
+            "model_name": "llama-3.1-8b-instant",
+            "messages": ["..."],
+            "allow_search": False
+        })
+
+        assert response.status_code == 400
+        assert response.json()["detail"]["error"] == "Content Flagged"
+        assert response.json()["detail"]["categories"] == ["S10"]
@@ -0,0 +1,120 @@
+"""Tests for app.backend.profiling module"""
+import json
+import time
+import pytest
+from unittest.mock import patch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+from app.backend import api
+from app.backend.profiling import ProfilingMiddleware, RequestProfile, attach_current_thread, profile_path
+
+
+class Payload(BaseModel):
+    items: list
+
+
+def busy_work(duration):
+    end = time.perf_counter() + duration
+    data = []
+    while time.perf_counter() < end:
+        data.append("x" * 100)
+    return len(data)
+
+
+@pytest.fixture
+def client(tmp_path):
+    """App with the profiling middleware and a CPU-bound endpoint"""
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware, store_dir=str(tmp_path), admin_key="admin", interval=0.001)
+
+    @app.post("/work")
+    def work(payload: Payload):
+        attach_current_thread()
+        return {"count": busy_work(0.05), "items": len(payload.items)}
+
+    return TestClient(app)
+
+
+class TestProfilingMiddleware:
+    """Test cases for ProfilingMiddleware"""
+
+    def test_profile_stored(self, client, tmp_path):
+        """Test a profiled request stores a summary and folded stacks"""
+        response = client.post("/work", json={"items": [1, 2]}, headers={"X-Profile": "1", "X-Admin-Key": "admin"})
+
+        assert response.status_code == 200
+        profile_id = response.headers["x-profile-id"]
+        summary = json.loads((tmp_path / f"{profile_id}.json").read_text())
+        assert summary["samples"] > 0
+        assert any("busy_work" in f["function"] for f in summary["top_functions"])
+        folded = (tmp_path / f"{profile_id}.folded").read_text().splitlines()
+        assert all(line.rsplit(" ", 1)[1].isdigit() for line in folded)
+
+    def test_query_flag(self, client):
+        response = client.post("/work?profile=true", json={"items": []}, headers={"X-Admin-Key": "admin"})
+        assert "x-profile-id" in response.headers
+
+    def test_not_requested(self, client):
+        """Test normal requests are passed through untouched"""
+        response = client.post("/work", json={"items": []})
+        assert response.status_code == 200
+        assert "x-profile-id" not in response.headers
+
+    def test_admin_required(self, client):
+        response = client.post("/work", json={"items": []}, headers={"X-Profile": "1", "X-Admin-Key": "wrong"})
+        assert response.status_code == 403
+
+    def test_ignored_without_admin_key(self, tmp_path):
+        """Test the profile flag is ignored when no admin key is configured"""
+        app = FastAPI()
+        app.add_middleware(ProfilingMiddleware, store_dir=str(tmp_path), admin_key=None)
+        app.get("/ping")(lambda: {"ok": True})
+
+        response = TestClient(app).get("/ping", headers={"X-Profile": "1"})
+
+        assert response.status_code == 200
+        assert "x-profile-id" not in response.headers
+        assert list(tmp_path.iterdir()) == []
+
+
+class TestRequestProfile:
+    """Test cases for RequestProfile"""
+
+    def test_allocations_reported(self):
+        """Test allocations made during the profile show up in the summary"""
+        profile = RequestProfile(interval=0.001)
+        profile.start()
+        kept = [bytearray(1024) for _ in range(200)]
+        result = profile.stop()
+
+        assert result["allocated_kb"] >= 150
+        assert any("test_profiling.py" in a["location"] for a in result["allocations"])
+        assert len(kept) == 200
+
+    def test_profile_path_rejects_traversal(self, tmp_path):
+        with pytest.raises(ValueError):
+            profile_path(str(tmp_path), "../etc/passwd")
+
+
+class TestProfileEndpoint:
+    """Test cases for GET /profiles/{id}"""
+
+    def test_get_profile(self, tmp_path):
+        (tmp_path / "abc123.json").write_text(json.dumps({"profile_id": "abc123"}))
+        (tmp_path / "abc123.folded").write_text("main;work 3\n")
+        client = TestClient(api.app)
+
+        with patch.object(api.settings, "PROFILE_DIR", str(tmp_path)), \
+             patch.object(api.settings, "ADMIN_API_KEY", "admin"):
+            headers = {"X-Admin-Key": "admin"}
+            assert client.get("/profiles/abc123", headers=headers).json() == {"profile_id": "abc123"}
+            assert client.get("/profiles/abc123?format=folded", headers=headers).text == "main;work 3\n"
+            assert client.get("/profiles/missing", headers=headers).status_code == 404
+            assert client.get("/profiles/abc123").status_code == 403
+
+    def test_disabled_without_admin_key(self, tmp_path):
+        (tmp_path / "abc123.json").write_text(json.dumps({"profile_id": "abc123"}))
+        with patch.object(api.settings, "PROFILE_DIR", str(tmp_path)), \
+             patch.object(api.settings, "ADMIN_API_KEY", None):
+            assert TestClient(api.app).get("/profiles/abc123").status_code == 503
@@ -0,0 +1,203 @@
+"""Tests for app.core.prompts module and the /prompts endpoints"""
+import json
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.backend import api
+from app.common.shared_state import InMemorySharedState
+from app.core.prompts import PromptRegistry, canonicalize_prompt
+
+
+class TestCanonicalizePrompt:
+    """Test cases for canonicalize_prompt"""
+
+    def test_whitespace_and_line_endings(self):
+        """Test equivalent prompts canonicalise to the same text"""
+        a = canonicalize_prompt("  You are helpful.  \r\n\r\n\r\n\r\nBe brief.\t\n")
+        b = canonicalize_prompt("You are helpful.\n\nBe brief.")
+        assert a == b == "You are helpful.\n\nBe brief."
+
+
+class TestPromptRegistry:
+    """Test cases for PromptRegistry"""
+
+    def test_register_versions(self):
+        """Test versions auto-increment and identical text is deduplicated"""
+        registry = PromptRegistry()
+        v1 = registry.register("support", "You are a support agent.")
+        same = registry.register("support", "You are a support agent.  ")
+        v2 = registry.register("support", "You are a friendly support agent.")
+
+        assert v1.version == 1
+        assert same is v1
+        assert v2.version == 2
+        assert registry.get("support").version == 2
+        assert registry.get("support", 1).text == "You are a support agent."
+
+    def test_conflicting_version(self):
+        """Test that an existing version cannot be overwritten"""
+        registry = PromptRegistry()
+        registry.register("support", "A", version=1)
+        with pytest.raises(ValueError):
+            registry.register("support", "B", version=1)
+
+    def test_unknown_template(self):
+        """Test unknown ids and versions raise KeyError"""
+        registry = PromptRegistry()
+        registry.register("support", "A")
+        with pytest.raises(KeyError):
+            registry.get("missing")
+        with pytest.raises(KeyError):
+            registry.get("support", 5)
+
+    def test_resolve_keeps_template_prefix(self):
+        """Test variables are appended after the cacheable template prefix"""
+        registry = PromptRegistry()
+        template = registry.register("support", "You are a support agent.")
+
+        prompt = registry.resolve(template_id="support", variables={"product": "Widgets", "customer": "ACME"})
+
+        assert prompt.startswith(template.text)
+        assert prompt.endswith("customer: ACME\nproduct: Widgets")
+
+    def test_resolve_inline_reuses_interned_text(self):
+        """Test inline prompts matching a template reuse the interned string"""
+        registry = PromptRegistry()
+        template = registry.register("support", "You are a support agent.")
+
+        prompt = registry.resolve(" You are a support agent. ")
+
+        assert prompt is template.text
+        assert registry.stats()["inline_matching_template"] == 1
+
+    def test_stats(self):
+        """Test request-size statistics"""
+        registry = PromptRegistry()
+        template = registry.register("support", "You are a support agent. " * 20)
+        registry.resolve(template_id="support")
+        registry.resolve(template_id="support")
+
+        stats = registry.stats()
+        assert stats["template_requests"] == 2
+        assert stats["request_bytes_saved"] == 2 * (template.size_bytes - len("support"))
+        assert stats["cacheable_prefix_tokens"] == 2 * template.tokens
+        assert stats["by_template"] == {"support@v1": 2}
+
+    def test_load_file(self, tmp_path):
+        """Test templates load from JSON"""
+        path = tmp_path / "templates.json"
+        path.write_text(json.dumps({"a": "Prompt A", "b": {"text": "Prompt B", "version": 3}}))
+
+        registry = PromptRegistry()
+        assert registry.load_file(str(path)) == 2
+        assert registry.get("b").version == 3
+        assert registry.load_file(str(tmp_path / "missing.json")) == 0
+
+
+class TestSharedPromptRegistry:
+    """Test cases for PromptRegistry kept in step across tasks through a shared state"""
+
+    def test_registration_seen_by_other_task(self):
+        """Test a template registered in one task resolves at once in another"""
+        state = InMemorySharedState()
+        a, b = PromptRegistry(state), PromptRegistry(state)
+        a.register("support", "You are a support agent.")
+
+        assert b.get("support").text == "You are a support agent."
+        assert [t["id"] for t in b.list()] == ["support"]
+
+    def test_tasks_agree_on_versions(self):
+        """Test versions are assigned in log order, and a conflicting version is refused in every task"""
+        state = InMemorySharedState()
+        a, b = PromptRegistry(state), PromptRegistry(state)
+        a.register("support", "A")
+        assert b.register("support", "B").version == 2
+        assert b.register("support", "A", version=1).version == 1
+        with pytest.raises(ValueError):
+            a.register("support", "C", version=2)
+
+        assert a.get("support").text == b.get("support").text == "B"
+
+    def test_unwritten_entry_skipped_after_timeout(self):
+        """Test a reserved log entry whose writer died does not block later registrations"""
+        state = InMemorySharedState()
+        state.incr("prompts:log")
+        registry = PromptRegistry(state, gap_timeout=0.1)
+
+        assert registry.register("support", "A").version == 1
+
+
+class TestPromptEndpoints:
+    """Test cases for template use through the API"""
+
+    @pytest.fixture
+    def registry(self):
+        registry = PromptRegistry()
+        registry.register("support", "You are a support agent.")
+        with patch('app.backend.api.prompt_registry', registry):
+            yield registry
+
+    @pytest.fixture
+    def client(self, registry):
+        return TestClient(api.app)
+
+    @patch('app.backend.api.get_response_from_ai_agents')
+    def test_chat_with_template_id(self, mock_get_response, client):
+        """Test the template text is passed to the agent"""
+        mock_get_response.return_value = "ok"
+
+        response = client.post("/chat", json={
+            "model_name": "llama-3.1-8b-instant",
+            "system_prompt_id": "support",
+            "messages": ["Hello"],
+            "allow_search": False
+        })
+
+        assert response.status_code == 200
+        assert mock_get_response.call_args.args[3] == "You are a support agent."
+
+    def test_chat_with_unknown_template(self, client):
+        """Test unknown template ids return 404"""
+        response = client.post("/chat", json={
+            "model_name": "llama-3.1-8b-instant",
+            "system_prompt_id": "missing",
+            "messages": ["Hello"],
+            "allow_search": False
+        })
+        assert response.status_code == 404
+
+    def test_chat_with_prompt_and_template(self, client):
+        """Test that inline prompt and template id are mutually exclusive"""
+        response = client.post("/chat", json={
+            "model_name": "llama-3.1-8b-instant",
+            "system_prompt": "inline",
+            "system_prompt_id": "support",
+            "messages": ["Hello"],
+            "allow_search": False
+        })
+        assert response.status_code == 400
+
+    @patch.object(api.settings, 'ADMIN_API_KEY', "secret")
+    def test_register_and_list(self, client):
+        """Test templates can be registered and listed"""
+        response = client.post("/prompts", json={"id": "sales", "text": "You sell things."},
+                               headers={"X-Admin-Key": "secret"})
+        assert response.status_code == 201
+        assert response.json()["version"] == 1
+
+        ids = {t["id"] for t in client.get("/prompts").json()["templates"]}
+        assert ids == {"support", "sales"}
+        assert client.get("/prompts/sales").json()["text"] == "You sell things."
+        assert "request_bytes_saved" in client.get("/prompts/stats").json()
+
+    @patch.object(api.settings, 'ADMIN_API_KEY', "secret")
+    def test_register_requires_admin_key(self, client):
+        """Test registration needs the admin key"""
+        response = client.post("/prompts", json={"id": "sales", "text": "x"})
+        assert response.status_code == 403
+
+    @patch.object(api.settings, 'ADMIN_API_KEY', None)
+    def test_register_disabled_without_admin_key(self, client):
+        """Test registration is refused when no admin key is configured"""
+        response = client.post("/prompts", json={"id": "sales", "text": "x"})
+        assert response.status_code == 503
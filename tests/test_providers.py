@@ -0,0 +1,91 @@
+"""Tests for app.core.providers module"""
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from langchain_core.messages.human import HumanMessage
+from app.backend import api
+from app.core.providers import (
+    LocalChatModel, LocalProvider, LocalProviderError, GroqProvider, get_provider, local_search_tool
+)
+
+
+def local_model(**options):
+    options.setdefault("latency_ms", 0)
+    options.setdefault("tokens_per_second", 0)
+    return LocalChatModel(model_name="local-test", **options)
+
+
+@pytest.fixture
+def local_settings():
+    """Route every model to a fresh local provider with no simulated delay"""
+    with patch('app.core.providers._providers', {"groq": GroqProvider(lambda model_name: None)}), \
+         patch('app.core.providers.settings', LLM_PROVIDER="local", MODEL_PROVIDERS={},
+               LOCAL_TOKENS_PER_SECOND=0, LOCAL_LATENCY_MS=0, LOCAL_LATENCY_SIGMA=0.5, LOCAL_OUTPUT_TOKENS=16,
+               LOCAL_TOOL_ROUNDS=1, LOCAL_ERROR_RATE=0.0, LOCAL_ERROR_STATUS=503, LOCAL_SEED=0):
+        yield
+
+
+class TestLocalChatModel:
+    """Test cases for LocalChatModel"""
+
+    def test_deterministic_answer_and_usage(self):
+        first = local_model(output_tokens=20).invoke([HumanMessage(content="What is LangGraph?")])
+        second = local_model(output_tokens=20).invoke([HumanMessage(content="What is LangGraph?")])
+
+        assert first.content == second.content
+        assert first.content.startswith("[local-test] Answer to: What is LangGraph?")
+        assert first.usage_metadata["output_tokens"] == 20
+
+    def test_tool_rounds(self):
+        """Test the model calls its bound tool tool_rounds times, then answers"""
+        model = local_model(tool_rounds=1).bind_tools([local_search_tool()])
+        call = model.invoke([HumanMessage(content="news today")])
+        assert call.tool_calls[0]["name"] == "local_search"
+        assert call.tool_calls[0]["args"] == {"query": "news today"}
+
+    def test_error_injection(self):
+        with pytest.raises(LocalProviderError) as exc:
+            local_model(error_rate=1.0, error_status=429).invoke([HumanMessage(content="hi")])
+        assert exc.value.status_code == 429
+
+    def test_simulated_latency(self):
+        """Test the call takes time-to-first-token plus output tokens at the configured rate"""
+        with patch('app.core.providers.time.sleep') as mock_sleep:
+            local_model(latency_ms=100, latency_sigma=0, tokens_per_second=100, output_tokens=50).invoke(
+                [HumanMessage(content="hi")])
+        assert mock_sleep.call_args.args[0] == pytest.approx(0.1 + 0.5)
+
+
+class TestRegistry:
+    """Test cases for provider selection"""
+
+    def test_routing(self, local_settings):
+        with patch('app.core.providers.settings.MODEL_PROVIDERS', {"llama-3.3-70b-versatile": "groq"}):
+            assert isinstance(get_provider("llama-3.1-8b-instant"), LocalProvider)
+            assert isinstance(get_provider("llama-3.3-70b-versatile"), GroqProvider)
+
+    def test_unknown_provider(self, local_settings):
+        with patch('app.core.providers.settings.LLM_PROVIDER', "nope"):
+            with pytest.raises(ValueError, match="Unknown LLM provider 'nope'"):
+                get_provider("llama-3.1-8b-instant")
+
+
+class TestOfflineStack:
+    """Test cases for the full API and agent stack on the local provider"""
+
+    def test_chat_with_search_offline(self, local_settings):
+        """Test /chat runs the react loop with the local model and search tool, without API keys"""
+        with patch('app.core.ai_agent.settings.GROQ_API_KEY', None), \
+             patch('app.core.ai_agent.settings.TAVILY_API_KEY', None):
+            response = TestClient(api.app).post("/chat", json={
+                "model_name": "llama-3.1-8b-instant",
+                "messages": ["Latest LangGraph release?"],
+                "allow_search": True,
+                "include_trace": True
+            })
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body["response"].startswith("[llama-3.1-8b-instant] Answer to: Latest LangGraph release?")
+        assert [step["type"] for step in body["metadata"]["trace"]] == ["ai", "tool", "ai"]
+        assert body["metadata"]["usage"]["llm_calls"] == 2
@@ -0,0 +1,175 @@
+"""Tests for app.core.retrieval module"""
+import os
+import pytest
+import numpy as np
+from unittest.mock import patch, MagicMock
+from langchain_core.messages.ai import AIMessage
+from app.core.retrieval import (
+    chunk_text, embed_texts, ingest_directory, load_index, build_retrieval_tool
+)
+from app.core.ai_agent import get_response_from_ai_agents
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    """Create a small document corpus"""
+    source = tmp_path / "docs"
+    source.mkdir()
+    (source / "billing.md").write_text(
+        "Invoices are issued on the first business day of each month. "
+        "Refunds for billing errors are processed within five days."
+    )
+    (source / "oncall.txt").write_text(
+        "The on-call engineer rotates every Monday. Pager escalation goes to the "
+        "platform team after fifteen minutes without acknowledgement."
+    )
+    (source / "image.png").write_bytes(b"\x89PNG")
+    return source
+
+
+class TestChunking:
+    """Test cases for chunk_text"""
+
+    def test_chunk_text_overlap(self):
+        """Test that consecutive chunks share the overlap window"""
+        text = " ".join(str(i) for i in range(10))
+        chunks = chunk_text(text, chunk_size=4, overlap=2)
+
+        assert chunks[0] == "0 1 2 3"
+        assert chunks[1] == "2 3 4 5"
+        assert chunks[-1].endswith("9")
+
+    def test_chunk_text_empty(self):
+        """Test that empty text yields no chunks"""
+        assert chunk_text("   ") == []
+
+    def test_chunk_text_invalid_overlap(self):
+        """Test that overlap must be smaller than the chunk size"""
+        with pytest.raises(ValueError):
+            chunk_text("a b c", chunk_size=2, overlap=2)
+
+
+class TestEmbedding:
+    """Test cases for embed_texts"""
+
+    def test_embeddings_are_normalised_and_deterministic(self):
+        """Test vectors are unit length and stable across calls"""
+        first = embed_texts(["pager escalation policy", "monthly invoices"], dim=64)
+        second = embed_texts(["pager escalation policy", "monthly invoices"], dim=64)
+
+        assert first.shape == (2, 64)
+        assert first.dtype == np.float32
+        np.testing.assert_allclose(np.linalg.norm(first, axis=1), 1.0, rtol=1e-5)
+        np.testing.assert_array_equal(first, second)
+
+    def test_empty_text_embeds_to_zero(self):
+        """Test that text without tokens does not produce NaNs"""
+        vector = embed_texts([""], dim=16)
+        assert not np.isnan(vector).any()
+
+
+class TestIndex:
+    """Test cases for ingestion and search"""
+
+    def test_ingest_and_search(self, corpus, tmp_path):
+        """Test that the most relevant document ranks first"""
+        index_dir = str(tmp_path / "index")
+        manifest = ingest_directory(str(corpus), index_dir, chunk_size=50, overlap=10,
+                                    dim=256, workers=1)
+
+        assert manifest["files"] == 2
+        assert manifest["chunks"] == 2
+
+        index = load_index(index_dir)
+        results = index.search("when is the pager escalated", k=2)
+
+        assert results[0]["source"] == "oncall.txt"
+        assert results[0]["score"] > 0
+
+    def test_search_limits_k(self, corpus, tmp_path):
+        """Test that k larger than the index is clamped"""
+        index_dir = str(tmp_path / "index")
+        ingest_directory(str(corpus), index_dir, dim=128, workers=1)
+
+        assert len(load_index(index_dir).search("invoices billing refunds", k=10)) <= 2
+
+    def test_reingest_swaps_index(self, corpus, tmp_path):
+        """Test re-ingesting switches the index while an open one keeps reading its own build"""
+        index_dir = str(tmp_path / "index")
+        ingest_directory(str(corpus), index_dir, dim=128, workers=1)
+        old = load_index(index_dir)
+        before = old.search("invoices billing refunds", k=1)
+        (corpus / "a-first.md").write_text("Rotate every API key at least once a quarter. " * 20)
+
+        ingest_directory(str(corpus), index_dir, dim=128, workers=1)
+
+        assert old.search("invoices billing refunds", k=1) == before
+        assert load_index(index_dir).manifest["files"] == old.manifest["files"] + 1
+        builds = [path.name for path in tmp_path.iterdir() if path.name.startswith("index.")]
+        assert len(builds) == 1 and os.path.realpath(index_dir) == str(tmp_path / builds[0])
+
+    def test_legacy_index_directory_replaced(self, corpus, tmp_path):
+        """Test an index written as a plain directory is switched to a versioned build"""
+        index_dir = tmp_path / "index"
+        index_dir.mkdir()
+        (index_dir / "manifest.json").write_text("{}")
+
+        ingest_directory(str(corpus), str(index_dir), dim=128, workers=1)
+
+        assert index_dir.is_symlink()
+        assert load_index(str(index_dir)).search("invoices billing refunds", k=1)
+
+    def test_failed_swap_keeps_old_index(self, corpus, tmp_path):
+        index_dir = str(tmp_path / "index")
+        ingest_directory(str(corpus), index_dir, dim=128, workers=1)
+        current = os.path.realpath(index_dir)
+
+        with patch("app.core.retrieval.os.replace", side_effect=OSError("disk full")):
+            with pytest.raises(OSError):
+                ingest_directory(str(corpus), index_dir, dim=128, workers=1)
+
+        assert os.path.realpath(index_dir) == current
+        assert sorted(path.name for path in tmp_path.iterdir()) == sorted(["docs", "index", os.path.basename(current)])
+        assert load_index(index_dir).search("invoices billing refunds", k=1)
+
+    def test_load_missing_index(self, tmp_path):
+        """Test that a missing index raises ValueError"""
+        with pytest.raises(ValueError, match="Local document index not found"):
+            load_index(str(tmp_path / "missing"))
+
+    def test_retrieval_tool(self, corpus, tmp_path):
+        """Test the agent tool returns formatted passages"""
+        index_dir = str(tmp_path / "index")
+        ingest_directory(str(corpus), index_dir, dim=128, workers=1)
+
+        tool = build_retrieval_tool(index_dir, k=1)
+        output = tool.invoke({"query": "refunds for billing errors"})
+
+        assert tool.name == "local_document_search"
+        assert "billing.md" in output
+
+
+class TestAgentIntegration:
+    """Test cases for retrieval in get_response_from_ai_agents"""
+
+    @patch('app.core.ai_agent.settings')
+    @patch('app.core.ai_agent.ChatGroq')
+    @patch('app.core.ai_agent.build_retrieval_tool')
+    @patch('app.core.ai_agent.create_react_agent')
+    def test_retrieval_tool_added(self, mock_create_agent, mock_build_tool, mock_chatgroq, mock_settings):
+        """Test that allow_retrieval adds the local search tool"""
+        mock_settings.GROQ_API_KEY = "test_groq_key"
+        mock_agent = MagicMock()
+        mock_agent.invoke.return_value = {"messages": [AIMessage(content="From the docs")]}
+        mock_create_agent.return_value = mock_agent
+
+        result = get_response_from_ai_agents(
+            llm_id="llama-3.1-8b-instant",
+            query=["test message"],
+            allow_search=False,
+            system_prompt="You are a helpful assistant",
+            allow_retrieval=True
+        )
+
+        assert result == "From the docs"
+        assert mock_create_agent.call_args.kwargs["tools"] == [mock_build_tool.return_value]
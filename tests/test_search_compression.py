@@ -0,0 +1,136 @@
+"""Tests for app.core.search_compression module"""
+from unittest.mock import patch
+from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+from langchain_core.messages.ai import AIMessage
+from langchain_core.tools import tool
+from app.core.ai_agent import get_response_from_ai_agents
+from app.core.search_compression import (
+    compress_results, compressed_search_tool, compression_stats, dedupe, is_boilerplate, bm25_scores
+)
+
+TAVILY_RESPONSE = {
+    "query": "eiffel tower height",
+    "follow_up_questions": None,
+    "answer": None,
+    "images": [],
+    "results": [
+        {
+            "url": "https://example.com/eiffel",
+            "title": "Eiffel Tower",
+            "score": 0.9,
+            "raw_content": None,
+            "content": "Skip to main content\nThe Eiffel Tower is 330 metres tall including its antennas. "
+                       "It was completed in 1889 for the World's Fair. Accept all cookies to continue.",
+        },
+        {
+            "url": "https://mirror.example.org/eiffel",
+            "title": "Eiffel Tower (mirror)",
+            "score": 0.7,
+            "raw_content": None,
+            "content": "The Eiffel Tower is 330 metres tall including its antennas! "
+                       "Paris has many bakeries selling fresh croissants every morning.",
+        },
+    ],
+    "response_time": 1.2,
+}
+
+
+class ToolCallingFakeModel(FakeMessagesListChatModel):
+    def bind_tools(self, tools, tool_choice=None, **kwargs):
+        return self
+
+
+@tool
+def tavily_search(query: str) -> dict:
+    """Search the web"""
+    return TAVILY_RESPONSE
+
+
+class TestStages:
+    """Test cases for the individual compression stages"""
+
+    def test_boilerplate(self):
+        assert is_boilerplate("Skip to main content")
+        assert is_boilerplate("Accept all cookies to continue.")
+        assert not is_boilerplate("The Eiffel Tower is 330 metres tall including its antennas.")
+
+    def test_near_duplicates_removed(self):
+        passages = [{"text": "The Eiffel Tower is 330 metres tall including its antennas."},
+                    {"text": "The Eiffel Tower is 330 metres tall, including its antennas!"},
+                    {"text": "It was completed in 1889 for the World's Fair."}]
+        assert [p["text"] for p in dedupe(passages)] == [passages[0]["text"], passages[2]["text"]]
+
+    def test_bm25_prefers_relevant_text(self):
+        scores = bm25_scores("eiffel tower height", ["The Eiffel Tower height is 330 m.", "Croissants in Paris."])
+        assert scores[0] > scores[1] == 0
+
+
+class TestCompressResults:
+    """Test cases for compress_results"""
+
+    def test_compression(self):
+        """Test boilerplate, duplicates and unused fields are dropped and sources keep page order"""
+        compressed = compress_results(TAVILY_RESPONSE, "eiffel tower height", token_budget=0)
+
+        assert compressed == {
+            "query": "eiffel tower height",
+            "results": [
+                {"title": "Eiffel Tower", "url": "https://example.com/eiffel",
+                 "content": "The Eiffel Tower is 330 metres tall including its antennas. "
+                            "It was completed in 1889 for the World's Fair."},
+                {"title": "Eiffel Tower (mirror)", "url": "https://mirror.example.org/eiffel",
+                 "content": "Paris has many bakeries selling fresh croissants every morning."},
+            ],
+        }
+
+    def test_token_budget_keeps_most_relevant(self):
+        compressed = compress_results(TAVILY_RESPONSE, "eiffel tower height metres", token_budget=20)
+        assert compressed["results"] == [{
+            "title": "Eiffel Tower", "url": "https://example.com/eiffel",
+            "content": "The Eiffel Tower is 330 metres tall including its antennas.",
+        }]
+
+
+class TestCompressedSearchTool:
+    """Test cases for the tool wrapper and savings report"""
+
+    @patch('app.core.search_compression.settings', SEARCH_COMPRESSION_ENABLED=True, SEARCH_TOKEN_BUDGET=1500,
+           SEARCH_MODEL_TOKEN_BUDGETS={"small-model": 20})
+    def test_reports_tokens_saved(self, mock_settings):
+        wrapped = compressed_search_tool(tavily_search, "small-model")
+        assert wrapped.name == "tavily_search" and wrapped.token_budget == 20
+
+        with compression_stats() as stats:
+            output = wrapped.invoke({"query": "eiffel tower height"})
+
+        assert len(output["results"]) == 1
+        assert stats["searches"] == 1
+        assert stats["tokens_saved"] == stats["tokens_before"] - stats["tokens_after"] > 0
+
+    @patch('app.core.search_compression.settings', SEARCH_COMPRESSION_ENABLED=False)
+    def test_disabled(self, mock_settings):
+        assert compressed_search_tool(tavily_search, "small-model") is tavily_search
+
+
+class TestAgentSearchCompression:
+    """Test cases for compression inside get_response_from_ai_agents"""
+
+    @patch('app.core.search_compression.settings', SEARCH_COMPRESSION_ENABLED=True, SEARCH_TOKEN_BUDGET=1500,
+           SEARCH_MODEL_TOKEN_BUDGETS={})
+    @patch('app.core.ai_agent.settings', GROQ_API_KEY="test_groq_key", TAVILY_API_KEY="test_tavily_key")
+    @patch('app.core.ai_agent.TavilySearch', return_value=tavily_search)
+    @patch('app.core.ai_agent.ChatGroq')
+    def test_tokens_saved_in_metadata(self, mock_chatgroq, mock_tavily, mock_settings, mock_compression_settings):
+        """Test the model sees compressed results and the request reports the tokens saved"""
+        search_call = AIMessage(content="", tool_calls=[
+            {"name": "tavily_search", "args": {"query": "eiffel tower height"}, "id": "call_1"}])
+        mock_chatgroq.return_value = ToolCallingFakeModel(responses=[search_call, AIMessage(content="330 m")])
+
+        metadata = {}
+        result = get_response_from_ai_agents("llama-3.1-8b-instant", ["How tall?"], True, "prompt",
+                                             metadata=metadata, include_trace=True)
+
+        assert result == "330 m"
+        assert metadata["search_compression"]["searches"] == 1
+        assert metadata["search_compression"]["tokens_saved"] > 0
+        assert "cookies" not in metadata["trace"][1]["content"]
@@ -0,0 +1,237 @@
+"""Tests for app.common.shared_state and the caches and stores built on it"""
+import pytest
+from unittest.mock import patch, MagicMock
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from langchain_core.tools import tool
+from app.backend import api
+from app.backend.sessions import SessionStore
+from app.backend.tenancy import UsageLedger
+from app.common import shared_state as shared_state_module
+from app.common.shared_state import InMemorySharedState, NearCache, create_shared_state
+from app.core.caching import ResponseCache, cached_search_tool
+
+
+class CountingState(InMemorySharedState):
+    """In-memory backend that counts calls, standing in for a remote one"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def get(self, key):
+        self.calls += 1
+        return super().get(key)
+
+    def get_many(self, keys):
+        self.calls += 1
+        return {key: value for key, value in ((k, super(CountingState, self).get(k)) for k in keys)
+                if value is not None}
+
+
+class TestInMemorySharedState:
+    """Test cases for InMemorySharedState"""
+
+    def test_ttl_expiry(self):
+        state = InMemorySharedState()
+        with patch("app.common.shared_state.time.time", return_value=100.0):
+            state.set("k", {"a": 1}, ttl=10)
+        with patch("app.common.shared_state.time.time", return_value=105.0):
+            assert state.get("k") == {"a": 1}
+        with patch("app.common.shared_state.time.time", return_value=111.0):
+            assert state.get("k") is None
+
+    def test_incr(self):
+        state = InMemorySharedState()
+        assert state.incr("n", 2, ttl=60) == 2
+        assert state.incr("n", 3) == 5
+        assert state.get_many(["n", "missing"]) == {"n": 5}
+
+
+class TestNearCache:
+    """Test cases for NearCache"""
+
+    def test_reads_served_locally(self):
+        """Test repeated reads and misses only reach the backend once per ttl"""
+        backend = CountingState()
+        backend.set("k", "v")
+        cache = NearCache(backend, ttl=60)
+
+        assert [cache.get("k") for _ in range(5)] == ["v"] * 5
+        assert cache.get("absent") is None and cache.get("absent") is None
+        assert backend.calls == 2
+        assert cache.stats()["hits"] == 5
+
+    def test_write_through(self):
+        backend = CountingState()
+        cache = NearCache(backend, ttl=60)
+        cache.set("k", "v", ttl=30)
+
+        assert backend.get("k") == "v"
+        assert cache.get("k") == "v"
+        cache.delete("k")
+        assert cache.get("k") is None
+
+    def test_bounded(self):
+        cache = NearCache(InMemorySharedState(), ttl=60, max_entries=2)
+        for key in "abc":
+            cache.set(key, key)
+        assert cache.stats()["entries"] == 2
+
+    def test_get_many_mixes_local_and_remote(self):
+        backend = CountingState()
+        backend.set("a", 1)
+        backend.set("b", 2)
+        cache = NearCache(backend, ttl=60)
+        cache.get("a")
+
+        assert cache.get_many(["a", "b", "c"]) == {"a": 1, "b": 2}
+        assert backend.calls == 2
+
+
+class TestCreateSharedState:
+    """Test cases for create_shared_state"""
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError, match="Unknown SHARED_STATE_BACKEND"):
+            create_shared_state("memcached")
+
+    @patch.object(shared_state_module, "redis")
+    def test_redis_wrapped_in_near_cache(self, mock_redis):
+        state = create_shared_state("redis", "redis://cache:6379/0", prefix="p:", near_cache_ttl=2)
+
+        assert isinstance(state, NearCache)
+        mock_redis.Redis.from_url.assert_called_once_with("redis://cache:6379/0")
+
+    @patch.object(shared_state_module, "redis", None)
+    def test_redis_missing(self):
+        with pytest.raises(ImportError):
+            create_shared_state("redis", "redis://cache:6379/0")
+
+
+class TestSharedQuotas:
+    """Test cases for quota windows counted across tasks"""
+
+    def test_quota_enforced_across_ledgers(self):
+        """Test usage recorded on one task counts against the quota on another"""
+        state = InMemorySharedState()
+        task_a = UsageLedger(request_quota=2, shared_state=state, sync_interval=3600)
+        task_b = UsageLedger(request_quota=2, shared_state=state, sync_interval=3600)
+
+        task_b.check_quota("acme")
+        task_a.record("acme", "llama-3.1-8b-instant")
+        task_a.record("acme", "llama-3.1-8b-instant")
+        task_a.sync()
+        task_b.sync()
+
+        with pytest.raises(HTTPException) as exc:
+            task_b.check_quota("acme")
+        assert exc.value.status_code == 429
+        assert task_b.report("acme") == {}
+        assert task_a.report("acme")["acme"]["window"]["requests_used"] == 2
+
+    def test_unsynced_local_usage_counts(self):
+        """Test usage not yet pushed still counts on the task that recorded it"""
+        ledger = UsageLedger(request_quota=1, shared_state=InMemorySharedState(), sync_interval=3600)
+        ledger.record("acme", "llama-3.1-8b-instant")
+
+        with pytest.raises(HTTPException):
+            ledger.check_quota("acme")
+
+
+class TestCaches:
+    """Test cases for the response cache, search cache and session store"""
+
+    def test_search_cache(self):
+        calls = []
+
+        @tool
+        def search(query: str) -> str:
+            """Search the web"""
+            calls.append(query)
+            return f"results for {query}"
+
+        cached = cached_search_tool(search, InMemorySharedState(), ttl=60)
+
+        assert cached.invoke({"query": "groq"}) == cached.invoke({"query": "groq"}) == "results for groq"
+        assert calls == ["groq"]
+        assert cached.name == "search"
+
+    def test_search_cache_disabled(self):
+        search = MagicMock()
+        assert cached_search_tool(search, InMemorySharedState(), ttl=0) is search
+
+    def test_session_history_trimmed(self):
+        sessions = SessionStore(InMemorySharedState(), max_turns=3)
+        sessions.append("acme", "s1", ["hi"], "hello")
+        history = sessions.append("acme", "s1", ["and?"], "more")
+
+        assert [turn["content"] for turn in history] == ["hello", "and?", "more"]
+        assert sessions.get("acme", "s1") == history
+        assert sessions.get("acme", "other") == []
+
+    def test_sessions_isolated_by_tenant(self):
+        """Test another tenant using the same session id neither sees nor extends the history"""
+        sessions = SessionStore(InMemorySharedState())
+        sessions.append("acme", "s1", ["secret"], "noted")
+        sessions.append("globex", "s1", ["hi"], "hello")
+
+        assert sessions.get("globex", "s1") == [{"role": "user", "content": "hi"},
+                                                {"role": "assistant", "content": "hello"}]
+        assert [turn["content"] for turn in sessions.get("acme", "s1")] == ["secret", "noted"]
+
+
+class TestChatEndpointState:
+    """Test cases for the response cache and sessions on POST /chat"""
+
+    @pytest.fixture
+    def payload(self):
+        return {
+            "model_name": "llama-3.1-8b-instant",
+            "system_prompt": "You are a helpful assistant",
+            "messages": ["Hello"],
+            "allow_search": False
+        }
+
+    @patch('app.backend.api.get_response_from_ai_agents')
+    def test_response_cache_hit(self, mock_get_response, payload):
+        """Test a repeated request is answered from the cache"""
+        mock_get_response.return_value = "Hi there"
+        client = TestClient(api.app)
+
+        with patch.object(api, "response_cache", ResponseCache(InMemorySharedState(), ttl=60)):
+            first = client.post("/chat", json=payload).json()
+            second = client.post("/chat", json=payload).json()
+
+        assert first == {"response": "Hi there"}
+        assert second == {"response": "Hi there", "metadata": {"cached": True}}
+        mock_get_response.assert_called_once()
+
+    @patch('app.backend.api.get_response_from_ai_agents')
+    def test_response_cache_keyed_by_supervisor(self, mock_get_response, payload):
+        """Test a supervisor-mode answer is not served to a single-agent request"""
+        mock_get_response.return_value = "Hi there"
+        client = TestClient(api.app)
+
+        with patch.object(api, "response_cache", ResponseCache(InMemorySharedState(), ttl=60)):
+            client.post("/chat", json=dict(payload, supervisor=True))
+            single = client.post("/chat", json=payload).json()
+
+        assert single == {"response": "Hi there"}
+        assert mock_get_response.call_count == 2
+
+    @patch('app.backend.api.get_response_from_ai_agents')
+    def test_session_history_passed(self, mock_get_response, payload):
+        """Test later turns of a session receive the earlier exchange"""
+        mock_get_response.return_value = "Hi there"
+        client = TestClient(api.app)
+
+        with patch.object(api, "session_store", SessionStore(InMemorySharedState())):
+            client.post("/chat", json=dict(payload, session_id="s1"))
+            client.post("/chat", json=dict(payload, session_id="s1", messages=["Again"]))
+
+        assert mock_get_response.call_args_list[0].kwargs["history"] == []
+        assert mock_get_response.call_args.kwargs["history"] == [
+            {"role": "user", "content": "Hello"},
+            {"role": "assistant", "content": "Hi there"},
+        ]
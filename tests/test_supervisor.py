@@ -0,0 +1,116 @@
+"""Tests for app.core.supervisor module"""
+import json
+import threading
+import time
+from unittest.mock import patch
+from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+from langchain_core.messages.ai import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from app.core.supervisor import Supervisor, parse_plan, PLANNER_PROMPT
+from app.core.ai_agent import get_response_from_ai_agents
+
+PLAN = json.dumps({"subtasks": [
+    {"task": "population of France", "agent": "search"},
+    {"task": "population of Spain", "agent": "general"},
+]})
+
+
+class ScriptedModel(FakeMessagesListChatModel):
+    """Fake chat model that plans, synthesizes or answers depending on the prompt it gets"""
+
+    responses: list = []
+
+    def bind_tools(self, tools, tool_choice=None, **kwargs):
+        return self
+
+    def _generate(self, messages, *args, **kwargs):
+        first, last = messages[0].content, messages[-1].content
+        if first.startswith(PLANNER_PROMPT[:20]):
+            text = PLAN
+        elif "Combine them" in last:
+            text = "combined answer"
+        else:
+            text = f"answer to {last}"
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+
+class TestParsePlan:
+    """Test cases for parse_plan"""
+
+    def test_json_with_surrounding_text(self):
+        text = f"Here is the plan:\n{PLAN}\nDone."
+        assert parse_plan(text, ["search", "general"], "search", 4) == [
+            {"task": "population of France", "agent": "search"},
+            {"task": "population of Spain", "agent": "general"},
+        ]
+
+    def test_unknown_agent_and_cap(self):
+        """Test agents not allowed for the request fall back to the default and the plan is capped"""
+        assert parse_plan(PLAN, ["general"], "general", 1) == [{"task": "population of France", "agent": "general"}]
+
+    def test_unusable_reply(self):
+        assert parse_plan("I cannot help with that", ["general"], "general", 4) == []
+        assert parse_plan("{not json}", ["general"], "general", 4) == []
+
+
+class TestSupervisor:
+    """Test cases for Supervisor"""
+
+    def test_subtasks_run_in_parallel(self):
+        """Test sub-agents overlap, so the run takes about as long as the slowest subtask"""
+        running = []
+        overlap = threading.Event()
+
+        def run_subagent(kind, task):
+            running.append(task)
+            if len(running) == 2:
+                overlap.set()
+            overlap.wait(2)
+            return [AIMessage(content=f"{kind} found {task}")]
+
+        model = ScriptedModel(responses=[])
+        supervisor = Supervisor(model, model, run_subagent, ["search", "general"])
+        start = time.perf_counter()
+        result = supervisor.invoke("Compare the populations of France and Spain")
+
+        assert overlap.is_set() and time.perf_counter() - start < 2
+        assert [subtask["agent"] for subtask in result["results"]] == ["search", "general"]
+        assert [m.content for m in result["messages"]] == [
+            PLAN, "search found population of France", "general found population of Spain", "combined answer"
+        ]
+
+    def test_single_subtask_skips_synthesis(self):
+        model = ScriptedModel(responses=[])
+        with patch.object(model, "_generate", wraps=model._generate) as generate:
+            supervisor = Supervisor(model, model, lambda kind, task: [AIMessage(content="only answer")],
+                                    ["general"], max_subtasks=1)
+            result = supervisor.invoke("question")
+
+        assert result["messages"][-1].content == "only answer"
+        assert generate.call_count == 1
+
+
+class TestAgentSupervisor:
+    """Test cases for supervisor mode inside get_response_from_ai_agents"""
+
+    @patch('app.core.ai_agent.settings', GROQ_API_KEY="test_groq_key", SUPERVISOR_PLANNER_MODEL="planner",
+           SUPERVISOR_MAX_SUBTASKS=4, SUPERVISOR_AGENT_MODELS={"general": "small-model"})
+    @patch('app.core.ai_agent.ChatGroq')
+    def test_supervisor_metadata(self, mock_chatgroq, mock_settings):
+        """Test search sub-agents are not used without allow_search, and sub-agent models are reported"""
+        mock_chatgroq.side_effect = lambda model: ScriptedModel(responses=[])
+
+        metadata = {}
+        result = get_response_from_ai_agents("llama-3.3-70b-versatile", ["France vs Spain?"], False, "prompt",
+                                             metadata=metadata, supervisor=True)
+
+        assert result == "combined answer"
+        assert [(s["agent"], s["model"]) for s in metadata["supervisor"]["subtasks"]] == [
+            ("general", "small-model"), ("general", "small-model")
+        ]
+        assert metadata["steps"]["llm_calls"] == 4
+        assert metadata["model_latency"]["calls"] == 4
+        assert {model: usage["llm_calls"] for model, usage in metadata["usage_by_model"].items()} == {
+            "planner": 1, "small-model": 2, "llama-3.3-70b-versatile": 1}
+        assert {call.kwargs["model"] for call in mock_chatgroq.call_args_list} == \
+            {"planner", "small-model", "llama-3.3-70b-versatile"}
@@ -0,0 +1,236 @@
+"""Tests for app.backend.tenancy and app.core.usage modules"""
+import json
+import threading
+import time
+import pytest
+from unittest.mock import patch
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from langchain_core.messages.ai import AIMessage
+from langchain_core.messages.human import HumanMessage
+from app.backend import api
+from app.backend.tenancy import resolve_tenant, check_tenant_limits, UsageLedger, FairShareScheduler
+from app.core.usage import extract_usage, estimate_cost
+
+
+class TestUsage:
+    """Test cases for token extraction and cost estimation"""
+
+    def test_extract_usage(self):
+        """Test that usage is summed over AI messages only"""
+        messages = [
+            HumanMessage(content="hi"),
+            AIMessage(content="", usage_metadata={"input_tokens": 10, "output_tokens": 5, "total_tokens": 15}),
+            AIMessage(content="done", usage_metadata={"input_tokens": 20, "output_tokens": 7, "total_tokens": 27}),
+        ]
+        usage = extract_usage(messages)
+
+        assert usage == {"input_tokens": 30, "output_tokens": 12, "total_tokens": 42, "llm_calls": 2}
+
+    def test_estimate_cost(self):
+        """Test cost uses the per-1M token prices"""
+        cost = estimate_cost("llama-3.3-70b-versatile", 1_000_000, 1_000_000)
+        assert cost == pytest.approx(0.59 + 0.79)
+
+    def test_estimate_cost_unknown_model(self):
+        """Test unknown models are costed at zero"""
+        assert estimate_cost("unknown", 1000, 1000) == 0
+
+
+class TestResolveTenant:
+    """Test cases for resolve_tenant"""
+
+    def test_header_trusted_without_keys(self):
+        assert resolve_tenant(None, "team-a", {}) == "team-a"
+        assert resolve_tenant(None, None, {}, "default") == "default"
+
+    def test_api_key_mapping(self):
+        assert resolve_tenant("key-1", "spoofed", {"key-1": "team-a"}) == "team-a"
+
+    def test_invalid_api_key(self):
+        with pytest.raises(HTTPException) as exc:
+            resolve_tenant("bad", None, {"key-1": "team-a"})
+        assert exc.value.status_code == 401
+
+    def test_quotas_need_keys(self):
+        """Test quotas are refused without API keys, since X-Tenant-ID can be rotated"""
+        with pytest.raises(ValueError):
+            check_tenant_limits({}, request_quota=10)
+        with pytest.raises(ValueError):
+            check_tenant_limits({}, tenant_quotas={"team-a": {"tokens": 100}})
+        assert check_tenant_limits({"key-1": "team-a"}, request_quota=10, max_concurrent=4) == []
+
+    def test_fair_share_without_keys_warns(self):
+        assert len(check_tenant_limits({}, max_concurrent=4)) == 1
+        assert check_tenant_limits({}) == []
+
+
+class TestUsageLedger:
+    """Test cases for UsageLedger"""
+
+    def test_record_and_report(self):
+        """Test counters accumulate per tenant and model"""
+        ledger = UsageLedger()
+        ledger.record("team-a", "llama-3.1-8b-instant", {"input_tokens": 100, "output_tokens": 50})
+        ledger.record("team-a", "llama-3.1-8b-instant", error=True)
+        ledger.record("team-b", "openai/gpt-oss-20b", {"input_tokens": 10, "output_tokens": 10})
+
+        report = ledger.report()
+        team_a = report["team-a"]["totals"]
+
+        assert team_a["requests"] == 2
+        assert team_a["errors"] == 1
+        assert team_a["input_tokens"] == 100
+        assert set(ledger.report("team-b")) == {"team-b"}
+
+    def test_record_usage_by_model(self):
+        """Test a multi-model request is priced per model and counted once"""
+        ledger = UsageLedger()
+        cost = ledger.record("team-a", "llama-3.3-70b-versatile", usage_by_model={
+            "llama-3.1-8b-instant": {"input_tokens": 1000, "output_tokens": 100},
+            "llama-3.3-70b-versatile": {"input_tokens": 200, "output_tokens": 50},
+        })
+
+        models = ledger.report()["team-a"]["models"]
+        assert models["llama-3.1-8b-instant"]["requests"] == 0
+        assert models["llama-3.1-8b-instant"]["input_tokens"] == 1000
+        assert models["llama-3.3-70b-versatile"]["requests"] == 1
+        assert cost == pytest.approx(estimate_cost("llama-3.1-8b-instant", 1000, 100) +
+                                     estimate_cost("llama-3.3-70b-versatile", 200, 50))
+
+    def test_token_quota(self):
+        """Test that exceeding the token quota raises 429"""
+        ledger = UsageLedger(token_quota=100)
+        ledger.check_quota("team-a")
+        ledger.record("team-a", "m", {"input_tokens": 80, "output_tokens": 30})
+
+        with pytest.raises(HTTPException) as exc:
+            ledger.check_quota("team-a")
+        assert exc.value.status_code == 429
+        assert "Retry-After" in exc.value.headers
+        ledger.check_quota("team-b")
+
+    def test_tenant_quota_override(self):
+        """Test per-tenant quota overrides"""
+        ledger = UsageLedger(request_quota=1, tenant_quotas={"vip": {"requests": 0}})
+        ledger.record("vip", "m")
+        ledger.record("vip", "m")
+        ledger.check_quota("vip")
+
+    def test_flush_writes_deltas(self, tmp_path):
+        """Test that flush appends only usage since the previous flush"""
+        path = tmp_path / "usage.jsonl"
+        ledger = UsageLedger(flush_path=str(path), flush_interval=3600)
+        ledger.record("team-a", "m", {"input_tokens": 5, "output_tokens": 5})
+
+        assert ledger.flush() == 1
+        assert ledger.flush() == 0
+
+        lines = [json.loads(line) for line in path.read_text().splitlines()]
+        assert lines[0]["tenant"] == "team-a"
+        assert lines[0]["input_tokens"] == 5
+        ledger.close()
+
+
+class TestFairShareScheduler:
+    """Test cases for FairShareScheduler"""
+
+    def test_disabled_scheduler(self):
+        """Test capacity 0 never blocks"""
+        scheduler = FairShareScheduler(0)
+        with scheduler.slot("a"), scheduler.slot("a"):
+            pass
+
+    def test_tenant_limited_to_fair_share(self):
+        """Test a tenant cannot take slots beyond its share while another waits"""
+        scheduler = FairShareScheduler(2)
+        started = threading.Event()
+        release = threading.Event()
+
+        def hold(tenant):
+            with scheduler.slot(tenant, timeout=1):
+                started.set()
+                release.wait(2)
+
+        holder = threading.Thread(target=hold, args=("b",))
+        holder.start()
+        started.wait(1)
+
+        with scheduler.slot("a", timeout=0.5):
+            # b holds one slot and a holds one; with two active tenants each share is 1
+            with pytest.raises(HTTPException) as exc:
+                with scheduler.slot("a", timeout=0.1):
+                    pass
+            assert exc.value.status_code == 429
+
+        release.set()
+        holder.join()
+        assert scheduler.snapshot()["in_flight"] == {}
+
+
+class TestUsageEndpoints:
+    """Test cases for tenant handling in the API"""
+
+    @pytest.fixture
+    def ledger(self):
+        ledger = UsageLedger()
+        with patch('app.backend.api.usage_ledger', ledger):
+            yield ledger
+
+    @pytest.fixture
+    def client(self, ledger):
+        return TestClient(api.app)
+
+    @pytest.fixture
+    def payload(self):
+        return {
+            "model_name": "llama-3.1-8b-instant",
+            "system_prompt": "You are a helpful assistant",
+            "messages": ["Hello"],
+            "allow_search": False
+        }
+
+    @patch('app.backend.api.get_response_from_ai_agents')
+    def test_chat_records_usage(self, mock_get_response, client, ledger, payload):
+        """Test usage and cost are returned and accounted to the tenant"""
+        def fake_response(*args, metadata=None, **kwargs):
+            metadata["usage"] = {"input_tokens": 1000, "output_tokens": 500,
+                                 "total_tokens": 1500, "llm_calls": 1}
+            return "Test AI response"
+        mock_get_response.side_effect = fake_response
+
+        response = client.post("/chat", json=payload, headers={"X-Tenant-ID": "team-a"})
+
+        body = response.json()
+        assert body["response"] == "Test AI response"
+        assert body["metadata"]["cost_usd"] == pytest.approx(estimate_cost("llama-3.1-8b-instant", 1000, 500))
+        assert ledger.report()["team-a"]["totals"]["output_tokens"] == 500
+
+    @patch('app.backend.api.get_response_from_ai_agents')
+    def test_chat_quota_exceeded(self, mock_get_response, client, ledger, payload):
+        """Test that a tenant over quota gets 429"""
+        mock_get_response.return_value = "ok"
+        ledger.request_quota = 1
+
+        assert client.post("/chat", json=payload).status_code == 200
+        assert client.post("/chat", json=payload).status_code == 429
+
+    @patch('app.backend.api.get_response_from_ai_agents', return_value="ok")
+    def test_unkeyed_tenants_share_one_queue(self, mock_get_response, client, ledger, payload):
+        """Test a rotated X-Tenant-ID does not buy a fair share of its own, though usage is still accounted to it"""
+        scheduler = FairShareScheduler(2)
+        with patch.object(api, "scheduler", scheduler), patch.object(scheduler, "slot", wraps=scheduler.slot) as slot:
+            client.post("/chat", json=payload, headers={"X-Tenant-ID": "team-new"})
+
+        assert slot.call_args.args[0] == api.settings.DEFAULT_TENANT
+        assert "team-new" in ledger.report()
+
+    @patch('app.backend.api.get_response_from_ai_agents')
+    def test_usage_report_scoped_to_tenant(self, mock_get_response, client, ledger, payload):
+        """Test tenants only see their own usage"""
+        mock_get_response.return_value = "ok"
+        client.post("/chat", json=payload, headers={"X-Tenant-ID": "team-a"})
+        client.post("/chat", json=payload, headers={"X-Tenant-ID": "team-b"})
+
+        report = client.get("/usage", headers={"X-Tenant-ID": "team-a"}).json()
+        assert set(report["tenants"]) == {"team-a"}
@@ -0,0 +1,176 @@
+"""Tests for app.backend.tiers module and latency tiers in the API"""
+import threading
+import time
+import pytest
+from pydantic import ValidationError
+from unittest.mock import patch
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+from langchain_core.messages.ai import AIMessage
+from langchain_core.tools import tool
+from app.backend import api
+from app.backend.api import RequestState
+from app.backend.tiers import apply_tier, latency_limits
+from app.core.ai_agent import get_response_from_ai_agents
+from app.core.budget import LatencyTargetExceeded, DeadlineRunner, DeadlineSaturated
+from app.core.providers import GroqProvider, LocalChatModel
+
+TIERS = {
+    "interactive": {"latency_target_ms": 2000, "max_output_tokens": 512, "max_results": 2, "max_steps": 4,
+                    "temperature": 0.3, "models": {"llama-3.3-70b-versatile": "llama-3.1-8b-instant"}},
+    "batch": {"timeout_ms": 60000, "max_results": 5},
+}
+
+
+class ToolCallingFakeModel(FakeMessagesListChatModel):
+    def bind_tools(self, tools, tool_choice=None, **kwargs):
+        return self
+
+
+def make_request(**fields):
+    return RequestState(**dict({"model_name": "llama-3.3-70b-versatile", "messages": ["hi"], "allow_search": True},
+                               **fields))
+
+
+class TestApplyTier:
+    """Test cases for apply_tier and latency_limits"""
+
+    def test_presets_cap_and_default(self):
+        """Test the tier caps speed-related controls, supplies defaults and maps the model"""
+        request = make_request(tier="interactive", max_output_tokens=2048, max_steps=2, temperature=0.9)
+        assert apply_tier(request, TIERS) == "interactive"
+
+        assert request.model_name == "llama-3.1-8b-instant"
+        assert (request.max_output_tokens, request.max_steps, request.max_results) == (512, 2, 2)
+        assert request.temperature == 0.9
+
+    def test_default_and_unknown_tier(self):
+        request = make_request()
+        assert apply_tier(request, TIERS) is None and request.max_results is None
+        assert apply_tier(request, TIERS, default_tier="batch") == "batch" and request.max_results == 5
+
+        with pytest.raises(HTTPException) as exc:
+            apply_tier(make_request(tier="nope"), TIERS)
+        assert exc.value.status_code == 400
+
+    @pytest.mark.parametrize("field", [{"max_output_tokens": 0}, {"temperature": -0.1}, {"temperature": 2.5},
+                                       {"max_results": 0}])
+    def test_generation_controls_validated(self, field):
+        with pytest.raises(ValidationError):
+            make_request(**field)
+
+    def test_latency_limits(self):
+        assert latency_limits("interactive", TIERS) == (2.0, 4.0)
+        assert latency_limits("batch", TIERS) == (None, 60.0)
+        assert latency_limits(None, TIERS) == (None, None)
+
+
+class TestTieredChat:
+    """Test cases for tiered requests through /chat"""
+
+    @pytest.fixture
+    def client(self):
+        with patch('app.backend.api.settings.LATENCY_TIERS', TIERS), \
+             patch('app.backend.api.settings.DEFAULT_LATENCY_TIER', ""):
+            yield TestClient(api.app)
+
+    @patch('app.backend.api.get_response_from_ai_agents', return_value="quick answer")
+    def test_controls_reach_the_agent(self, mock_agent, client):
+        response = client.post("/chat", json={"model_name": "llama-3.3-70b-versatile", "messages": ["hi"],
+                                              "allow_search": True, "tier": "interactive"})
+
+        assert response.status_code == 200
+        assert response.json()["metadata"]["tier"]["met"] is True
+        assert mock_agent.call_args.args[0] == "llama-3.1-8b-instant"
+        assert mock_agent.call_args.kwargs["generation"] == {"max_output_tokens": 512, "temperature": 0.3,
+                                                            "max_results": 2}
+        assert mock_agent.call_args.kwargs["limits"]["max_steps"] == 4
+        assert (mock_agent.call_args.kwargs["latency_target"], mock_agent.call_args.kwargs["timeout"]) == (2.0, 4.0)
+
+    @patch('app.backend.api.get_response_from_ai_agents', side_effect=LatencyTargetExceeded("too slow"))
+    def test_timeout_is_504(self, mock_agent, client):
+        response = client.post("/chat", json={"model_name": "llama-3.1-8b-instant", "messages": ["hi"],
+                                              "allow_search": False, "tier": "batch"})
+        assert response.status_code == 504
+        assert response.json()["detail"]["tier"] == "batch"
+
+    @patch('app.backend.api.get_response_from_ai_agents', side_effect=DeadlineSaturated("busy"))
+    def test_saturated_is_503(self, mock_agent, client):
+        response = client.post("/chat", json={"model_name": "llama-3.1-8b-instant", "messages": ["hi"],
+                                              "allow_search": False, "tier": "batch"})
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+
+
+class TestAgentControls:
+    """Test cases for generation controls and the hard timeout in get_response_from_ai_agents"""
+
+    def test_configure_model(self):
+        model = GroqProvider(lambda name: None).configure(LocalChatModel(), max_output_tokens=10, temperature=0.2)
+        assert (model.max_tokens, model.temperature) == (10, 0.2)
+
+    @patch('app.core.ai_agent.settings', GROQ_API_KEY="test_groq_key", TAVILY_API_KEY="test_tavily_key")
+    @patch('app.core.ai_agent.TavilySearch')
+    @patch('app.core.ai_agent.ChatGroq')
+    def test_timeout_stops_run(self, mock_chatgroq, mock_tavily, mock_settings):
+        """Test a run still going at its timeout is stopped at its next step"""
+        @tool
+        def tavily_search(query: str) -> str:
+            """Search the web"""
+            time.sleep(0.3)
+            return "results"
+
+        mock_tavily.return_value = tavily_search
+        search_call = AIMessage(content="", tool_calls=[{"name": "tavily_search", "args": {"query": "q"}, "id": "c1"}])
+        mock_chatgroq.return_value = ToolCallingFakeModel(responses=[search_call, AIMessage(content="late")])
+
+        with pytest.raises(LatencyTargetExceeded):
+            get_response_from_ai_agents("llama-3.1-8b-instant", ["hi"], True, "prompt",
+                                        generation={"max_results": 3}, timeout=0.1)
+        assert mock_tavily.call_args.kwargs["max_results"] == 3
+
+    @patch('app.core.ai_agent.settings', GROQ_API_KEY="test_groq_key", TAVILY_API_KEY="test_tavily_key")
+    @patch('app.core.ai_agent.TavilySearch')
+    @patch('app.core.ai_agent.ChatGroq')
+    def test_timeout_interrupts_blocked_call(self, mock_chatgroq, mock_tavily, mock_settings):
+        """Test the caller gets LatencyTargetExceeded at the deadline even while a step is blocked"""
+        @tool
+        def tavily_search(query: str) -> str:
+            """Search the web"""
+            time.sleep(1.0)
+            return "results"
+
+        mock_tavily.return_value = tavily_search
+        search_call = AIMessage(content="", tool_calls=[{"name": "tavily_search", "args": {"query": "q"}, "id": "c1"}])
+        mock_chatgroq.return_value = ToolCallingFakeModel(responses=[search_call, AIMessage(content="late")])
+
+        start = time.perf_counter()
+        with pytest.raises(LatencyTargetExceeded):
+            get_response_from_ai_agents("llama-3.1-8b-instant", ["hi"], True, "prompt", timeout=0.1)
+        assert time.perf_counter() - start < 0.5
+
+
+class TestDeadlineRunner:
+    """Test cases for DeadlineRunner"""
+
+    def test_timeout_tells_run_to_stop(self):
+        runner = DeadlineRunner(1)
+        stopped = threading.Event()
+        assert runner.run(lambda: "done", timeout=1) == "done"
+        with pytest.raises(LatencyTargetExceeded):
+            runner.run(lambda: stopped.wait(5), timeout=0.05, on_timeout=stopped.set)
+        assert stopped.is_set()
+
+    def test_saturated_by_abandoned_run(self):
+        """Test a run abandoned at its timeout keeps its thread, and new runs are refused rather than queued"""
+        runner = DeadlineRunner(1)
+        release = threading.Event()
+        with pytest.raises(LatencyTargetExceeded):
+            runner.run(lambda: release.wait(5), timeout=0.05)
+
+        with pytest.raises(DeadlineSaturated):
+            runner.run(lambda: "queued", timeout=1)
+        release.set()
+        time.sleep(0.2)
+        assert runner.run(lambda: "done", timeout=1) == "done"
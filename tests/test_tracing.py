@@ -0,0 +1,162 @@
+"""Tests for app.common.tracing and app.core.agent_tracing modules"""
+import json
+import uuid
+import pytest
+from unittest.mock import patch, MagicMock
+from langchain_core.messages.ai import AIMessage
+from langchain_core.messages.human import HumanMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+from app.common import tracing
+from app.common.tracing import (
+    Tracer, InMemoryExporter, FileExporter, NOOP_SPAN, create_exporter, current_span
+)
+from app.core.agent_tracing import TracingCallbackHandler, tracing_callbacks
+from app.core.ai_agent import get_response_from_ai_agents
+
+
+@pytest.fixture
+def exporter():
+    """Point the global tracer at an in-memory exporter for one test"""
+    exporter = InMemoryExporter()
+    with patch.object(tracing.tracer, "exporter", exporter), \
+         patch.object(tracing.tracer, "sample_rate", 1.0):
+        yield exporter
+
+
+class TestTracer:
+    """Test cases for Tracer"""
+
+    def test_nested_spans(self):
+        """Test children share the trace id and point at their parent"""
+        exporter = InMemoryExporter()
+        tracer = Tracer(exporter)
+
+        with tracer.span("parent", route="/chat") as parent:
+            with tracer.span("child") as child:
+                assert current_span() is child
+
+        assert [s.name for s in exporter.spans] == ["child", "parent"]
+        assert child.trace_id == parent.trace_id
+        assert child.parent_id == parent.span_id
+        assert parent.attributes == {"route": "/chat"}
+        assert parent.duration_ms >= 0
+
+    def test_exception_recorded(self):
+        """Test errors mark the span and still export it"""
+        exporter = InMemoryExporter()
+        tracer = Tracer(exporter)
+
+        with pytest.raises(RuntimeError):
+            with tracer.span("failing"):
+                raise RuntimeError("boom")
+
+        assert exporter.spans[0].status == "error"
+        assert exporter.spans[0].attributes["error.type"] == "RuntimeError"
+
+    def test_disabled_tracer_is_noop(self):
+        """Test a tracer without exporter hands out the no-op span"""
+        tracer = Tracer(None)
+        with tracer.span("anything") as span:
+            assert span is NOOP_SPAN
+
+    def test_unsampled_trace_propagates(self):
+        """Test children of an unsampled root are not sampled either"""
+        exporter = InMemoryExporter()
+        tracer = Tracer(exporter, sample_rate=0.0000001)
+
+        with patch("app.common.tracing.random.random", return_value=0.5):
+            with tracer.span("root") as root, tracer.span("child") as child:
+                pass
+
+        assert root is NOOP_SPAN and child is NOOP_SPAN
+        assert exporter.spans == []
+
+    def test_trace_decorator(self):
+        exporter = InMemoryExporter()
+        tracer = Tracer(exporter)
+
+        @tracer.trace("decorated")
+        def work():
+            return 42
+
+        assert work() == 42
+        assert exporter.spans[0].name == "decorated"
+
+
+class TestExporters:
+    """Test cases for exporter creation"""
+
+    def test_file_exporter(self, tmp_path):
+        path = tmp_path / "traces.jsonl"
+        tracer = Tracer(FileExporter(str(path)))
+        with tracer.span("written"):
+            pass
+
+        record = json.loads(path.read_text())
+        assert record["name"] == "written"
+
+    def test_none_disables(self):
+        assert create_exporter("none") is None
+
+    def test_unknown_exporter(self):
+        with pytest.raises(ValueError, match="Unknown tracing exporter"):
+            create_exporter("zipkin")
+
+
+class TestTracingCallbackHandler:
+    """Test cases for turning langchain callbacks into spans"""
+
+    def test_node_llm_and_tool_spans(self, exporter):
+        """Test node, LLM and tool spans nest under the nearest traced ancestor"""
+        with tracing.tracer.span("root") as root:
+            handler = TracingCallbackHandler(root, llm_id="llama-3.1-8b-instant")
+            graph_run, node_run, inner_run, llm_run, tool_run = (uuid.uuid4() for _ in range(5))
+
+            handler.on_chain_start({}, {}, run_id=graph_run, name="LangGraph", metadata={})
+            handler.on_chain_start({}, {}, run_id=node_run, parent_run_id=graph_run, name="agent",
+                                   metadata={"langgraph_node": "agent", "langgraph_step": 1})
+            handler.on_chain_start({}, {}, run_id=inner_run, parent_run_id=node_run, name="RunnableSequence",
+                                   metadata={"langgraph_node": "agent"})
+            handler.on_chat_model_start({}, [[HumanMessage(content="hi")]], run_id=llm_run, parent_run_id=inner_run,
+                                        metadata={"ls_provider": "groq"},
+                                        invocation_params={"model": "llama-3.1-8b-instant"})
+            message = AIMessage(content="", usage_metadata={"input_tokens": 7, "output_tokens": 2, "total_tokens": 9})
+            handler.on_llm_end(LLMResult(generations=[[ChatGeneration(message=message)]]), run_id=llm_run)
+            handler.on_tool_start({"name": "tavily_search"}, "query", run_id=tool_run, parent_run_id=graph_run)
+            handler.on_tool_end("result text", run_id=tool_run)
+            handler.on_chain_end({}, run_id=inner_run)
+            handler.on_chain_end({}, run_id=node_run)
+            handler.on_chain_end({}, run_id=graph_run)
+
+        spans = {s.name: s for s in exporter.spans}
+        assert spans["llm.call"].parent_id == spans["langgraph.node.agent"].span_id
+        assert spans["llm.call"].attributes["llm.input_tokens"] == 7
+        assert spans["llm.call"].attributes["llm.model"] == "llama-3.1-8b-instant"
+        assert spans["tool.tavily_search"].parent_id == root.span_id
+        assert spans["tool.tavily_search"].attributes["tool.output_chars"] == len("result text")
+
+    def test_no_callbacks_when_unsampled(self):
+        assert tracing_callbacks() == []
+
+
+class TestAgentSpans:
+    """Test cases for spans emitted by get_response_from_ai_agents"""
+
+    @patch('app.core.ai_agent.settings')
+    @patch('app.core.ai_agent.ChatGroq')
+    @patch('app.core.ai_agent.create_react_agent')
+    def test_agent_spans(self, mock_create_agent, mock_chatgroq, mock_settings, exporter):
+        """Test the agent emits build and invoke spans under its own span"""
+        mock_settings.GROQ_API_KEY = "test_groq_key"
+        mock_agent = MagicMock()
+        mock_agent.invoke.return_value = {"messages": [AIMessage(content="Answer")]}
+        mock_create_agent.return_value = mock_agent
+
+        get_response_from_ai_agents("llama-3.1-8b-instant", ["hi"], False, "prompt", metadata={})
+
+        names = [s.name for s in exporter.spans]
+        assert names == ["agent.build", "agent.invoke", "agent.get_response_from_ai_agents"]
+        root = exporter.spans[-1]
+        assert root.attributes["llm.model"] == "llama-3.1-8b-instant"
+        callbacks = mock_agent.invoke.call_args.kwargs["config"]["callbacks"]
+        assert isinstance(callbacks[0], TracingCallbackHandler)
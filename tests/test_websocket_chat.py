@@ -0,0 +1,125 @@
+"""Tests for the /ws/chat endpoint and app.backend.websocket_chat module"""
+import threading
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+from langchain_core.messages.ai import AIMessage
+from app.backend import api
+from app.common.shared_state import InMemorySharedState
+from app.core.ai_agent import get_response_from_ai_agents
+from app.core.caching import ResponseCache
+from app.core.hedging import RunCancelled
+
+START = {"type": "start", "model_name": "llama-3.1-8b-instant", "system_prompt": "Be brief", "allow_search": False}
+
+
+def streaming_agent(model, messages, *args, on_token=None, cancel_event=None, **kwargs):
+    for word in ("Hello", " there"):
+        on_token(word)
+    return f"Hello there ({messages[0]})"
+
+
+def receive_turn(websocket):
+    """Collect server messages up to the end of one turn"""
+    received = []
+    while not received or received[-1]["type"] not in ("done", "cancelled", "error"):
+        received.append(websocket.receive_json())
+    return received
+
+
+@pytest.fixture
+def client():
+    with patch.object(api, "response_cache", ResponseCache(InMemorySharedState(), ttl=0)):
+        yield TestClient(api.app)
+
+
+class TestChatWebSocket:
+    """Test cases for the WebSocket chat protocol"""
+
+    @patch('app.backend.api.get_response_from_ai_agents', side_effect=streaming_agent)
+    def test_turns_stream_and_keep_history(self, mock_agent, client):
+        """Test tokens stream before done and later turns send only the new message"""
+        with client.websocket_connect("/ws/chat") as websocket:
+            websocket.send_json(START)
+            session_id = websocket.receive_json()["session_id"]
+
+            websocket.send_json({"type": "message", "content": "first"})
+            first = receive_turn(websocket)
+            websocket.send_json({"type": "message", "content": "second"})
+            receive_turn(websocket)
+
+        assert [m["type"] for m in first] == ["token", "token", "done"]
+        assert "".join(m["content"] for m in first[:-1]) == "Hello there"
+        assert first[-1]["response"] == "Hello there (first)"
+        second_call = mock_agent.call_args_list[1]
+        assert second_call.args[1] == ["second"]
+        assert second_call.kwargs["history"] == [{"role": "user", "content": "first"},
+                                                 {"role": "assistant", "content": "Hello there (first)"}]
+        api.session_store.clear(api.settings.DEFAULT_TENANT, session_id)
+
+    @patch('app.backend.api.get_response_from_ai_agents')
+    def test_cancel_and_interrupt(self, mock_agent, client):
+        """Test a cancelled turn stops, and an interrupt replaces the running turn without adding it to history"""
+        started = threading.Event()
+
+        def slow_agent(model, messages, *args, on_token=None, cancel_event=None, **kwargs):
+            if messages == ["slow"]:
+                started.set()
+                cancel_event.wait(5)
+                raise RunCancelled("Agent run cancelled")
+            return "fast answer"
+
+        mock_agent.side_effect = slow_agent
+        with client.websocket_connect("/ws/chat") as websocket:
+            websocket.send_json(START)
+            session_id = websocket.receive_json()["session_id"]
+
+            websocket.send_json({"type": "message", "content": "slow"})
+            started.wait(5)
+            websocket.send_json({"type": "cancel"})
+            assert receive_turn(websocket) == [{"type": "cancelled"}]
+
+            started.clear()
+            websocket.send_json({"type": "message", "content": "slow"})
+            started.wait(5)
+            websocket.send_json({"type": "interrupt", "content": "quick"})
+            assert receive_turn(websocket) == [{"type": "cancelled"}]
+            assert receive_turn(websocket)[-1]["response"] == "fast answer"
+
+        assert api.session_store.get(api.settings.DEFAULT_TENANT, session_id) == [{"role": "user", "content": "quick"},
+                                                     {"role": "assistant", "content": "fast answer"}]
+        api.session_store.clear(api.settings.DEFAULT_TENANT, session_id)
+
+    def test_protocol_errors(self, client):
+        with client.websocket_connect("/ws/chat") as websocket:
+            websocket.send_json({"type": "message", "content": "hi"})
+            assert websocket.receive_json() == {"type": "error", "status_code": 400,
+                                                "detail": "Send a start message first"}
+            websocket.send_json(dict(START, model_name="not-a-model"))
+            assert websocket.receive_json()["status_code"] == 400
+            websocket.send_json({"type": "cancel"})
+            assert websocket.receive_json()["status_code"] == 409
+
+
+class TestAgentStreaming:
+    """Test cases for on_token and cancel_event in get_response_from_ai_agents"""
+
+    @patch('app.core.ai_agent.settings', GROQ_API_KEY="test_groq_key")
+    @patch('app.core.ai_agent.ChatGroq')
+    def test_on_token(self, mock_chatgroq, mock_settings):
+        mock_chatgroq.return_value = FakeMessagesListChatModel(responses=[AIMessage(content="streamed answer")])
+        tokens = []
+        result = get_response_from_ai_agents("llama-3.1-8b-instant", ["hi"], False, "prompt", on_token=tokens.append)
+
+        assert result == "streamed answer"
+        assert "".join(tokens) == "streamed answer"
+
+    @patch('app.core.ai_agent.settings', GROQ_API_KEY="test_groq_key")
+    @patch('app.core.ai_agent.ChatGroq')
+    def test_cancel_event(self, mock_chatgroq, mock_settings):
+        mock_chatgroq.return_value = FakeMessagesListChatModel(responses=[AIMessage(content="never")])
+        cancel_event = threading.Event()
+        cancel_event.set()
+        with pytest.raises(RunCancelled):
+            get_response_from_ai_agents("llama-3.1-8b-instant", ["hi"], False, "prompt", cancel_event=cancel_event)
@@ -0,0 +1,130 @@
+"""Tests for app.backend.worker_pool module"""
+import os
+import pickle
+import time
+import pytest
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from unittest.mock import patch, MagicMock
+from fastapi.testclient import TestClient
+from app.backend import api
+from app.backend.concurrency import is_overload_error
+from app.backend.worker_pool import AgentWorkerPool, WorkerError, _portable_error
+from app.core.moderation import ContentFlaggedError
+
+
+class UpstreamError(Exception):
+    """Stand-in for a groq error that needs keyword arguments to rebuild"""
+
+    def __init__(self, message, *, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class TestPortableError:
+    """Test cases for sending worker errors back to the frontend"""
+
+    def test_picklable_error_kept(self):
+        error = ValueError("GROQ_API_KEY is not set")
+        assert _portable_error(error) is error
+
+    def test_unpicklable_error_wrapped(self):
+        """Test an error that cannot be rebuilt keeps its type name, message and status code"""
+        error = pickle.loads(pickle.dumps(_portable_error(UpstreamError("slow down", status_code=429))))
+
+        assert isinstance(error, WorkerError)
+        assert (error.error_type, str(error), error.status_code) == ("UpstreamError", "slow down", 429)
+        assert is_overload_error(error)
+
+    def test_content_flagged_round_trip(self):
+        error = pickle.loads(pickle.dumps(ContentFlaggedError({"safe": False, "categories": ["S1"]})))
+        assert error.verdict["categories"] == ["S1"]
+
+
+class TestAgentWorkerPool:
+    """Test cases for AgentWorkerPool with real worker processes"""
+
+    @pytest.fixture
+    def pool(self, monkeypatch):
+        monkeypatch.setenv("GROQ_API_KEY", "")
+        pool = AgentWorkerPool(workers=1, max_tasks=10).start()
+        yield pool
+        pool.shutdown()
+
+    def test_runs_in_worker_and_raises_agent_errors(self, pool):
+        """Test requests run in a separate, pre-started process and errors come back as raised"""
+        assert pool.pids and pool.pids[0] != os.getpid()
+
+        with pytest.raises(ValueError, match="GROQ_API_KEY"):
+            pool.get_response("llama-3.1-8b-instant", ["hi"], False, "prompt")
+        assert pool.snapshot()["submitted"] == 1
+
+    def test_recycle_replaces_workers(self, pool):
+        old_pids = pool.pids
+        pool.recycle()
+        assert pool.pids != old_pids
+        assert pool.snapshot()["recycles"] == 1
+
+    def test_recycles_by_hand_without_max_tasks_per_child(self, monkeypatch):
+        """Test Python 3.10 builds the pool without max_tasks_per_child and recycles it after the task limit"""
+        monkeypatch.setenv("GROQ_API_KEY", "")
+        with patch("app.backend.worker_pool._MAX_TASKS_PER_CHILD", False), \
+             patch("app.backend.worker_pool.ProcessPoolExecutor", wraps=ProcessPoolExecutor) as mock_executor:
+            pool = AgentWorkerPool(workers=1, max_tasks=2).start()
+            try:
+                assert "max_tasks_per_child" not in mock_executor.call_args.kwargs
+                for _ in range(2):
+                    with pytest.raises(ValueError):
+                        pool.get_response("llama-3.1-8b-instant", ["hi"], False, "prompt")
+                deadline = time.monotonic() + 60
+                while pool.snapshot()["recycles"] == 0 and time.monotonic() < deadline:
+                    time.sleep(0.05)
+                assert pool.snapshot()["recycles"] == 1
+            finally:
+                pool.shutdown()
+
+    def test_recycle_between_start_and_submit(self):
+        """Test a request submits to the executor that is current at submit time, not a recycled one"""
+        pool = AgentWorkerPool(workers=1)
+        old, new = ThreadPoolExecutor(1), ThreadPoolExecutor(1)
+        pool._executor = old
+
+        def start():
+            # recycle() swapping executors right after start() returned
+            pool._executor = new
+            old.shutdown(wait=False)
+            return pool
+
+        with patch.object(pool, "start", side_effect=start), \
+             patch("app.backend.worker_pool._run_agent", return_value=("ok", {"steps": 1})):
+            metadata = {}
+            assert pool.get_response("llama-3.1-8b-instant", ["hi"], False, "prompt", metadata=metadata) == "ok"
+        assert metadata == {"steps": 1}
+        new.shutdown()
+
+
+class TestWorkerPoolRouting:
+    """Test cases for the API's use of the worker pool"""
+
+    def test_chat_uses_worker_pool(self):
+        """Test /chat calls the pool and returns the metadata the worker filled in"""
+        pool = MagicMock()
+
+        def get_response(*args, metadata=None, **kwargs):
+            metadata["usage"] = {"input_tokens": 1, "output_tokens": 1, "total_tokens": 2, "llm_calls": 1}
+            return "from worker"
+
+        pool.get_response.side_effect = get_response
+        with patch.object(api, "worker_pool", pool):
+            response = TestClient(api.app).post("/chat", json={
+                "model_name": "llama-3.1-8b-instant",
+                "messages": ["hi"],
+                "allow_search": False
+            })
+
+        assert response.json()["response"] == "from worker"
+        assert response.json()["metadata"]["usage"]["total_tokens"] == 2
+
+    def test_recycle_requires_pool(self):
+        with patch.object(api, "worker_pool", None), patch.object(api.settings, "ADMIN_API_KEY", "admin"):
+            response = TestClient(api.app).post("/workers/recycle", headers={"X-Admin-Key": "admin"})
+        assert response.status_code == 409